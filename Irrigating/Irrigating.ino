@@ -3,30 +3,137 @@
 
 RTC_DS3231 rtc;
 
-// Pin definitions
-#define RELAY_PIN 3
-#define SOIL_PIN 6   // Digital output from soil moisture sensor
+// Task intervals (ms) for the millis() scheduler
+#define SAMPLE_INTERVAL_MS 50     // Soil sensor sampling
+#define CONTROL_INTERVAL_MS 100   // Pump on/off decisions
+#define CLOCK_INTERVAL_MS 1000    // RTC read and midnight reset
+#define REPORT_INTERVAL_MS 2000   // Fixed-rate reporting to the dashboard
 
-// Flow Rate in liters/minute (adjust based on your pump)
-float flowRate = 1.0;  
+// Soil samples kept for debouncing; the pump switches on when at least
+// DRY_COUNT samples read HIGH and off when at most WET_COUNT do
+#define SAMPLE_BUFFER_SIZE 8
+#define DRY_COUNT 6
+#define WET_COUNT 2
 
-// Variables
-bool pumpStatus = false;
-bool prevPumpStatus = false;
-unsigned long pumpStartTime = 0;
-float totalWaterUsed = 0.0;
-float waterUsedToday = 0.0;
-int wateringEventsToday = 0;
+// Reporting mode
+// false = send IRRIGATION_DATA every REPORT_INTERVAL_MS (fixed rate)
+// true  = send only when a reported field changes, plus a heartbeat
+#define REPORT_ON_CHANGE true
+#define HEARTBEAT_INTERVAL_S 60  // Max silence between reports in change mode
+
+// Offline backlog kept in the AT24C32 EEPROM on the DS3231 module, for
+// zone 0 only. Each 8-byte record holds: RTC unixtime (4), water today in 0.01 L (2),
+// events today (1), pump flag (bit 7) + soil HIGH count (bits 0-6) (1)
+#define BACKLOG_EEPROM_ADDR 0x57
+#define BACKLOG_RECORD_SIZE 8
+#define BACKLOG_CAPACITY 512          // 4 KB / 8 bytes
+#define BACKLOG_INTERVAL_S 300        // Log a record at least this often
+#define BACKLOG_RECORDS_PER_LINE 8    // Records per BACKLOG: line during download
+#define COMMAND_INTERVAL_MS 50        // Serial command polling
+#define BACKLOG_SEND_INTERVAL_MS 200  // Pacing of backlog download lines
+
+// Zones: one soil sensor and one relay per bed, each with its own pump
+// state, timing and water counters. Zone 0 is the original pair (sensor on
+// pin 6, relay on pin 3); add a line per extra bed.
+// With more than one zone every report is a single frame listing all zones:
+//   IRRIGATION_DATA:ZONES=3,MOISTURE=700;300;300,PUMP=1;0;0,...,TIME=...
+// (values separated by ';', zone 0 first). A one-zone build sends the
+// original single-zone line. Each zone adds about 25 characters, roughly
+// 25 ms at 9600 baud, so raise the baud rate on both ends for many zones.
+struct Zone {
+  byte soilPin;      // Digital output from the zone's soil moisture sensor
+  byte relayPin;
+  float flowRate;    // Liters/minute of the zone's pump or valve
+
+  bool pumpStatus;
+  unsigned long pumpStartTime;
+  float totalWaterUsed;
+  float waterUsedToday;
+  int wateringEventsToday;
+
+  // Ring buffer of raw soil readings (1 = HIGH/DRY)
+  byte soilSamples[SAMPLE_BUFFER_SIZE];
+  byte soilSampleIndex;
+  byte soilHighCount;
+  bool soilDry;
+
+  // Last values sent to the dashboard (change-driven mode)
+  int lastSentMoisture;
+  bool lastSentPump;
+  float lastSentWater;
+  int lastSentEvents;
+};
+
+Zone zones[] = {
+  // soil pin, relay pin, flow rate (L/min)
+  {6, 3, 1.0},
+  // {7, 4, 1.0},
+  // {8, 5, 0.5},
+};
+const byte ZONE_COUNT = sizeof(zones) / sizeof(zones[0]);
 
+// Fields of the data frame that carry one value per zone
+enum ZoneField { FIELD_MOISTURE, FIELD_PUMP, FIELD_WATER_USED, FIELD_TOTAL, FIELD_EVENTS };
+
+// Variables
+DateTime now;
 DateTime lastDate;
 
+unsigned long lastReportTime = 0;
+
+// Backlog ring buffer position and download state
+unsigned int backlogHead = 0;       // Next slot to write
+unsigned int backlogCount = 0;      // Valid records stored
+uint32_t lastBacklogTime = 0;
+bool lastBacklogPump = false;
+unsigned int downloadIndex = 0;     // Next slot to send
+unsigned int downloadRemaining = 0;
+
+// Serial command buffer
+char commandBuffer[48];
+byte commandLength = 0;
+
+// Cooperative scheduler: each task runs when its interval has elapsed
+struct Task {
+  unsigned long interval;
+  unsigned long lastRun;
+  void (*run)();
+};
+
+void sampleSoil();
+void controlPump();
+void updateClock();
+void reportData();
+void readCommands();
+void sendBacklog();
+
+Task tasks[] = {
+  {SAMPLE_INTERVAL_MS, 0, sampleSoil},
+  {CONTROL_INTERVAL_MS, 0, controlPump},
+  {CLOCK_INTERVAL_MS, 0, updateClock},
+  {REPORT_INTERVAL_MS, 0, reportData},
+  {COMMAND_INTERVAL_MS, 0, readCommands},
+  {BACKLOG_SEND_INTERVAL_MS, 0, sendBacklog},
+};
+const byte TASK_COUNT = sizeof(tasks) / sizeof(tasks[0]);
+
 void setup() {
   Serial.begin(9600);
-  pinMode(RELAY_PIN, OUTPUT);
-  pinMode(SOIL_PIN, INPUT);
-  
-  // Make sure pump is OFF initially
-  digitalWrite(RELAY_PIN, HIGH);  // HIGH = OFF for most relay modules
+  for (byte z = 0; z < ZONE_COUNT; z++) {
+    Zone& zone = zones[z];
+    pinMode(zone.relayPin, OUTPUT);
+    pinMode(zone.soilPin, INPUT);
+
+    // Make sure pump is OFF initially
+    digitalWrite(zone.relayPin, HIGH);  // HIGH = OFF for most relay modules
+
+    // Start with a buffer full of WET readings so the pump stays off until
+    // the sensor has actually reported dry soil
+    for (byte i = 0; i < SAMPLE_BUFFER_SIZE; i++) zone.soilSamples[i] = 0;
+    zone.lastSentMoisture = -1;
+    zone.lastSentWater = -1.0;
+    zone.lastSentEvents = -1;
+  }
 
   if (!rtc.begin()) {
     Serial.println("RTC not found!");
@@ -38,75 +145,186 @@ void setup() {
     rtc.adjust(DateTime(F(__DATE__), F(__TIME__)));
   }
 
-  lastDate = rtc.now();
+  now = rtc.now();
+  lastDate = now;
+
+  findBacklogHead();
   
   Serial.println("Smart Irrigation System Started");
   Serial.println("Digital Soil Sensor Logic (CORRECTED):");
   Serial.println("- HIGH = DRY soil (pump ON)");
   Serial.println("- LOW = WET soil (pump OFF)");
+
+  unsigned long start = millis();
+  for (byte i = 0; i < TASK_COUNT; i++) tasks[i].lastRun = start;
 }
 
 void loop() {
-  DateTime now = rtc.now();
+  unsigned long current = millis();
+  for (byte i = 0; i < TASK_COUNT; i++) {
+    if (current - tasks[i].lastRun >= tasks[i].interval) {
+      // Advance by whole intervals to avoid drift, but never try to catch up
+      // on runs missed while another task was busy
+      tasks[i].lastRun += tasks[i].interval;
+      if (current - tasks[i].lastRun >= tasks[i].interval) tasks[i].lastRun = current;
+      tasks[i].run();
+    }
+  }
+}
 
-  // Reset daily water usage at midnight
-  if (now.day() != lastDate.day()) {
-    waterUsedToday = 0;
-    wateringEventsToday = 0;
-    Serial.println("Daily counters reset - New day!");
+// Moisture for the dashboard: the debounced state, 700 = DRY, 300 = WET.
+// Only a debounced change is reported, not every step of the ring or
+// contact bounce; the raw HIGH count goes into the backlog records.
+int moistureDisplay(const Zone& zone) {
+  return zone.soilDry ? 700 : 300;
+}
+
+// Zone prefix for console messages of multi-zone builds
+void printZone(byte z) {
+  if (ZONE_COUNT > 1) {
+    Serial.print("Zone "); Serial.print(z); Serial.print(" ");
   }
-  lastDate = now;
+}
 
-  int soilStatus = digitalRead(SOIL_PIN);
-  
-  // Debug: Print raw sensor reading
-  Serial.print("Raw sensor: "); Serial.println(soilStatus == HIGH ? "HIGH (DRY)" : "LOW (WET)");
+void sampleSoil() {
+  for (byte z = 0; z < ZONE_COUNT; z++) {
+    Zone& zone = zones[z];
+    byte reading = digitalRead(zone.soilPin) == HIGH ? 1 : 0;
+    zone.soilHighCount += reading - zone.soilSamples[zone.soilSampleIndex];
+    zone.soilSamples[zone.soilSampleIndex] = reading;
+    zone.soilSampleIndex = (zone.soilSampleIndex + 1) % SAMPLE_BUFFER_SIZE;
+
+    // Debounce with hysteresis so contact bounce cannot toggle the pump
+    bool wasDry = zone.soilDry;
+    if (zone.soilHighCount >= DRY_COUNT) zone.soilDry = true;
+    else if (zone.soilHighCount <= WET_COUNT) zone.soilDry = false;
+
+    if (REPORT_ON_CHANGE && zone.soilDry != wasDry) {
+      printZone(z);
+      Serial.print("Raw sensor: "); Serial.println(zone.soilDry ? "HIGH (DRY)" : "LOW (WET)");
+    }
+  }
+}
 
+void controlZone(byte z) {
+  Zone& zone = zones[z];
   // CORRECTED Soil sensor logic:
   // HIGH (1) = DRY soil → turn pump ON
   // LOW (0) = WET soil → turn pump OFF
-  if (soilStatus == HIGH) {
+  if (zone.soilDry) {
     // Soil is DRY - turn pump ON
-    if (!pumpStatus) {
+    if (!zone.pumpStatus) {
+      printZone(z);
       Serial.println(">>> SOIL DRY - TURNING PUMP ON <<<");
-      pumpStartTime = millis();
-      wateringEventsToday++;
+      zone.pumpStartTime = millis();
+      zone.wateringEventsToday++;
     }
-    digitalWrite(RELAY_PIN, LOW);  // RELAY ON (most relays are active LOW)
-    pumpStatus = true;
+    digitalWrite(zone.relayPin, LOW);  // RELAY ON (most relays are active LOW)
+    zone.pumpStatus = true;
   } 
   else {
     // Soil is WET - turn pump OFF
-    if (pumpStatus) {
+    if (zone.pumpStatus) {
+      printZone(z);
       Serial.println(">>> SOIL WET - TURNING PUMP OFF <<<");
-      unsigned long durationMs = millis() - pumpStartTime;
+      unsigned long durationMs = millis() - zone.pumpStartTime;
       float durationMin = durationMs / 60000.0; // convert ms → minutes
-      float waterSupplied = flowRate * durationMin;
-      waterUsedToday += waterSupplied;
-      totalWaterUsed += waterSupplied;
+      float waterSupplied = zone.flowRate * durationMin;
+      zone.waterUsedToday += waterSupplied;
+      zone.totalWaterUsed += waterSupplied;
       
+      printZone(z);
       Serial.print("Watering completed: ");
       Serial.print(durationMin, 2);
       Serial.print(" minutes, ");
       Serial.print(waterSupplied, 2);
       Serial.println(" liters");
     }
-    digitalWrite(RELAY_PIN, HIGH); // RELAY OFF (most relays are active LOW)
-    pumpStatus = false;
+    digitalWrite(zone.relayPin, HIGH); // RELAY OFF (most relays are active LOW)
+    zone.pumpStatus = false;
   }
+}
 
-  prevPumpStatus = pumpStatus;
+bool zoneChanged(const Zone& zone) {
+  return moistureDisplay(zone) != zone.lastSentMoisture
+      || zone.pumpStatus != zone.lastSentPump
+      || zone.waterUsedToday != zone.lastSentWater
+      || zone.wateringEventsToday != zone.lastSentEvents;
+}
 
-  // Send data to Python Dashboard
-  // For dashboard compatibility: send higher number when DRY, lower when WET
-  int moistureDisplay = (soilStatus == HIGH) ? 700 : 300;  // DRY=700, WET=300
-  
+void controlPump() {
+  for (byte z = 0; z < ZONE_COUNT; z++) controlZone(z);
+
+  // Pump changes are always logged so the host can rebuild pump time
+  if (zones[0].pumpStatus != lastBacklogPump) logBacklogRecord();
+
+  // In change-driven mode report as soon as a value of any zone changes;
+  // the frame always carries every zone
+  if (REPORT_ON_CHANGE) {
+    bool changed = false;
+    for (byte z = 0; z < ZONE_COUNT && !changed; z++) changed = zoneChanged(zones[z]);
+    bool heartbeatDue = millis() - lastReportTime >= HEARTBEAT_INTERVAL_S * 1000UL;
+    if (changed || heartbeatDue) sendIrrigationData();
+  }
+}
+
+void updateClock() {
+  now = rtc.now();
+
+  // Reset daily water usage at midnight
+  if (now.day() != lastDate.day()) {
+    for (byte z = 0; z < ZONE_COUNT; z++) {
+      zones[z].waterUsedToday = 0;
+      zones[z].wateringEventsToday = 0;
+    }
+    Serial.println("Daily counters reset - New day!");
+    logBacklogRecord();
+  }
+  lastDate = now;
+
+  if (now.unixtime() - lastBacklogTime >= BACKLOG_INTERVAL_S) logBacklogRecord();
+}
+
+void reportData() {
+  if (REPORT_ON_CHANGE) return;  // Reports are sent from controlPump()
+
+  for (byte z = 0; z < ZONE_COUNT; z++) {
+    printZone(z);
+    Serial.print("Raw sensor: "); Serial.println(zones[z].soilDry ? "HIGH (DRY)" : "LOW (WET)");
+  }
+  sendIrrigationData();
+}
+
+// Prints one field with the value of every zone, separated by ';'
+void printZoneField(const char* name, ZoneField field) {
+  Serial.print(name);
+  for (byte z = 0; z < ZONE_COUNT; z++) {
+    const Zone& zone = zones[z];
+    if (z > 0) Serial.print(";");
+    switch (field) {
+      case FIELD_MOISTURE: Serial.print(moistureDisplay(zone)); break;
+      case FIELD_PUMP: Serial.print(zone.pumpStatus ? 1 : 0); break;
+      case FIELD_WATER_USED: Serial.print(zone.waterUsedToday, 2); break;
+      case FIELD_TOTAL: Serial.print(zone.totalWaterUsed, 2); break;
+      case FIELD_EVENTS: Serial.print(zone.wateringEventsToday); break;
+    }
+  }
+}
+
+void sendIrrigationData() {
   Serial.print("IRRIGATION_DATA:");
-  Serial.print("MOISTURE="); Serial.print(moistureDisplay);
-  Serial.print(",PUMP="); Serial.print(pumpStatus ? 1 : 0);
-  Serial.print(",WATER_USED="); Serial.print(waterUsedToday, 2);
-  Serial.print(",TOTAL="); Serial.print(totalWaterUsed, 2);
-  Serial.print(",EVENTS="); Serial.print(wateringEventsToday);
+  if (ZONE_COUNT > 1) {
+    Serial.print("ZONES="); Serial.print(ZONE_COUNT); Serial.print(",");
+  }
+  printZoneField("MOISTURE=", FIELD_MOISTURE);
+  printZoneField(",PUMP=", FIELD_PUMP);
+  printZoneField(",WATER_USED=", FIELD_WATER_USED);
+  printZoneField(",TOTAL=", FIELD_TOTAL);
+  printZoneField(",EVENTS=", FIELD_EVENTS);
+  if (REPORT_ON_CHANGE) {
+    // Tells the dashboard how long the previous values may be held
+    Serial.print(",HEARTBEAT="); Serial.print(HEARTBEAT_INTERVAL_S);
+  }
   Serial.print(",TIME="); 
   
   // Format time with leading zeros
@@ -123,5 +341,136 @@ void loop() {
   Serial.print(now.second());
   Serial.println();
 
-  delay(2000); // send update every 2s
-}
\ No newline at end of file
+  for (byte z = 0; z < ZONE_COUNT; z++) {
+    Zone& zone = zones[z];
+    zone.lastSentMoisture = moistureDisplay(zone);
+    zone.lastSentPump = zone.pumpStatus;
+    zone.lastSentWater = zone.waterUsedToday;
+    zone.lastSentEvents = zone.wateringEventsToday;
+  }
+  lastReportTime = millis();
+}
+
+// ---- Offline backlog (AT24C32 EEPROM) ----
+
+void eepromWrite(unsigned int address, const byte* data, byte length) {
+  Wire.beginTransmission(BACKLOG_EEPROM_ADDR);
+  Wire.write((byte)(address >> 8));
+  Wire.write((byte)(address & 0xFF));
+  Wire.write(data, length);
+  Wire.endTransmission();
+  delay(5);  // EEPROM write cycle; records are aligned so one page write suffices
+}
+
+void eepromRead(unsigned int address, byte* data, byte length) {
+  Wire.beginTransmission(BACKLOG_EEPROM_ADDR);
+  Wire.write((byte)(address >> 8));
+  Wire.write((byte)(address & 0xFF));
+  Wire.endTransmission();
+  Wire.requestFrom((int)BACKLOG_EEPROM_ADDR, (int)length);
+  for (byte i = 0; i < length && Wire.available(); i++) data[i] = Wire.read();
+}
+
+uint32_t recordTime(const byte* record) {
+  return (uint32_t)record[0] | ((uint32_t)record[1] << 8)
+       | ((uint32_t)record[2] << 16) | ((uint32_t)record[3] << 24);
+}
+
+// Erased slots read 0xFFFFFFFF; the newest timestamp marks the ring head
+void findBacklogHead() {
+  byte record[BACKLOG_RECORD_SIZE];
+  uint32_t newest = 0;
+  backlogHead = 0;
+  backlogCount = 0;
+  for (unsigned int slot = 0; slot < BACKLOG_CAPACITY; slot++) {
+    eepromRead(slot * BACKLOG_RECORD_SIZE, record, BACKLOG_RECORD_SIZE);
+    uint32_t t = recordTime(record);
+    if (t == 0xFFFFFFFFUL || t == 0) continue;
+    backlogCount++;
+    if (t >= newest) {
+      newest = t;
+      backlogHead = (slot + 1) % BACKLOG_CAPACITY;
+    }
+  }
+}
+
+void logBacklogRecord() {
+  const Zone& zone = zones[0];
+  uint32_t t = now.unixtime();
+  unsigned int water = (unsigned int)(zone.waterUsedToday * 100.0 + 0.5);
+  byte record[BACKLOG_RECORD_SIZE] = {
+    (byte)t, (byte)(t >> 8), (byte)(t >> 16), (byte)(t >> 24),
+    (byte)water, (byte)(water >> 8),
+    (byte)min(zone.wateringEventsToday, 255),
+    (byte)((zone.pumpStatus ? 0x80 : 0) | (zone.soilHighCount & 0x7F))
+  };
+  eepromWrite(backlogHead * BACKLOG_RECORD_SIZE, record, BACKLOG_RECORD_SIZE);
+  backlogHead = (backlogHead + 1) % BACKLOG_CAPACITY;
+  if (backlogCount < BACKLOG_CAPACITY) backlogCount++;
+  lastBacklogTime = t;
+  lastBacklogPump = zone.pumpStatus;
+}
+
+// Start a download of every record newer than since (0 = everything)
+void startBacklogDownload(uint32_t since) {
+  byte record[BACKLOG_RECORD_SIZE];
+  unsigned int oldest = (backlogHead + BACKLOG_CAPACITY - backlogCount) % BACKLOG_CAPACITY;
+  downloadIndex = oldest;
+  downloadRemaining = backlogCount;
+
+  // Skip records the host already has (ring is in time order from oldest)
+  while (downloadRemaining > 0) {
+    eepromRead(downloadIndex * BACKLOG_RECORD_SIZE, record, BACKLOG_RECORD_SIZE);
+    if (recordTime(record) > since) break;
+    downloadIndex = (downloadIndex + 1) % BACKLOG_CAPACITY;
+    downloadRemaining--;
+  }
+
+  Serial.print("BACKLOG_BEGIN:COUNT="); Serial.print(downloadRemaining);
+  Serial.print(",BUFFER="); Serial.print(SAMPLE_BUFFER_SIZE);
+  Serial.print(",INTERVAL="); Serial.println(BACKLOG_INTERVAL_S);
+}
+
+// Sends one line of hex-encoded records per run so control keeps running
+void sendBacklog() {
+  if (downloadRemaining == 0) return;
+
+  byte record[BACKLOG_RECORD_SIZE];
+  Serial.print("BACKLOG:");
+  for (byte n = 0; n < BACKLOG_RECORDS_PER_LINE && downloadRemaining > 0; n++) {
+    eepromRead(downloadIndex * BACKLOG_RECORD_SIZE, record, BACKLOG_RECORD_SIZE);
+    for (byte i = 0; i < BACKLOG_RECORD_SIZE; i++) {
+      if (record[i] < 0x10) Serial.print("0");
+      Serial.print(record[i], HEX);
+    }
+    downloadIndex = (downloadIndex + 1) % BACKLOG_CAPACITY;
+    downloadRemaining--;
+  }
+  Serial.println();
+
+  if (downloadRemaining == 0) Serial.println("BACKLOG_END");
+}
+
+// ---- Serial commands from the dashboard ----
+// REQUEST_DATA              send a data line now
+// REQUEST_DATA:SINCE=<unix> download backlog records newer than <unix>
+
+void readCommands() {
+  while (Serial.available() > 0) {
+    char c = Serial.read();
+    if (c == '\r') continue;
+    if (c != '\n') {
+      if (commandLength < sizeof(commandBuffer) - 1) commandBuffer[commandLength++] = c;
+      continue;
+    }
+    commandBuffer[commandLength] = '\0';
+    commandLength = 0;
+
+    if (strcmp(commandBuffer, "REQUEST_DATA") == 0) {
+      sendIrrigationData();
+    } else if (strncmp(commandBuffer, "REQUEST_DATA:SINCE=", 19) == 0) {
+      startBacklogDownload(strtoul(commandBuffer + 19, NULL, 10));
+    }
+    // SETTINGS: commands are not supported by this sketch yet
+  }
+}
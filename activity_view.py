@@ -0,0 +1,172 @@
+import time
+from datetime import datetime, date
+import tkinter as tk
+from tkinter import ttk
+import tkinter.font as tkfont
+
+from event_log import LEVELS, EventQuery
+
+
+LEVEL_COLORS = {
+    'DEBUG': '#95a5a6',
+    'INFO': 'white',
+    'WARNING': '#f39c12',
+    'ERROR': '#e74c3c',
+    'CRITICAL': '#ff6b6b'
+}
+
+# Start of the shown span, in seconds back from now ('today' is since midnight)
+SINCE_CHOICES = {
+    'All': None,
+    'Last hour': 3600,
+    'Today': 'today',
+    'Last 7 days': 7 * 86400
+}
+
+POLL_MS = 250  # How often new events are picked up
+FILTER_DELAY_MS = 300  # Typing pause before the text filter is applied
+
+
+class ActivityView(tk.Frame):
+    """Virtualized, filterable list of the event log
+
+    The listbox only ever holds the rows that fit on screen. The scrollbar
+    is driven from the number of matching events, so scrolling through a
+    long history formats one screen of rows per step. New events are
+    picked up by polling on the GUI thread, and while the view is scrolled
+    to the bottom it follows them.
+    """
+    def __init__(self, parent, event_log, level='INFO'):
+        super().__init__(parent, bg='#34495e')
+        self.event_log = event_log
+        self.query = None
+        self.top = 0
+        self.visible_rows = 20
+        self.follow = True
+        self.cleared_seq = 0
+        self.pending_filter = None
+
+        filter_frame = tk.Frame(self, bg='#34495e')
+        filter_frame.pack(fill='x', padx=5, pady=(5, 0))
+
+        tk.Label(filter_frame, text="Level:", fg='white', bg='#34495e',
+                font=('Arial', 10)).pack(side=tk.LEFT)
+        self.level_var = tk.StringVar(value=level)
+        level_box = ttk.Combobox(filter_frame, textvariable=self.level_var, values=LEVELS,
+                                 width=10, state="readonly")
+        level_box.pack(side=tk.LEFT, padx=5)
+        level_box.bind("<<ComboboxSelected>>", lambda event: self.apply_filter())
+
+        tk.Label(filter_frame, text="Since:", fg='white', bg='#34495e',
+                font=('Arial', 10)).pack(side=tk.LEFT, padx=(10, 0))
+        self.since_var = tk.StringVar(value='All')
+        since_box = ttk.Combobox(filter_frame, textvariable=self.since_var, values=list(SINCE_CHOICES),
+                                 width=11, state="readonly")
+        since_box.pack(side=tk.LEFT, padx=5)
+        since_box.bind("<<ComboboxSelected>>", lambda event: self.apply_filter())
+
+        tk.Label(filter_frame, text="Search:", fg='white', bg='#34495e',
+                font=('Arial', 10)).pack(side=tk.LEFT, padx=(10, 0))
+        self.text_var = tk.StringVar()
+        tk.Entry(filter_frame, textvariable=self.text_var, width=25).pack(side=tk.LEFT, padx=5)
+        self.text_var.trace_add('write', lambda *args: self.filter_later())
+
+        self.count_label = tk.Label(filter_frame, text="", fg='#bdc3c7', bg='#34495e',
+                                   font=('Arial', 9))
+        self.count_label.pack(side=tk.RIGHT)
+
+        list_frame = tk.Frame(self, bg='#34495e')
+        list_frame.pack(fill='both', expand=True, padx=5, pady=5)
+
+        self.font = tkfont.Font(family='Arial', size=10)
+        self.listbox = tk.Listbox(list_frame, font=self.font,
+                                  bg='#2c3e50', fg='white',
+                                  selectbackground='#3498db', activestyle='none')
+        self.scrollbar = tk.Scrollbar(list_frame, command=self.on_scroll)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.listbox.pack(side=tk.LEFT, fill='both', expand=True)
+
+        self.listbox.bind("<Configure>", self.on_resize)
+        self.listbox.bind("<MouseWheel>", lambda event: self.scroll_by(-3 if event.delta > 0 else 3))
+        self.listbox.bind("<Button-4>", lambda event: self.scroll_by(-3))
+        self.listbox.bind("<Button-5>", lambda event: self.scroll_by(3))
+
+        self.apply_filter()
+        self.after(POLL_MS, self.poll)
+
+    def since_seq(self):
+        since = SINCE_CHOICES[self.since_var.get()]
+        if since is None:
+            return 0
+        if since == 'today':
+            start = datetime.combine(date.today(), datetime.min.time()).timestamp()
+        else:
+            start = time.time() - since
+        return self.event_log.seq_at(start)
+
+    def apply_filter(self):
+        """Rebuild the query from the filter controls and jump to the newest rows"""
+        self.pending_filter = None
+        self.query = EventQuery(self.event_log, self.level_var.get(), self.text_var.get(),
+                                max(self.since_seq(), self.cleared_seq))
+        self.follow = True
+        self.show()
+
+    def filter_later(self):
+        if self.pending_filter is not None:
+            self.after_cancel(self.pending_filter)
+        self.pending_filter = self.after(FILTER_DELAY_MS, self.apply_filter)
+
+    def clear(self):
+        """Hide everything logged so far; the log files keep it"""
+        self.cleared_seq = self.event_log.next_seq
+        self.apply_filter()
+
+    def poll(self):
+        if self.query.refresh():
+            self.show()
+        self.after(POLL_MS, self.poll)
+
+    def on_resize(self, event):
+        border = 2 * (int(self.listbox.cget('borderwidth')) + int(self.listbox.cget('highlightthickness')))
+        line_height = self.font.metrics('linespace') + 2 * int(self.listbox.cget('selectborderwidth'))
+        rows = max(1, (event.height - border) // line_height)
+        if rows != self.visible_rows:
+            self.visible_rows = rows
+            self.show()
+
+    def on_scroll(self, *args):
+        if args[0] == 'moveto':
+            self.top = int(float(args[1]) * len(self.query))
+            self.follow = False
+            self.show()
+        elif args[0] == 'scroll':
+            self.scroll_by(int(args[1]) * (self.visible_rows if args[2] == 'pages' else 1))
+
+    def scroll_by(self, rows):
+        self.top += rows
+        self.follow = False
+        self.show()
+
+    def show(self):
+        """Page in the visible rows of the query"""
+        total = len(self.query)
+        last_top = max(0, total - self.visible_rows)
+        if self.follow or self.top >= last_top:
+            self.top = last_top
+            self.follow = True
+        self.top = max(0, self.top)
+
+        self.listbox.delete(0, tk.END)
+        for index, (timestamp, level, message, _) in enumerate(self.query.page(self.top, self.visible_rows)):
+            when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp))
+            self.listbox.insert(tk.END, f"[{when}] {level:<8} {message}")
+            if level != 'INFO':
+                self.listbox.itemconfig(index, fg=LEVEL_COLORS[level])
+        self.listbox.yview_moveto(0)
+
+        if total:
+            self.scrollbar.set(self.top / total, min(1.0, (self.top + self.visible_rows) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+        self.count_label.config(text=f"{total} events")
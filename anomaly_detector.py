@@ -0,0 +1,222 @@
+import json
+import math
+from datetime import datetime
+
+
+class RunningStats:
+    """Welford's online mean and variance in O(1) memory"""
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+
+class EWMA:
+    """Exponentially weighted moving average"""
+    def __init__(self, alpha=0.1):
+        self.alpha = alpha
+        self.value = None
+
+    def add(self, value):
+        if self.value is None:
+            self.value = value
+        else:
+            self.value += self.alpha * (value - self.value)
+        return self.value
+
+
+class RunLengthTracker:
+    """How long a value has stayed unchanged"""
+    def __init__(self):
+        self.value = None
+        self.since = None
+
+    def update(self, value, timestamp):
+        if value != self.value:
+            self.value = value
+            self.since = timestamp
+        return (timestamp - self.since).total_seconds()
+
+
+class _ZoneState:
+    """Rolling statistics for one zone"""
+    def __init__(self, ewma_alpha):
+        self.last = None
+        self.pump_since = None
+        self.pump_water_start = 0.0
+        self.uncredited_pump_seconds = 0.0
+        self.moisture_run = RunLengthTracker()
+        self.run_durations = RunningStats()
+        self.water_per_event = EWMA(ewma_alpha)
+        self.active_alerts = set()
+
+
+class AnomalyDetector:
+    """Online detector for stuck relays, dead sensors and leaks
+
+    observe() is called once per sample and returns any new alerts. Each
+    alert is raised once per episode and re-armed when the condition
+    clears, so a stuck pump does not flood the activity feed.
+    """
+    def __init__(self, flow_rate=1.0, stuck_pump_seconds=3600, long_run_sigma=4.0,
+                 min_runs=10, flow_tolerance=1.5, water_spike_factor=3.0, ewma_alpha=0.1):
+        self.flow_rate = flow_rate
+        self.stuck_pump_seconds = stuck_pump_seconds
+        self.long_run_sigma = long_run_sigma
+        self.min_runs = min_runs
+        self.flow_tolerance = flow_tolerance
+        self.water_spike_factor = water_spike_factor
+        self.ewma_alpha = ewma_alpha
+        self.zones = {}
+
+    def observe(self, timestamp, moisture, pump, water_used, events, zone='default'):
+        """Update the zone's statistics with one sample and return new alerts"""
+        state = self.zones.get(zone)
+        if state is None:
+            state = self.zones[zone] = _ZoneState(self.ewma_alpha)
+
+        alerts = []
+        last = state.last
+        same_day = last is not None and last['timestamp'].date() == timestamp.date()
+
+        # The sketch credits a run's water when the pump turns off, so the
+        # counter may only grow by what the pump could deliver since the last credit
+        if same_day:
+            if last['pump']:
+                state.uncredited_pump_seconds += max((timestamp - last['timestamp']).total_seconds(), 0)
+            delta = water_used - last['water_used']
+            if delta > 0.005:
+                allowed = self.flow_rate * state.uncredited_pump_seconds / 60.0 * self.flow_tolerance + 0.02
+                if delta > allowed:
+                    alerts.append(self._alert(state, 'water_jump', 'warning', zone, timestamp,
+                        f"Water used jumped {delta:.2f} L after {state.uncredited_pump_seconds:.0f} s of pumping "
+                        f"(flow rate allows {allowed:.2f} L) - possible leak or broken pipe"))
+                else:
+                    state.active_alerts.discard('water_jump')
+                state.uncredited_pump_seconds = 0.0
+            elif delta < -0.01:
+                alerts.append(self._alert(state, 'water_reset', 'warning', zone, timestamp,
+                    f"Water used dropped from {last['water_used']:.2f} L to {water_used:.2f} L "
+                    f"without a day change - controller reset?"))
+            else:
+                state.active_alerts.discard('water_reset')
+        else:
+            state.uncredited_pump_seconds = 0.0
+
+        # Pump run tracking
+        moisture_run = state.moisture_run.update(moisture, timestamp)
+        if pump:
+            if state.pump_since is None:
+                state.pump_since = timestamp
+                state.pump_water_start = water_used
+            run_seconds = (timestamp - state.pump_since).total_seconds()
+
+            if run_seconds >= self.stuck_pump_seconds and moisture_run >= self.stuck_pump_seconds:
+                alerts.append(self._alert(state, 'stuck_pump', 'critical', zone, timestamp,
+                    f"Pump ON for {run_seconds / 60:.0f} min with moisture stuck at {moisture} "
+                    f"- stuck relay or dead sensor"))
+
+            stats = state.run_durations
+            if stats.count >= self.min_runs:
+                limit = stats.mean + self.long_run_sigma * max(stats.std, 1.0)
+                if run_seconds > limit:
+                    alerts.append(self._alert(state, 'long_run', 'warning', zone, timestamp,
+                        f"Pump run of {run_seconds:.0f} s exceeds usual {stats.mean:.0f} s "
+                        f"± {stats.std:.0f} s"))
+        elif state.pump_since is not None:
+            run_seconds = (timestamp - state.pump_since).total_seconds()
+            state.run_durations.add(run_seconds)
+            state.pump_since = None
+            state.active_alerts.discard('stuck_pump')
+            state.active_alerts.discard('long_run')
+
+            # Water credited to this run compared with the usual amount per event
+            if same_day:
+                event_water = water_used - state.pump_water_start
+                typical = state.water_per_event.value
+                if typical and event_water > typical * self.water_spike_factor:
+                    alerts.append(self._alert(state, 'water_spike', 'warning', zone, timestamp,
+                        f"Watering event used {event_water:.2f} L, usual is {typical:.2f} L"))
+                else:
+                    state.active_alerts.discard('water_spike')
+                state.water_per_event.add(event_water)
+
+        state.last = {'timestamp': timestamp, 'moisture': moisture, 'pump': pump,
+                      'water_used': water_used, 'events': events}
+        return [alert for alert in alerts if alert is not None]
+
+    def _alert(self, state, kind, severity, zone, timestamp, message):
+        """Build an alert unless one of this kind is already active"""
+        if kind in state.active_alerts:
+            return None
+        state.active_alerts.add(kind)
+        return {
+            'time': timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+            'zone': zone,
+            'kind': kind,
+            'severity': severity,
+            'message': message
+        }
+
+
+class AlertLog:
+    """Append-only JSON-lines log of raised alerts"""
+    def __init__(self, filename='irrigation_alerts.log'):
+        self.filename = filename
+
+    def write(self, alert):
+        try:
+            with open(self.filename, 'a') as f:
+                f.write(json.dumps(alert) + "\n")
+        except Exception as e:
+            print(f"Error writing alert log: {e}")
+
+
+def benchmark_detector(hours=72, seed=0):
+    """Measure the detector's per-sample cost against parse + rollup ingest"""
+    import time
+    from irrigation_rollups import IrrigationRollups, parse_irrigation_line, TIME_FORMAT
+    from irrigation_simulator import generate_stream
+
+    samples = []
+    for line in generate_stream(hours, seed=seed):
+        params = parse_irrigation_line(line)
+        if params is not None:
+            samples.append((line, datetime.strptime(params["TIME"], TIME_FORMAT), params))
+
+    rollups = IrrigationRollups()
+    started = time.perf_counter()
+    for line, timestamp, _ in samples:
+        params = parse_irrigation_line(line)
+        rollups.add_sample(timestamp, params["MOISTURE"], params["PUMP"], params["WATER_USED"], params["EVENTS"])
+    ingest = time.perf_counter() - started
+
+    detector = AnomalyDetector()
+    started = time.perf_counter()
+    alerts = []
+    for _, timestamp, params in samples:
+        alerts.extend(detector.observe(timestamp, params["MOISTURE"], params["PUMP"],
+                                       params["WATER_USED"], params["EVENTS"]))
+    detect = time.perf_counter() - started
+
+    n = len(samples)
+    print(f"🚨 Anomaly detector benchmark over {n} samples ({hours} simulated hours)")
+    print(f"  Parse + rollup ingest: {ingest / n * 1e6:.1f} µs/sample")
+    print(f"  Detector:              {detect / n * 1e6:.1f} µs/sample "
+          f"({detect / ingest * 100:.1f}% of ingest, {n / detect:.0f} samples/s)")
+    print(f"  Alerts raised on healthy data: {len(alerts)}")
+    return detect / n
+
+
+if __name__ == "__main__":
+    benchmark_detector()
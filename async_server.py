@@ -0,0 +1,73 @@
+import asyncio
+import threading
+
+
+class BackgroundServer:
+    """An asyncio TCP server running its own loop on a background thread
+
+    The live data server, the MQTT stand-in broker and the replication
+    server share this scaffolding; each implements
+    _handle_client(reader, writer). start() returns once the port is bound
+    (port 0 picks a free one, read back from port) or raises the bind
+    error. stop() cancels the open connections and closes the loop.
+    """
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._start_error = None
+
+    def start(self):
+        """Start the server loop in a background thread"""
+        if self._thread and self._thread.is_alive():
+            return
+        ready = threading.Event()
+        self._start_error = None
+        self._thread = threading.Thread(target=self._run_loop, args=(ready,), daemon=True)
+        self._thread.start()
+        ready.wait(5)
+        if self._start_error:
+            raise self._start_error
+
+    def stop(self):
+        """Stop the server and disconnect all clients"""
+        if self._loop and self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread:
+            self._thread.join(timeout=5)
+        self._thread = None
+
+    def _run_loop(self, ready):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._server = self._loop.run_until_complete(
+                asyncio.start_server(self._handle_client, self.host, self.port)
+            )
+            self.port = self._server.sockets[0].getsockname()[1]
+        except Exception as e:
+            self._start_error = e
+            ready.set()
+            self._loop.close()
+            self._loop = None
+            return
+
+        ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._server.close()
+            pending = asyncio.all_tasks(self._loop)
+            for task in pending:
+                task.cancel()
+            if pending:
+                self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self._loop.run_until_complete(self._server.wait_closed())
+            self._loop.close()
+            self._loop = None
+
+    async def _handle_client(self, reader, writer):
+        raise NotImplementedError
@@ -0,0 +1,412 @@
+import gc
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+
+import smart_irrigation_dashboard as dashboard
+from event_log import EventQuery
+from history_loader import check_unlisted_months
+from irrigation_rollups import IrrigationRollups, parse_irrigation_line
+from irrigation_simulator import (VirtualIrrigationController, assert_backlog_ingest, assert_timing_accuracy,
+                                  check_backlog_ingest, check_timing_accuracy)
+from storage_backends import JsonFileStorage, SQLiteStorage
+
+
+# Days of synthetic history each case runs against
+HISTORY_SIZES = {
+    'day': 1,
+    'month': 30,
+    'year': 365
+}
+
+BASELINE_FILE = 'benchmark_baseline.json'
+DEFAULT_THRESHOLD = 0.25  # Fail a comparison when a case gets >25% slower
+
+SETTINGS = {'dry_threshold': 700, 'wet_threshold': 300, 'flow_rate': 1.0, 'port': 'COM6'}
+
+
+def synthetic_samples(days, interval=60, start=datetime(2024, 1, 1), flow_rate=1.0, seed=0):
+    """Raw samples in the sketch's reporting pattern, one every `interval` s
+
+    The soil sensor reads 700 (dry) or 300 (wet); the pump runs while the
+    soil is dry, 1-6 times a day for 1-5 minutes. WATER_USED and EVENTS are
+    the sketch's daily counters, reset at midnight.
+    """
+    rng = np.random.default_rng(seed)
+    per_day = 86400 // interval
+    n = days * per_day
+    pump = np.zeros(n, dtype=bool)
+    for day in range(days):
+        for _ in range(rng.integers(1, 7)):
+            begin = day * per_day + rng.integers(0, per_day - 5 * 60 // interval)
+            pump[begin:begin + max(1, rng.integers(1, 6) * 60 // interval)] = True
+
+    day_index = np.arange(n) // per_day
+    day_starts = np.arange(days) * per_day
+    water = np.cumsum(pump * (flow_rate * interval / 60.0))
+    water -= np.concatenate(([0.0], water[day_starts[1:] - 1]))[day_index]
+    starts = pump & ~np.concatenate(([False], pump[:-1]))
+    events = np.cumsum(starts)
+    events -= np.concatenate(([0], events[day_starts[1:] - 1]))[day_index]
+
+    return {
+        'timestamps': np.datetime64(start, 'us') + np.arange(n) * np.timedelta64(interval, 's'),
+        'moisture': np.where(pump, 700, 300),
+        'pump': pump,
+        'water_used': np.round(water, 2),
+        'events': events
+    }
+
+
+def write_history(directory, days, storage='json', interval=60):
+    """Write a history in the dashboard's own files; returns the end time
+
+    The buckets come from IrrigationRollups and are saved through the
+    storage backends, so the JSON, CSV and SQLite schemas are exactly
+    the ones the dashboard reads.
+    """
+    arrays = synthetic_samples(days, interval)
+    rollups = IrrigationRollups()
+    rollups.ingest_batch(heartbeat=interval, **arrays)
+
+    if storage == 'sqlite':
+        store = SQLiteStorage(os.path.join(directory, 'irrigation_data.db'), import_json=None)
+    else:
+        store = JsonFileStorage(os.path.join(directory, 'irrigation_data.json'),
+                                os.path.join(directory, 'irrigation_data.csv'))
+    store.append_samples([{
+        'timestamp': timestamp, 'moisture': moisture, 'pump': pump, 'water_used': water, 'events': events
+    } for timestamp, moisture, pump, water, events in zip(
+        arrays['timestamps'].tolist(), arrays['moisture'].tolist(), arrays['pump'].tolist(),
+        arrays['water_used'].tolist(), arrays['events'].tolist())])
+    if storage == 'sqlite':
+        store.save_levels(rollups.levels())  # The monitor writes these through as they change
+    store.save(rollups.levels(), SETTINGS)
+    store.close()
+    return arrays['timestamps'][-1].tolist() + timedelta(seconds=interval)
+
+
+def live_lines(start, seed=0):
+    """Endless IRRIGATION_DATA lines of the simulated sketch, continuing a history"""
+    controller = VirtualIrrigationController(start=start, seed=seed)
+    while True:
+        for line in controller.step():
+            if line.startswith("IRRIGATION_DATA:"):
+                yield line
+
+
+class HeadlessText:
+    """Stands in for the data summary's Text widget"""
+    def __init__(self):
+        self.text = ""
+
+    def delete(self, *args):
+        self.text = ""
+
+    def insert(self, index, text):
+        self.text += text
+
+
+class HeadlessRoot:
+    def after(self, ms, func, *args):
+        pass
+
+
+class HeadlessMonitor(dashboard.SmartIrrigationMonitor):
+    """The dashboard's monitor with its real data paths but no Tk window"""
+    def setup_gui(self):
+        self.root = HeadlessRoot()
+        self.summary_text = HeadlessText()
+
+    def scan_ports(self):
+        pass
+
+
+class HeadlessDialogs:
+    """Answer the export dialogs with paths in the work directory"""
+    def __init__(self, directory):
+        self.directory = directory
+        self.saved = {}
+
+    def __enter__(self):
+        def show_error(title, message):
+            raise RuntimeError(message)
+
+        replacements = [
+            (dashboard.filedialog, 'asksaveasfilename', lambda **kwargs: os.path.join(self.directory, 'export.json')),
+            (dashboard.filedialog, 'askdirectory', lambda **kwargs: self.directory),
+            (dashboard.messagebox, 'showinfo', lambda *args, **kwargs: None),
+            (dashboard.messagebox, 'showerror', show_error),
+            (plt, 'show', lambda *args, **kwargs: plt.close('all'))
+        ]
+        for module, name, replacement in replacements:
+            self.saved[(module, name)] = getattr(module, name)
+            setattr(module, name, replacement)
+        return self
+
+    def __exit__(self, *exc):
+        for (module, name), original in self.saved.items():
+            setattr(module, name, original)
+
+
+def _sample_step(monitor, lines):
+    """update_aggregated_data() on the next live sample, as process_arduino_data sets it up"""
+    params = parse_irrigation_line(next(lines))
+
+    def step():
+        nonlocal params
+        monitor.current_moisture = params["MOISTURE"]
+        monitor.pump_status = params["PUMP"]
+        monitor.total_water_used_today = params["WATER_USED"]
+        monitor.watering_events_today = params["EVENTS"]
+        monitor.last_timestamp = params["TIME"]
+        monitor.update_aggregated_data()
+        params = parse_irrigation_line(next(lines))
+    return step
+
+
+# name, unit, threshold, factory(monitor, live lines) returning the timed callable
+CASES = [
+    ('process_arduino_data', 'line', DEFAULT_THRESHOLD,
+     lambda monitor, lines: lambda: monitor.process_arduino_data(next(lines))),
+    ('update_aggregated_data', 'sample', DEFAULT_THRESHOLD, _sample_step),
+    ('save_historical_data', 'call', DEFAULT_THRESHOLD,
+     lambda monitor, lines: monitor.save_historical_data),
+    ('load_historical_data', 'call', DEFAULT_THRESHOLD,
+     lambda monitor, lines: monitor.load_historical_data),
+    ('export_json_data', 'call', DEFAULT_THRESHOLD,
+     lambda monitor, lines: monitor.export_json_data),
+    ('export_csv_data', 'call', DEFAULT_THRESHOLD,
+     lambda monitor, lines: monitor.export_csv_data),
+    ('water_usage_graph_day', 'chart', 0.35,
+     lambda monitor, lines: lambda: monitor.show_water_usage_graph('day')),
+    ('moisture_graph_hour', 'chart', 0.35,
+     lambda monitor, lines: lambda: monitor.show_moisture_graph('hour')),
+    ('efficiency_analysis', 'chart', 0.35,
+     lambda monitor, lines: monitor.show_efficiency_analysis),
+    ('pump_duration_analysis', 'chart', 0.35,
+     lambda monitor, lines: monitor.show_pump_duration_analysis),
+    ('update_data_summary', 'call', DEFAULT_THRESHOLD,
+     lambda monitor, lines: monitor.update_data_summary)
+]
+
+
+def measure(func, min_time=0.2, rounds=3):
+    """Best seconds per call over `rounds` rounds of at least min_time each
+
+    Like timeit, the garbage collector is off while a round runs.
+    """
+    best = None
+    for _ in range(rounds):
+        calls = 0
+        gc.collect()
+        gc.disable()
+        try:
+            started = time.perf_counter()
+            while True:
+                func()
+                calls += 1
+                elapsed = time.perf_counter() - started
+                if elapsed >= min_time:
+                    break
+        finally:
+            gc.enable()
+        per_call = elapsed / calls
+        best = per_call if best is None else min(best, per_call)
+    return best
+
+
+def format_seconds(seconds):
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f} µs"
+    if seconds < 1:
+        return f"{seconds * 1e3:.1f} ms"
+    return f"{seconds:.2f} s"
+
+
+def run_suite(sizes=HISTORY_SIZES, storage='json', match=None, min_time=0.2, rounds=3, limits=None, retries=2):
+    """Time every case on every history size; returns {case[size]: result}
+
+    limits maps case keys to the slowest acceptable seconds per call. A
+    case over its limit is measured again up to `retries` times and keeps
+    its best time, so one noisy round does not fail a comparison.
+    """
+    limits = limits or {}
+    results = {}
+    cwd = os.getcwd()
+    for size, days in sizes.items():
+        cases = [case for case in CASES if not match or match in f"{case[0]}[{size}]"]
+        if not cases:
+            continue
+        directory = tempfile.mkdtemp(prefix='irrigation_suite_')
+        try:
+            started = time.perf_counter()
+            end = write_history(directory, days, storage)
+            os.chdir(directory)
+            monitor = HeadlessMonitor(storage=storage)
+            monitor.history_loader.loaded.wait()
+            buckets = sum(len(store) for store in monitor.rollups.levels().values())
+            print(f"⏱️ {size} of history: {buckets} buckets ({storage}, "
+                  f"prepared in {time.perf_counter() - started:.1f} s)")
+
+            lines = live_lines(end)
+            try:
+                with HeadlessDialogs(directory):
+                    timed = {}
+                    for name, unit, threshold, factory in cases:
+                        key = f"{name}[{size}]"
+                        timed[key] = factory(monitor, lines)
+                        seconds = measure(timed[key], min_time, rounds)
+                        results[key] = {'seconds': seconds, 'unit': unit, 'threshold': threshold}
+                        print(f"  {key:<40} {format_seconds(seconds):>10} per {unit}")
+
+                    # Re-measure slow cases after the others, away from whatever slowed them
+                    for _ in range(retries):
+                        slow = [key for key in timed if results[key]['seconds'] > limits.get(key, float('inf'))]
+                        for key in slow:
+                            seconds = min(results[key]['seconds'], measure(timed[key], min_time, rounds))
+                            results[key]['seconds'] = seconds
+                            print(f"  {key:<40} {format_seconds(seconds):>10} per {results[key]['unit']} (retry)")
+            finally:
+                monitor.storage.close()
+                monitor.event_log.close()
+                monitor.sample_ring.close()
+
+            errors = EventQuery(monitor.event_log, 'ERROR')
+            if len(errors):
+                raise RuntimeError(f"the monitor logged errors: {errors.page(0, 3)}")
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+def run_checks(hours=24, seeds=(0, 1, 2)):
+    """Correctness checks of the simulated sketch and the history load; returns the failure messages"""
+    checks = [('pump timing', lambda seed: assert_timing_accuracy(check_timing_accuracy(hours, seed))),
+              ('offline backlog', lambda seed: assert_backlog_ingest(*check_backlog_ingest(hours, seed)))]
+    failures = []
+    for name, check in checks:
+        for seed in seeds:
+            try:
+                check(seed)
+            except AssertionError as e:
+                failures.append(f"{name} (seed {seed}): {e}")
+    try:
+        check_unlisted_months()
+    except AssertionError as e:
+        failures.append(f"history load: {e}")
+    return failures
+
+
+def environment():
+    import pandas
+    return {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpus': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pandas.__version__,
+        'matplotlib': matplotlib.__version__
+    }
+
+
+def save_baseline(results, filename=BASELINE_FILE, storage='json'):
+    with open(filename, 'w') as f:
+        json.dump({
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'storage': storage,
+            'environment': environment(),
+            'results': results
+        }, f, indent=2)
+    print(f"💾 Baseline of {len(results)} cases written to {filename}")
+
+
+def case_limit(key, baseline, threshold=None):
+    """Slowest acceptable seconds per call for a case, or None without a baseline"""
+    reference = baseline['results'].get(key)
+    if reference is None:
+        return None
+    return reference['seconds'] * (1 + (threshold if threshold is not None else reference['threshold']))
+
+
+def compare_results(results, baseline, threshold=None):
+    """List (case, baseline s, current s, ratio, limit) of the cases beyond their threshold"""
+    regressions = []
+    print("📊 Against the baseline:")
+    for key, result in results.items():
+        reference = baseline['results'].get(key)
+        if reference is None:
+            print(f"  {key:<40} {format_seconds(result['seconds']):>10}   (no baseline)")
+            continue
+        ratio = result['seconds'] / reference['seconds']
+        limit = case_limit(key, baseline, threshold) / reference['seconds']
+        status = "❌" if ratio > limit else "✅"
+        print(f"  {status} {key:<38} {format_seconds(reference['seconds']):>10} → "
+              f"{format_seconds(result['seconds']):>10} ({ratio:.2f}x, limit {limit:.2f}x)")
+        if ratio > limit:
+            regressions.append((key, reference['seconds'], result['seconds'], ratio, limit))
+    return regressions
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard's hot paths against a baseline")
+    parser.add_argument('--sizes', default=','.join(HISTORY_SIZES),
+                        help="comma-separated history sizes: " + ', '.join(HISTORY_SIZES))
+    parser.add_argument('--cases', help="only run cases whose name contains this text")
+    parser.add_argument('--storage', choices=['json', 'sqlite'], default='json')
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--save-baseline', action='store_true', help="write the results as the new baseline")
+    parser.add_argument('--compare', action='store_true', help="exit 1 when a case is slower than its threshold")
+    parser.add_argument('--threshold', type=float, default=None,
+                        help=f"allowed slowdown for every case, e.g. 0.25 (default: per case, mostly {DEFAULT_THRESHOLD})")
+    parser.add_argument('--min-time', type=float, default=0.2, help="seconds per timing round")
+    parser.add_argument('--check', action='store_true',
+                        help="run the correctness checks instead; exit 1 when one fails")
+    args = parser.parse_args()
+
+    if args.check:
+        failures = run_checks()
+        for failure in failures:
+            print(f"❌ {failure}")
+        if failures:
+            sys.exit(1)
+        print("✅ Correctness checks passed")
+        sys.exit(0)
+
+    sizes = {size: HISTORY_SIZES[size] for size in args.sizes.split(',')}
+    baseline = None
+    if args.compare:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('storage') != args.storage:
+            print(f"⚠️ Baseline was recorded with {baseline.get('storage')} storage")
+        if baseline.get('environment') != environment():
+            print(f"⚠️ Baseline was recorded on a different setup: {baseline.get('environment')}")
+
+    limits = None
+    if baseline is not None:
+        limits = {key: case_limit(key, baseline, args.threshold) for key in baseline['results']}
+    results = run_suite(sizes, args.storage, args.cases, args.min_time, limits=limits)
+
+    if args.save_baseline:
+        save_baseline(results, args.baseline, args.storage)
+    if baseline is not None:
+        regressions = compare_results(results, baseline, args.threshold)
+        if regressions:
+            print(f"❌ {len(regressions)} of {len(results)} cases regressed")
+            sys.exit(1)
+        print(f"✅ No regressions in {len(results)} cases")
@@ -0,0 +1,86 @@
+import struct
+import calendar
+from datetime import datetime, timedelta
+
+
+# Mirrors the record layout written by logBacklogRecord() in Irrigating.ino:
+# unixtime (uint32), water today in 0.01 L (uint16), events today (uint8),
+# pump flag in bit 7 + soil HIGH count in bits 0-6 (uint8), little-endian
+RECORD_FORMAT = '<IHBB'
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_rtc_time(timestamp):
+    """Convert a naive RTC datetime to the sketch's unixtime()"""
+    return calendar.timegm(timestamp.timetuple())
+
+
+def from_rtc_time(seconds):
+    """Convert the sketch's unixtime() back to a naive RTC datetime"""
+    return EPOCH + timedelta(seconds=seconds)
+
+
+def encode_record(timestamp, water_used, events, pump, soil_high_count):
+    """Pack one backlog record exactly as the sketch stores it"""
+    flags = (0x80 if pump else 0) | (soil_high_count & 0x7F)
+    return struct.pack(RECORD_FORMAT, to_rtc_time(timestamp),
+                       int(water_used * 100 + 0.5), min(events, 255), flags)
+
+
+def decode_records(payload, buffer_size=8):
+    """Unpack hex-encoded records into sample dicts"""
+    raw = bytes.fromhex(payload)
+    samples = []
+    for offset in range(0, len(raw) - RECORD_SIZE + 1, RECORD_SIZE):
+        seconds, water, events, flags = struct.unpack_from(RECORD_FORMAT, raw, offset)
+        samples.append({
+            'timestamp': from_rtc_time(seconds),
+            'moisture': 300 + (400 * (flags & 0x7F)) // buffer_size,
+            'pump': bool(flags & 0x80),
+            'water_used': water / 100.0,
+            'events': events
+        })
+    return samples
+
+
+class BacklogReceiver:
+    """Collects a BACKLOG_BEGIN / BACKLOG / BACKLOG_END download from the sketch"""
+    def __init__(self):
+        self.active = False
+        self.expected = 0
+        self.buffer_size = 8
+        self.interval = None
+        self.samples = []
+
+    def feed(self, line):
+        """Consume one serial line
+
+        Returns the completed, time-ordered sample list on BACKLOG_END,
+        otherwise None. Lines that are not backlog lines are ignored.
+        """
+        if line.startswith("BACKLOG_BEGIN:"):
+            fields = dict(part.split("=", 1) for part in line[len("BACKLOG_BEGIN:"):].split(",") if "=" in part)
+            self.active = True
+            self.expected = int(fields.get('COUNT', 0))
+            self.buffer_size = int(fields.get('BUFFER', 8))
+            self.interval = int(fields['INTERVAL']) if 'INTERVAL' in fields else None
+            self.samples = []
+            if self.expected == 0:
+                self.active = False
+                return []
+        elif line.startswith("BACKLOG:") and self.active:
+            self.samples.extend(decode_records(line[len("BACKLOG:"):].strip(), self.buffer_size))
+        elif line.startswith("BACKLOG_END") and self.active:
+            self.active = False
+            samples = sorted(self.samples, key=lambda sample: sample['timestamp'])
+            self.samples = []
+            return samples
+        return None
+
+
+def backlog_request(last_timestamp):
+    """Build the REQUEST_DATA command asking for records after last_timestamp"""
+    since = to_rtc_time(last_timestamp) if last_timestamp else 0
+    return f"REQUEST_DATA:SINCE={since}\n"
@@ -0,0 +1,347 @@
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from range_index import FenwickTree
+
+
+EPOCH = datetime(1970, 1, 1)
+ONE_MINUTE = timedelta(minutes=1)
+
+# Updates with more minutes than this are merged in one vectorized pass
+BATCH_MINUTES = 64
+
+# numpy datetime64 unit of each level's buckets
+BUCKET_UNITS = {'minute': 'm', 'hour': 'h', 'day': 'D', 'month': 'M', 'year': 'Y'}
+
+
+def minute_numbers(keys):
+    """Minutes since 1970 of minute bucket keys ('YYYY-MM-DD HH:MM')"""
+    return np.array(keys, dtype='datetime64[m]').astype(np.int64)
+
+
+def minute_of(moment):
+    """Minute number of a datetime"""
+    return (moment - EPOCH) // ONE_MINUTE
+
+
+def time_of(minute):
+    return EPOCH + minute * ONE_MINUTE
+
+
+def minute_runs(minutes):
+    """(starts, ends) of the runs of consecutive minutes in a sorted, unique array"""
+    if len(minutes) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    breaks = np.flatnonzero(np.diff(minutes) != 1) + 1
+    starts = minutes[np.concatenate(([0], breaks))]
+    ends = minutes[np.concatenate((breaks - 1, [len(minutes) - 1]))] + 1
+    return starts, ends
+
+
+def bucket_bounds(keys, level):
+    """First and past-the-end minute numbers of bucket keys of a level"""
+    if level == 'minute':
+        starts = minute_numbers(keys)
+        return starts, starts + 1
+    buckets = np.array(keys, dtype=f'datetime64[{BUCKET_UNITS[level]}]')
+    starts = buckets.astype('datetime64[m]').astype(np.int64)
+    ends = (buckets + 1).astype('datetime64[m]').astype(np.int64)
+    return starts, ends
+
+
+class CoverageIndex:
+    """Covered and missing time of a history, from its minute buckets
+
+    A minute is covered when its minute bucket exists; the stretches a
+    change-driven stream holds are filled in by the rollups, so only
+    disconnects, stalls and lost imports leave holes. The index keeps the
+    sorted runs of covered minutes and a Fenwick tree over their lengths,
+    so covered time between two instants is two bisections and a range
+    sum, O(log runs).
+
+    Built from the minute keys on the first query. A live minute extends
+    the last run (O(log runs)); a minute that opens or closes a hole
+    further back inserts or joins runs and the tree is rebuilt on the
+    next query. Large batches (a backlog, a piece of loaded history) are
+    merged into the runs in one vectorized pass without rescanning keys.
+    """
+    def __init__(self, store):
+        self.store = store
+        self.lock = threading.Lock()
+        self.starts = None
+        self.builds = 0
+
+    def invalidate(self):
+        with self.lock:
+            self.starts = None
+
+    def _build(self):
+        starts, ends = minute_runs(np.sort(minute_numbers(list(self.store))))
+        self._set_runs(starts, ends)
+        self.builds += 1
+
+    def _set_runs(self, starts, ends):
+        self.starts = starts.tolist()
+        self.ends = ends.tolist()
+        self.tree = None
+        self.arrays = None
+
+    def _runs(self):
+        if self.starts is None:
+            self._build()
+        return self.starts, self.ends
+
+    def _tree(self):
+        if self.tree is None:
+            self.tree = FenwickTree(np.array(self.ends, dtype=np.int64) - np.array(self.starts, dtype=np.int64))
+        return self.tree
+
+    def update(self, keys):
+        """Mark the minute buckets with the given (unique) keys as covered"""
+        with self.lock:
+            if self.starts is None or not keys:
+                return
+            minutes = minute_numbers(list(keys))
+            if len(minutes) > BATCH_MINUTES:
+                self._merge(*minute_runs(np.sort(minutes)))
+            else:
+                for minute in minutes.tolist():
+                    self._add(minute)
+
+    def _add(self, minute):
+        starts, ends = self.starts, self.ends
+        i = bisect_right(starts, minute) - 1
+        if i >= 0 and minute < ends[i]:
+            return
+        self.arrays = None
+        joins_next = i + 1 < len(starts) and starts[i + 1] == minute + 1
+        if i >= 0 and ends[i] == minute:
+            if joins_next:
+                # The minute closes a hole: two runs become one
+                ends[i] = ends[i + 1]
+                del starts[i + 1], ends[i + 1]
+                self.tree = None
+            else:
+                ends[i] += 1
+                if self.tree is not None:
+                    self.tree.add(i, 1)
+        elif joins_next:
+            starts[i + 1] = minute
+            if self.tree is not None:
+                self.tree.add(i + 1, 1)
+        elif i + 1 == len(starts):
+            starts.append(minute)
+            ends.append(minute + 1)
+            if self.tree is not None:
+                self.tree.append(1)
+        else:
+            starts.insert(i + 1, minute)
+            ends.insert(i + 1, minute + 1)
+            self.tree = None
+
+    def _merge(self, new_starts, new_ends):
+        """Union the runs with new ones; overlapping and touching runs join"""
+        starts = np.concatenate((np.array(self.starts, dtype=np.int64), new_starts))
+        ends = np.concatenate((np.array(self.ends, dtype=np.int64), new_ends))
+        order = np.argsort(starts, kind='stable')
+        starts, ends = starts[order], ends[order]
+        reach = np.maximum.accumulate(ends)
+        first = np.flatnonzero(np.concatenate(([True], starts[1:] > reach[:-1])))
+        last = np.append(first[1:] - 1, len(starts) - 1)
+        self._set_runs(starts[first], reach[last])
+
+    def covered_minutes(self, start=None, end=None):
+        """Covered minutes in [start, end) (datetimes, None for unbounded), O(log runs)"""
+        with self.lock:
+            starts, ends = self._runs()
+            if not starts:
+                return 0
+            low = minute_of(start) if start is not None else starts[0]
+            high = minute_of(end) if end is not None else ends[-1]
+            first = bisect_right(ends, low)
+            stop = bisect_left(starts, high)
+            if first >= stop:
+                return 0
+            total = self._tree().range_sum(first, stop)
+            total -= max(0, low - starts[first])
+            total -= max(0, ends[stop - 1] - high)
+            return total
+
+    def coverage(self, start, end):
+        """Share of [start, end) that is covered, 0.0 to 1.0"""
+        minutes = minute_of(end) - minute_of(start)
+        return self.covered_minutes(start, end) / minutes if minutes > 0 else 0.0
+
+    def gaps(self, start=None, end=None, min_minutes=1):
+        """(start, end) datetimes of the holes of at least min_minutes within [start, end)
+
+        Without bounds only the holes between the first and last covered
+        minute are listed.
+        """
+        with self.lock:
+            starts, ends = self._runs()
+            if not starts:
+                return [(start, end)] if start is not None and end is not None else []
+            low = minute_of(start) if start is not None else starts[0]
+            high = minute_of(end) if end is not None else ends[-1]
+            first = bisect_right(ends, low)
+            stop = bisect_left(starts, high)
+            holes = []
+            cursor = low
+            for i in range(first, stop):
+                if starts[i] - cursor >= min_minutes:
+                    holes.append((cursor, starts[i]))
+                cursor = max(cursor, ends[i])
+            if high - cursor >= min_minutes:
+                holes.append((cursor, high))
+            return [(time_of(a), time_of(b)) for a, b in holes]
+
+    def run_count(self):
+        with self.lock:
+            return len(self._runs()[0])
+
+    def _covered_before(self, minutes):
+        """Covered minutes before each of an array of minute numbers"""
+        if self.arrays is None:
+            run_starts = np.array(self.starts, dtype=np.int64)
+            run_ends = np.array(self.ends, dtype=np.int64)
+            self.arrays = (run_starts, run_ends, np.concatenate(([0], np.cumsum(run_ends - run_starts))))
+        run_starts, run_ends, cumulative = self.arrays
+        count = np.searchsorted(run_starts, minutes, side='left')
+        overhang = np.where(count > 0, np.maximum(run_ends[count - 1] - minutes, 0), 0)
+        return cumulative[count] - overhang
+
+    def bucket_coverage(self, keys, level):
+        """Covered share of each bucket key of a level, as a float array"""
+        if not keys:
+            return np.empty(0)
+        bucket_starts, bucket_ends = bucket_bounds(keys, level)
+        with self.lock:
+            self._runs()
+            covered = self._covered_before(bucket_ends) - self._covered_before(bucket_starts)
+        return covered / (bucket_ends - bucket_starts)
+
+    def bucket_gaps(self, keys, level):
+        """True for each bucket key (sorted) with a hole between it and the previous bucket"""
+        if len(keys) < 2:
+            return np.zeros(len(keys), dtype=bool)
+        bucket_starts, bucket_ends = bucket_bounds(keys, level)
+        with self.lock:
+            self._runs()
+            between = self._covered_before(bucket_starts[1:]) - self._covered_before(bucket_ends[:-1])
+        return np.concatenate(([False], between < bucket_starts[1:] - bucket_ends[:-1]))
+
+
+def fragmented_minutes(years, seed=0, mean_session_hours=4.0, mean_gap_hours=1.0, start=datetime(2020, 1, 1)):
+    """Sorted minute numbers of a history with random sessions and holes"""
+    rng = np.random.default_rng(seed)
+    first = minute_of(start)
+    total = int(years * 365 * 1440)
+    count = int(total / ((mean_session_hours + mean_gap_hours) * 60)) + 2
+    sessions = rng.exponential(mean_session_hours * 60, count).astype(np.int64) + 1
+    gaps = rng.exponential(mean_gap_hours * 60, count).astype(np.int64) + 1
+    # Many holes are only a few minutes long: a stalled sketch or a USB hiccup
+    short = rng.random(count) < 0.5
+    gaps[short] = rng.integers(1, 10, short.sum())
+    run_starts = first + np.concatenate(([0], np.cumsum(sessions + gaps)[:-1]))
+    run_ends = run_starts + sessions
+    keep = run_starts < first + total
+    run_starts, run_ends = run_starts[keep], np.minimum(run_ends[keep], first + total)
+    lengths = run_ends - run_starts
+    return np.repeat(run_starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths) + np.arange(lengths.sum())
+
+
+def scan_gaps(store, start_key=None, end_key=None):
+    """Holes between start_key and end_key by sorting and diffing every minute key in between"""
+    keys = sorted(key for key in store if (start_key is None or key >= start_key) and (end_key is None or key < end_key))
+    minutes = minute_numbers(keys)
+    holes = np.flatnonzero(np.diff(minutes) > 1)
+    return list(zip((minutes[holes] + 1).tolist(), minutes[holes + 1].tolist()))
+
+
+def benchmark_coverage(years=(1, 3, 6), queries=2000, seed=0):
+    """Coverage queries, gap listing and updates through the index against scanning the keys"""
+    import time
+
+    rng = np.random.default_rng(seed)
+    print("🕳️ Coverage index benchmark (fragmented minute histories)")
+    for year_count in years:
+        minutes = fragmented_minutes(year_count, seed=seed)
+        keys = [key.replace('T', ' ') for key in np.datetime_as_string(minutes.astype('datetime64[m]')).tolist()]
+        store = dict.fromkeys(keys)
+        index = CoverageIndex(store)
+
+        started = time.perf_counter()
+        runs = index.run_count()
+        build = time.perf_counter() - started
+
+        first, last = int(minutes[0]), int(minutes[-1]) + 1
+        bounds = np.sort(rng.integers(first, last, size=(queries, 2)), axis=1)
+        windows = [(time_of(int(a)), time_of(int(b))) for a, b in bounds]
+
+        started = time.perf_counter()
+        for window in windows:
+            index.covered_minutes(*window)
+        query = (time.perf_counter() - started) / queries
+        for (a, b), window in zip(bounds[:50].tolist(), windows[:50]):
+            low, high = np.searchsorted(minutes, [a, b])
+            assert index.covered_minutes(*window) == high - low
+
+        # Gaps in the last week, the window a chart or summary asks about
+        week = (time_of(last - 7 * 1440), time_of(last))
+        week_keys = [key.replace('T', ' ') for key in
+                     np.datetime_as_string(np.array([last - 7 * 1440, last], dtype='datetime64[m]')).tolist()]
+        started = time.perf_counter()
+        for _ in range(200):
+            index_gaps = index.gaps(*week)
+        gap_query = (time.perf_counter() - started) / 200
+        started = time.perf_counter()
+        for _ in range(5):
+            scanned = scan_gaps(store, *week_keys)
+        gap_scan = (time.perf_counter() - started) / 5
+        assert [(minute_of(a), minute_of(b)) for a, b in index_gaps if a > week[0] and b < week[1]] == scanned
+
+        # Whole-history gap listing, the rescan the index replaces
+        started = time.perf_counter()
+        all_gaps = index.gaps()
+        gap_all = time.perf_counter() - started
+        started = time.perf_counter()
+        scanned_all = scan_gaps(store)
+        gap_all_scan = time.perf_counter() - started
+        assert len(all_gaps) == len(scanned_all)
+
+        # Day coverage strip over the whole history
+        day_keys = sorted({key[:10] for key in keys})
+        started = time.perf_counter()
+        index.bucket_coverage(day_keys, 'day')
+        strip = time.perf_counter() - started
+
+        # Live minutes at the end, then a backlog filling a hole in the middle
+        live_keys = [key.replace('T', ' ') for key in np.datetime_as_string(
+            np.arange(last, last + queries).astype('datetime64[m]')).tolist()]
+        started = time.perf_counter()
+        for key in live_keys:
+            index.update([key])
+            index.covered_minutes(week[0])
+        live = (time.perf_counter() - started) / queries
+
+        hole_start, hole_end = all_gaps[len(all_gaps) // 2]
+        backlog = [(hole_start + ONE_MINUTE * i).strftime("%Y-%m-%d %H:%M")
+                   for i in range(int((hole_end - hole_start) / ONE_MINUTE))]
+        started = time.perf_counter()
+        index.update(backlog)
+        index.covered_minutes(week[0])
+        merge = time.perf_counter() - started
+
+        print(f"  {year_count} years ({len(keys):,} minutes in {runs:,} runs): build {build * 1000:.0f} ms, "
+              f"coverage query {query * 1e6:.1f} µs, last-week gaps {gap_query * 1e6:.0f} µs "
+              f"(key scan {gap_scan * 1000:.1f} ms), all {len(all_gaps):,} gaps {gap_all * 1000:.1f} ms "
+              f"(key scan {gap_all_scan * 1000:.0f} ms), {len(day_keys)}-day strip {strip * 1000:.1f} ms, "
+              f"live minute + query {live * 1e6:.1f} µs, {len(backlog)}-minute backlog merge {merge * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    benchmark_coverage()
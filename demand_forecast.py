@@ -0,0 +1,387 @@
+import numpy as np
+
+
+# Older days count for less: a day's weight halves every HALF_LIFE_DAYS
+HALF_LIFE_DAYS = 365
+
+# Shrinks every coefficient but the level towards zero by this many
+# days' worth of evidence, so a short history gets a flat forecast
+# instead of a wild annual curve
+RIDGE = 7.0
+
+MIN_DAYS = 14  # Completed days needed before forecasting
+HORIZON = 7  # Days forecast after the running day
+
+# Features: level, trend (per year), two annual harmonics, Tuesday..Sunday offsets
+FEATURES = 12
+
+
+def day_numbers(day_keys):
+    """Integer days since 1970-01-01 of 'YYYY-MM-DD' keys"""
+    return np.array(day_keys, dtype='datetime64[D]').astype(np.int64)
+
+
+def design_matrix(days, origin):
+    """Model features of day numbers; works on any shape, adding a last axis
+
+    The trend is in years since origin; weekdays are offsets from
+    Monday, for schedules that water on fixed days.
+    """
+    days = np.asarray(days, dtype=np.float64)
+    years = (days - origin) / 365.25
+    angle = 2.0 * np.pi * days / 365.25
+    weekday = (days.astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday
+    columns = [np.ones_like(days), years, np.cos(angle), np.sin(angle), np.cos(2 * angle), np.sin(2 * angle)]
+    columns.extend((weekday == day).astype(np.float64) for day in range(1, 7))
+    return np.stack(columns, axis=-1)
+
+
+def solve_coefficients(gram, moment, ridge=RIDGE):
+    """Coefficients from the weighted least-squares sums, for one model or a stack of them"""
+    penalty = np.full(FEATURES, ridge)
+    penalty[0] = 0.0
+    return np.linalg.solve(gram + np.diag(penalty), moment[..., None])[..., 0]
+
+
+class DemandForecast:
+    """Water-demand forecast of one zone from its daily totals
+
+    A linear model of the day's water: level, trend, an annual cycle and
+    weekday offsets, fitted by least squares with exponentially decaying
+    weights. Only the weighted sums X'WX, X'Wy and y'Wy are kept, so a
+    completed day is folded in with one rank-one update when the day
+    rolls over, and a past day a backlog changes is corrected in place;
+    nothing is refitted. Like DailyAnalytics, refresh() follows the
+    rollups' data version; a reload (new generation) is fitted again
+    from the whole history through refit_forecasts(), which fits any
+    number of zones in one vectorized pass. The running day is not
+    fitted until it is complete.
+    """
+    def __init__(self, rollups, half_life=HALF_LIFE_DAYS, ridge=RIDGE):
+        self.rollups = rollups
+        self.decay = 0.5 ** (1.0 / half_life)
+        self.ridge = ridge
+        self._version = None
+        self._generation = None
+        self.refits = 0
+        self.updates = 0
+        self.today = None  # Key of the running day
+        self.count = 0  # Completed days folded into the sums
+        self._values = {}  # Completed day -> water folded in, see folded_values()
+        self._history = None
+        self._set_sums(np.zeros((FEATURES, FEATURES)), np.zeros(FEATURES), 0.0, 0.0, None, None)
+
+    def _set_sums(self, gram, moment, sum_squares, weight, latest, origin):
+        self.gram = gram
+        self.moment = moment
+        self.sum_squares = sum_squares
+        self.weight = weight
+        self.latest = latest  # Day number the weights are relative to
+        self.origin = origin  # Day number the trend is measured from
+        self._coefficients = None
+        self._forecasts = {}
+
+    @property
+    def stale(self):
+        """True when the next refresh() has to fit the whole history"""
+        return self.rollups.generation != self._generation
+
+    def refresh(self):
+        """Bring the model up to the rollups' current version"""
+        rollups = self.rollups
+        if rollups.generation != self._generation:
+            refit_forecasts([self])
+        elif rollups.version != self._version:
+            version = rollups.version
+            # Safe from the GUI thread while samples arrive: the rollups lock their day versions
+            days = rollups.days_changed_since(self._version)
+            if days:
+                self._update(days)
+            self._version = version
+        return self
+
+    def _update(self, days):
+        daily = self.rollups.daily_data
+        completed = set(days)
+        newest = max(days)
+        if self.today is None or newest > self.today:
+            if self.today is not None:
+                completed.add(self.today)  # The running day rolled over
+            self.today = newest
+            self._forecasts = {}
+        for day in sorted(completed):
+            if day < self.today and day in daily:
+                self._fold(day, daily[day]['water_used'])
+        self.updates += 1
+
+    def folded_values(self):
+        """Completed day -> water folded into the sums
+
+        Only corrections of past days need these, so after a refit the
+        dict is built on first use rather than for every zone refitted.
+        """
+        if self._values is None:
+            days, values = self._history
+            self._values = dict(zip(days, values.tolist()))
+            self._history = None
+        return self._values
+
+    def _fold(self, day, value):
+        values = self.folded_values()
+        old = values.get(day)
+        if old == value:
+            return
+        number = int(day_numbers([day])[0])
+        if self.latest is None:
+            self.latest = self.origin = number
+        if number > self.latest:
+            # Age everything already folded in by the days that passed
+            scale = self.decay ** (number - self.latest)
+            self.gram *= scale
+            self.moment *= scale
+            self.sum_squares *= scale
+            self.weight *= scale
+            self.latest = number
+        weight = self.decay ** (self.latest - number)
+        x = design_matrix(number, self.origin)
+        if old is None:
+            self.gram += weight * np.outer(x, x)
+            self.weight += weight
+            self.count += 1
+        else:
+            self.moment -= weight * old * x
+            self.sum_squares -= weight * old * old
+        self.moment += weight * value * x
+        self.sum_squares += weight * value * value
+        values[day] = value
+        self._coefficients = None
+        self._forecasts = {}
+
+    def coefficients(self):
+        if self._coefficients is None:
+            self._coefficients = solve_coefficients(self.gram, self.moment, self.ridge)
+        return self._coefficients
+
+    def ready(self):
+        return self.count >= MIN_DAYS
+
+    def forecast(self, days=HORIZON):
+        """[(day key, expected liters)] for the running day and the given number of days after it, or None"""
+        self.refresh()
+        if not self.ready():
+            return None
+        if days in self._forecasts:
+            return self._forecasts[days]
+        start = int(day_numbers([self.today])[0]) if self.today else self.latest + 1
+        numbers = np.arange(start, start + days + 1)
+        expected = np.maximum(design_matrix(numbers, self.origin) @ self.coefficients(), 0.0)
+        keys = np.datetime_as_string(numbers.astype('datetime64[D]')).tolist()
+        self._forecasts[days] = list(zip(keys, expected.tolist()))
+        return self._forecasts[days]
+
+    def error(self):
+        """Weighted RMS error of the fitted days (liters per day)"""
+        beta = self.coefficients()
+        residual = self.sum_squares - 2.0 * beta @ self.moment + beta @ self.gram @ beta
+        return float(np.sqrt(max(residual, 0.0) / self.weight)) if self.weight else 0.0
+
+    def trend(self):
+        """Change of daily water per year (liters per day per year)"""
+        return float(self.coefficients()[1])
+
+    def summary_lines(self, label=None):
+        forecast = self.forecast()
+        prefix = f"{label}: " if label else ""
+        if forecast is None:
+            return [f"{prefix}needs {MIN_DAYS} completed days of history ({self.count} so far)"]
+        today = self.rollups.daily_data.get(self.today) if self.today else None
+        lines = [f"{prefix}today {forecast[0][1]:.1f} L expected"
+                 + (f" ({today['water_used']:.1f} L so far)" if today else ""),
+                 f"{prefix}tomorrow {forecast[1][1]:.1f} L, next {len(forecast) - 1} days "
+                 f"{sum(value for _, value in forecast[1:]):.1f} L (±{self.error():.1f} L/day)",
+                 f"{prefix}trend {self.trend():+.2f} L/day per year"]
+        return lines
+
+
+def refit_forecasts(forecasts):
+    """Fit several zones' models from their whole daily histories in one pass
+
+    Apart from the trend's origin, every zone's features are those of the
+    calendar day, so the features of the days any zone covers are built
+    once. With each zone's day weights as a row of W, all the X'WX sums
+    are one matrix product of W with the per-day feature products, and
+    the trend is then moved to each zone's own origin.
+    """
+    if not forecasts:
+        return
+    histories = []
+    for forecast in forecasts:
+        rollups = forecast.rollups
+        version, generation = rollups.version, rollups.generation
+        daily = rollups.daily_data
+        days = list(daily)
+        numbers = day_numbers(days)
+        values = np.array([daily[day]['water_used'] for day in days], dtype=np.float64)
+        today = None
+        if days:
+            running = int(np.argmax(numbers))
+            today = days.pop(running)
+            numbers = np.delete(numbers, running)
+            values = np.delete(values, running)
+        histories.append((version, generation, today, days, numbers, values))
+
+    spans = [(numbers.min(), numbers.max()) for *_, numbers, _ in histories if len(numbers)]
+    first = min(low for low, _ in spans) if spans else 0
+    last = max(high for _, high in spans) if spans else 0
+    calendar = design_matrix(np.arange(first, last + 1), first)
+
+    weights = np.zeros((len(forecasts), len(calendar)))
+    weighted_values = np.zeros((len(forecasts), len(calendar)))
+    sum_squares = np.zeros(len(forecasts))
+    for row, (forecast, (*_, numbers, values)) in enumerate(zip(forecasts, histories)):
+        if len(numbers):
+            zone_weights = forecast.decay ** (numbers.max() - numbers)
+            weights[row, numbers - first] = zone_weights
+            weighted_values[row, numbers - first] = zone_weights * values
+            sum_squares[row] = zone_weights @ (values * values)
+
+    if len(forecasts) < FEATURES:
+        gram = np.stack([(calendar.T * zone_weights) @ calendar for zone_weights in weights])
+    else:
+        # Cheaper than a product per zone once there are more zones than features
+        products = (calendar[:, :, None] * calendar[:, None, :]).reshape(len(calendar), -1)
+        gram = (weights @ products).reshape(len(forecasts), FEATURES, FEATURES)
+    moment = weighted_values @ calendar
+    origin = np.array([numbers.min() if len(numbers) else first for *_, numbers, _ in histories])
+    shift = (origin - first) / 365.25
+    gram[:, 1, :] -= shift[:, None] * gram[:, 0, :]
+    gram[:, :, 1] -= shift[:, None] * gram[:, :, 0]
+    moment[:, 1] -= shift * moment[:, 0]
+
+    for row, (forecast, (version, generation, today, days, numbers, values)) in enumerate(
+            zip(forecasts, histories)):
+        if len(numbers):
+            forecast._set_sums(gram[row], moment[row], float(sum_squares[row]), float(weights[row].sum()),
+                               int(numbers.max()), int(origin[row]))
+        else:
+            forecast._set_sums(np.zeros((FEATURES, FEATURES)), np.zeros(FEATURES), 0.0, 0.0, None, None)
+        forecast.count = len(days)
+        forecast._values = None
+        forecast._history = (days, values)
+        forecast.today = today
+        forecast._version = version
+        forecast._generation = generation
+        forecast.refits += 1
+
+    ready = [forecast for forecast in forecasts if forecast.ready()]
+    ridges = {forecast.ridge for forecast in ready}
+    if len(ridges) == 1:
+        coefficients = solve_coefficients(np.stack([f.gram for f in ready]), np.stack([f.moment for f in ready]),
+                                          ridges.pop())
+        for forecast, beta in zip(ready, coefficients):
+            forecast._coefficients = beta
+
+
+def synthetic_demand(days, seed=0):
+    """Daily water of a bed: summer peak, no watering on Sundays, slow growth and noise"""
+    rng = np.random.default_rng(seed)
+    numbers = np.arange(days) + day_numbers(['2000-01-01'])[0]
+    season = np.maximum(0.0, np.sin(2 * np.pi * (numbers - 80) / 365.25))
+    water = 4.0 + 8.0 * season + 0.3 * np.arange(days) / 365.25 + rng.normal(0.0, 1.0, days)
+    water[(numbers + 3) % 7 == 6] *= 0.2
+    return numbers, np.maximum(water, 0.0)
+
+
+def fill_history(rollups, numbers, water):
+    """Write daily buckets straight into rollups, as a reload would"""
+    keys = np.datetime_as_string(numbers.astype('datetime64[D]')).tolist()
+    for key, value in zip(keys, water.tolist()):
+        rollups.daily_data[key].update({'water_used': value, 'moisture_avg': 500,
+                                        'events': 1 if value else 0, 'pump_duration': value * 60.0})
+    rollups.version += 1
+    rollups.generation += 1
+
+
+def benchmark_forecast(years=(1, 5, 20), zones=100, steps=60, seed=0):
+    """Day-rollover update, refit and query cost, and one-day-ahead error"""
+    import time
+    from datetime import datetime, timedelta
+    from irrigation_rollups import IrrigationRollups
+
+    print(f"💧 Water-demand forecast benchmark ({steps} day rollovers, {zones} zones for the batched refit)")
+    results = {}
+    for year_count in years:
+        days = int(year_count * 365)
+        numbers, water = synthetic_demand(days + steps, seed)
+        rollups = IrrigationRollups()
+        fill_history(rollups, numbers[:days], water[:days])
+        forecast = DemandForecast(rollups)
+
+        started = time.perf_counter()
+        forecast.refresh()
+        refit = time.perf_counter() - started
+
+        # The same weighted fit with np.linalg.lstsq, the way a refit on every rollover would go
+        started = time.perf_counter()
+        weights = np.sqrt(forecast.decay ** (numbers[days - 2] - numbers[:days - 1]))
+        x = design_matrix(numbers[:days - 1], numbers[0])
+        np.linalg.lstsq(x * weights[:, None], water[:days - 1] * weights, rcond=None)
+        lstsq = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for _ in range(100):
+            forecast.forecast()
+        query = (time.perf_counter() - started) / 100
+
+        # Each step starts a new day: the day before is folded in, then the new day is forecast
+        update_times, errors, naive_errors = [], [], []
+        for step in range(days, days + steps):
+            day = datetime(2000, 1, 1, 12) + timedelta(days=int(step))
+            rollups.add_sample(day, 500, False, float(water[step]), 1)
+            started = time.perf_counter()
+            expected = forecast.forecast()[0][1]
+            update_times.append(time.perf_counter() - started)
+            errors.append(abs(expected - water[step]))
+            naive_errors.append(abs(water[step - 7:step].mean() - water[step]))
+
+        fresh = DemandForecast(rollups).refresh()
+        if not np.allclose(fresh.coefficients(), forecast.coefficients(), rtol=1e-6, atol=1e-8):
+            raise AssertionError("Incremental model drifted from a full refit")
+
+        # Many zones: one vectorized refit against one refit per zone
+        fleet = []
+        for zone in range(zones):
+            zone_rollups = IrrigationRollups()
+            fill_history(zone_rollups, *synthetic_demand(days, seed + zone + 1))
+            fleet.append(DemandForecast(zone_rollups))
+        started = time.perf_counter()
+        for zone_forecast in fleet:
+            refit_forecasts([zone_forecast])
+        one_by_one = time.perf_counter() - started
+        started = time.perf_counter()
+        refit_forecasts(fleet)
+        batched = time.perf_counter() - started
+
+        results[year_count] = {
+            'refit_ms': refit * 1000, 'lstsq_ms': lstsq * 1000, 'query_us': query * 1e6,
+            'update_us': float(np.median(update_times)) * 1e6, 'mae': float(np.mean(errors)),
+            'naive_mae': float(np.mean(naive_errors)), 'one_by_one_ms': one_by_one * 1000,
+            'batched_ms': batched * 1000
+        }
+        r = results[year_count]
+        print(f"  {year_count:>2g} years ({days} days): refit {r['refit_ms']:.2f} ms (lstsq {r['lstsq_ms']:.2f} ms), "
+              f"rollover + forecast {r['update_us']:.0f} µs, cached forecast {r['query_us']:.0f} µs")
+        print(f"      {zones} zones: batched refit {r['batched_ms']:.0f} ms, one by one {r['one_by_one_ms']:.0f} ms; "
+              f"one-day-ahead error {r['mae']:.2f} L (last-7-days mean {r['naive_mae']:.2f} L)")
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Water-demand forecast benchmark")
+    parser.add_argument('--years', type=float, nargs='+', default=[1, 5, 20])
+    parser.add_argument('--zones', type=int, default=100)
+    args = parser.parse_args()
+
+    benchmark_forecast(args.years, args.zones)
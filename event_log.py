@@ -0,0 +1,376 @@
+import gzip
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+from bisect import bisect_left
+
+
+LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
+LEVEL_NUMBERS = {name: 10 * (i + 1) for i, name in enumerate(LEVELS)}
+LEVEL_NAMES = {number: name for name, number in LEVEL_NUMBERS.items()}
+
+
+def format_record(timestamp, level, message, fields):
+    """One JSON line per event; extra fields sit next to the fixed ones"""
+    record = dict(fields) if fields else {}
+    record['ts'] = round(timestamp, 3)
+    record['time'] = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp))
+    record['level'] = level
+    record['message'] = message
+    return json.dumps(record, ensure_ascii=False) + "\n"
+
+
+class EventLog:
+    """Leveled, structured activity and error events
+
+    Each event goes into an in-memory index ordered by time, which the
+    Recent Activity view pages through, and onto a queue that a background
+    thread drains into a JSON-lines file. Once the file reaches max_bytes
+    it is gzip-compressed into numbered segments (events.log.1.gz is the
+    newest), keeping at most `backups` of them. Events below `level` are
+    dropped at the call site, and a full queue drops events rather than
+    stalling the serial thread.
+    """
+    def __init__(self, filename='irrigation_events.log', level='INFO', max_bytes=2000000,
+                 backups=20, keep=50000, queue_size=10000):
+        self.filename = filename
+        self.level = LEVEL_NUMBERS[level]
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.keep = keep
+
+        # Parallel columns; times[i] belongs to sequence number first_seq + i
+        self.times = []
+        self.levels = []
+        self.messages = []
+        self.fields = []
+        self.first_seq = 0
+        self.lock = threading.Lock()
+
+        self.queue = queue.Queue(queue_size)
+        self.dropped = 0
+        self.writer = None
+
+    def enabled(self, level):
+        return LEVEL_NUMBERS[level] >= self.level
+
+    def log(self, level, message, **fields):
+        """Record an event; returns its sequence number, or None when filtered out"""
+        number = LEVEL_NUMBERS[level]
+        if number < self.level:
+            return None
+
+        with self.lock:
+            # Keep the index ordered even if the wall clock steps back
+            now = time.time()
+            if self.times and now < self.times[-1]:
+                now = self.times[-1]
+            self.times.append(now)
+            self.levels.append(number)
+            self.messages.append(message)
+            self.fields.append(fields or None)
+            seq = self.first_seq + len(self.times) - 1
+            if len(self.times) > self.keep + self.keep // 4:
+                self._trim(len(self.times) - self.keep)
+
+        if self.filename:
+            try:
+                self.queue.put_nowait((now, level, message, fields))
+            except queue.Full:
+                self.dropped += 1
+        return seq
+
+    def debug(self, message, **fields):
+        return self.log('DEBUG', message, **fields)
+
+    def info(self, message, **fields):
+        return self.log('INFO', message, **fields)
+
+    def warning(self, message, **fields):
+        return self.log('WARNING', message, **fields)
+
+    def error(self, message, **fields):
+        return self.log('ERROR', message, **fields)
+
+    def critical(self, message, **fields):
+        return self.log('CRITICAL', message, **fields)
+
+    def _trim(self, count):
+        """Forget the oldest events in memory; they stay in the files"""
+        del self.times[:count]
+        del self.levels[:count]
+        del self.messages[:count]
+        del self.fields[:count]
+        self.first_seq += count
+
+    @property
+    def next_seq(self):
+        with self.lock:
+            return self.first_seq + len(self.times)
+
+    def seq_at(self, timestamp):
+        """Sequence number of the first event at or after a Unix time"""
+        with self.lock:
+            return self.first_seq + bisect_left(self.times, timestamp)
+
+    def rows(self, seqs):
+        """(time, level, message, fields) of the given events still in memory"""
+        with self.lock:
+            first, count = self.first_seq, len(self.times)
+            return [(self.times[seq - first], LEVEL_NAMES[self.levels[seq - first]],
+                     self.messages[seq - first], self.fields[seq - first])
+                    for seq in seqs if first <= seq < first + count]
+
+    def segment(self, number):
+        return f"{self.filename}.{number}.gz"
+
+    def load_recent(self):
+        """Fill the index with the newest events from the files of earlier runs
+
+        Call before logging anything, so sequence numbers start at the
+        oldest loaded event.
+        """
+        if not self.filename:
+            return 0
+        chunks, total = [], 0
+        for path in [self.filename] + [self.segment(i) for i in range(1, self.backups + 1)]:
+            if total >= self.keep:
+                break
+            if not os.path.exists(path):
+                if path == self.filename:
+                    continue  # Just rotated
+                break
+            opener = gzip.open if path.endswith('.gz') else open
+            events = []
+            try:
+                with opener(path, 'rt', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                            number = LEVEL_NUMBERS[record.pop('level')]
+                            timestamp = record.pop('ts')
+                        except (ValueError, KeyError):
+                            continue  # Torn last line of a crashed run
+                        if number < self.level:
+                            continue
+                        record.pop('time', None)
+                        message = record.pop('message', '')
+                        events.append((timestamp, number, message, record or None))
+            except (OSError, EOFError) as e:
+                print(f"Error reading event log {path}: {e}")
+                break
+            chunks.append(events)
+            total += len(events)
+
+        events = [event for chunk in reversed(chunks) for event in chunk][-self.keep:]
+        with self.lock:
+            self.times[:0] = [event[0] for event in events]
+            self.levels[:0] = [event[1] for event in events]
+            self.messages[:0] = [event[2] for event in events]
+            self.fields[:0] = [event[3] for event in events]
+            self.first_seq = 0
+        return len(events)
+
+    def start(self):
+        """Start the background writer"""
+        if self.filename and self.writer is None:
+            self.writer = threading.Thread(target=self._write_loop, daemon=True)
+            self.writer.start()
+
+    def close(self, timeout=5.0):
+        """Write out the queued events and stop the writer"""
+        if self.writer is not None:
+            self.queue.put(None)
+            self.writer.join(timeout)
+            self.writer = None
+
+    def _write_loop(self):
+        stream = None
+        while True:
+            batch = [self.queue.get()]
+            while batch[-1] is not None:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = batch[-1] is None
+
+            try:
+                if stream is None:
+                    stream = open(self.filename, 'a', encoding='utf-8')
+                stream.write(''.join(format_record(*event) for event in batch if event is not None))
+                stream.flush()
+                if stream.tell() >= self.max_bytes:
+                    stream.close()
+                    stream = None
+                    self._rotate()
+            except Exception as e:
+                print(f"Error writing event log: {e}")
+
+            if stop:
+                if stream is not None:
+                    stream.close()
+                return
+
+    def _rotate(self):
+        """Compress the current file into segment 1, shifting the older ones up"""
+        oldest = self.segment(self.backups)
+        if os.path.exists(oldest):
+            os.remove(oldest)
+        for number in range(self.backups - 1, 0, -1):
+            if os.path.exists(self.segment(number)):
+                os.replace(self.segment(number), self.segment(number + 1))
+        with open(self.filename, 'rb') as source, gzip.open(self.segment(1), 'wb') as target:
+            shutil.copyfileobj(source, target)
+        os.remove(self.filename)
+
+
+class EventQuery:
+    """Sequence numbers of the events matching a minimum level, text and start
+
+    refresh() only scans events logged since its last call, so the viewer
+    can re-run it on every poll. Without a level or text restriction the
+    result is a plain range and nothing is scanned at all.
+    """
+    def __init__(self, event_log, level='DEBUG', text='', start_seq=0):
+        self.event_log = event_log
+        self.level = LEVEL_NUMBERS[level]
+        self.text = text.strip().lower()
+        self.start = start_seq
+        self.every_event = self.level <= event_log.level and not self.text
+        self.matches = []
+        self.first = self.end = start_seq
+        self.refresh()
+
+    def refresh(self):
+        """Take in new events; returns True if the result changed"""
+        log = self.event_log
+        with log.lock:
+            first, end = log.first_seq, log.first_seq + len(log.times)
+            scan_from = max(self.end, first, self.start)
+            if not self.every_event:
+                levels = log.levels[scan_from - first:]
+                messages = log.messages[scan_from - first:]
+
+        changed = end != self.end or first > self.first
+        if self.every_event:
+            self.first, self.end = max(first, self.start), end
+            return changed
+
+        if first > self.first:
+            del self.matches[:bisect_left(self.matches, first)]
+        text = self.text
+        self.matches.extend(seq for seq, number, message in zip(range(scan_from, end), levels, messages)
+                            if number >= self.level and (not text or text in message.lower()))
+        self.first, self.end = first, end
+        return changed
+
+    def __len__(self):
+        if self.every_event:
+            return max(0, self.end - self.first)
+        return len(self.matches)
+
+    def page(self, offset, count):
+        """Rows offset..offset+count of the result, oldest first"""
+        if self.every_event:
+            seqs = range(self.first + offset, min(self.first + offset + count, self.end))
+        else:
+            seqs = self.matches[offset:offset + count]
+        return self.event_log.rows(seqs)
+
+
+def benchmark_event_log(hours=24, seed=0):
+    """Per-sample logging cost on the ingest path and viewer paging cost"""
+    import tempfile
+    from collections import deque
+    from datetime import datetime
+    from irrigation_rollups import IrrigationRollups, parse_irrigation_line, TIME_FORMAT
+    from irrigation_simulator import generate_stream
+
+    lines = [line for line in generate_stream(hours, seed=seed) if line.startswith("IRRIGATION_DATA:")]
+    n = len(lines)
+    print(f"📝 Event log benchmark: {n} samples ({hours} h stream)")
+
+    def ingest(log_sample, repeats=3):
+        best = None
+        for _ in range(repeats):
+            rollups = IrrigationRollups()
+            started = time.perf_counter()
+            for line in lines:
+                log_sample(line, 'raw')
+                params = parse_irrigation_line(line)
+                log_sample(f"📊 Parsed - Moisture: {params['MOISTURE']}, Pump: {params['PUMP']}", 'parsed')
+                rollups.add_sample(datetime.strptime(params["TIME"], TIME_FORMAT), params["MOISTURE"],
+                                   params["PUMP"], params["WATER_USED"], params["EVENTS"])
+            elapsed = (time.perf_counter() - started) / n * 1e6
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    directory = tempfile.mkdtemp(prefix='irrigation_events_')
+    try:
+        baseline = ingest(lambda message, kind: None)
+
+        # What the dashboard did before: a formatted line per sample into a deque
+        recent = deque(maxlen=100)
+        old = ingest(lambda message, kind: recent.append(f"[{datetime.now().strftime('%H:%M:%S')}] {message}"))
+
+        quiet = EventLog(os.path.join(directory, 'quiet.log'), level='INFO')
+        quiet.start()
+        disabled = ingest(lambda message, kind: quiet.debug(message))
+        quiet.close()
+
+        verbose = EventLog(os.path.join(directory, 'events.log'), level='DEBUG', max_bytes=1000000)
+        verbose.start()
+        enabled = ingest(lambda message, kind: verbose.debug(message, kind=kind), repeats=1)
+        started = time.perf_counter()
+        verbose.close()
+        drain = time.perf_counter() - started
+
+        def per_call(log_line, count=200000):
+            started = time.perf_counter()
+            for _ in range(count):
+                log_line("📊 Parsed - Moisture: 700, Pump: False")
+            return (time.perf_counter() - started) / count * 1e6
+
+        calls = EventLog(os.path.join(directory, 'calls.log'), level='INFO', keep=1000)
+        calls.start()
+        call_disabled = per_call(calls.debug)
+        call_enabled = per_call(calls.info)
+        calls.close()
+        print(f"  per call: filtered out {call_disabled:.2f} µs, indexed + queued {call_enabled:.2f} µs "
+              f"({calls.dropped} dropped by the bounded queue)")
+
+        print(f"  ingest without logging:      {baseline:6.1f} µs/sample")
+        for label, cost in (("old deque lines", old), ("DEBUG filtered out", disabled),
+                            ("DEBUG queued + written", enabled)):
+            print(f"  {label:>26}: {cost:6.1f} µs/sample (+{cost - baseline:.1f} µs, "
+                  f"{(cost - baseline) / baseline * 100:.0f}%)")
+        files = sorted(os.listdir(directory))
+        size = sum(os.path.getsize(os.path.join(directory, name)) for name in files)
+        print(f"  writer: {len(files)} files, {size / 1e6:.1f} MB on disk, {verbose.dropped} dropped, "
+              f"{drain * 1000:.0f} ms to drain at close")
+
+        # Viewer: filter the in-memory index and page in one screen of rows
+        for level, text in (('DEBUG', ''), ('INFO', ''), ('DEBUG', 'pump: true')):
+            started = time.perf_counter()
+            query = EventQuery(verbose, level, text)
+            filtered = time.perf_counter() - started
+            started = time.perf_counter()
+            rows = query.page(max(0, len(query) - 30), 30)
+            paged = time.perf_counter() - started
+            print(f"  view level={level:<5} text={text!r:<13} {len(query):>6} of {len(verbose.times)} events: "
+                  f"filter {filtered * 1000:.1f} ms, page of {len(rows)} {paged * 1e6:.0f} µs")
+
+        started = time.perf_counter()
+        reloaded = EventLog(os.path.join(directory, 'events.log'), level='DEBUG')
+        count = reloaded.load_recent()
+        print(f"  reload {count} events from the rotated files: {(time.perf_counter() - started) * 1000:.0f} ms")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    benchmark_event_log()
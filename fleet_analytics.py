@@ -0,0 +1,323 @@
+import json
+import os
+import time
+from collections import Counter
+from multiprocessing import Pool
+
+import numpy as np
+
+from irrigation_analytics import MAX_WATER_PER_EVENT, daily_metrics, fit_sums, fit_line
+from storage_backends import JsonFileStorage, SQLiteStorage
+
+
+# Columns of the packed fleet cache, one memory-mapped .npy file each
+COLUMNS = {
+    'day': np.int32,        # days since 1970-01-01
+    'water': np.float64,    # liters
+    'events': np.float64,
+    'pump_minutes': np.float64
+}
+
+INDEX_FILE = 'fleet_index.json'
+
+
+def zone_names(paths):
+    """Unique zone labels of history stores, in order
+
+    A store is labelled with its file name without extension. When several
+    stores share that name, e.g. site1/irrigation_data.json and
+    site2/irrigation_data.json, they are labelled with their path below
+    the common directory instead. A store listed twice is an error.
+    """
+    full = [os.path.abspath(path) for path in paths]
+    repeated = sorted(path for path, count in Counter(full).items() if count > 1)
+    if repeated:
+        raise ValueError(f"History stores listed more than once: {', '.join(repeated)}")
+    names = [os.path.splitext(os.path.basename(path))[0] for path in full]
+    if len(set(names)) == len(names):
+        return names
+
+    root = os.path.commonpath([os.path.dirname(path) for path in full])
+    relative = [os.path.relpath(path, root).replace(os.sep, '/') for path in full]
+    counts = Counter(names)
+    names = [os.path.splitext(path)[0] if counts[name] > 1 else name for path, name in zip(relative, names)]
+    # zone.json and zone.db in one directory differ only in their extension
+    counts = Counter(names)
+    names = [path if counts[name] > 1 else name for path, name in zip(relative, names)]
+    repeated = sorted(name for name, count in Counter(names).items() if count > 1)
+    if repeated:
+        raise ValueError(f"Zone labels are not unique: {', '.join(repeated)}")
+    return names
+
+
+def load_zone_columns(path):
+    """Read the daily level of one history store into column arrays"""
+    if path.endswith('.db'):
+        storage = SQLiteStorage(path, read_only=True)
+        try:
+            days = storage.read_range('day')
+        finally:
+            storage.close()
+    else:
+        days = sorted(JsonFileStorage(path, csv_file=None).load().get('daily_data', {}).items())
+
+    keys = np.array([key for key, _ in days], dtype='datetime64[D]')
+    return {
+        'day': keys.astype(np.int64).astype(np.int32),
+        'water': np.array([bucket['water_used'] for _, bucket in days], dtype=np.float64),
+        'events': np.array([bucket['events'] for _, bucket in days], dtype=np.float64),
+        'pump_minutes': np.array([bucket['pump_duration'] for _, bucket in days], dtype=np.float64) / 60.0
+    }
+
+
+def pack_fleet(paths, cache_dir, workers=None):
+    """Load many history stores in parallel into one columnar cache
+
+    Each column of every zone is written back to back into a .npy file,
+    and fleet_index.json records the zone names and row offsets. Workers
+    of analyze_fleet() memory-map these files, so the page cache is shared
+    and no zone data is pickled to them.
+    """
+    names = zone_names(paths)
+    os.makedirs(cache_dir, exist_ok=True)
+    if workers == 1:
+        loaded = [load_zone_columns(path) for path in paths]
+    else:
+        workers = workers or os.cpu_count()
+        with Pool(workers) as pool:
+            loaded = pool.map(load_zone_columns, paths, chunksize=max(1, len(paths) // (4 * workers)))
+
+    offsets = np.concatenate(([0], np.cumsum([len(columns['day']) for columns in loaded]))).tolist()
+    for name, dtype in COLUMNS.items():
+        column = np.lib.format.open_memmap(os.path.join(cache_dir, name + '.npy'), mode='w+',
+                                           dtype=dtype, shape=(offsets[-1],))
+        for columns, start, end in zip(loaded, offsets, offsets[1:]):
+            column[start:end] = columns[name]
+        column.flush()
+        del column
+
+    with open(os.path.join(cache_dir, INDEX_FILE), 'w') as f:
+        json.dump({'zones': names, 'sources': list(paths),
+                   'offsets': offsets}, f)
+    return offsets[-1]
+
+
+def _open_columns(cache_dir):
+    return {name: np.load(os.path.join(cache_dir, name + '.npy'), mmap_mode='r') for name in COLUMNS}
+
+
+def _analyze_chunk(task):
+    """Per-zone metrics and the partial fleet aggregate for a run of zones"""
+    cache_dir, offsets, first_zone, max_water_per_event = task
+    columns = _open_columns(cache_dir)
+    zones = []
+    partial = {
+        'days': 0, 'water': 0.0, 'events': 0.0, 'pump_minutes': 0.0, 'efficiency_sum': 0.0,
+        'fit': np.zeros(5), 'monthly_water': {}
+    }
+
+    for i, (start, end) in enumerate(zip(offsets, offsets[1:])):
+        water = np.asarray(columns['water'][start:end])
+        events = np.asarray(columns['events'][start:end])
+        pump_minutes = np.asarray(columns['pump_minutes'][start:end])
+        metrics = daily_metrics(water, events, pump_minutes, max_water_per_event)
+        fit = fit_sums(pump_minutes, water)
+
+        total_water, total_events, total_minutes = water.sum(), events.sum(), pump_minutes.sum()
+        zones.append(_summary(first_zone + i, end - start, total_water, total_events, total_minutes,
+                              metrics['efficiency'].sum(), fit))
+
+        partial['days'] += end - start
+        partial['water'] += total_water
+        partial['events'] += total_events
+        partial['pump_minutes'] += total_minutes
+        partial['efficiency_sum'] += metrics['efficiency'].sum()
+        partial['fit'] += fit
+
+    # Fleet-wide water per calendar month for the whole chunk at once
+    chunk = slice(offsets[0], offsets[-1])
+    months = np.asarray(columns['day'][chunk]).astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+    if len(months):
+        first_month = months.min()
+        totals = np.bincount(months - first_month, weights=np.asarray(columns['water'][chunk]))
+        for month, total in enumerate(totals.tolist()):
+            if total:
+                partial['monthly_water'][int(first_month) + month] = total
+    return zones, partial
+
+
+def _summary(zone, days, water, events, pump_minutes, efficiency_sum, fit):
+    trend = fit_line(fit)
+    return {
+        'zone': zone,
+        'days': int(days),
+        'water_used': float(water),
+        'events': int(events),
+        'pump_minutes': float(pump_minutes),
+        'water_per_event': float(water / events) if events else 0.0,
+        'efficiency': float(efficiency_sum / days) if days else 0.0,
+        'minutes_per_event': float(pump_minutes / events) if events else 0.0,
+        'liters_per_minute': float(water / pump_minutes) if pump_minutes else 0.0,
+        'trend_slope': float(trend[0]) if trend else None
+    }
+
+
+def merge_partials(partials):
+    """Combine per-chunk aggregates into fleet totals"""
+    merged = {
+        'days': 0, 'water': 0.0, 'events': 0.0, 'pump_minutes': 0.0, 'efficiency_sum': 0.0,
+        'fit': np.zeros(5), 'monthly_water': {}
+    }
+    for partial in partials:
+        for key in ('days', 'water', 'events', 'pump_minutes', 'efficiency_sum', 'fit'):
+            merged[key] += partial[key]
+        for month, total in partial['monthly_water'].items():
+            merged['monthly_water'][month] = merged['monthly_water'].get(month, 0.0) + total
+    return merged
+
+
+def analyze_fleet(cache_dir, workers=None, max_water_per_event=MAX_WATER_PER_EVENT):
+    """Per-zone and combined metrics of a packed fleet
+
+    Zones are split into contiguous chunks of similar row counts, a few
+    per worker so a long history does not hold up the pool.
+    """
+    with open(os.path.join(cache_dir, INDEX_FILE)) as f:
+        index = json.load(f)
+    offsets = index['offsets']
+    zone_count = len(index['zones'])
+    workers = workers or os.cpu_count()
+
+    # Chunk boundaries at zone edges, balanced by rows
+    targets = np.linspace(0, offsets[-1], workers * 4 + 1)[1:-1]
+    edges = np.unique(np.concatenate(([0], np.searchsorted(offsets, targets), [zone_count])))
+    tasks = [(cache_dir, offsets[start:end + 1], int(start), max_water_per_event)
+             for start, end in zip(edges, edges[1:]) if end > start]
+
+    if workers == 1:
+        results = [_analyze_chunk(task) for task in tasks]
+    else:
+        with Pool(workers) as pool:
+            results = pool.map(_analyze_chunk, tasks)
+
+    zones = []
+    for chunk_zones, _ in results:
+        for zone in chunk_zones:
+            zone['zone'] = index['zones'][zone['zone']]
+            zones.append(zone)
+    merged = merge_partials(partial for _, partial in results)
+    combined = _summary('ALL ZONES', merged['days'], merged['water'], merged['events'],
+                        merged['pump_minutes'], merged['efficiency_sum'], merged['fit'])
+    monthly = {str(np.datetime64(month, 'M')): total for month, total in sorted(merged['monthly_water'].items())}
+    return zones, combined, monthly
+
+
+def write_fleet_csv(filename, zones, combined):
+    import csv
+    with open(filename, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(combined.keys()))
+        writer.writeheader()
+        writer.writerows(zones)
+        writer.writerow(combined)
+
+
+def print_fleet_report(zones, combined, monthly, top=10):
+    print(f"🌐 Fleet report: {len(zones)} zones, {combined['days']} zone-days")
+    print(f"  Total water: {combined['water_used']:.1f} L in {combined['events']} events, "
+          f"{combined['pump_minutes']:.0f} pump minutes")
+    print(f"  Water per event: {combined['water_per_event']:.2f} L, efficiency {combined['efficiency']:.1f}%, "
+          f"{combined['minutes_per_event']:.1f} min/event, {combined['liters_per_minute']:.2f} L/min")
+    print("  Least efficient zones:")
+    for zone in sorted(zones, key=lambda zone: zone['efficiency'])[:top]:
+        print(f"    {zone['zone']}: {zone['efficiency']:.1f}% ({zone['water_per_event']:.2f} L/event, "
+              f"{zone['liters_per_minute']:.2f} L/min)")
+    for month, total in list(monthly.items())[-12:]:
+        print(f"  {month}: {total:.1f} L")
+
+
+def make_synthetic_fleet(directory, zones=200, years=3, seed=0):
+    """Write zone histories in the irrigation_data.json layout"""
+    from datetime import date, timedelta
+
+    rng = np.random.default_rng(seed)
+    start = date(2022, 1, 1)
+    keys = [(start + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(years * 365)]
+    paths = []
+    for zone in range(zones):
+        flow = rng.uniform(0.5, 2.0)
+        events = rng.poisson(rng.uniform(0.5, 4.0), len(keys))
+        minutes = events * rng.uniform(0.5, 3.0, len(keys))
+        water = minutes * flow * rng.uniform(0.9, 1.1, len(keys))
+        daily, monthly = {}, {}
+        for key, w, e, m in zip(keys, water.tolist(), events.tolist(), minutes.tolist()):
+            daily[key] = {'water_used': round(w, 2), 'moisture_avg': 500, 'events': e, 'pump_duration': m * 60}
+            month = monthly.setdefault(key[:7], {'water_used': 0.0, 'moisture_avg': 0, 'events': 0,
+                                                 'pump_duration': 0.0})
+            month['water_used'] += w
+            month['events'] += e
+        path = os.path.join(directory, f"zone{zone:04d}.json")
+        with open(path, 'w') as f:
+            json.dump({'minute_data': {}, 'hourly_data': {}, 'daily_data': daily, 'monthly_data': monthly,
+                       'yearly_data': {}, 'settings': {'flow_rate': flow}}, f)
+        paths.append(path)
+    return paths
+
+
+def benchmark_fleet(zones=200, years=3, max_workers=None):
+    """Pack and analyze time of a synthetic fleet at 1..N worker processes"""
+    import shutil
+    import tempfile
+
+    max_workers = max_workers or os.cpu_count()
+    directory = tempfile.mkdtemp(prefix='irrigation_fleet_')
+    try:
+        paths = make_synthetic_fleet(directory, zones, years)
+        print(f"🌐 Fleet analytics benchmark: {zones} zones × {years} years "
+              f"({os.cpu_count()} CPUs available)")
+        baseline = None
+        worker_counts = [1]
+        while worker_counts[-1] * 2 < max_workers:
+            worker_counts.append(worker_counts[-1] * 2)
+        if max_workers > 1:
+            worker_counts.append(max_workers)
+        for workers in worker_counts:
+            cache_dir = os.path.join(directory, f"cache{workers}")
+            started = time.perf_counter()
+            rows = pack_fleet(paths, cache_dir, workers)
+            packed = time.perf_counter() - started
+
+            started = time.perf_counter()
+            _, combined, _ = analyze_fleet(cache_dir, workers)
+            analyzed = time.perf_counter() - started
+
+            total = packed + analyzed
+            baseline = baseline or total
+            print(f"  {workers:>2} workers: pack {packed:.2f} s, analyze {analyzed * 1000:.0f} ms "
+                  f"({rows / analyzed:,.0f} zone-days/s), speedup {baseline / total:.2f}x "
+                  f"[{combined['water_used']:.0f} L]")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Efficiency and pump metrics across many zone histories")
+    parser.add_argument('stores', nargs='*', help="irrigation_data.json or .db files, one per zone")
+    parser.add_argument('--cache', default='fleet_cache', help="directory for the packed columns")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--csv', help="write per-zone and combined metrics to this CSV")
+    parser.add_argument('--benchmark', action='store_true', help="scaling benchmark on a synthetic fleet")
+    parser.add_argument('--zones', type=int, default=200)
+    parser.add_argument('--years', type=int, default=3)
+    args = parser.parse_args()
+
+    if args.benchmark or not args.stores:
+        benchmark_fleet(args.zones, args.years, args.workers)
+    else:
+        pack_fleet(args.stores, args.cache, args.workers)
+        zones, combined, monthly = analyze_fleet(args.cache, args.workers)
+        print_fleet_report(zones, combined, monthly)
+        if args.csv:
+            write_fleet_csv(args.csv, zones, combined)
+            print(f"✅ Fleet metrics written to {args.csv}")
@@ -0,0 +1,285 @@
+import threading
+import time
+
+from irrigation_rollups import LEVEL_FILE_KEYS
+
+
+# Loaded in full with the recent data: one bucket per day, month or year
+# is small, and live samples recompute month and year totals from them
+WHOLE_LEVELS = ('day', 'month', 'year')
+
+# Loaded one month at a time, the newest month with the recent data and
+# the older months afterwards, newest first
+STREAMED_LEVELS = ('hour', 'minute')
+
+
+def month_of(start):
+    """Month key a range start falls in ('2025' starts with '2025-01')"""
+    return start[:7] if len(start) >= 7 else start[:4] + '-01'
+
+
+class HistoryLoader:
+    """Loads the stored history into the rollups on a background thread
+
+    The first stage loads the day, month and year levels and the hour and
+    minute buckets of the newest month with data, i.e. today and this
+    month. After it, older hour and then minute buckets stream in one
+    month at a time, newest first.
+
+    Each level keeps a coverage mark, the oldest month loaded so far ('' once
+    complete). A failed load keeps the marks it reached, sets error and
+    releases every waiter; callers check error before trusting the levels. A reader waits for exactly the range it asks for, so a graph
+    of last week's hours does not wait for last year's minutes. Stored
+    buckets never replace buckets already in memory, so the buckets of live
+    samples are kept.
+    """
+    def __init__(self, storage, rollups, on_recent=None, on_done=None):
+        self.storage = storage
+        self.rollups = rollups
+        self.on_recent = on_recent  # Called with the stored settings after the first stage
+        self.on_done = on_done  # Called with the error, or None, once everything is in memory
+
+        self.coverage = {level: None for level in WHOLE_LEVELS + STREAMED_LEVELS}
+        self.changed = threading.Condition()
+        self.waiters = []
+        self.recent_loaded = threading.Event()
+        self.loaded = threading.Event()
+        self.error = None
+        self.buckets = 0
+        self.timings = {}
+        self.started = None
+        self.thread = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def covers(self, level, start=None):
+        """True if every bucket of level from start on (all of it for None) is in memory"""
+        oldest = self.coverage.get(level)
+        if oldest is None:
+            return False
+        return oldest == '' or (start is not None and month_of(start) >= oldest)
+
+    def wait(self, level, start=None, timeout=None):
+        """Block until covers(level, start) or the load failed; returns False on timeout"""
+        with self.changed:
+            return self.changed.wait_for(lambda: self.covers(level, start) or self.error is not None,
+                                         timeout)
+
+    def notify(self, levels, callback, start=None):
+        """Call callback (on the loader thread) once all levels are covered from start on
+
+        After a failed load the callback runs straight away with what is in memory.
+        """
+        with self.changed:
+            if self.error is None and not all(self.covers(level, start) for level in levels):
+                self.waiters.append((levels, start, callback))
+                return
+        callback()
+
+    def pending(self):
+        """[(level, oldest month loaded)] of the levels still loading"""
+        return [(level, oldest) for level, oldest in self.coverage.items() if oldest != '']
+
+    def _cover(self, levels, oldest):
+        with self.changed:
+            for level in levels:
+                self.coverage[level] = oldest
+            ready = [waiter for waiter in self.waiters
+                     if self.error is not None or all(self.covers(level, waiter[1]) for level in waiter[0])]
+            self.waiters = [waiter for waiter in self.waiters if waiter not in ready]
+            self.changed.notify_all()
+        for _, _, callback in ready:
+            callback()
+
+    def _merge(self, levels):
+        self.rollups.merge_levels(levels)
+        self.buckets += sum(len(buckets) for buckets in levels.values())
+
+    def _reader(self):
+        """Return the stored settings, read(level, month=None) -> {key: bucket}
+        and bucket_months(level) -> months holding buckets of level
+
+        Backends with range reads fetch each month on its own. A JSON file
+        can only be parsed whole, so its streamed levels are split into
+        months once and handed out from there.
+        """
+        storage = self.storage
+        storage.prepare()
+        if storage.range_reads:
+            def read(level, month=None):
+                return dict(storage.read_range(level, month, month))
+            return storage.load_settings(), read, storage.bucket_months
+
+        data = storage.load_in_steps()
+        months = {}
+
+        def split(level):
+            if level not in months:
+                by_month = months[level] = {}
+                for key, bucket in data.get(LEVEL_FILE_KEYS[level], {}).items():
+                    by_month.setdefault(key[:7], {})[key] = bucket
+            return months[level]
+
+        def read(level, month=None):
+            if month is None:
+                return data.get(LEVEL_FILE_KEYS[level], {})
+            return split(level).pop(month, {})
+
+        def bucket_months(level):
+            return list(split(level))
+        return data.get('settings', {}), read, bucket_months
+
+    def _run(self):
+        try:
+            settings, read, bucket_months = self._reader()
+            recent = {level: read(level) for level in WHOLE_LEVELS}
+            # The streamed levels' own months too: a crash before the month
+            # total was written, or an hour-only import, leaves hours and
+            # minutes in months without one
+            months = set(recent['month'])
+            for level in STREAMED_LEVELS:
+                months.update(bucket_months(level))
+            months = sorted(months, reverse=True)
+            for level in STREAMED_LEVELS:
+                recent[level] = read(level, months[0]) if months else {}
+            self._merge(recent)
+            self._cover(WHOLE_LEVELS, '')
+            self._cover(STREAMED_LEVELS, months[0] if months else '')
+            self.timings['recent'] = time.perf_counter() - self.started
+            self.recent_loaded.set()
+            if self.on_recent:
+                self.on_recent(settings)
+
+            for level in STREAMED_LEVELS:
+                for month in months[1:]:
+                    self._merge({level: read(level, month)})
+                    self._cover([level], month)
+                self._cover([level], '')
+        except Exception as e:
+            with self.changed:
+                self.error = e
+            # Whatever failed to load is not coming; release every waiter
+            # but leave the coverage marks where the load stopped
+            self._cover([], None)
+        finally:
+            self.timings['done'] = time.perf_counter() - self.started
+            self.recent_loaded.set()
+            self.loaded.set()
+            if self.on_done:
+                self.on_done(self.error)
+
+
+def check_unlisted_months(storages=('json', 'sqlite')):
+    """Hour and minute buckets in a month without a month total are loaded too"""
+    import os
+    import shutil
+    import tempfile
+    from irrigation_rollups import IrrigationRollups, LEVELS
+    from storage_backends import JsonFileStorage, SQLiteStorage
+
+    bucket = {'water_used': 1.5, 'moisture': 400, 'events': 1, 'pump_duration': 30.0}
+    levels = {
+        'minute': {'2025-08-17 06:00': bucket, '2025-06-03 12:30': bucket},
+        'hour': {'2025-08-17 06': bucket, '2025-06-03 12': bucket, '2025-05-20 07': bucket},
+        'day': {'2025-08-17': bucket},
+        'month': {'2025-08': bucket},  # June and May never got theirs
+        'year': {'2025': bucket}
+    }
+    directory = tempfile.mkdtemp(prefix='irrigation_loader_')
+    try:
+        for name in storages:
+            if name == 'sqlite':
+                storage = SQLiteStorage(os.path.join(directory, 'irrigation_data.db'), import_json=None)
+                storage.save_levels(levels)
+            else:
+                storage = JsonFileStorage(os.path.join(directory, 'irrigation_data.json'), csv_file=None)
+            storage.save(levels, {})
+            rollups = IrrigationRollups()
+            loader = HistoryLoader(storage, rollups)
+            loader.start()
+            loader.loaded.wait()
+            storage.close()
+            if loader.error:
+                raise AssertionError(f"{name}: load failed: {loader.error}")
+            loaded = rollups.levels()
+            for level in LEVELS:
+                if sorted(loaded[level]) != sorted(levels[level]):
+                    raise AssertionError(f"{name}: {level} buckets {sorted(loaded[level])}, "
+                                         f"stored {sorted(levels[level])}")
+            if loader.pending():
+                raise AssertionError(f"{name}: still loading {loader.pending()}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def benchmark_startup(sizes=None, storages=('json', 'sqlite')):
+    """Time to first window, to the recent data and to the full history, per history size
+
+    'before' is the old startup path: load_historical_data() and the data
+    summary ran before the window was created. There is no display here,
+    so the window is the headless monitor and Tk's own setup is not counted.
+    While the history loads, the main thread ticks every millisecond like
+    an idle mainloop; the longest gap between ticks is how long the GUI
+    would freeze.
+    """
+    import os
+    import shutil
+    import tempfile
+    from benchmark_suite import HISTORY_SIZES, HeadlessMonitor, write_history
+
+    print("🚀 Startup benchmark (time to first window vs history size)")
+    home = os.getcwd()
+    for storage in storages:
+        for size, days in (sizes or HISTORY_SIZES).items():
+            directory = tempfile.mkdtemp(prefix='irrigation_startup_')
+            try:
+                write_history(directory, days, storage)
+                os.chdir(directory)
+
+                started = time.perf_counter()
+                monitor = HeadlessMonitor(storage=storage)
+                monitor.update_data_summary()
+                window = time.perf_counter() - started
+
+                stall = 0.0
+                last = time.perf_counter()
+                while not monitor.history_loader.loaded.is_set():
+                    time.sleep(0.001)
+                    now = time.perf_counter()
+                    stall = max(stall, now - last)
+                    last = now
+                timings = monitor.history_loader.timings
+
+                started = time.perf_counter()
+                monitor.load_historical_data()
+                monitor.update_data_summary()
+                before = time.perf_counter() - started + window
+
+                print(f"  {storage:<6} {size:<5} {monitor.history_loader.buckets:>7} buckets: "
+                      f"first window {window * 1000:6.1f} ms (before {before * 1000:7.1f} ms), "
+                      f"recent data {timings['recent'] * 1000:7.1f} ms, "
+                      f"all history {timings['done'] * 1000:7.1f} ms, longest GUI stall {stall * 1000:5.1f} ms")
+                monitor.storage.close()
+                monitor.event_log.close()
+                monitor.sample_ring.close()
+            finally:
+                os.chdir(home)
+                shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Background history loading")
+    parser.add_argument('--check', action='store_true',
+                        help="check that a history with months lacking a month total loads in full")
+    args = parser.parse_args()
+
+    if args.check:
+        check_unlisted_months()
+        print("✅ Every stored month loaded")
+    else:
+        benchmark_startup()
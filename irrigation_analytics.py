@@ -0,0 +1,304 @@
+import numpy as np
+
+
+# Water per event that scores 0% efficiency (the old views' normalization)
+MAX_WATER_PER_EVENT = 10.0
+
+
+def daily_metrics(water, events, pump_minutes, max_water_per_event=MAX_WATER_PER_EVENT):
+    """Per-day analysis metrics from daily water, event and pump-minute arrays"""
+    watered = events > 0
+    water_per_event = np.divide(water, events, out=np.zeros_like(water), where=watered)
+    return {
+        'water_per_event': water_per_event,
+        # Lower water per event = higher efficiency; days without watering score 100
+        'efficiency': np.where(
+            watered, np.maximum(0.0, 100.0 - water_per_event / max_water_per_event * 100.0), 100.0),
+        'avg_duration_per_event': np.divide(pump_minutes, events, out=np.zeros_like(pump_minutes),
+                                            where=watered),
+        'pump_efficiency': np.divide(water, pump_minutes, out=np.zeros_like(water), where=pump_minutes > 0)
+    }
+
+
+def fit_sums(x, y):
+    """Least-squares sums n, Σx, Σy, Σxx, Σxy for a line through (x, y)"""
+    return np.array([len(x), x.sum(), y.sum(), (x * x).sum(), (x * y).sum()])
+
+
+def fit_line(sums):
+    """(slope, intercept) from fit_sums() totals, or None when undetermined"""
+    n, sx, sy, sxx, sxy = sums
+    denominator = n * sxx - sx * sx
+    if n < 2 or abs(denominator) <= 1e-9 * max(n * sxx, 1.0):
+        return None
+    slope = (n * sxy - sx * sy) / denominator
+    return slope, (sy - slope * sx) / n
+
+
+def day_rows_metrics(rows, max_water_per_event=MAX_WATER_PER_EVENT):
+    """Both analysis views' series from sorted [day, bucket] rows (no caching)"""
+    water = np.array([bucket['water_used'] for _, bucket in rows], dtype=np.float64)
+    events = np.array([bucket['events'] for _, bucket in rows], dtype=np.float64)
+    pump_minutes = np.array([bucket['pump_duration'] for _, bucket in rows], dtype=np.float64) / 60.0
+    metrics = daily_metrics(water, events, pump_minutes, max_water_per_event)
+    metrics.update({
+        'dates': [day for day, _ in rows],
+        'water_used': water,
+        'pump_minutes': pump_minutes,
+        'cumulative_water': np.cumsum(water),
+        'trend': fit_line(fit_sums(pump_minutes, water))
+    })
+    return metrics
+
+
+class DailyAnalytics:
+    """Columnar daily series and the metrics behind the analysis views
+
+    The daily buckets are mirrored into NumPy columns and every derived
+    metric is computed with array operations. refresh() is keyed on the
+    rollups' data version: an unchanged history is a cache hit, and when
+    only some days changed (the live day, a backlog) just those positions
+    are recomputed. The cumulative total is re-summed from the first
+    changed day, and the pump-duration trend line is kept as running
+    least-squares sums instead of refitting np.polyfit. A reload, or a
+    new day inserted before the end, rebuilds the columns once.
+    """
+    def __init__(self, rollups, max_water_per_event=MAX_WATER_PER_EVENT):
+        self.rollups = rollups
+        self.max_water_per_event = max_water_per_event
+        self._version = None
+        self._generation = None
+        self.rebuilds = 0
+        self.updates = 0
+        self._reset(0)
+
+    def _reset(self, capacity):
+        self.dates = []
+        self._index = {}
+        self._size = 0
+        self._columns = {name: np.zeros(capacity) for name in (
+            'water', 'events', 'pump_minutes', 'water_per_event', 'efficiency',
+            'cumulative_water', 'avg_duration_per_event', 'pump_efficiency')}
+        # Least-squares sums for water ~ pump_minutes: n, Σx, Σy, Σxx, Σxy
+        self._fit = np.zeros(5)
+
+    def __len__(self):
+        return self._size
+
+    def __getattr__(self, name):
+        columns = self.__dict__.get('_columns')
+        if columns is not None and name in columns:
+            return columns[name][:self._size]
+        raise AttributeError(name)
+
+    def refresh(self):
+        """Bring the columns up to the rollups' current version"""
+        rollups = self.rollups
+        if rollups.generation != self._generation:
+            self._rebuild()
+        elif rollups.version != self._version:
+            days = rollups.days_changed_since(self._version)
+            new_days = sorted(day for day in days if day not in self._index)
+            if new_days and self.dates and new_days[0] < self.dates[-1]:
+                self._rebuild()
+            else:
+                self._update(days, new_days)
+        self._version = rollups.version
+        self._generation = rollups.generation
+        return self
+
+    def _rebuild(self):
+        daily = self.rollups.daily_data
+        dates = sorted(daily.keys())
+        self._reset(max(len(dates), 16))
+        self.dates = dates
+        self._index = {day: i for i, day in enumerate(dates)}
+        self._size = len(dates)
+
+        columns = self._columns
+        n = self._size
+        columns['water'][:n] = [daily[day]['water_used'] for day in dates]
+        columns['events'][:n] = [daily[day]['events'] for day in dates]
+        columns['pump_minutes'][:n] = [daily[day]['pump_duration'] for day in dates]
+        columns['pump_minutes'][:n] /= 60.0
+
+        positions = np.arange(n)
+        self._derive(positions)
+        np.cumsum(columns['water'][:n], out=columns['cumulative_water'][:n])
+        self._fit_add(positions, 1.0)
+        self.rebuilds += 1
+
+    def _update(self, days, new_days):
+        daily = self.rollups.daily_data
+        if new_days:
+            self._grow(self._size + len(new_days))
+            for day in new_days:
+                self._index[day] = self._size
+                self.dates.append(day)
+                self._size += 1
+
+        positions = np.array(sorted(self._index[day] for day in days if day in self._index), dtype=np.intp)
+        if not len(positions):
+            return
+        existing = positions[np.isin(positions, [self._index[day] for day in new_days], invert=True)]
+        self._fit_add(existing, -1.0)
+
+        columns = self._columns
+        columns['water'][positions] = [daily[self.dates[i]]['water_used'] for i in positions]
+        columns['events'][positions] = [daily[self.dates[i]]['events'] for i in positions]
+        columns['pump_minutes'][positions] = [daily[self.dates[i]]['pump_duration'] / 60.0 for i in positions]
+
+        self._derive(positions)
+        self._fit_add(positions, 1.0)
+
+        first = positions[0]
+        cumulative = columns['cumulative_water']
+        np.cumsum(columns['water'][first:self._size], out=cumulative[first:self._size])
+        if first > 0:
+            cumulative[first:self._size] += cumulative[first - 1]
+        self.updates += 1
+
+    def _grow(self, size):
+        capacity = len(self._columns['water'])
+        if size <= capacity:
+            return
+        capacity = max(size, capacity * 2)
+        for name, column in self._columns.items():
+            grown = np.zeros(capacity)
+            grown[:self._size] = column[:self._size]
+            self._columns[name] = grown
+
+    def _derive(self, positions):
+        """Recompute the per-day metrics at the given positions"""
+        columns = self._columns
+        metrics = daily_metrics(columns['water'][positions], columns['events'][positions],
+                                columns['pump_minutes'][positions], self.max_water_per_event)
+        for name, values in metrics.items():
+            columns[name][positions] = values
+
+    def _fit_add(self, positions, sign):
+        self._fit += sign * fit_sums(self._columns['pump_minutes'][positions], self._columns['water'][positions])
+
+    def trend(self):
+        """(slope, intercept) of water used against pump minutes, or None"""
+        return fit_line(self._fit)
+
+    def efficiency_metrics(self):
+        """Series for show_efficiency_analysis
+
+        Copies are returned, since plotted arrays are kept by matplotlib and
+        the columns are updated in place.
+        """
+        self.refresh()
+        return {
+            'dates': list(self.dates),
+            'water_per_event': self.water_per_event.copy(),
+            'efficiency': self.efficiency.copy(),
+            'cumulative_water': self.cumulative_water.copy()
+        }
+
+    def pump_metrics(self):
+        """Series for show_pump_duration_analysis"""
+        self.refresh()
+        return {
+            'dates': list(self.dates),
+            'pump_minutes': self.pump_minutes.copy(),
+            'water_used': self.water.copy(),
+            'avg_duration_per_event': self.avg_duration_per_event.copy(),
+            'pump_efficiency': self.pump_efficiency.copy(),
+            'trend': self.trend()
+        }
+
+
+def _legacy_metrics(daily_data):
+    """The per-date Python loops the analysis views used to run"""
+    dates = sorted(daily_data.keys())
+    water_per_event, efficiency_scores = [], []
+    for date in dates:
+        data = daily_data[date]
+        if data['events'] > 0:
+            wpe = data['water_used'] / data['events']
+            water_per_event.append(wpe)
+            efficiency_scores.append(max(0, 100 - (wpe / MAX_WATER_PER_EVENT * 100)))
+        else:
+            water_per_event.append(0)
+            efficiency_scores.append(100)
+    cumulative_water, total = [], 0
+    for date in dates:
+        total += daily_data[date]['water_used']
+        cumulative_water.append(total)
+
+    pump_durations = [daily_data[date]['pump_duration'] / 60.0 for date in dates]
+    water_used = [daily_data[date]['water_used'] for date in dates]
+    events = [daily_data[date]['events'] for date in dates]
+    trend = np.polyfit(pump_durations, water_used, 1) if len(pump_durations) > 1 else None
+    avg_duration_per_event = [pump_durations[i] / events[i] if events[i] > 0 else 0 for i in range(len(dates))]
+    efficiency = [water_used[i] / pump_durations[i] if pump_durations[i] > 0 else 0 for i in range(len(dates))]
+    return water_per_event, efficiency_scores, cumulative_water, avg_duration_per_event, efficiency, trend
+
+
+def benchmark_analytics(years=(1, 5, 20), repeats=20, seed=0):
+    """Cold and warm analytics compute against the old per-date loops"""
+    import time
+    from datetime import datetime, timedelta
+    from irrigation_rollups import IrrigationRollups
+
+    rng = np.random.default_rng(seed)
+    print("📈 Analysis views benchmark (metrics only, no plotting)")
+    for year_count in years:
+        rollups = IrrigationRollups()
+        start = datetime(2000, 1, 1, 12, 0)
+        days = year_count * 365
+        for i in range(days):
+            events = int(rng.integers(0, 6))
+            rollups.daily_data[(start + timedelta(days=i)).strftime("%Y-%m-%d")].update({
+                'water_used': events * rng.uniform(0.5, 3.0),
+                'moisture_avg': 500,
+                'events': events,
+                'pump_duration': events * rng.uniform(30, 180)
+            })
+        rollups.generation += 1
+
+        started = time.perf_counter()
+        for _ in range(repeats):
+            legacy = _legacy_metrics(rollups.daily_data)
+        legacy_time = (time.perf_counter() - started) / repeats
+
+        started = time.perf_counter()
+        for _ in range(repeats):
+            analytics = DailyAnalytics(rollups)
+            analytics.efficiency_metrics()
+            analytics.pump_metrics()
+        cold = (time.perf_counter() - started) / repeats
+
+        started = time.perf_counter()
+        for _ in range(repeats):
+            analytics.efficiency_metrics()
+            analytics.pump_metrics()
+        warm = (time.perf_counter() - started) / repeats
+
+        # One live sample on the last day, then a view
+        last = start + timedelta(days=days - 1)
+        timings = []
+        for i in range(repeats):
+            rollups.add_sample(last + timedelta(seconds=2 * i), 500, False, 1.0 + i, 1)
+            started = time.perf_counter()
+            analytics.efficiency_metrics()
+            analytics.pump_metrics()
+            timings.append(time.perf_counter() - started)
+        incremental = sum(timings) / repeats
+
+        fresh = DailyAnalytics(rollups).refresh()
+        assert np.allclose(fresh.cumulative_water, analytics.cumulative_water)
+        assert np.allclose(fresh.efficiency, analytics.efficiency)
+        assert np.allclose(legacy[3][:-1], fresh.avg_duration_per_event[:-1])
+        slope, intercept = analytics.trend()
+        assert np.allclose((slope, intercept), np.polyfit(fresh.pump_minutes, fresh.water, 1))
+
+        print(f"  {year_count:>2} years ({days} days): loops {legacy_time * 1000:.2f} ms, "
+              f"cold {cold * 1000:.2f} ms, warm {warm * 1e6:.1f} µs, "
+              f"after one sample {incremental * 1e6:.1f} µs")
+
+
+if __name__ == "__main__":
+    benchmark_analytics()
@@ -0,0 +1,239 @@
+import numpy as np
+from matplotlib.ticker import MaxNLocator
+
+
+# Figure size and subplot grid of each chart type
+CHART_LAYOUTS = {
+    'water': ((14, 10), (2, 1)),
+    'moisture': ((14, 8), (1, 1)),
+    'efficiency': ((14, 12), (3, 1)),
+    'pump': ((16, 10), (2, 2)),
+    'whatif': ((18, 6), (1, 3))
+}
+
+# Levels that keep a moisture value per bucket
+MOISTURE_LEVELS = ('minute', 'hour', 'day')
+
+# Longer series only label every n-th bucket; hundreds of rotated labels
+# are unreadable and dominate the drawing time
+MAX_TICK_LABELS = 31
+
+
+def limit_tick_labels(ax, count):
+    """Thin out the category labels on the x axis of a long series"""
+    if count > MAX_TICK_LABELS:
+        ax.xaxis.set_major_locator(MaxNLocator(MAX_TICK_LABELS, integer=True))
+
+
+def draw_water_usage(axes, period, periods, water_used, events):
+    """Water used and watering events per bucket of one level"""
+    ax1, ax2 = axes
+
+    # Water usage graph
+    ax1.bar(periods, water_used, color='#3498db', alpha=0.7, edgecolor='#2980b9')
+    ax1.set_title(f'{period.title()}ly Water Usage', fontsize=16, fontweight='bold', pad=20)
+    ax1.set_ylabel('Water Used (Liters)', fontsize=12)
+    ax1.grid(True, alpha=0.3)
+    ax1.tick_params(axis='x', rotation=45)
+    limit_tick_labels(ax1, len(periods))
+
+    # Add value labels on bars
+    for i, v in enumerate(water_used):
+        if v > 0:
+            ax1.text(i, v + max(water_used) * 0.01, f'{v:.1f}L',
+                    ha='center', va='bottom', fontweight='bold')
+
+    # Events graph
+    ax2.bar(periods, events, color='#2ecc71', alpha=0.7, edgecolor='#27ae60')
+    ax2.set_title(f'{period.title()}ly Watering Events', fontsize=16, fontweight='bold', pad=20)
+    ax2.set_ylabel('Number of Events', fontsize=12)
+    ax2.set_xlabel('Time Period', fontsize=12)
+    ax2.grid(True, alpha=0.3)
+    ax2.tick_params(axis='x', rotation=45)
+    limit_tick_labels(ax2, len(periods))
+
+    # Add value labels on bars
+    for i, v in enumerate(events):
+        if v > 0:
+            ax2.text(i, v + max(events) * 0.01, str(v),
+                    ha='center', va='bottom', fontweight='bold')
+
+
+def draw_forecast(ax, forecast, count):
+    """Expected water of the running day and the days after it, as hatched bars on a daily usage chart
+
+    count is the number of bars already drawn; the running day's bar is
+    one of them and gets the expected total drawn over it.
+    """
+    days = [day for day, _ in forecast]
+    ax.bar(days, [value for _, value in forecast], color='#e67e22', alpha=0.35, hatch='//',
+           edgecolor='#d35400', label='Forecast')
+    ax.legend(loc='upper left')
+    limit_tick_labels(ax, count + len(days) - 1)
+
+
+def draw_coverage_strip(ax, coverage):
+    """Thin strip above a chart: the share of each bucket with data, red (none) to green (all)"""
+    strip = ax.inset_axes([0, 1.005, 1, 0.025])
+    strip.imshow([coverage], aspect='auto', cmap='RdYlGn', vmin=0.0, vmax=1.0, interpolation='nearest',
+                 extent=(-0.5, len(coverage) - 0.5, 0, 1))
+    strip.set_xlim(ax.get_xlim())
+    strip.set_axis_off()
+
+
+def draw_moisture(ax, period, periods, moisture, dry_threshold, wet_threshold, gaps=None):
+    """Moisture per bucket against the dry and wet thresholds
+
+    gaps marks the buckets with missing data before them; the line is
+    broken there instead of drawn straight across.
+    """
+    # Plot moisture levels
+    if gaps is not None and np.any(gaps):
+        ax.plot(periods, moisture, marker='o', color='#9b59b6', linestyle='none',
+                label='Moisture Level', markersize=6)
+        breaks = np.flatnonzero(gaps)
+        ax.plot(np.insert(np.arange(len(periods), dtype=float), breaks, np.nan),
+                np.insert(np.asarray(moisture, dtype=float), breaks, np.nan),
+                color='#9b59b6', linewidth=2)
+    else:
+        ax.plot(periods, moisture, marker='o', color='#9b59b6',
+                label='Moisture Level', linewidth=2, markersize=6)
+
+    # Add threshold lines
+    ax.axhline(y=dry_threshold, color='red', linestyle='--', linewidth=2,
+               label=f'Dry Threshold ({dry_threshold})')
+    ax.axhline(y=wet_threshold, color='green', linestyle='--', linewidth=2,
+               label=f'Wet Threshold ({wet_threshold})')
+
+    ax.set_title(f'{period.title()}ly Soil Moisture History', fontsize=16, fontweight='bold', pad=20)
+    ax.set_xlabel('Time Period', fontsize=12)
+    ax.set_ylabel('Moisture Level', fontsize=12)
+    ax.legend(fontsize=11)
+    ax.grid(True, alpha=0.3)
+    ax.tick_params(axis='x', rotation=45)
+    limit_tick_labels(ax, len(periods))
+
+
+def draw_efficiency(axes, metrics):
+    """Water per event, efficiency score and cumulative water per day"""
+    ax1, ax2, ax3 = axes
+    dates = metrics['dates']
+
+    # Water per event
+    ax1.plot(dates, metrics['water_per_event'], marker='s', color='#e74c3c',
+            linewidth=2, markersize=6, label='Water per Event')
+    ax1.set_title('Water Usage per Watering Event', fontsize=14, fontweight='bold')
+    ax1.set_ylabel('Liters per Event')
+    ax1.grid(True, alpha=0.3)
+    ax1.legend()
+
+    # Efficiency scores
+    ax2.bar(dates, metrics['efficiency'], color='#27ae60', alpha=0.7)
+    ax2.set_title('Daily Irrigation Efficiency Score', fontsize=14, fontweight='bold')
+    ax2.set_ylabel('Efficiency Score (%)')
+    ax2.grid(True, alpha=0.3)
+
+    # Cumulative water usage
+    ax3.plot(dates, metrics['cumulative_water'], marker='o', color='#3498db',
+            linewidth=3, markersize=6, label='Cumulative Water Usage')
+    ax3.fill_between(dates, metrics['cumulative_water'], alpha=0.3, color='#3498db')
+    ax3.set_title('Cumulative Water Usage Over Time', fontsize=14, fontweight='bold')
+    ax3.set_ylabel('Total Liters')
+    ax3.set_xlabel('Date')
+    ax3.grid(True, alpha=0.3)
+    ax3.legend()
+
+    for ax in axes:
+        ax.tick_params(axis='x', rotation=45)
+        limit_tick_labels(ax, len(dates))
+
+
+def draw_pump_duration(axes, metrics):
+    """Pump minutes, water against pump time, minutes per event and L/min per day"""
+    (ax1, ax2), (ax3, ax4) = axes
+    dates = metrics['dates']
+    pump_durations = metrics['pump_minutes']
+    water_used = metrics['water_used']
+
+    # Daily pump duration
+    ax1.bar(dates, pump_durations, color='#8e44ad', alpha=0.7)
+    ax1.set_title('Daily Pump Duration', fontsize=12, fontweight='bold')
+    ax1.set_ylabel('Duration (minutes)')
+    ax1.grid(True, alpha=0.3)
+    ax1.tick_params(axis='x', rotation=45)
+    limit_tick_labels(ax1, len(dates))
+
+    # Pump duration vs Water used
+    ax2.scatter(pump_durations, water_used, color='#e67e22', s=60, alpha=0.7)
+    ax2.set_title('Pump Duration vs Water Used', fontsize=12, fontweight='bold')
+    ax2.set_xlabel('Pump Duration (minutes)')
+    ax2.set_ylabel('Water Used (Liters)')
+    ax2.grid(True, alpha=0.3)
+
+    # Add trend line
+    if metrics['trend'] is not None:
+        p = np.poly1d(metrics['trend'])
+        ax2.plot(pump_durations, p(pump_durations), "r--", alpha=0.8)
+
+    # Average duration per event
+    ax3.plot(dates, metrics['avg_duration_per_event'], marker='d', color='#16a085',
+            linewidth=2, markersize=6)
+    ax3.set_title('Average Duration per Watering Event', fontsize=12, fontweight='bold')
+    ax3.set_ylabel('Minutes per Event')
+    ax3.grid(True, alpha=0.3)
+    ax3.tick_params(axis='x', rotation=45)
+    limit_tick_labels(ax3, len(dates))
+
+    # Pump efficiency (water/time)
+    ax4.bar(dates, metrics['pump_efficiency'], color='#f39c12', alpha=0.7)
+    ax4.set_title('Pump Efficiency (L/min)', fontsize=12, fontweight='bold')
+    ax4.set_ylabel('Liters per Minute')
+    ax4.set_xlabel('Date')
+    ax4.grid(True, alpha=0.3)
+    ax4.tick_params(axis='x', rotation=45)
+    limit_tick_labels(ax4, len(dates))
+
+
+def _axis_index(axis, value, name):
+    """Index of value on a sorted grid axis, tolerating rounding"""
+    k = int(np.searchsorted(axis, value))
+    for i in (k, k - 1):
+        if 0 <= i < len(axis) and np.isclose(axis[i], value):
+            return i
+    raise ValueError(f'{name} {value} is not on the what-if grid')
+
+
+def draw_settings_whatif(axes, result, dry, wet, flow, current, candidate):
+    """Predicted water and pump starts per day over threshold pairs, and water against flow rate
+
+    current and candidate are (dry, wet, flow) settings on the grid axes.
+    """
+    ax1, ax2, ax3 = axes
+    days = max(result['days'], 1e-9)
+    k = _axis_index(flow, candidate[2], 'Flow rate')
+    panels = [
+        (ax1, result['water_used'][:, :, k] / days, 'Blues', f'Water per Day at {candidate[2]:.2f} L/min', 'Liters per Day'),
+        (ax2, result['events'] / days, 'Oranges', 'Pump Starts per Day', 'Starts per Day')
+    ]
+    for ax, values, cmap, title, unit in panels:
+        mesh = ax.pcolormesh(wet, dry, values, cmap=cmap, shading='nearest')
+        ax.figure.colorbar(mesh, ax=ax, label=unit)
+        ax.plot(current[1], current[0], 'x', color='#e74c3c', markersize=12, markeredgewidth=3, label='Current')
+        ax.plot(candidate[1], candidate[0], '*', color='#2ecc71', markersize=16,
+                markeredgecolor='black', label='Candidate')
+        ax.set_title(title, fontsize=12, fontweight='bold')
+        ax.set_xlabel('Wet Threshold (pump OFF at or below)')
+        ax.set_ylabel('Dry Threshold (pump ON at or above)')
+        ax.legend(fontsize=9, loc='lower right')
+
+    # Water is pump time times flow rate: one line per threshold pair
+    for setting, color, label in ((current, '#e74c3c', 'Current thresholds'),
+                                  (candidate, '#2ecc71', 'Candidate thresholds')):
+        i, j = _axis_index(dry, setting[0], 'Dry threshold'), _axis_index(wet, setting[1], 'Wet threshold')
+        ax3.plot(flow, result['water_used'][i, j, :] / days, marker='o', color=color, linewidth=2, label=label)
+    ax3.axvline(x=candidate[2], color='gray', linestyle='--', linewidth=1)
+    ax3.set_title('Water per Day vs Flow Rate', fontsize=12, fontweight='bold')
+    ax3.set_xlabel('Flow Rate (L/min)')
+    ax3.set_ylabel('Liters per Day')
+    ax3.legend(fontsize=9)
+    ax3.grid(True, alpha=0.3)
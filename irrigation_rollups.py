@@ -0,0 +1,570 @@
+import threading
+from collections import defaultdict
+from datetime import timedelta
+
+import numpy as np
+
+from coverage_index import CoverageIndex
+from range_index import ADDITIVE_FIELDS, RangeIndex
+
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+LEVELS = ('minute', 'hour', 'day', 'month', 'year')
+
+LEVEL_FORMATS = {
+    'minute': "%Y-%m-%d %H:%M",
+    'hour': "%Y-%m-%d %H:00",
+    'day': "%Y-%m-%d",
+    'month': "%Y-%m",
+    'year': "%Y"
+}
+
+# Keys used for each level in irrigation_data.json and JSON exports
+LEVEL_FILE_KEYS = {
+    'minute': 'minute_data',
+    'hour': 'hourly_data',
+    'day': 'daily_data',
+    'month': 'monthly_data',
+    'year': 'yearly_data'
+}
+
+# numpy datetime64 unit of each level's buckets, for batch ingest
+LEVEL_UNITS = {
+    'minute': 'm',
+    'hour': 'h',
+    'day': 'D',
+    'month': 'M',
+    'year': 'Y'
+}
+
+# The fixed-rate sketch reports every 2 s, so each pump-on sample stands for 2 s
+DEFAULT_SAMPLE_INTERVAL = 2.0
+
+# A change-driven stream may stay silent for up to one heartbeat; anything
+# longer than this many heartbeats is treated as a disconnect, not a constant stretch
+GAP_TOLERANCE = 1.5
+
+
+def new_level_data(level):
+    """Create an empty bucket store for one aggregation level"""
+    if level in ('minute', 'hour'):
+        return defaultdict(lambda: {
+            'water_used': 0.0, 'moisture': 0, 'events': 0, 'pump_duration': 0.0
+        })
+    return defaultdict(lambda: {
+        'water_used': 0.0, 'moisture_avg': 0, 'events': 0, 'pump_duration': 0.0
+    })
+
+
+def parse_irrigation_line(data):
+    """Parse an IRRIGATION_DATA: line into a dict of typed fields
+
+    Returns None for lines that are not data lines. Raises ValueError for
+    malformed field values.
+    """
+    if not data.startswith("IRRIGATION_DATA:"):
+        return None
+
+    params = {}
+    for param in data[len("IRRIGATION_DATA:"):].split(","):
+        if "=" in param:
+            key, value = param.split("=", 1)
+            if key == "MOISTURE":
+                params[key] = int(value)
+            elif key == "PUMP":
+                params[key] = bool(int(value))
+            elif key in ["WATER_USED", "TOTAL"]:
+                params[key] = float(value)
+            elif key in ["EVENTS", "HEARTBEAT"]:
+                params[key] = int(value)
+            elif key == "TIME":
+                params[key] = value
+    return params
+
+
+# Fields a multi-zone frame carries once per zone, with their types (PUMP is 0/1)
+ZONE_FIELD_TYPES = {
+    "MOISTURE": int,
+    "PUMP": int,
+    "WATER_USED": float,
+    "TOTAL": float,
+    "EVENTS": int
+}
+
+
+def parse_zone_frame(data):
+    """Parse an IRRIGATION_DATA: line of one or more zones into per-zone dicts
+
+    A multi-zone sketch sends ZONES=n and n ';'-separated values per field,
+    zone 0 first (MOISTURE=700;300,PUMP=1;0,...); HEARTBEAT and TIME are
+    shared. Each zone's dict holds the fields parse_irrigation_line()
+    returns, so a single-zone line gives a list of one. Returns None for
+    lines that are not data lines. Raises ValueError for malformed field
+    values or a field without exactly one value per zone.
+    """
+    if "ZONES=" not in data:
+        params = parse_irrigation_line(data)
+        return None if params is None else [params]
+
+    columns = {}
+    shared = {}
+    for param in data[len("IRRIGATION_DATA:"):].split(","):
+        key, sep, value = param.partition("=")
+        if not sep:
+            continue
+        convert = ZONE_FIELD_TYPES.get(key)
+        if convert:
+            columns[key] = list(map(convert, value.split(";")))
+        elif key in ("HEARTBEAT", "ZONES"):
+            shared[key] = int(value)
+        elif key == "TIME":
+            shared[key] = value
+    if "PUMP" in columns:
+        columns["PUMP"] = [value != 0 for value in columns["PUMP"]]
+
+    count = shared.pop("ZONES")
+    if count < 1:
+        raise ValueError(f"Bad zone count {count}")
+    zones = [dict(shared) for _ in range(count)]
+    for key, values in columns.items():
+        if len(values) != count:
+            raise ValueError(f"{key} has {len(values)} values for {count} zones")
+        for zone, value in zip(zones, values):
+            zone[key] = value
+    return zones
+
+
+def key_in_range(key, start=None, end=None):
+    """True if the bucket key overlaps [start, end]
+
+    Keys and bounds are zero-padded timestamps of any precision, so they
+    compare chronologically as strings: month '2025-08' overlaps a range
+    starting '2025-08-15', and hour '2025-08-31 23:00' is within end '2025-08-31'.
+    """
+    if start and key < start[:len(key)]:
+        return False
+    if end and key[:len(end)] > end:
+        return False
+    return True
+
+
+def format_bucket_keys(keys, level):
+    """Format integer datetime64 bucket numbers of a level as bucket keys"""
+    text = np.datetime_as_string(np.asarray(keys, dtype=np.int64).astype(f'datetime64[{LEVEL_UNITS[level]}]'))
+    if level == 'minute':
+        return [key.replace('T', ' ') for key in text.tolist()]
+    if level == 'hour':
+        return [key.replace('T', ' ') + ':00' for key in text.tolist()]
+    return text.tolist()
+
+
+def samples_to_arrays(samples):
+    """Split a list of sample dicts into the column arrays ingest_batch() takes"""
+    return {
+        'timestamps': np.array([s['timestamp'] for s in samples], dtype='datetime64[us]'),
+        'moisture': np.array([s['moisture'] for s in samples], dtype=np.int64),
+        'pump': np.array([s['pump'] for s in samples], dtype=bool),
+        'water_used': np.array([s['water_used'] for s in samples], dtype=np.float64),
+        'events': np.array([s['events'] for s in samples], dtype=np.int64)
+    }
+
+
+def bucket_start(timestamp, level):
+    """Return the first instant of the bucket containing timestamp"""
+    if level == 'minute':
+        return timestamp.replace(second=0, microsecond=0)
+    if level == 'hour':
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    if level == 'day':
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    if level == 'month':
+        return timestamp.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return timestamp.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_bucket_start(timestamp, level):
+    """Return the first instant of the bucket after the one containing timestamp"""
+    start = bucket_start(timestamp, level)
+    if level == 'minute':
+        return start + timedelta(minutes=1)
+    if level == 'hour':
+        return start + timedelta(hours=1)
+    if level == 'day':
+        return start + timedelta(days=1)
+    if level == 'month':
+        if start.month == 12:
+            return start.replace(year=start.year + 1, month=1)
+        return start.replace(month=start.month + 1)
+    return start.replace(year=start.year + 1)
+
+
+class IrrigationRollups:
+    """Minute, hourly, daily, monthly and yearly aggregates of irrigation samples"""
+    def __init__(self):
+        self.minute_data = new_level_data('minute')
+        self.hourly_data = new_level_data('hour')
+        self.daily_data = new_level_data('day')
+        self.monthly_data = new_level_data('month')
+        self.yearly_data = new_level_data('year')
+
+        # Last sample seen, used to reconstruct constant stretches
+        self.last_sample = None
+
+        # Data version for derived caches: version grows with every change,
+        # generation with every wholesale reload. day_versions maps each day
+        # key to the version it last changed at, ordered by that version;
+        # the ingest thread updates it while other threads read it, under lock.
+        self.version = 0
+        self.generation = 0
+        self.day_versions = {}
+        self.lock = threading.Lock()
+
+        # Range totals over each level (range_total), updated as buckets change
+        self.indexes = {level: RangeIndex(store, ADDITIVE_FIELDS[level]) for level, store in self.levels().items()}
+        self._indexed_generation = 0
+
+        # Covered and missing time, from the minute buckets (coverage_index())
+        self.coverage = CoverageIndex(self.minute_data)
+        self._covered_generation = 0
+
+    def levels(self):
+        """Map level names to their bucket stores"""
+        return {
+            'minute': self.minute_data,
+            'hour': self.hourly_data,
+            'day': self.daily_data,
+            'month': self.monthly_data,
+            'year': self.yearly_data
+        }
+
+    def load_levels(self, data):
+        """Replace all levels in place from a saved history dict"""
+        for level, store in self.levels().items():
+            store.clear()
+            store.update(data.get(LEVEL_FILE_KEYS[level], {}))
+        self.last_sample = None
+        with self.lock:
+            self.version += 1
+            self.generation += 1
+            self.day_versions.clear()
+
+    def merge_levels(self, levels):
+        """Add stored buckets ({level: {key: bucket}}) that are not in memory yet
+
+        For history arriving in pieces; a bucket already in memory, e.g.
+        one live samples have updated meanwhile, is kept.
+        """
+        stores = self.levels()
+        in_sync = self._covered_generation == self.generation
+        for level, buckets in levels.items():
+            store = stores[level]
+            if store:
+                buckets = {key: bucket for key, bucket in buckets.items() if key not in store}
+            store.update(buckets)
+            if level == 'minute' and in_sync:
+                self.coverage.update(list(buckets))
+        self.version += 1
+        self.generation += 1
+        if in_sync:
+            self._covered_generation = self.generation
+
+    def range_total(self, level, start=None, end=None):
+        """Sum a level's additive fields over the buckets within [start, end]
+
+        Returns {field: total} for the fields in ADDITIVE_FIELDS[level]; the
+        bounds select buckets like key_in_range(). O(log n) once the level's
+        index has been built by its first query.
+        """
+        self._sync_indexes()
+        return self.indexes[level].total(start, end)
+
+    def sorted_keys(self, level):
+        """A level's bucket keys in order, from its range index"""
+        self._sync_indexes()
+        return self.indexes[level].sorted_keys()
+
+    def coverage_index(self):
+        """The CoverageIndex of the minute buckets, brought in line with any reload"""
+        self._sync_coverage()
+        return self.coverage
+
+    def _sync_coverage(self):
+        # A reload or an outside edit replaced buckets; rebuild on the next query.
+        # merge_levels() keeps the index in sync by merging the new minutes instead.
+        if self._covered_generation != self.generation:
+            self.coverage.invalidate()
+            self._covered_generation = self.generation
+
+    def _sync_indexes(self):
+        # A reload replaced buckets wholesale; rebuild each index on its next query
+        if self._indexed_generation != self.generation:
+            for index in self.indexes.values():
+                index.invalidate()
+            self._indexed_generation = self.generation
+
+    def days_changed_since(self, version):
+        """Day keys changed after the given version, newest change first"""
+        days = []
+        with self.lock:
+            for day, day_version in reversed(self.day_versions.items()):
+                if day_version <= version:
+                    break
+                days.append(day)
+        return days
+
+    def _touch_days(self, day_keys):
+        with self.lock:
+            self.version += 1
+            for day in day_keys:
+                self.day_versions.pop(day, None)
+                self.day_versions[day] = self.version
+
+    def add_sample(self, timestamp, moisture, pump, water_used, events, heartbeat=None):
+        """Fold one sample into every level and return the changed buckets
+
+        Without a heartbeat (fixed-rate stream) each pump-on sample adds
+        DEFAULT_SAMPLE_INTERVAL seconds of pump time. With a heartbeat
+        (change-driven stream) the previous sample's state is held until this
+        one, and the skipped buckets are filled in one pass per level.
+        """
+        changed = {level: set() for level in LEVELS}
+        self._apply_sample(timestamp, moisture, pump, water_used, events, heartbeat, changed)
+        self._update_period_totals(changed)
+        self._touch_days(changed['day'])
+
+        levels = self.levels()
+        return {
+            level: {key: dict(levels[level][key]) for key in sorted(keys_changed)}
+            for level, keys_changed in changed.items()
+        }
+
+    def add_samples(self, samples, heartbeat=None, before=None):
+        """Fold a time-ordered batch of sample dicts
+
+        Returns (count, changed_buckets): how many samples were used and the
+        changed buckets in the same layout as add_sample().
+
+        Monthly and yearly totals are recomputed once for the whole batch.
+        Samples at or after before are skipped, so a backlog downloaded
+        while live data is already arriving never overwrites newer buckets;
+        the live stream's last sample is kept for its own gap filling.
+        """
+        changed = {level: set() for level in LEVELS}
+        live_sample = self.last_sample
+        self.last_sample = None
+
+        count = 0
+        for sample in samples:
+            if before is not None and sample['timestamp'] >= before:
+                break
+            self._apply_sample(sample['timestamp'], sample['moisture'], sample['pump'],
+                               sample['water_used'], sample['events'], heartbeat, changed)
+            count += 1
+
+        self._update_period_totals(changed)
+        self._touch_days(changed['day'])
+        if live_sample is not None:
+            self.last_sample = live_sample
+
+        levels = self.levels()
+        return count, {
+            level: {key: dict(levels[level][key]) for key in sorted(keys_changed)}
+            for level, keys_changed in changed.items()
+        }
+
+    def ingest_batch(self, timestamps, moisture, pump, water_used, events, heartbeat=None, before=None):
+        """Fold column arrays of samples into every level in one group-by pass
+
+        Produces the same buckets as feeding the samples one at a time
+        through add_sample(), and follows add_samples() for the batch edges:
+        it returns (count, changed_buckets), drops samples at or after
+        before, and keeps the live stream's last sample. Unsorted input is
+        sorted by time first.
+
+        Per level, samples are grouped by their datetime64 bucket number.
+        The last sample of each group sets water, moisture and events. With
+        a heartbeat the held pump state becomes a piecewise-linear "pump
+        seconds so far" curve, so each bucket's pump time is the curve at
+        its end minus the curve at its start, and buckets between two
+        samples take the earlier sample's values.
+        """
+        times = np.asarray(timestamps, dtype='datetime64[us]')
+        moisture = np.asarray(moisture, dtype=np.int64)
+        pump = np.asarray(pump, dtype=bool)
+        water_used = np.asarray(water_used, dtype=np.float64)
+        events = np.asarray(events, dtype=np.int64)
+
+        if len(times) > 1 and (times[1:] < times[:-1]).any():
+            order = np.argsort(times, kind='stable')
+            times, moisture, pump, water_used, events = (
+                times[order], moisture[order], pump[order], water_used[order], events[order])
+        if before is not None:
+            count = int(np.searchsorted(times, np.datetime64(before, 'us'), side='left'))
+            times, moisture, pump, water_used, events = (
+                times[:count], moisture[:count], pump[:count], water_used[:count], events[:count])
+        count = len(times)
+        changed = {level: set() for level in LEVELS}
+        if count == 0:
+            return 0, {level: {} for level in LEVELS}
+
+        # Seconds since the first sample, and the pump seconds credited so far
+        seconds = (times - times[0]).astype(np.int64) / 1e6
+        if heartbeat:
+            elapsed = np.diff(seconds)
+            held = (elapsed > 0) & (elapsed <= heartbeat * GAP_TOLERANCE)
+            credited = np.concatenate(([0.0], np.cumsum(np.where(held & pump[:-1], elapsed, 0.0))))
+            gaps = np.flatnonzero(held)
+        else:
+            gaps = np.empty(0, dtype=np.intp)
+
+        levels = self.levels()
+        for level in LEVELS:
+            unit = f'datetime64[{LEVEL_UNITS[level]}]'
+            sample_keys = times.astype(unit).astype(np.int64)
+
+            # Every bucket a held stretch passes through, and the sample holding it
+            first = sample_keys[gaps]
+            last = (times[gaps + 1] - np.timedelta64(1, 'us')).astype(unit).astype(np.int64)
+            spans = last - first + 1
+            holder = np.repeat(gaps, spans)
+            offsets = np.arange(len(holder)) - np.repeat(np.cumsum(spans) - spans, spans)
+            spanned = np.repeat(first, spans) + offsets
+
+            keys = np.unique(np.concatenate((sample_keys, spanned)))
+            if heartbeat:
+                starts = (keys.astype(unit) - times[0]).astype('timedelta64[us]').astype(np.int64) / 1e6
+                ends = (keys.astype(unit) + 1 - times[0]).astype('timedelta64[us]').astype(np.int64) / 1e6
+                pump_seconds = np.interp(ends, seconds, credited) - np.interp(starts, seconds, credited)
+            else:
+                pump_seconds = np.bincount(np.searchsorted(keys, sample_keys),
+                                           weights=pump * DEFAULT_SAMPLE_INTERVAL, minlength=len(keys))
+
+            store = levels[level]
+            key_names = format_bucket_keys(keys, level)
+            for key, pump_time in zip(key_names, pump_seconds.tolist()):
+                bucket = store[key]
+                if pump_time:
+                    bucket['pump_duration'] += pump_time
+            changed[level].update(key_names)
+
+            if level in ('minute', 'hour', 'day'):
+                field = 'moisture' if level != 'day' else 'moisture_avg'
+                # Buckets the stream skipped entirely get the held values
+                skipped = (spanned != sample_keys[holder]) & (spanned != sample_keys[holder + 1])
+                fills = [(spanned[skipped], holder[skipped])]
+                ends_of_groups = np.flatnonzero(np.append(sample_keys[1:] != sample_keys[:-1], True))
+                fills.append((sample_keys[ends_of_groups], ends_of_groups))
+                for fill_keys, index in fills:
+                    for key, water, level_moisture, level_events in zip(
+                            format_bucket_keys(fill_keys, level), water_used[index].tolist(),
+                            moisture[index].tolist(), events[index].tolist()):
+                        store[key].update({
+                            'water_used': water,
+                            field: level_moisture,
+                            'events': level_events
+                        })
+
+        self._update_period_totals(changed)
+        self._touch_days(changed['day'])
+        if self.last_sample is None:
+            self.last_sample = {
+                'timestamp': times[-1].astype(object), 'moisture': int(moisture[-1]),
+                'pump': bool(pump[-1]), 'water_used': float(water_used[-1]), 'events': int(events[-1])
+            }
+
+        return count, {
+            level: {key: dict(levels[level][key]) for key in sorted(keys_changed)}
+            for level, keys_changed in changed.items()
+        }
+
+    def _apply_sample(self, timestamp, moisture, pump, water_used, events, heartbeat, changed):
+        levels = self.levels()
+        prev = self.last_sample
+
+        if heartbeat:
+            if prev is not None:
+                elapsed = (timestamp - prev['timestamp']).total_seconds()
+                if 0 < elapsed <= heartbeat * GAP_TOLERANCE:
+                    self._fill_constant_stretch(prev, timestamp, changed)
+        elif pump:
+            for level in LEVELS:
+                key = timestamp.strftime(LEVEL_FORMATS[level])
+                levels[level][key]['pump_duration'] += DEFAULT_SAMPLE_INTERVAL
+
+        keys = {level: timestamp.strftime(LEVEL_FORMATS[level]) for level in LEVELS}
+        for level in ('minute', 'hour'):
+            levels[level][keys[level]].update({
+                'water_used': water_used,
+                'moisture': moisture,
+                'events': events
+            })
+        self.daily_data[keys['day']].update({
+            'water_used': water_used,
+            'moisture_avg': moisture,
+            'events': events
+        })
+        for level in LEVELS:
+            changed[level].add(keys[level])
+
+        self.last_sample = {
+            'timestamp': timestamp, 'moisture': moisture, 'pump': pump,
+            'water_used': water_used, 'events': events
+        }
+
+    def _fill_constant_stretch(self, prev, end, changed):
+        """Credit the interval [prev, end) with prev's state at every level"""
+        levels = self.levels()
+        start = prev['timestamp']
+
+        for level in LEVELS:
+            data = levels[level]
+            prev_key = start.strftime(LEVEL_FORMATS[level])
+            end_key = end.strftime(LEVEL_FORMATS[level])
+            cursor = start
+            while cursor < end:
+                segment_end = min(next_bucket_start(cursor, level), end)
+                key = cursor.strftime(LEVEL_FORMATS[level])
+                bucket = data[key]
+
+                # Buckets the stream skipped entirely get the held values
+                if key != prev_key and key != end_key and level in ('minute', 'hour', 'day'):
+                    bucket['water_used'] = prev['water_used']
+                    bucket['events'] = prev['events']
+                    bucket['moisture' if level != 'day' else 'moisture_avg'] = prev['moisture']
+
+                if prev['pump']:
+                    bucket['pump_duration'] += (segment_end - cursor).total_seconds()
+                changed[level].add(key)
+                cursor = segment_end
+
+    def _update_period_totals(self, changed):
+        """Recompute monthly and yearly totals for the touched periods
+
+        Also brings every level's range index up to date with the changed
+        buckets; months are summed from the day index, years from the month index.
+        """
+        self._sync_indexes()
+        indexes = self.indexes
+        indexes['day'].update(changed['day'])
+        for month_key in changed['month']:
+            totals = indexes['day'].total(month_key, month_key)
+            self.monthly_data[month_key].update({
+                'water_used': totals['water_used'],
+                'events': totals['events']
+            })
+        indexes['month'].update(changed['month'])
+
+        for year_key in changed['year']:
+            totals = indexes['month'].total(year_key, year_key)
+            self.yearly_data[year_key].update({
+                'water_used': totals['water_used'],
+                'events': totals['events']
+            })
+        indexes['year'].update(changed['year'])
+
+        for level in ('minute', 'hour'):
+            indexes[level].update(changed[level])
+
+        self._sync_coverage()
+        self.coverage.update(changed['minute'])
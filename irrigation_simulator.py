@@ -0,0 +1,616 @@
+import bisect
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from irrigation_rollups import IrrigationRollups, parse_irrigation_line, TIME_FORMAT
+from controller_backlog import BacklogReceiver, encode_record
+
+
+# Tolerances of the scheduled sketch in check_timing_accuracy(): 6 of 8
+# samples at 50 ms, one 100 ms control tick and 150 ms of contact bounce
+# bound either latency near 550 ms; debouncing must leave no extra runs
+TIMING_LIMITS = {
+    'max_on_latency_ms': 600,
+    'max_off_latency_ms': 600,
+    'spurious_events': 0
+}
+WATER_ERROR_SECONDS = 0.25  # Pump time the water total may be off by, per dry spell
+
+# Tolerances of a downloaded backlog against live ingest in check_backlog_ingest():
+# records hold water in 0.01 L and are logged on every pump change
+BACKLOG_LIMITS = {
+    'water_used': 0.01,     # L per day
+    'pump_duration': 2.0,   # s per day, one sample interval
+    'events': 0,
+    'ingest_seconds': 1.0   # to fold in a day's download
+}
+
+
+class VirtualIrrigationController:
+    """Python model of the Irrigating.ino sketch
+
+    Runs the sketch's millis() scheduler: the soil sensor is sampled into
+    the debouncing ring every sample_interval_ms, the pump is switched and
+    change-driven reports are sent every control_interval_ms, the RTC is
+    read every second and fixed-rate reports go out every
+    report_interval_ms. step() advances loop_interval seconds and returns
+    the lines printed meanwhile, exactly as the sketch prints them.
+
+    The soil dries out after a random wet spell and becomes wet again
+    after the pump has run for a while; for bounce_ms after each change
+    the digital output chatters. Ticks that cannot change anything (a
+    settled ring, a pump that already follows it, an RTC read other than
+    at midnight) are skipped rather than run, and now catches up with the
+    skipped RTC reads when a line is printed, so long simulations stay
+    cheap.
+    """
+    def __init__(self, start=None, flow_rate=1.0, loop_interval=2.0,
+                 report_on_change=False, heartbeat=60, seed=0, sample_interval_ms=50, control_interval_ms=100,
+                 clock_interval_ms=1000, report_interval_ms=2000, buffer_size=8, dry_count=6, wet_count=2,
+                 bounce_ms=150):
+        self.now = start or datetime(2025, 1, 1)
+        self.flow_rate = flow_rate
+        self.loop_interval = loop_interval
+        self.report_on_change = report_on_change
+        self.heartbeat = heartbeat
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.sample_interval_ms = sample_interval_ms
+        self.control_interval_ms = control_interval_ms
+        self.clock_interval_ms = clock_interval_ms
+        self.report_interval_ms = report_interval_ms
+        self.dry_count = dry_count
+        self.wet_count = wet_count
+        self.bounce_ms = bounce_ms
+
+        # Sketch state
+        self.millis = 0  # Every tick before this has run
+        self.clock_ms = 0  # Last RTC read applied to now
+        self._midnight = None  # Tick of the next midnight RTC read, once known
+        self.samples = [0] * buffer_size
+        self.sample_index = 0
+        self.high_count = 0
+        self.soil_dry = False  # Debounced
+        self.pump_status = False
+        self.pump_start_time = 0
+        self.total_water_used = 0.0
+        self.water_used_today = 0.0
+        self.watering_events_today = 0
+        self.last_date = self.now
+
+        # Last values sent (change-driven mode)
+        self.last_sent = None
+        self.last_report_time = 0
+
+        # Soil model: the raw HIGH/LOW output and when it next changes, in ms
+        self.soil_high = False
+        self.soil_edge_at = -bounce_ms
+        self.soil_change_at = self.rng.uniform(1800, 14400) * 1000
+
+    @property
+    def moisture_display(self):
+        """MOISTURE as the sketch reports it: the debounced state"""
+        return 700 if self.soil_dry else 300
+
+    def read_soil(self, ms):
+        """Digital soil reading at ms: True for HIGH (dry)"""
+        if ms >= self.soil_change_at:
+            self.soil_high = not self.soil_high
+            self.soil_edge_at = self.soil_change_at
+            # Wet soil dries out on its own; dry soil waits for the pump
+            self.soil_change_at = (float('inf') if self.soil_high
+                                   else self.soil_edge_at + self.rng.uniform(1800, 14400) * 1000)
+        if ms - self.soil_edge_at < self.bounce_ms:
+            return (int(ms) * 2654435761 + self.seed) % 7 < 3
+        return self.soil_high
+
+    def sample_soil(self, ms, lines):
+        reading = 1 if self.read_soil(ms) else 0
+        self.high_count += reading - self.samples[self.sample_index]
+        self.samples[self.sample_index] = reading
+        self.sample_index = (self.sample_index + 1) % len(self.samples)
+        was_dry = self.soil_dry
+        if self.high_count >= self.dry_count:
+            self.soil_dry = True
+        elif self.high_count <= self.wet_count:
+            self.soil_dry = False
+        if self.report_on_change and self.soil_dry != was_dry:
+            lines.append(f"Raw sensor: {'HIGH (DRY)' if self.soil_dry else 'LOW (WET)'}")
+
+    def control_pump(self, ms, lines):
+        if self.soil_dry:
+            if not self.pump_status:
+                lines.append(">>> SOIL DRY - TURNING PUMP ON <<<")
+                self.pump_start_time = ms
+                self.watering_events_today += 1
+                if self.soil_high and self.soil_change_at == float('inf'):
+                    self.soil_change_at = ms + self.rng.uniform(20, 120) * 1000
+            self.pump_status = True
+        else:
+            if self.pump_status:
+                lines.append(">>> SOIL WET - TURNING PUMP OFF <<<")
+                duration_min = (ms - self.pump_start_time) / 60000.0
+                water_supplied = self.flow_rate * duration_min
+                self.water_used_today += water_supplied
+                self.total_water_used += water_supplied
+                lines.append(f"Watering completed: {duration_min:.2f} minutes, {water_supplied:.2f} liters")
+            self.pump_status = False
+
+        if self.report_on_change and (self._current() != self.last_sent
+                                      or ms - self.last_report_time >= self.heartbeat * 1000):
+            self.send_data(ms, lines)
+
+    def sync_clock(self, ms):
+        """Apply the RTC reads up to and including ms to now"""
+        ticks = (ms - self.clock_ms) // self.clock_interval_ms
+        if ticks > 0:
+            self.now += timedelta(milliseconds=ticks * self.clock_interval_ms)
+            self.clock_ms += ticks * self.clock_interval_ms
+
+    def update_clock(self, ms, lines):
+        self.sync_clock(ms)
+        self._midnight = None
+        if self.now.day != self.last_date.day:
+            self.water_used_today = 0.0
+            self.watering_events_today = 0
+            lines.append("Daily counters reset - New day!")
+        self.last_date = self.now
+
+    def report_data(self, ms, lines):
+        lines.append(f"Raw sensor: {'HIGH (DRY)' if self.soil_dry else 'LOW (WET)'}")
+        self.send_data(ms, lines)
+
+    def send_data(self, ms, lines):
+        # The control task runs before the RTC read of the same millis(), the report task after it
+        self.sync_clock(ms if not self.report_on_change else ms - 1)
+        lines.append(self.format_data_line())
+        self.last_sent = self._current()
+        self.last_report_time = ms
+
+    def _current(self):
+        return self.moisture_display, self.pump_status, self.water_used_today, self.watering_events_today
+
+    @staticmethod
+    def _next_tick(interval, since):
+        return int(-(-since // interval)) * interval if since != float('inf') else since
+
+    def _due(self, task, since):
+        """The next tick of task at or after since that can change anything"""
+        if task == 'sample':
+            settled = (self.high_count == (len(self.samples) if self.soil_high else 0)
+                       and since >= self.soil_edge_at + self.bounce_ms)
+            return self._next_tick(self.sample_interval_ms, max(since, self.soil_change_at) if settled else since)
+        if task == 'control':
+            if self.pump_status != self.soil_dry or (self.report_on_change and self._current() != self.last_sent):
+                return self._next_tick(self.control_interval_ms, since)
+            if self.report_on_change:
+                return self._next_tick(self.control_interval_ms,
+                                       max(since, self.last_report_time + self.heartbeat * 1000))
+            return float('inf')
+        if task == 'clock':
+            if self._midnight is None:
+                if self.now.day != self.last_date.day:
+                    seconds = 0  # The clock was set across midnight
+                else:
+                    midnight = self.now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+                    seconds = (midnight - self.now).total_seconds()
+                ticks = max(1, -(-seconds * 1000 // self.clock_interval_ms))
+                self._midnight = self.clock_ms + int(ticks) * self.clock_interval_ms
+            return self._next_tick(self.clock_interval_ms, max(since, self._midnight))
+        if self.report_on_change:
+            return float('inf')  # Reports are sent from the control task
+        return self._next_tick(self.report_interval_ms, since)
+
+    def step(self):
+        """Run the sketch for loop_interval seconds and return the lines printed"""
+        lines = []
+        end = self.millis + round(self.loop_interval * 1000)
+        tasks = (('sample', self.sample_soil), ('control', self.control_pump),
+                 ('clock', self.update_clock), ('report', self.report_data))
+        since = max(self.millis, 1)  # Each task first runs one interval after setup()
+        self._midnight = None  # now may have been set between steps
+        while True:
+            due = min(self._due(task, since) for task, _ in tasks)
+            if due >= end:
+                break
+            # Tasks due at the same millis() run in declaration order
+            for task, run in tasks:
+                if self._due(task, due) == due:
+                    run(due, lines)
+            since = due + 1
+        self.sync_clock(end - 1)
+        self.millis = end
+        return lines
+
+    def format_data_line(self, moisture_display=None):
+        """Format an IRRIGATION_DATA line exactly as the sketch prints it"""
+        if moisture_display is None:
+            moisture_display = self.moisture_display
+        line = (
+            f"IRRIGATION_DATA:MOISTURE={moisture_display},PUMP={1 if self.pump_status else 0},"
+            f"WATER_USED={self.water_used_today:.2f},TOTAL={self.total_water_used:.2f},"
+            f"EVENTS={self.watering_events_today}"
+        )
+        if self.report_on_change:
+            line += f",HEARTBEAT={self.heartbeat}"
+        return line + f",TIME={self.now.strftime(TIME_FORMAT)}"
+
+
+class ScheduledIrrigationController:
+    """Python model of the sketch's millis() scheduler and soil debouncing
+
+    read_soil(ms) returns the raw digital reading at a given millis() value.
+    The model jumps straight to the next due task, so long runs are cheap.
+    With sample and control intervals of 2000 ms and a one-sample buffer it
+    behaves like the original delay(2000) loop.
+    """
+    def __init__(self, read_soil, flow_rate=1.0, sample_interval_ms=50, control_interval_ms=100,
+                 buffer_size=8, dry_count=6, wet_count=2):
+        self.read_soil = read_soil
+        self.flow_rate = flow_rate
+        self.sample_interval_ms = sample_interval_ms
+        self.control_interval_ms = control_interval_ms
+        self.dry_count = dry_count
+        self.wet_count = wet_count
+
+        self.samples = [0] * buffer_size
+        self.sample_index = 0
+        self.high_count = 0
+        self.soil_dry = False
+
+        self.pump_status = False
+        self.pump_start_time = 0
+        self.water_used = 0.0
+        self.pump_events = []  # (on_ms, off_ms, water_supplied)
+
+    def sample_soil(self, ms):
+        reading = 1 if self.read_soil(ms) else 0
+        self.high_count += reading - self.samples[self.sample_index]
+        self.samples[self.sample_index] = reading
+        self.sample_index = (self.sample_index + 1) % len(self.samples)
+        if self.high_count >= self.dry_count:
+            self.soil_dry = True
+        elif self.high_count <= self.wet_count:
+            self.soil_dry = False
+
+    def control_pump(self, ms):
+        if self.soil_dry and not self.pump_status:
+            self.pump_start_time = ms
+            self.pump_status = True
+        elif not self.soil_dry and self.pump_status:
+            water_supplied = self.flow_rate * (ms - self.pump_start_time) / 60000.0
+            self.water_used += water_supplied
+            self.pump_events.append((self.pump_start_time, ms, water_supplied))
+            self.pump_status = False
+
+    def run_until(self, end_ms):
+        """Run the sample and control tasks up to end_ms"""
+        next_sample = self.sample_interval_ms
+        next_control = self.control_interval_ms
+        while min(next_sample, next_control) <= end_ms:
+            # Tasks are checked in declaration order: sampling before control
+            if next_sample <= next_control:
+                self.sample_soil(next_sample)
+                next_sample += self.sample_interval_ms
+            else:
+                self.control_pump(next_control)
+                next_control += self.control_interval_ms
+        return self.pump_events
+
+
+def bouncing_soil_trace(hours=24, seed=0, bounce_ms=150):
+    """Return (read_soil, dry_intervals) for an open-loop soil trace
+
+    Dry spells of 20-120 s are separated by 5-60 min of wet soil. For
+    bounce_ms around every edge the digital output chatters randomly.
+    """
+    rng = random.Random(seed)
+    intervals = []
+    t = rng.uniform(300, 3600) * 1000
+    end = hours * 3600 * 1000
+    while t < end:
+        length = rng.uniform(20, 120) * 1000
+        intervals.append((int(t), int(t + length)))
+        t += length + rng.uniform(300, 3600) * 1000
+
+    starts = [start for start, _ in intervals]
+
+    def read_soil(ms):
+        i = bisect.bisect_right(starts, ms + bounce_ms) - 1
+        if i < 0:
+            return False
+        start, stop = intervals[i]
+        if abs(ms - start) < bounce_ms or abs(ms - stop) < bounce_ms:
+            # Deterministic chatter so both controllers see the same bounce
+            return (ms * 2654435761 + seed) % 7 < 3
+        return start <= ms < stop
+
+    return read_soil, intervals
+
+
+def check_timing_accuracy(hours=24, seed=0, flow_rate=1.0):
+    """Compare pump timing of the delay(2000) loop against the scheduled sketch"""
+    read_soil, intervals = bouncing_soil_trace(hours, seed)
+    end_ms = hours * 3600 * 1000
+    models = {
+        'delay(2000) loop': ScheduledIrrigationController(
+            read_soil, flow_rate, sample_interval_ms=2000, control_interval_ms=2000,
+            buffer_size=1, dry_count=1, wet_count=0),
+        'millis() scheduler': ScheduledIrrigationController(read_soil, flow_rate)
+    }
+    true_water = sum(flow_rate * (stop - start) / 60000.0 for start, stop in intervals)
+
+    results = {}
+    for name, model in models.items():
+        events = model.run_until(end_ms)
+        on_latency, off_latency = [], []
+        for start, stop in intervals:
+            # Match each dry spell to the pump run that overlaps it for longest
+            overlapping = [(min(off, stop) - max(on, start), on, off) for on, off, _ in events
+                           if on < stop + 5000 and off > start]
+            if overlapping:
+                _, on, off = max(overlapping)
+                on_latency.append(on - start)
+                off_latency.append(off - stop)
+        results[name] = {
+            'events': len(events),
+            'spurious_events': len(events) - len(on_latency),
+            'max_on_latency_ms': max(on_latency, default=0),
+            'max_off_latency_ms': max(off_latency, default=0),
+            'mean_off_latency_ms': sum(off_latency) / max(len(off_latency), 1),
+            'water_error_l': model.water_used - true_water,
+            'dry_spells': len(intervals)
+        }
+
+    print(f"⏱ Pump timing accuracy over {hours} simulated hours ({len(intervals)} dry spells)")
+    for name, r in results.items():
+        print(f"  {name:>18}: {r['events']} pump runs ({r['spurious_events']} spurious), "
+              f"on latency max {r['max_on_latency_ms']:.0f} ms, "
+              f"off latency max {r['max_off_latency_ms']:.0f} ms (mean {r['mean_off_latency_ms']:.0f} ms), "
+              f"water error {r['water_error_l']:+.3f} L")
+    return results
+
+
+def assert_timing_accuracy(results, flow_rate=1.0):
+    """Raise AssertionError when the scheduled sketch misses TIMING_LIMITS"""
+    r = results['millis() scheduler']
+    for key, limit in TIMING_LIMITS.items():
+        assert r[key] <= limit, f"{key} is {r[key]:.0f}, limit {limit}"
+    tolerance = flow_rate * WATER_ERROR_SECONDS * r['dry_spells'] / 60.0
+    assert abs(r['water_error_l']) <= tolerance, \
+        f"water error is {r['water_error_l']:+.3f} L, limit ±{tolerance:.3f} L"
+    delay = results['delay(2000) loop']
+    assert r['max_on_latency_ms'] < delay['max_on_latency_ms'], "on latency is no better than the delay(2000) loop"
+
+
+def record_backlog(hours=24, seed=0, interval=300, records_per_line=8):
+    """Run the sketch offline and return (backlog_lines, live_lines)
+
+    Records are logged like logBacklogRecord(): on every pump change, at
+    midnight and at least every interval seconds. backlog_lines is the
+    download the sketch would send for REQUEST_DATA:SINCE=0; live_lines is
+    what a connected dashboard would have received instead.
+    """
+    controller = VirtualIrrigationController(report_on_change=True, seed=seed)
+    records = []
+    live_lines = []
+    last_logged = None
+    last_pump = False
+
+    for _ in range(int(hours * 3600 / controller.loop_interval)):
+        stamp = controller.now
+        lines = controller.step()
+        live_lines.extend(lines)
+        new_day = "Daily counters reset - New day!" in lines
+        if (controller.pump_status != last_pump or new_day or last_logged is None
+                or (stamp - last_logged).total_seconds() >= interval):
+            records.append(encode_record(stamp, controller.water_used_today, controller.watering_events_today,
+                                         controller.pump_status, controller.high_count))
+            last_logged = stamp
+            last_pump = controller.pump_status
+
+    backlog_lines = [f"BACKLOG_BEGIN:COUNT={len(records)},BUFFER=8,INTERVAL={interval}"]
+    for i in range(0, len(records), records_per_line):
+        backlog_lines.append("BACKLOG:" + b"".join(records[i:i + records_per_line]).hex().upper())
+    backlog_lines.append("BACKLOG_END")
+    return backlog_lines, live_lines
+
+
+def check_backlog_ingest(hours=24, seed=0):
+    """Download a day-long offline backlog and compare it with live ingest
+
+    Returns (backlog rollups, live rollups, ingest seconds).
+    """
+    backlog_lines, live_lines = record_backlog(hours, seed)
+
+    started = time.perf_counter()
+    receiver = BacklogReceiver()
+    samples = None
+    for line in backlog_lines:
+        result = receiver.feed(line)
+        if result is not None:
+            samples = result
+    rollups = IrrigationRollups()
+    count, _ = rollups.add_samples(samples, heartbeat=receiver.interval)
+    elapsed = time.perf_counter() - started
+
+    live = ingest_stream(live_lines)
+    serial_bytes = sum(len(line) + 2 for line in backlog_lines)
+
+    print(f"📥 Offline backlog over {hours} simulated hours")
+    print(f"  Records: {count} ({serial_bytes} bytes, {serial_bytes / 960:.1f} s at 9600 baud)")
+    print(f"  Ingest time: {elapsed * 1000:.1f} ms ({count / max(elapsed, 1e-9):.0f} samples/s)")
+    for day in sorted(live.daily_data):
+        b, l = rollups.daily_data.get(day), live.daily_data[day]
+        if b is None:
+            print(f"  {day}: missing from backlog")
+            continue
+        print(f"  {day}: backlog {b['water_used']:.2f} L / {b['pump_duration']:.0f} s pump, "
+              f"live {l['water_used']:.2f} L / {l['pump_duration']:.0f} s pump")
+    return rollups, live, elapsed
+
+
+def assert_backlog_ingest(rollups, live, elapsed):
+    """Raise AssertionError when a backlog misses BACKLOG_LIMITS against live ingest"""
+    assert elapsed <= BACKLOG_LIMITS['ingest_seconds'], \
+        f"ingest took {elapsed:.2f} s, limit {BACKLOG_LIMITS['ingest_seconds']} s"
+    assert live.daily_data, "live ingest produced no days"
+    for day, l in sorted(live.daily_data.items()):
+        b = rollups.daily_data.get(day)
+        assert b is not None, f"{day} is missing from the backlog"
+        for field in ('water_used', 'pump_duration', 'events'):
+            limit = BACKLOG_LIMITS[field]
+            assert abs(b[field] - l[field]) <= limit + 1e-9, \
+                f"{day} {field} is {b[field]} in the backlog and {l[field]} live, limit ±{limit}"
+
+
+def generate_stream(hours=24, report_on_change=False, seed=0, start=None):
+    """Return every serial line the sketch prints over the given period"""
+    controller = VirtualIrrigationController(start=start, report_on_change=report_on_change, seed=seed)
+    lines = []
+    for _ in range(int(hours * 3600 / controller.loop_interval)):
+        lines.extend(controller.step())
+    return lines
+
+
+def format_zone_frame(zones, time, heartbeat=None):
+    """Format per-zone values (parse_irrigation_line() dicts) as the multi-zone sketch's one frame"""
+    fields = [f"ZONES={len(zones)}"] if len(zones) > 1 else []
+    fields.append("MOISTURE=" + ";".join(str(zone["MOISTURE"]) for zone in zones))
+    fields.append("PUMP=" + ";".join("1" if zone["PUMP"] else "0" for zone in zones))
+    fields.append("WATER_USED=" + ";".join(f"{zone['WATER_USED']:.2f}" for zone in zones))
+    fields.append("TOTAL=" + ";".join(f"{zone['TOTAL']:.2f}" for zone in zones))
+    fields.append("EVENTS=" + ";".join(str(zone["EVENTS"]) for zone in zones))
+    if heartbeat:
+        fields.append(f"HEARTBEAT={heartbeat}")
+    fields.append(f"TIME={time}")
+    return "IRRIGATION_DATA:" + ",".join(fields)
+
+
+def generate_zone_stream(zones=4, hours=24, report_on_change=False, seed=0, start=None):
+    """Data lines of one board per zone, and the frames one multi-zone board sends instead
+
+    Returns (frames, boards): boards[z] holds zone z's single-zone data
+    lines. A frame goes out whenever any zone reports and carries the
+    latest values of every zone.
+    """
+    controllers = [VirtualIrrigationController(start=start, report_on_change=report_on_change, seed=seed + zone)
+                   for zone in range(zones)]
+    frames, boards = [], [[] for _ in range(zones)]
+    latest = [None] * zones
+    for _ in range(int(hours * 3600 / controllers[0].loop_interval)):
+        reported = None
+        for zone, controller in enumerate(controllers):
+            for line in controller.step():
+                params = parse_irrigation_line(line)
+                if params is not None:
+                    boards[zone].append(line)
+                    latest[zone] = params
+                    reported = params
+        if reported:
+            frames.append(format_zone_frame(latest, reported["TIME"], reported.get("HEARTBEAT")))
+    return frames, boards
+
+
+def parse_stream_samples(lines):
+    """Parse serial lines into sample dicts and the announced heartbeat"""
+    samples, heartbeat = [], None
+    for line in lines:
+        params = parse_irrigation_line(line)
+        if params is None:
+            continue
+        heartbeat = params.get("HEARTBEAT", heartbeat)
+        samples.append({
+            'timestamp': datetime.strptime(params["TIME"], TIME_FORMAT),
+            'moisture': params.get("MOISTURE", 0),
+            'pump': params.get("PUMP", False),
+            'water_used': params.get("WATER_USED", 0.0),
+            'events': params.get("EVENTS", 0)
+        })
+    return samples, heartbeat
+
+
+def ingest_stream(lines):
+    """Feed serial lines through the dashboard's parse and rollup path"""
+    rollups = IrrigationRollups()
+    for line in lines:
+        params = parse_irrigation_line(line)
+        if params is None:
+            continue
+        rollups.add_sample(
+            datetime.strptime(params["TIME"], TIME_FORMAT),
+            params.get("MOISTURE", 0),
+            params.get("PUMP", False),
+            params.get("WATER_USED", 0.0),
+            params.get("EVENTS", 0),
+            heartbeat=params.get("HEARTBEAT")
+        )
+    return rollups
+
+
+def compare_reporting_modes(hours=24, seed=0):
+    """Compare bandwidth and ingest CPU of fixed-rate vs change-driven reporting"""
+    results = {}
+    for mode, on_change in (('fixed-rate', False), ('change-driven', True)):
+        lines = generate_stream(hours, report_on_change=on_change, seed=seed)
+        serial_bytes = sum(len(line) + 2 for line in lines)  # println adds \r\n
+        data_lines = sum(1 for line in lines if line.startswith("IRRIGATION_DATA:"))
+
+        started = time.process_time()
+        rollups = ingest_stream(lines)
+        cpu = time.process_time() - started
+
+        results[mode] = {
+            'bytes': serial_bytes,
+            'data_lines': data_lines,
+            'ingest_cpu_s': cpu,
+            'pump_seconds': sum(d['pump_duration'] for d in rollups.daily_data.values()),
+            'water_used': sum(d['water_used'] for d in rollups.daily_data.values()),
+            'minute_buckets': len(rollups.minute_data)
+        }
+
+    print(f"📡 Reporting mode comparison over {hours} simulated hours")
+    for mode, r in results.items():
+        print(f"  {mode:>13}: {r['bytes']:>9} bytes, {r['data_lines']:>6} data lines, "
+              f"ingest {r['ingest_cpu_s'] * 1000:.1f} ms CPU, pump {r['pump_seconds']:.0f} s, "
+              f"water {r['water_used']:.2f} L, {r['minute_buckets']} minute buckets")
+    fixed, change = results['fixed-rate'], results['change-driven']
+    print(f"  Bandwidth reduction: {fixed['bytes'] / max(change['bytes'], 1):.1f}x")
+    print(f"  Ingest CPU reduction: {fixed['ingest_cpu_s'] / max(change['ingest_cpu_s'], 1e-9):.1f}x")
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Irrigating.ino simulator")
+    parser.add_argument('--hours', type=float, default=24)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timing', action='store_true', help="check pump timing of the scheduled sketch")
+    parser.add_argument('--backlog', action='store_true', help="check offline backlog download and ingest")
+    parser.add_argument('--check', action='store_true',
+                        help="with --timing or --backlog: exit 1 when outside the tolerances")
+    args = parser.parse_args()
+
+    if args.timing:
+        results = check_timing_accuracy(args.hours, args.seed)
+        if args.check:
+            try:
+                assert_timing_accuracy(results)
+            except AssertionError as e:
+                print(f"❌ Timing check failed: {e}")
+                sys.exit(1)
+            print("✅ Timing within tolerances")
+    elif args.backlog:
+        rollups, live, elapsed = check_backlog_ingest(args.hours, args.seed)
+        if args.check:
+            try:
+                assert_backlog_ingest(rollups, live, elapsed)
+            except AssertionError as e:
+                print(f"❌ Backlog check failed: {e}")
+                sys.exit(1)
+            print("✅ Backlog within tolerances")
+    else:
+        compare_reporting_modes(args.hours, args.seed)
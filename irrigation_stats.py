@@ -0,0 +1,170 @@
+import threading
+from collections import deque
+
+
+class UsageStatistics:
+    """Incrementally maintained statistics behind the data summary
+
+    Completed days are folded into count/sum/min/max once, on the day
+    rollover; the running value of the current day is combined with them
+    when the summary is rendered. The recent day window follows the
+    rollups' changed days, so days filled in across midnight appear too,
+    and the months are listed in order from the month range index, so
+    rendering never sorts the full history. A change to a completed day
+    (backlog, imports) or a reload rebuilds the statistics once. The
+    ingest thread only changes the rollups; refresh and the rendering run
+    under a lock.
+    """
+    def __init__(self, rollups, recent_days=7):
+        self.rollups = rollups
+        self.recent_days = deque(maxlen=recent_days)
+        self.lock = threading.Lock()
+        self.rebuilds = 0
+        self._version = None
+        self._generation = None
+        self._reset_days()
+
+    def _reset_days(self):
+        self.count = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+        self.current_day = None
+
+    def _rebuild(self):
+        """Recompute everything from the full history (O(n), only after a reload)"""
+        rollups = self.rollups
+        version, generation = rollups.version, rollups.generation
+        daily_data = rollups.daily_data
+        days = rollups.sorted_keys('day')
+        self._reset_days()
+        for day in days[:-1]:
+            self._finalize(daily_data[day]['water_used'])
+        if days:
+            self.current_day = days[-1]
+        self.recent_days.clear()
+        self.recent_days.extend(days[-self.recent_days.maxlen:])
+        self._version, self._generation = version, generation
+        self.rebuilds += 1
+
+    def _refresh(self):
+        rollups = self.rollups
+        if rollups.generation != self._generation:
+            self._rebuild()
+            return
+        version = rollups.version
+        daily_data = rollups.daily_data
+        for day in sorted(rollups.days_changed_since(self._version)):
+            if self.current_day is None or day > self.current_day:
+                if self.current_day is not None:
+                    self._finalize(daily_data[self.current_day]['water_used'])
+                self.current_day = day
+                self.recent_days.append(day)
+            elif day < self.current_day:
+                # An already-finalized day changed
+                self._rebuild()
+                return
+        self._version = version
+
+    def _finalize(self, value):
+        if value > 0:
+            self.count += 1
+            self.total += value
+            self.minimum = value if self.minimum is None else min(self.minimum, value)
+            self.maximum = value if self.maximum is None else max(self.maximum, value)
+
+    def usage(self):
+        """Return (average, maximum, minimum, days) over days with usage, or None"""
+        with self.lock:
+            self._refresh()
+            count, total, minimum, maximum = self.count, self.total, self.minimum, self.maximum
+            value = self.rollups.daily_data[self.current_day]['water_used'] if self.current_day else 0.0
+        if value > 0:
+            count += 1
+            total += value
+            minimum = value if minimum is None else min(minimum, value)
+            maximum = value if maximum is None else max(maximum, value)
+        if count == 0:
+            return None
+        return total / count, maximum, minimum, count
+
+    def recent_daily_lines(self):
+        with self.lock:
+            self._refresh()
+            daily_data = self.rollups.daily_data
+            return [f"{day}: {daily_data[day]['water_used']:.1f}L, {daily_data[day]['events']} events"
+                    for day in self.recent_days]
+
+    def monthly_lines(self):
+        monthly_data = self.rollups.monthly_data
+        return [f"{month}: {monthly_data[month]['water_used']:.1f}L total, {monthly_data[month]['events']} events"
+                for month in self.rollups.sorted_keys('month')]
+
+    def usage_lines(self):
+        usage = self.usage()
+        if usage is None:
+            return []
+        average, maximum, minimum, days = usage
+        return [
+            "--- USAGE STATISTICS ---",
+            f"Average Daily Usage: {average:.2f} L",
+            f"Maximum Daily Usage: {maximum:.2f} L",
+            f"Minimum Daily Usage: {minimum:.2f} L",
+            f"Total Days with Usage: {days}"
+        ]
+
+
+def benchmark_summary(years=(1, 10, 30), repeats=20):
+    """Compare the old full-scan summary with the incremental statistics"""
+    import time
+    from datetime import date, datetime, timedelta
+    import numpy as np
+    from irrigation_rollups import IrrigationRollups
+
+    print("📋 Data summary benchmark (history sections only)")
+    for year_count in years:
+        rollups = IrrigationRollups()
+        daily_data, monthly_data = rollups.daily_data, rollups.monthly_data
+        day = date(2000, 1, 1)
+        for i in range(year_count * 365):
+            key = day.strftime("%Y-%m-%d")
+            daily_data[key].update({'water_used': (i % 11) * 0.7, 'events': i % 5, 'pump_duration': 60.0})
+            monthly_data[key[:7]]['water_used'] += daily_data[key]['water_used']
+            monthly_data[key[:7]]['events'] += daily_data[key]['events']
+            day += timedelta(days=1)
+        rollups.generation += 1
+
+        started = time.perf_counter()
+        for _ in range(repeats):
+            lines = []
+            for d in sorted(daily_data.keys())[-7:]:
+                lines.append(f"{d}: {daily_data[d]['water_used']:.1f}L, {daily_data[d]['events']} events")
+            for m in sorted(monthly_data.keys()):
+                lines.append(f"{m}: {monthly_data[m]['water_used']:.1f}L total, {monthly_data[m]['events']} events")
+            values = [d['water_used'] for d in daily_data.values() if d['water_used'] > 0]
+            lines.append(f"{np.mean(values):.2f} {max(values):.2f} {min(values):.2f} {len(values)}")
+        legacy = (time.perf_counter() - started) / repeats
+
+        stats = UsageStatistics(rollups)
+        started = time.perf_counter()
+        stats.usage()
+        rebuild = time.perf_counter() - started
+
+        # A live sample on the last day before each render
+        moment = datetime.strptime(key, "%Y-%m-%d") + timedelta(hours=12)
+        incremental = 0.0
+        for i in range(repeats):
+            rollups.add_sample(moment + timedelta(seconds=2 * i), 500, False, 1.0 + i, 1)
+            started = time.perf_counter()
+            lines = stats.recent_daily_lines() + stats.monthly_lines() + stats.usage_lines()
+            incremental += (time.perf_counter() - started) / repeats
+        if stats.rebuilds != 1:
+            raise AssertionError(f"{stats.rebuilds} rebuilds, expected the first one only")
+
+        print(f"  {year_count:>2} years ({len(daily_data)} days, {len(monthly_data)} months): "
+              f"full scan {legacy * 1000:.2f} ms, incremental {incremental * 1e6:.0f} µs per render after a sample "
+              f"(one-off rebuild {rebuild * 1000:.1f} ms)")
+
+
+if __name__ == "__main__":
+    benchmark_summary()
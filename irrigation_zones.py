@@ -0,0 +1,135 @@
+import time
+from datetime import datetime
+
+from demand_forecast import DemandForecast
+from history_loader import HistoryLoader
+from irrigation_rollups import IrrigationRollups, TIME_FORMAT, parse_irrigation_line, parse_zone_frame
+from irrigation_simulator import generate_zone_stream
+
+
+class ZoneSeries:
+    """History of one extra zone of a multi-zone controller
+
+    Zone 0 is the monitor's own series; every further zone keeps its own
+    rollups and storage (irrigation_data_zone1.json, ...), written through
+    on every sample like the main series. The stored history starts
+    loading on a HistoryLoader thread when the zone first reports; until
+    today's and this month's history is in, samples are buffered so the
+    serial thread never waits for the disk.
+    """
+    def __init__(self, zone, storage, on_done=None):
+        self.zone = zone
+        self.storage = storage
+        self.rollups = IrrigationRollups()
+        self.forecast = DemandForecast(self.rollups)
+        self.params = {}  # Latest parsed values
+        self.buffered = []  # Frames received before the recent history was in
+        self.loader = HistoryLoader(storage, self.rollups, on_done=on_done)
+
+    def start(self):
+        """Start loading the stored history"""
+        self.loader.start()
+
+    def add(self, params):
+        """Add one zone's values from a parsed frame; returns the changed buckets"""
+        self.params = params
+        self.buffered.append(params)
+        if not self.loader.recent_loaded.is_set():
+            return {}
+        return self._drain()
+
+    def _drain(self):
+        """Add the buffered frames in order; returns their changed buckets"""
+        changed = {}
+        for params in self.buffered:
+            for level, buckets in self._add(params).items():
+                changed.setdefault(level, {}).update(buckets)
+        self.buffered = []
+        return changed
+
+    def _add(self, params):
+        changed = self.rollups.add_sample(
+            datetime.strptime(params["TIME"], TIME_FORMAT),
+            params.get("MOISTURE", 0),
+            params.get("PUMP", False),
+            params.get("WATER_USED", 0.0),
+            params.get("EVENTS", 0),
+            heartbeat=params.get("HEARTBEAT")
+        )
+        if changed:
+            self.storage.write_buckets(changed)
+            self.storage.append_samples([self.rollups.last_sample])
+        return changed
+
+    def status_line(self):
+        params = self.params
+        return (f"Zone {self.zone}: moisture {params.get('MOISTURE', 0)}, "
+                f"pump {'ACTIVE' if params.get('PUMP') else 'INACTIVE'}, "
+                f"{params.get('WATER_USED', 0.0):.2f} L / {params.get('EVENTS', 0)} events today, "
+                f"{params.get('TOTAL', 0.0):.2f} L total, {len(self.rollups.daily_data)} days of history")
+
+    def save(self, settings):
+        """Write the zone's history; returns False if a failed load kept the stored one"""
+        self.loader.loaded.wait()
+        self._drain()
+        if self.loader.error:
+            # Rewriting the store from a partial history would drop the rest
+            self.storage.flush()
+            return False
+        self.storage.save(self.rollups.levels(), settings)
+        return True
+
+    def close(self):
+        self.loader.loaded.wait()
+        self.storage.close()
+
+
+def benchmark_zone_parse(zone_counts=(1, 2, 4, 8, 16), hours=2, seed=0, repeats=5):
+    """Host parse cost per zone: one multi-zone frame against one board (and line) per zone"""
+    print(f"🌱 Zone frame parse benchmark ({hours} simulated hours of fixed-rate reports, best of {repeats})")
+    results = {}
+    for zones in zone_counts:
+        frames, boards = generate_zone_stream(zones, hours, seed=seed)
+        lines = [line for board in boards for line in board]
+
+        # Both paths must give every zone the same values
+        for index, frame in enumerate(frames):
+            if parse_zone_frame(frame) != [parse_irrigation_line(board[index]) for board in boards]:
+                raise AssertionError(f"Frame {index} of {zones} zones does not match the per-zone lines")
+
+        board_time = frame_time = float('inf')
+        for _ in range(repeats):
+            started = time.perf_counter()
+            for line in lines:
+                parse_irrigation_line(line)
+            board_time = min(board_time, time.perf_counter() - started)
+
+            started = time.perf_counter()
+            for frame in frames:
+                parse_zone_frame(frame)
+            frame_time = min(frame_time, time.perf_counter() - started)
+
+        zone_samples = len(lines)
+        results[zones] = {
+            'board_us': board_time / zone_samples * 1e6,
+            'frame_us': frame_time / zone_samples * 1e6,
+            'board_bytes': sum(len(line) + 2 for line in lines) / zone_samples,  # println adds \r\n
+            'frame_bytes': sum(len(frame) + 2 for frame in frames) / zone_samples
+        }
+        r = results[zones]
+        print(f"  {zones:>2} zones: one board per zone {r['board_us']:.2f} µs and {r['board_bytes']:.0f} bytes "
+              f"per zone sample, one frame {r['frame_us']:.2f} µs and {r['frame_bytes']:.0f} bytes "
+              f"({r['board_us'] / r['frame_us']:.1f}x speedup, {len(lines) // len(frames)} lines -> 1)")
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Multi-zone frame parsing")
+    parser.add_argument('--hours', type=float, default=2)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--zones', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    benchmark_zone_parse(args.zones, args.hours, args.seed)
@@ -0,0 +1,261 @@
+import asyncio
+import json
+import time
+from urllib.parse import urlparse, parse_qs
+
+from async_server import BackgroundServer
+
+
+SSE_HEADERS = (
+    "HTTP/1.1 200 OK\r\n"
+    "Content-Type: text/event-stream\r\n"
+    "Cache-Control: no-cache\r\n"
+    "Connection: keep-alive\r\n"
+    "Access-Control-Allow-Origin: *\r\n"
+    "\r\n"
+)
+
+VIEWER_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Smart Irrigation Live</title></head>
+<body style="font-family: Arial; background: #2c3e50; color: white">
+<h2>Smart Irrigation Live Data</h2>
+<pre id="status">Waiting for data...</pre>
+<script>
+var source = new EventSource('/events');
+source.addEventListener('sample', function (e) {
+  document.getElementById('status').textContent = JSON.stringify(JSON.parse(e.data), null, 2);
+});
+</script>
+</body></html>
+"""
+
+
+class _Subscriber:
+    """One connected event-stream client with its own bounded buffer"""
+    def __init__(self, buffer_size):
+        self.queue = asyncio.Queue(maxsize=buffer_size)
+        self.task = asyncio.current_task()
+
+
+class LiveDataServer(BackgroundServer):
+    """Local asyncio server fanning out live samples over Server-Sent Events
+
+    The ingest thread calls publish(); it never waits on a client. Each client
+    has a bounded queue and is disconnected as soon as that queue overflows.
+    Historical buckets are served from /history using history_provider,
+    and range totals from /totals using totals_provider.
+    """
+    def __init__(self, host='127.0.0.1', port=8765, client_buffer=256, history_provider=None,
+                 totals_provider=None):
+        super().__init__(host, port)
+        self.client_buffer = client_buffer
+        self.history_provider = history_provider
+        self.totals_provider = totals_provider
+
+        self._clients = set()
+        self._seq = 0
+
+        self.published_count = 0
+        self.dropped_clients = 0
+
+    @property
+    def client_count(self):
+        return len(self._clients)
+
+    def publish(self, event, payload):
+        """Queue an event for every subscriber (safe to call from any thread)"""
+        loop = self._loop
+        if loop is None or not loop.is_running():
+            return
+        self._seq += 1
+        envelope = {'seq': self._seq, 'sent': time.time(), 'data': payload}
+        message = f"id: {self._seq}\nevent: {event}\ndata: {json.dumps(envelope, default=str)}\n\n".encode()
+        loop.call_soon_threadsafe(self._fan_out, message)
+
+    def _fan_out(self, message):
+        """Hand one message to every client, dropping those that fell behind"""
+        self.published_count += 1
+        for client in list(self._clients):
+            try:
+                client.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self._clients.discard(client)
+                self.dropped_clients += 1
+                client.task.cancel()
+
+    async def _handle_client(self, reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=10)
+            while True:
+                header = await asyncio.wait_for(reader.readline(), timeout=10)
+                if header in (b'\r\n', b'\n', b''):
+                    break
+
+            parts = request_line.decode('latin-1').split()
+            if len(parts) < 2 or parts[0] != 'GET':
+                await self._send_response(writer, "405 Method Not Allowed", "text/plain", b"Method not allowed")
+                return
+
+            url = urlparse(parts[1])
+            if url.path == '/events':
+                await self._stream_events(writer)
+            elif url.path == '/history':
+                await self._send_history(writer, parse_qs(url.query))
+            elif url.path == '/totals':
+                await self._send_totals(writer, parse_qs(url.query))
+            elif url.path == '/':
+                await self._send_response(writer, "200 OK", "text/html; charset=utf-8", VIEWER_PAGE.encode())
+            else:
+                await self._send_response(writer, "404 Not Found", "text/plain", b"Not found")
+        except (asyncio.TimeoutError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def _stream_events(self, writer):
+        client = _Subscriber(self.client_buffer)
+        self._clients.add(client)
+        try:
+            writer.write(SSE_HEADERS.encode() + b"retry: 2000\n\n")
+            await writer.drain()
+            while True:
+                message = await client.queue.get()
+                writer.write(message)
+                await writer.drain()
+        finally:
+            self._clients.discard(client)
+
+    async def _send_history(self, writer, query):
+        level = query.get('level', ['day'])[0]
+        start = query.get('start', [None])[0]
+        end = query.get('end', [None])[0]
+
+        if self.history_provider is None:
+            await self._send_response(writer, "503 Service Unavailable", "text/plain", b"No history available")
+            return
+
+        try:
+            # The provider may block, e.g. until the range has been loaded
+            buckets = await asyncio.get_running_loop().run_in_executor(
+                None, self.history_provider, level, start, end)
+        except (KeyError, ValueError) as e:
+            await self._send_response(writer, "400 Bad Request", "text/plain", str(e).encode())
+            return
+
+        body = json.dumps({'level': level, 'start': start, 'end': end, 'buckets': buckets}, default=str)
+        await self._send_response(writer, "200 OK", "application/json", body.encode())
+
+    async def _send_totals(self, writer, query):
+        level = query.get('level', ['day'])[0]
+        start = query.get('start', [None])[0]
+        end = query.get('end', [None])[0]
+
+        if self.totals_provider is None:
+            await self._send_response(writer, "503 Service Unavailable", "text/plain", b"No history available")
+            return
+
+        try:
+            totals = await asyncio.get_running_loop().run_in_executor(
+                None, self.totals_provider, level, start, end)
+        except (KeyError, ValueError) as e:
+            await self._send_response(writer, "400 Bad Request", "text/plain", str(e).encode())
+            return
+
+        body = json.dumps({'level': level, 'start': start, 'end': end, 'totals': totals})
+        await self._send_response(writer, "200 OK", "application/json", body.encode())
+
+    async def _send_response(self, writer, status, content_type, body):
+        writer.write(
+            f"HTTP/1.1 {status}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Access-Control-Allow-Origin: *\r\n"
+            "Connection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+
+
+async def _load_test_client(host, port, latencies, expected, connected):
+    """Subscribe to /events and record the delivery latency of each sample"""
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(b"GET /events HTTP/1.1\r\nHost: localhost\r\n\r\n")
+    await writer.drain()
+    connected.release()
+
+    received = 0
+    try:
+        while received < expected:
+            line = await reader.readline()
+            if not line:
+                break
+            if line.startswith(b"data: "):
+                envelope = json.loads(line[6:])
+                latencies.append(time.time() - envelope['sent'])
+                received += 1
+    finally:
+        writer.close()
+    return received
+
+
+async def _run_load_test(server, clients, samples, rate):
+    latencies = []
+    connected = asyncio.Semaphore(0)
+    tasks = [
+        asyncio.create_task(_load_test_client(server.host, server.port, latencies, samples, connected))
+        for _ in range(clients)
+    ]
+    for _ in range(clients):
+        await connected.acquire()
+    while server.client_count < clients:
+        await asyncio.sleep(0.01)
+
+    def ingest():
+        for i in range(samples):
+            server.publish('sample', {
+                'moisture': 700 if i % 2 else 300, 'pump': bool(i % 2),
+                'water_used': i * 0.01, 'events': i // 2,
+                'time': time.strftime("%Y-%m-%d %H:%M:%S")
+            })
+            time.sleep(1.0 / rate)
+
+    await asyncio.get_running_loop().run_in_executor(None, ingest)
+    results = await asyncio.wait_for(asyncio.gather(*tasks, return_exceptions=True), timeout=60)
+    return latencies, results
+
+
+def run_load_test(clients=300, samples=200, rate=50):
+    """Publish samples to many local subscribers and report fan-out latency"""
+    server = LiveDataServer(port=0, client_buffer=64)
+    server.start()
+    try:
+        latencies, results = asyncio.run(_run_load_test(server, clients, samples, rate))
+    finally:
+        server.stop()
+
+    latencies.sort()
+    complete = sum(1 for r in results if r == samples)
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000.0
+
+    print(f"📡 Fan-out load test: {clients} clients, {samples} samples at {rate}/s")
+    print(f"  Clients receiving every sample: {complete}/{clients}")
+    print(f"  Dropped slow clients: {server.dropped_clients}")
+    if latencies:
+        print(f"  Latency p50: {percentile(0.50):.2f} ms")
+        print(f"  Latency p95: {percentile(0.95):.2f} ms")
+        print(f"  Latency p99: {percentile(0.99):.2f} ms")
+        print(f"  Latency max: {latencies[-1] * 1000.0:.2f} ms")
+    return latencies
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Live data fan-out server load test")
+    parser.add_argument('--clients', type=int, default=300)
+    parser.add_argument('--samples', type=int, default=200)
+    parser.add_argument('--rate', type=float, default=50)
+    args = parser.parse_args()
+
+    run_load_test(args.clients, args.samples, args.rate)
@@ -0,0 +1,430 @@
+import calendar
+import csv
+import gzip
+import heapq
+import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import closing
+from datetime import datetime
+from itertools import groupby
+
+from irrigation_rollups import LEVELS, LEVEL_FILE_KEYS, TIME_FORMAT
+from storage_backends import JsonFileStorage, SQLiteStorage, moisture_field
+
+
+# Sort rank of each record kind; raw samples first, then fine to coarse
+# levels, so days are merged before the months and years built from them
+RANKS = ('sample',) + LEVELS
+
+# Run files are merged at most this many at a time (open file limit)
+MERGE_FAN_IN = 256
+
+
+def input_device(path, settings, device=None):
+    """Controller of one input: the given device, else settings['device_id'], else the file name"""
+    return device or settings.get('device_id') or os.path.splitext(os.path.basename(path))[0]
+
+
+def read_input(path, device=None):
+    """Yield (device, kind, key, water_used, moisture, events, pump_seconds) from one file
+
+    Understands irrigation_data.json / irrigation_export.json, SQLite
+    stores, the raw sample log (irrigation_data.csv) and the dashboard's
+    daily/hourly/monthly CSV exports. The controller is resolved with
+    input_device().
+    """
+    if path.endswith('.json'):
+        with open(path) as f:
+            data = json.load(f)
+        device = input_device(path, data.get('settings', {}), device)
+        for level in LEVELS:
+            field = moisture_field(level)
+            for key, bucket in data.get(LEVEL_FILE_KEYS[level], {}).items():
+                yield (device, level, key, bucket.get('water_used', 0.0), bucket.get(field, 0),
+                       bucket.get('events', 0), bucket.get('pump_duration', 0.0))
+    elif path.endswith('.db'):
+        storage = SQLiteStorage(path, read_only=True)
+        try:
+            device = input_device(path, storage.load_settings(), device)
+            for level in LEVELS:
+                field = moisture_field(level)
+                for key, bucket in storage.read_range(level):
+                    yield (device, level, key, bucket['water_used'], bucket[field],
+                           bucket['events'], bucket['pump_duration'])
+            for sample in storage.iter_samples():
+                yield (device, 'sample', sample['timestamp'].strftime(TIME_FORMAT), sample['water_used'],
+                       sample['moisture'], sample['events'], 1 if sample['pump'] else 0)
+        finally:
+            storage.close()
+    else:
+        device = input_device(path, {}, device)
+        # Rotated sample logs (irrigation_data.csv.1.gz) are gzip-compressed
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt', newline='') as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                if 'Time' in row:
+                    # Raw sample log; the pump column holds the pump state, not seconds
+                    yield (device, 'sample', row['Time'], float(row['Water_Used_L']), int(row['Moisture']),
+                           int(row['Watering_Events']), int(row['Pump']))
+                elif 'Date' in row:
+                    yield (device, 'day', row['Date'], float(row['Water_Used_L']), float(row['Avg_Moisture']),
+                           int(row['Watering_Events']), float(row['Pump_Duration_Minutes']) * 60.0)
+                elif 'DateTime' in row:
+                    yield (device, 'hour', row['DateTime'], float(row['Water_Used_L']),
+                           float(row['Moisture_Level']), int(row['Watering_Events']),
+                           float(row['Pump_Duration_Seconds']))
+                elif 'Month' in row:
+                    yield (device, 'month', row['Month'], float(row['Total_Water_Used_L']), 0,
+                           int(row['Total_Events']), float(row['Total_Pump_Duration_Hours']) * 3600.0)
+
+
+def read_settings(path):
+    if not path.endswith('.json'):
+        return {}
+    with open(path) as f:
+        return json.load(f).get('settings', {})
+
+
+def _format_record(device, kind, key, water, moisture, events, pump):
+    # CSV exports round-trip pump time through minutes/hours, so values are
+    # normalized before duplicates are compared
+    return (f"{device}\t{RANKS.index(kind)}\t{key}\t{round(float(water), 4)!r}\t{round(float(moisture), 2)!r}\t"
+            f"{int(events)}\t{round(float(pump), 3)!r}\n")
+
+
+def write_run(path, device, run_path):
+    """Phase 1: one input file to a sorted run file; returns the record count and device"""
+    lines = []
+    # Closed here rather than whenever it is collected, so a failed run releases its input
+    with closing(read_input(path, device)) as records:
+        for record in records:
+            device = record[0]
+            lines.append(_format_record(*record))
+    lines.sort()
+    with open(run_path, 'w') as f:
+        f.writelines(lines)
+    return len(lines), device
+
+
+def _merge_files(paths, out_path):
+    files = [open(path) for path in paths]
+    try:
+        with open(out_path, 'w') as out:
+            out.writelines(heapq.merge(*files))
+    finally:
+        for f in files:
+            f.close()
+
+
+def merged_lines(run_paths, work_dir):
+    """Phase 2: k-way merge of the runs, in passes of at most MERGE_FAN_IN files"""
+    generation = 0
+    while len(run_paths) > MERGE_FAN_IN:
+        merged = []
+        for i in range(0, len(run_paths), MERGE_FAN_IN):
+            out_path = os.path.join(work_dir, f"merge{generation}_{i}.run")
+            _merge_files(run_paths[i:i + MERGE_FAN_IN], out_path)
+            merged.append(out_path)
+        run_paths = merged
+        generation += 1
+
+    files = [open(path) for path in run_paths]
+    try:
+        yield from heapq.merge(*files)
+    finally:
+        for f in files:
+            f.close()
+
+
+def resolve(kind, records):
+    """Merge conflicting (water_used, moisture, events, pump) observations
+
+    Counters of a day only grow, so water_used, events and pump seconds
+    take the largest value any input saw, and moisture comes from the
+    observation with the most water and events (the latest snapshot).
+    For raw samples the latest snapshot wins as a whole.
+    """
+    latest = max(records, key=lambda record: (record[0], record[2], record[3], record[1]))
+    if len(records) == 1 or kind == 'sample':
+        return latest
+    return (max(record[0] for record in records), latest[1],
+            max(record[2] for record in records), max(record[3] for record in records))
+
+
+class ConsolidatedWriter:
+    """Streams merged buckets and samples into one store per device"""
+    def __init__(self, out_dir, fmt='sqlite', settings=None, batch_size=5000):
+        self.out_dir = out_dir
+        self.fmt = fmt
+        self.settings = settings or {}
+        self.batch_size = batch_size
+        self.storage = None
+        self.levels = None
+        self.paths = []
+
+    def open(self, device):
+        os.makedirs(self.out_dir, exist_ok=True)
+        if self.fmt == 'sqlite':
+            path = os.path.join(self.out_dir, f"{device}.db")
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+            self.storage = SQLiteStorage(path, import_json=None, batch_size=self.batch_size,
+                                         flush_interval=float('inf'))
+        else:
+            path = os.path.join(self.out_dir, f"{device}.json")
+            csv_path = os.path.join(self.out_dir, f"{device}.csv")
+            if os.path.exists(csv_path):
+                os.remove(csv_path)
+            self.storage = JsonFileStorage(path, csv_path, batch_size=self.batch_size,
+                                           flush_interval=float('inf'))
+            self.levels = {level: {} for level in LEVELS}
+        self.paths.append(path)
+
+    def bucket(self, level, key, water, moisture, events, pump):
+        bucket = {'water_used': water, moisture_field(level): moisture, 'events': int(events),
+                  'pump_duration': pump}
+        if self.levels is not None:
+            self.levels[level][key] = bucket
+        else:
+            self.storage.write_buckets({level: {key: bucket}})
+
+    def sample(self, key, water, moisture, events, pump):
+        self.storage.append_samples([{'timestamp': datetime.strptime(key, TIME_FORMAT), 'moisture': int(moisture),
+                                      'pump': bool(pump), 'water_used': water, 'events': int(events)}])
+
+    def close(self, device):
+        settings = dict(self.settings, device_id=device)
+        if self.levels is not None:
+            self.storage.save(self.levels, settings)
+            self.levels = None
+        else:
+            self.storage.save_settings(settings)
+        self.storage.close()
+        self.storage = None
+
+
+def merge_histories(inputs, out_dir, fmt='sqlite'):
+    """Merge-import history files into one consolidated store per device
+
+    inputs is a list of paths, or (device, path) pairs for files that do
+    not name their controller. Records are deduplicated by device, level
+    (or raw sample) and timestamp key; conflicting copies are combined
+    with resolve(). Monthly and yearly totals are rebuilt from the merged
+    days when the days cover the whole period; a period only partly
+    covered keeps the larger of its stored and its summed totals and is
+    listed in stats['partial_periods']. Settings come from the last JSON
+    input that has them. Returns a statistics dict; stats['devices']
+    lists the inputs of every controller so an accidental merge of two
+    controllers shows.
+    """
+    stats = {'files': len(inputs), 'records': 0, 'duplicates': 0, 'conflicts': 0, 'written': 0, 'stores': [],
+             'devices': {}, 'partial_periods': []}
+    settings = {}
+    work_dir = tempfile.mkdtemp(prefix='irrigation_merge_')
+    try:
+        run_paths = []
+        for i, item in enumerate(inputs):
+            device, path = item if isinstance(item, tuple) else (None, item)
+            run_path = os.path.join(work_dir, f"{i}.run")
+            records, device = write_run(path, device, run_path)
+            stats['records'] += records
+            if device is not None:
+                stats['devices'].setdefault(device, []).append(path)
+            run_paths.append(run_path)
+            settings = read_settings(path) or settings
+
+        writer = ConsolidatedWriter(out_dir, fmt, settings)
+        current_device = None
+        month_totals, year_totals = {}, {}
+        # Days per merged month and months per merged year
+        month_parts, year_parts = {}, {}
+
+        def period_totals(level, key, stored, totals, parts):
+            """Totals of a stored month or year that merged days or months also add up"""
+            if key not in totals:
+                return stored
+            summed = totals.pop(key)
+            if level == 'month':
+                year, month = map(int, key.split('-'))
+                whole = calendar.monthrange(year, month)[1]
+            else:
+                whole = 12
+            if parts.pop(key) >= whole:
+                return summed
+            # Only part of the period was merged; its sum may miss days the stored total saw
+            stats['partial_periods'].append((current_device, level, key))
+            return tuple(max(a, b) for a, b in zip(stored, summed))
+
+        def flush_period(level, totals):
+            for key, (water, events, pump) in sorted(totals.items()):
+                writer.bucket(level, key, water, 0, events, pump)
+                stats['written'] += 1
+                if level == 'month':
+                    _accumulate(year_totals, key[:4], water, events, pump)
+                    year_parts[key[:4]] = year_parts.get(key[:4], 0) + 1
+            totals.clear()
+            (month_parts if level == 'month' else year_parts).clear()
+
+        def finish_device():
+            flush_period('month', month_totals)
+            flush_period('year', year_totals)
+            writer.close(current_device)
+
+        def record_key(line):
+            return line.split('\t', 3)[:3]
+
+        for (device, rank, key), group in groupby(merged_lines(run_paths, work_dir), key=record_key):
+            if device != current_device:
+                if current_device is not None:
+                    finish_device()
+                writer.open(device)
+                current_device = device
+
+            kind = RANKS[int(rank)]
+            lines = list(group)
+            distinct = {tuple(line.rstrip('\n').split('\t')[3:]) for line in lines}
+            stats['duplicates'] += len(lines) - len(distinct)
+            if len(distinct) > 1:
+                stats['conflicts'] += 1
+            water, moisture, events, pump = resolve(
+                kind, [(float(w), float(m), int(e), float(p)) for w, m, e, p in distinct])
+
+            if kind == 'sample':
+                writer.sample(key, water, moisture, events, pump)
+            elif kind == 'month':
+                # Days covering the whole month define its totals
+                water, events, pump = period_totals('month', key, (water, events, pump), month_totals, month_parts)
+                writer.bucket('month', key, water, moisture, events, pump)
+                _accumulate(year_totals, key[:4], water, events, pump)
+                year_parts[key[:4]] = year_parts.get(key[:4], 0) + 1
+            elif kind == 'year':
+                flush_period('month', month_totals)
+                water, events, pump = period_totals('year', key, (water, events, pump), year_totals, year_parts)
+                writer.bucket('year', key, water, moisture, events, pump)
+            else:
+                writer.bucket(kind, key, water, moisture, events, pump)
+                if kind == 'day':
+                    _accumulate(month_totals, key[:7], water, events, pump)
+                    month_parts[key[:7]] = month_parts.get(key[:7], 0) + 1
+            stats['written'] += 1
+
+        if current_device is not None:
+            finish_device()
+        stats['stores'] = writer.paths
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return stats
+
+
+def _accumulate(totals, key, water, events, pump):
+    total = totals.get(key, (0.0, 0, 0.0))
+    totals[key] = (total[0] + water, total[1] + events, total[2] + pump)
+
+
+def benchmark_merge(devices=3, files_per_device=100, days=365, seed=0):
+    """Merge hundreds of overlapping exports and check them against the truth"""
+    import resource
+    import numpy as np
+    from datetime import date, timedelta
+
+    rng = np.random.default_rng(seed)
+    directory = tempfile.mkdtemp(prefix='irrigation_merge_bench_')
+    try:
+        start = date(2024, 1, 1)
+        keys = [(start + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(days)]
+        truth, inputs = {}, []
+        for d in range(devices):
+            device = f"controller{d}"
+            events = rng.poisson(2.0, days)
+            water = np.round(events * rng.uniform(0.5, 3.0, days), 2)
+            pump = np.round(water * 60.0, 3)
+            truth[device] = {key: (w, int(e), p) for key, w, e, p in zip(keys, water.tolist(), events.tolist(),
+                                                                       pump.tolist())}
+            for f in range(files_per_device):
+                # Each laptop saw a window of the history; its last day is an early snapshot
+                first = int(rng.integers(0, days - 30))
+                last = min(days, first + int(rng.integers(30, 120)))
+                daily = {}
+                for i in range(first, last):
+                    w, e, p = truth[device][keys[i]]
+                    if i == last - 1 and last < days:
+                        w, e, p = round(w / 2, 2), e // 2, round(p / 2, 3)
+                    daily[keys[i]] = {'water_used': w, 'moisture_avg': 500, 'events': e, 'pump_duration': p}
+                if f % 3 == 2:
+                    path = os.path.join(directory, f"{device}_daily_irrigation_data_{f}.csv")
+                    with open(path, 'w', newline='') as out:
+                        writer = csv.writer(out)
+                        writer.writerow(['Date', 'Water_Used_L', 'Watering_Events', 'Avg_Moisture',
+                                         'Pump_Duration_Minutes'])
+                        for key, b in sorted(daily.items()):
+                            writer.writerow([key, b['water_used'], b['events'], 500, b['pump_duration'] / 60.0])
+                    inputs.append((device, path))
+                else:
+                    path = os.path.join(directory, f"{device}_irrigation_data_{f}.json")
+                    # Hourly buckets for the window's last two weeks, as the dashboard keeps them
+                    hourly = {f"{key} {hour:02d}:00": {'water_used': daily[key]['water_used'] * hour / 24,
+                                                       'moisture': 500, 'events': daily[key]['events'],
+                                                       'pump_duration': 0.0}
+                              for key in sorted(daily)[-14:] for hour in range(24)}
+                    with open(path, 'w') as out:
+                        json.dump({'hourly_data': hourly, 'daily_data': daily,
+                                   'settings': {'device_id': device, 'flow_rate': 1.0}}, out)
+                    inputs.append(path)
+
+        size = sum(os.path.getsize(path if isinstance(path, str) else path[1]) for path in inputs)
+        started = time.perf_counter()
+        stats = merge_histories(inputs, os.path.join(directory, 'merged'))
+        elapsed = time.perf_counter() - started
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+        wrong = 0
+        for device, days_truth in truth.items():
+            storage = SQLiteStorage(os.path.join(directory, 'merged', f"{device}.db"), read_only=True)
+            for key, bucket in storage.read_range('day'):
+                w, e, p = days_truth[key]
+                if abs(bucket['water_used'] - w) > 1e-6 or bucket['events'] != e or abs(bucket['pump_duration'] - p) > 1e-3:
+                    wrong += 1
+            storage.close()
+
+        print(f"🔀 Merge-import benchmark: {len(inputs)} files ({size / 1e6:.1f} MB), {devices} controllers")
+        print(f"  {stats['records']:,} records → {stats['written']:,} merged "
+              f"({stats['duplicates']:,} duplicates, {stats['conflicts']:,} conflicts resolved)")
+        print(f"  {elapsed:.1f} s ({stats['records'] / elapsed:,.0f} records/s, {len(inputs) / elapsed:.0f} files/s), "
+              f"peak RSS {peak:.0f} MB")
+        print(f"  Merged days differing from the true history: {wrong}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Merge irrigation histories from several machines")
+    parser.add_argument('inputs', nargs='*',
+                        help="irrigation_data.json, exports, .db stores or CSV files; "
+                             "prefix with DEVICE= for files that do not name their controller")
+    parser.add_argument('--out', default='merged_history', help="directory for the consolidated stores")
+    parser.add_argument('--format', choices=['sqlite', 'json'], default='sqlite')
+    parser.add_argument('--benchmark', action='store_true')
+    args = parser.parse_args()
+
+    if args.benchmark or not args.inputs:
+        benchmark_merge()
+    else:
+        inputs = [tuple(item.split('=', 1)) if '=' in item and not os.path.exists(item) else item
+                  for item in args.inputs]
+        stats = merge_histories(inputs, args.out, args.format)
+        print(f"✅ Merged {stats['files']} files: {stats['records']} records, {stats['duplicates']} duplicates, "
+              f"{stats['conflicts']} conflicts resolved")
+        for device, paths in stats['devices'].items():
+            if len(paths) > 1:
+                print(f"⚠️ {len(paths)} inputs merged as controller '{device}': {', '.join(paths)}")
+        for device, level, key in stats['partial_periods']:
+            print(f"⚠️ {device} {level} {key}: merged records cover only part of it; kept the larger totals")
+        for path in stats['stores']:
+            print(f"  {path}")
@@ -0,0 +1,203 @@
+import asyncio
+import socket
+import struct
+
+from async_server import BackgroundServer
+
+
+# MQTT 3.1.1 control packet types (high nibble of the first byte)
+CONNECT, CONNACK, PUBLISH, SUBSCRIBE, SUBACK = 1, 2, 3, 8, 9
+PINGREQ, PINGRESP, DISCONNECT = 12, 13, 14
+
+
+def encode_length(length):
+    """MQTT remaining length: 7 bits per byte, high bit set while more follow"""
+    encoded = bytearray()
+    while True:
+        byte, length = length % 128, length // 128
+        encoded.append(byte | 0x80 if length else byte)
+        if not length:
+            return bytes(encoded)
+
+
+def encode_string(text):
+    data = text.encode('utf-8')
+    return struct.pack('!H', len(data)) + data
+
+
+def packet(packet_type, body=b'', flags=0):
+    return bytes([packet_type << 4 | flags]) + encode_length(len(body)) + body
+
+
+def connect_packet(client_id, keepalive=60):
+    # Protocol name, level 4 (3.1.1), clean session, keepalive, client id
+    return packet(CONNECT, encode_string('MQTT') + bytes([4, 0x02]) + struct.pack('!H', keepalive) +
+                  encode_string(client_id))
+
+
+def publish_packet(topic, payload):
+    """QoS 0 PUBLISH: no packet id, no acknowledgement"""
+    return packet(PUBLISH, encode_string(topic) + payload)
+
+
+def subscribe_packet(packet_id, topic_filter):
+    return packet(SUBSCRIBE, struct.pack('!H', packet_id) + encode_string(topic_filter) + b'\x00', flags=2)
+
+
+def topic_matches(topic_filter, topic):
+    """MQTT wildcards: '+' matches one level, a trailing '#' the rest"""
+    filter_levels = topic_filter.split('/')
+    topic_levels = topic.split('/')
+    for i, level in enumerate(filter_levels):
+        if level == '#':
+            return True
+        if i >= len(topic_levels) or (level != '+' and level != topic_levels[i]):
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+
+async def read_packet(reader):
+    """(packet type, flags, body) of the next packet on an asyncio stream"""
+    first = (await reader.readexactly(1))[0]
+    length, shift = 0, 0
+    while True:
+        byte = (await reader.readexactly(1))[0]
+        length |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            break
+    return first >> 4, first & 0x0F, await reader.readexactly(length)
+
+
+def _read_string(body, offset):
+    length = struct.unpack_from('!H', body, offset)[0]
+    return body[offset + 2:offset + 2 + length].decode('utf-8'), offset + 2 + length
+
+
+class _Client:
+    """One connected client: its subscriptions and a bounded outgoing buffer"""
+    def __init__(self, buffer_size):
+        self.filters = set()
+        self.queue = asyncio.Queue(maxsize=buffer_size)
+        self.task = asyncio.current_task()
+
+
+class LocalMqttBroker(BackgroundServer):
+    """Stand-in MQTT broker for local subscribers, QoS 0 only
+
+    Speaks enough MQTT 3.1.1 for publishers and subscribers on this
+    machine: CONNECT, PUBLISH, SUBSCRIBE, PINGREQ and DISCONNECT. There
+    are no retained messages, sessions or QoS 1/2. Like the live data
+    server, a subscriber whose buffer overflows is disconnected rather
+    than slowing the publishers down.
+    """
+    def __init__(self, host='127.0.0.1', port=1883, client_buffer=1024):
+        super().__init__(host, port)
+        self.client_buffer = client_buffer
+
+        self._clients = set()
+
+        self.received_count = 0
+        self.delivered_count = 0
+        self.dropped_clients = 0
+
+    def _route(self, topic, message):
+        self.received_count += 1
+        for client in list(self._clients):
+            if any(topic_matches(topic_filter, topic) for topic_filter in client.filters):
+                try:
+                    client.queue.put_nowait(message)
+                    self.delivered_count += 1
+                except asyncio.QueueFull:
+                    self._clients.discard(client)
+                    self.dropped_clients += 1
+                    client.task.cancel()
+
+    async def _send(self, client, writer):
+        while True:
+            writer.write(await client.queue.get())
+            await writer.drain()
+
+    async def _handle_client(self, reader, writer):
+        client = _Client(self.client_buffer)
+        sender = None
+        try:
+            packet_type, _, _ = await asyncio.wait_for(read_packet(reader), timeout=10)
+            if packet_type != CONNECT:
+                return
+            writer.write(packet(CONNACK, b'\x00\x00'))
+            self._clients.add(client)
+            sender = asyncio.ensure_future(self._send(client, writer))
+            while True:
+                packet_type, flags, body = await read_packet(reader)
+                if packet_type == PUBLISH:
+                    topic, offset = _read_string(body, 0)
+                    if flags & 0x06:
+                        offset += 2  # Packet id of QoS 1/2, delivered as QoS 0
+                    self._route(topic, publish_packet(topic, body[offset:]))
+                elif packet_type == SUBSCRIBE:
+                    packet_id, offset, granted = body[:2], 2, bytearray()
+                    while offset < len(body):
+                        topic_filter, offset = _read_string(body, offset)
+                        client.filters.add(topic_filter)
+                        offset += 1
+                        granted.append(0)
+                    client.queue.put_nowait(packet(SUBACK, packet_id + bytes(granted)))
+                elif packet_type == PINGREQ:
+                    client.queue.put_nowait(packet(PINGRESP))
+                elif packet_type == DISCONNECT:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError,
+                asyncio.CancelledError, asyncio.QueueFull):
+            pass
+        finally:
+            self._clients.discard(client)
+            if sender:
+                sender.cancel()
+            writer.close()
+
+
+def subscribe(host, port, topic_filter, client_id='irrigation-sub'):
+    """Yield (topic, payload) of every message matching topic_filter (blocking)"""
+    with socket.create_connection((host, port)) as sock:
+        sock.sendall(connect_packet(client_id) + subscribe_packet(1, topic_filter))
+        stream = sock.makefile('rb')
+        while True:
+            first = stream.read(1)
+            if not first:
+                return
+            length, shift = 0, 0
+            while True:
+                byte = stream.read(1)[0]
+                length |= (byte & 0x7F) << shift
+                shift += 7
+                if not byte & 0x80:
+                    break
+            body = stream.read(length)
+            if first[0] >> 4 == PUBLISH:
+                topic, offset = _read_string(body, 0)
+                yield topic, body[offset:]
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Local stand-in MQTT broker (QoS 0)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1883)
+    parser.add_argument('--subscribe', metavar='FILTER', help="print messages matching this topic filter instead")
+    args = parser.parse_args()
+
+    if args.subscribe:
+        for topic, payload in subscribe(args.host, args.port, args.subscribe):
+            print(f"{topic} {payload.decode('utf-8', 'replace')}")
+    else:
+        broker = LocalMqttBroker(args.host, args.port)
+        broker.start()
+        print(f"📡 MQTT stand-in broker on {args.host}:{broker.port} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            broker.stop()
@@ -0,0 +1,502 @@
+import csv
+import gzip
+import io
+import json
+import os
+import socket
+import threading
+import time
+from collections import deque
+
+from irrigation_rollups import TIME_FORMAT
+from mqtt_broker import CONNACK, connect_packet, publish_packet
+
+
+# What a sink does with a record its full queue has no room for
+POLICIES = ('drop_oldest', 'drop_newest', 'block')
+
+
+def sink_record(sample, total=None):
+    """The record every sink receives for one live sample"""
+    return {
+        'time': sample['timestamp'].strftime(TIME_FORMAT),
+        'moisture': sample['moisture'],
+        'pump': bool(sample['pump']),
+        'water_used': sample['water_used'],
+        'events': sample['events'],
+        'total': total
+    }
+
+
+class SinkQueue:
+    """Bounded FIFO of (enqueued, record) with batch takes"""
+    def __init__(self, size):
+        self.size = size
+        self.items = deque()
+        self.changed = threading.Condition()
+        self.closed = False
+
+    def __len__(self):
+        return len(self.items)
+
+    def put(self, record, policy, block_timeout):
+        """Queue a record; returns how many records were dropped (0 or 1)"""
+        with self.changed:
+            if len(self.items) >= self.size:
+                if policy == 'drop_oldest':
+                    self.items.popleft()
+                    self.items.append((time.monotonic(), record))
+                    self.changed.notify()
+                    return 1
+                if policy == 'drop_newest' or not self.changed.wait_for(
+                        lambda: len(self.items) < self.size or self.closed, block_timeout):
+                    return 1
+            self.items.append((time.monotonic(), record))
+            self.changed.notify()
+            return 0
+
+    def take(self, batch_size, flush_interval):
+        """Wait for batch_size records or the oldest to be flush_interval old; [] once closed and empty"""
+        with self.changed:
+            while not self.closed:
+                if len(self.items) >= batch_size:
+                    break
+                if self.items:
+                    remaining = flush_interval - (time.monotonic() - self.items[0][0])
+                    if remaining <= 0:
+                        break
+                    self.changed.wait(remaining)
+                else:
+                    self.changed.wait()
+            batch = [self.items.popleft() for _ in range(min(batch_size, len(self.items)))]
+            self.changed.notify_all()
+            return batch
+
+    def oldest(self):
+        items = self.items
+        return items[0][0] if items else None
+
+    def close(self):
+        with self.changed:
+            self.closed = True
+            self.changed.notify_all()
+
+
+class Sink:
+    """One destination of the live sample stream, written on its own thread
+
+    Records wait in a bounded queue and are written batch_size at a time,
+    or once the oldest has waited flush_interval seconds. When the queue
+    is full, policy decides: drop_oldest keeps the newest records,
+    drop_newest refuses the incoming one, and block makes the ingest
+    thread wait up to block_timeout for room before dropping it. A failed
+    batch is kept and retried every retry_interval seconds, so a sink that
+    is down fills its queue and then drops by its policy.
+
+    _write_batch() deletes records from the front of its list once they
+    are written, so a retry only writes the ones that did not make it
+    and a batch that failed half way is not duplicated.
+    """
+    def __init__(self, name=None, batch_size=50, flush_interval=1.0, queue_size=10000,
+                 policy='drop_oldest', block_timeout=0.5, retry_interval=1.0):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown sink policy '{policy}' (choose from {', '.join(POLICIES)})")
+        self.name = name or self.kind
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.retry_interval = retry_interval
+        self.queue = SinkQueue(queue_size)
+        self.thread = None
+        self.on_error = None  # Called with (sink, error or None) when writes start or stop failing
+
+        self.started = None
+        self.received = 0
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self.batches = 0
+        self.write_seconds = 0.0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.last_error = None
+
+    def start(self):
+        self.started = time.monotonic()
+        self.thread = threading.Thread(target=self._run, name=f"sink-{self.name}", daemon=True)
+        self.thread.start()
+
+    def submit(self, record):
+        """Queue one record (called by the ingest thread)"""
+        self.received += 1
+        self.dropped += self.queue.put(record, self.policy, self.block_timeout)
+
+    def stop(self, timeout=5.0):
+        """Write what is queued (for up to timeout seconds) and close"""
+        self.queue.close()
+        if self.thread:
+            self.thread.join(timeout)
+
+    def stats(self):
+        elapsed = time.monotonic() - self.started if self.started else 0.0
+        oldest = self.queue.oldest()
+        return {
+            'name': self.name,
+            'kind': self.kind,
+            'policy': self.policy,
+            'received': self.received,
+            'written': self.written,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'queued': len(self.queue),
+            'rate': self.written / elapsed if elapsed else 0.0,
+            'lag': time.monotonic() - oldest if oldest is not None else 0.0,
+            'last_lag': self.last_lag,
+            'max_lag': self.max_lag,
+            'batch_ms': self.write_seconds / self.batches * 1000 if self.batches else 0.0,
+            'last_error': self.last_error
+        }
+
+    def _run(self):
+        try:
+            self._open()
+        except Exception as e:
+            self._failed(e)
+        batch = []
+        deadline = None
+        while True:
+            if not batch:
+                batch = self.queue.take(self.batch_size, self.flush_interval)
+                if not batch:
+                    break
+                records = [record for _, record in batch]
+            try:
+                started = time.monotonic()
+                self._write_batch(records)
+                finished = time.monotonic()
+            except Exception as e:
+                self._failed(e)
+                if self.queue.closed:
+                    deadline = deadline or time.monotonic() + self.retry_interval * 3
+                    if time.monotonic() > deadline:
+                        break
+                time.sleep(self.retry_interval)
+                continue
+
+            self.write_seconds += finished - started
+            self.batches += 1
+            self.written += len(batch)
+            self.last_lag = finished - batch[0][0]
+            self.max_lag = max(self.max_lag, self.last_lag)
+            if self.last_error is not None:
+                self.last_error = None
+                if self.on_error:
+                    self.on_error(self, None)
+            batch = []
+        try:
+            self._close()
+        except Exception as e:
+            self._failed(e)
+
+    def _failed(self, error):
+        self.errors += 1
+        first = self.last_error is None
+        self.last_error = str(error)
+        if first and self.on_error:
+            self.on_error(self, error)
+
+    def _open(self):
+        pass
+
+    def _write_batch(self, records):
+        """Write records, deleting each from the list once it is written"""
+        raise NotImplementedError
+
+    def _close(self):
+        pass
+
+
+class ArchiveSink(Sink):
+    """Gzipped JSON Lines files, one per day of sample time
+
+    Each batch is appended as a gzip member of its day's file; gzip and
+    zcat read the members back as one stream. A member that fails half
+    way is cut off again, so the file never ends in a broken member.
+    """
+    kind = 'archive'
+
+    def __init__(self, directory='irrigation_archive', **kwargs):
+        super().__init__(**kwargs)
+        self.directory = directory
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _write_batch(self, records):
+        while records:
+            day = records[0]['time'][:10]
+            count = next((i for i, record in enumerate(records) if record['time'][:10] != day), len(records))
+            path = os.path.join(self.directory, f"samples-{day}.jsonl.gz")
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            try:
+                with gzip.open(path, 'at', encoding='utf-8') as f:
+                    f.write(''.join(json.dumps(record) + '\n' for record in records[:count]))
+            except Exception:
+                if os.path.exists(path):
+                    os.truncate(path, size)
+                raise
+            del records[:count]
+
+
+class CsvTailSink(Sink):
+    """A CSV file to follow with tail -f, flushed after every batch
+
+    Once it passes max_bytes it is moved to <path>.1 and started again,
+    so it holds the recent stream rather than the whole history. A batch
+    goes out in one write; one that fails is cut off the file again, so
+    a reader never sees half a row.
+    """
+    kind = 'csv'
+    HEADER = ['Time', 'Moisture', 'Pump', 'Water_Used_L', 'Watering_Events', 'Total_L']
+
+    def __init__(self, path='irrigation_tail.csv', max_bytes=10 * 2 ** 20, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.file = None
+
+    def _open(self):
+        new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self.file = open(self.path, 'a', newline='')
+        self.writer = csv.writer(self.file)
+        if new_file:
+            self.writer.writerow(self.HEADER)
+
+    def _write_batch(self, records):
+        if self.file is None:
+            self._open()
+        rows = io.StringIO()
+        csv.writer(rows).writerows(
+            [r['time'], r['moisture'], 1 if r['pump'] else 0, r['water_used'], r['events'], r['total']]
+            for r in records
+        )
+        size = self.file.tell()
+        try:
+            self.file.write(rows.getvalue())
+            self.file.flush()
+        except Exception:
+            file, self.file = self.file, None
+            try:
+                file.close()
+            except OSError:
+                pass
+            os.truncate(self.path, size)
+            raise
+        del records[:]
+        if self.max_bytes and self.file.tell() >= self.max_bytes:
+            file, self.file = self.file, None
+            file.close()
+            os.replace(self.path, self.path + '.1')
+            self._open()
+
+    def _close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+
+class MqttSink(Sink):
+    """Publishes each record as JSON to an MQTT broker at QoS 0
+
+    A batch goes out in one write. The connection is made on the first
+    batch and again after an error; messages the socket took before the
+    error are not sent again.
+    """
+    kind = 'mqtt'
+
+    def __init__(self, host='127.0.0.1', port=1883, topic='irrigation/samples', client_id='irrigation-monitor',
+                 timeout=5.0, **kwargs):
+        super().__init__(**kwargs)
+        self.host = host
+        self.port = port
+        self.topic = topic
+        self.client_id = client_id
+        self.timeout = timeout
+        self.sock = None
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        try:
+            # Keepalive 0: the broker never expects pings between batches
+            sock.sendall(connect_packet(self.client_id, keepalive=0))
+            reply = sock.recv(4)
+            if len(reply) < 4 or reply[0] >> 4 != CONNACK or reply[3] != 0:
+                raise ConnectionError(f"MQTT broker refused the connection ({reply!r})")
+        except Exception:
+            sock.close()
+            raise
+        self.sock = sock
+
+    def _write_batch(self, records):
+        if self.sock is None:
+            self._connect()
+        packets = [publish_packet(self.topic, json.dumps(record).encode()) for record in records]
+        data = memoryview(b''.join(packets))
+        sent = 0
+        try:
+            while sent < len(data):
+                sent += self.sock.send(data[sent:])
+        except OSError:
+            self._close()
+            # The broker drops a packet cut off by the disconnect; only whole ones went out
+            done = 0
+            for packet in packets:
+                if sent < len(packet):
+                    break
+                sent -= len(packet)
+                done += 1
+            del records[:done]
+            raise
+        del records[:]
+
+    def _close(self):
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+
+
+SINK_TYPES = {
+    'archive': ArchiveSink,
+    'csv': CsvTailSink,
+    'mqtt': MqttSink
+}
+
+
+def build_sinks(specs):
+    """Sinks from dicts like {'type': 'csv', 'path': ..., 'batch_size': 10}"""
+    sinks = []
+    for spec in specs:
+        options = {key: value for key, value in spec.items() if key not in ('type', 'broker')}
+        if spec['type'] not in SINK_TYPES:
+            raise ValueError(f"Unknown sink type '{spec['type']}' (choose from {', '.join(SINK_TYPES)})")
+        sinks.append(SINK_TYPES[spec['type']](**options))
+    return sinks
+
+
+class OutputStage:
+    """Fans each live sample out to every sink without waiting on any of them"""
+    def __init__(self, sinks=(), on_error=None):
+        self.sinks = list(sinks)
+        for sink in self.sinks:
+            sink.on_error = on_error
+
+    def start(self):
+        for sink in self.sinks:
+            sink.start()
+
+    def publish(self, record):
+        for sink in self.sinks:
+            sink.submit(record)
+
+    def stop(self, timeout=5.0):
+        for sink in self.sinks:
+            sink.queue.close()
+        for sink in self.sinks:
+            sink.stop(timeout)
+
+    def stats(self):
+        return [sink.stats() for sink in self.sinks]
+
+
+class SlowSink(Sink):
+    """Benchmark sink that takes delay seconds per batch and writes nothing"""
+    kind = 'slow'
+
+    def __init__(self, delay=0.05, **kwargs):
+        super().__init__(**kwargs)
+        self.delay = delay
+
+    def _write_batch(self, records):
+        time.sleep(self.delay)
+        del records[:]
+
+
+def benchmark_sinks(samples=50000, rate=5000, directory=None):
+    """Ingest-side publish cost with the real sinks and a slow one, per queue policy
+
+    The slow sink needs 50 ms per batch of 50, about 1000 records/s, far
+    below the offered rate, so it must drop or block. rate is the offered
+    samples per second (None: as fast as possible).
+    """
+    import shutil
+    import tempfile
+    from datetime import datetime, timedelta
+    import numpy as np
+    from mqtt_broker import LocalMqttBroker, subscribe
+
+    directory = directory or tempfile.mkdtemp(prefix='irrigation_sinks_')
+    start = datetime(2025, 1, 1)
+    records = [sink_record({'timestamp': start + timedelta(seconds=2 * i), 'moisture': 700 if i % 40 < 5 else 300,
+                            'pump': i % 40 < 5, 'water_used': round(i * 0.01, 2), 'events': i // 40}, 100.0)
+               for i in range(samples)]
+
+    broker = LocalMqttBroker(port=0, client_buffer=samples + 10)
+    broker.start()
+    received = [0]
+
+    def count_messages():
+        for _ in subscribe('127.0.0.1', broker.port, 'irrigation/#'):
+            received[0] += 1
+    threading.Thread(target=count_messages, daemon=True).start()
+    time.sleep(0.2)
+
+    print(f"🚰 Output sink benchmark ({samples} samples{f' at {rate}/s' if rate else ', unthrottled'})")
+    try:
+        for policy in ('drop_oldest', 'drop_newest', 'block'):
+            received[0] = 0
+            sinks = [
+                ArchiveSink(os.path.join(directory, policy, 'archive'), batch_size=500, flush_interval=0.5),
+                CsvTailSink(os.path.join(directory, policy, 'tail.csv'), batch_size=200, flush_interval=0.2),
+                MqttSink(port=broker.port, topic='irrigation/samples', batch_size=200, flush_interval=0.2),
+                SlowSink(delay=0.05, batch_size=50, queue_size=2000, policy=policy, block_timeout=0.05)
+            ]
+            os.makedirs(os.path.join(directory, policy), exist_ok=True)
+            stage = OutputStage(sinks)
+            stage.start()
+            costs = np.empty(samples)
+            began = time.perf_counter()
+            for i, record in enumerate(records):
+                before = time.perf_counter()
+                stage.publish(record)
+                costs[i] = time.perf_counter() - before
+                if rate:
+                    delay = began + (i + 1) / rate - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+            offered = time.perf_counter() - began
+            stats = stage.stats()
+            stage.stop(timeout=1.0)
+            time.sleep(0.2)
+
+            print(f"  {policy}: publish p50 {np.percentile(costs, 50) * 1e6:.1f} µs, "
+                  f"p99 {np.percentile(costs, 99) * 1e6:.1f} µs, max {costs.max() * 1000:.1f} ms; "
+                  f"{samples / offered:,.0f} samples/s offered")
+            for stat in stats:
+                print(f"    {stat['name']:<8} {stat['rate']:>10,.0f}/s written, {stat['dropped']:>7} dropped, "
+                      f"{stat['queued']:>6} queued at the end, lag {stat['max_lag'] * 1000:7.1f} ms max, "
+                      f"{stat['batch_ms']:6.2f} ms/batch")
+            print(f"    broker delivered {received[0]} messages to a subscriber")
+    finally:
+        broker.stop()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the output sinks with a deliberately slow one")
+    parser.add_argument('--samples', type=int, default=50000)
+    parser.add_argument('--rate', type=int, default=5000, help="offered samples per second (0: unthrottled)")
+    args = parser.parse_args()
+    benchmark_sinks(args.samples, args.rate or None)
@@ -0,0 +1,206 @@
+import threading
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+
+
+# Fields that add up across buckets. Minute and hour buckets hold the
+# sketch's running daily counters for water and events, so only their
+# pump time sums over a range.
+ADDITIVE_FIELDS = {
+    'minute': ('pump_duration',),
+    'hour': ('pump_duration',),
+    'day': ('water_used', 'events', 'pump_duration'),
+    'month': ('water_used', 'events', 'pump_duration'),
+    'year': ('water_used', 'events', 'pump_duration')
+}
+
+
+class FenwickTree:
+    """Binary indexed tree: prefix sums, point updates and appends in O(log n)"""
+    def __init__(self, values=()):
+        values = np.asarray(values)
+        n = len(values)
+        prefix = np.concatenate(([0], np.cumsum(values)))
+        # Node i (1-based) holds the sum of the lowbit(i) values ending at i
+        nodes = np.arange(1, n + 1)
+        self.tree = [0] + (prefix[nodes] - prefix[nodes - (nodes & -nodes)]).tolist()
+
+    def __len__(self):
+        return len(self.tree) - 1
+
+    def add(self, position, delta):
+        """Add delta to the value at 0-based position"""
+        tree = self.tree
+        i = position + 1
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    def append(self, value):
+        i = len(self.tree)
+        self.tree.append(value + self.prefix(i - 1) - self.prefix(i - (i & -i)))
+
+    def prefix(self, count):
+        """Sum of the first count values"""
+        tree = self.tree
+        total = 0
+        while count > 0:
+            total += tree[count]
+            count &= count - 1
+        return total
+
+    def range_sum(self, start, stop):
+        """Sum of the values at positions [start, stop)"""
+        if stop <= start:
+            return 0
+        return self.prefix(stop) - self.prefix(start)
+
+
+class RangeIndex:
+    """Range totals over one level's buckets, in key order
+
+    Built from the bucket store on the first query. Buckets changed
+    afterwards are passed to update(): a changed bucket is a point
+    update and a new bucket after the last key an append, both
+    O(log n). A bucket inserted before the last key (a backlog reaching
+    into an earlier day, older history merged in) drops the index, and
+    the next query rebuilds it in one vectorized pass.
+    """
+    def __init__(self, store, fields):
+        self.store = store
+        self.fields = fields
+        self.lock = threading.Lock()
+        self.keys = None
+        self.builds = 0
+
+    def invalidate(self):
+        with self.lock:
+            self.keys = None
+
+    def _build(self):
+        store = self.store
+        self.keys = sorted(store)
+        self.positions = {key: i for i, key in enumerate(self.keys)}
+        self.values = {field: [store[key][field] for key in self.keys] for field in self.fields}
+        self.trees = {field: FenwickTree(values) for field, values in self.values.items()}
+        self.builds += 1
+
+    def update(self, keys):
+        """Reflect changes to the buckets with the given keys"""
+        with self.lock:
+            if self.keys is None:
+                return
+            store, positions = self.store, self.positions
+            for key in sorted(keys):
+                bucket = store[key]
+                position = positions.get(key)
+                if position is not None:
+                    for field in self.fields:
+                        delta = bucket[field] - self.values[field][position]
+                        if delta:
+                            self.values[field][position] = bucket[field]
+                            self.trees[field].add(position, delta)
+                elif not self.keys or key > self.keys[-1]:
+                    positions[key] = len(self.keys)
+                    self.keys.append(key)
+                    for field in self.fields:
+                        self.values[field].append(bucket[field])
+                        self.trees[field].append(bucket[field])
+                else:
+                    self.keys = None
+                    return
+
+    def sorted_keys(self):
+        """A copy of the bucket keys, in order"""
+        with self.lock:
+            if self.keys is None:
+                self._build()
+            return list(self.keys)
+
+    def total(self, start=None, end=None):
+        """{field: sum} over the buckets within [start, end], as key_in_range() selects them"""
+        with self.lock:
+            if self.keys is None:
+                self._build()
+            keys = self.keys
+            first = bisect_left(keys, start[:len(keys[0])]) if start and keys else 0
+            stop = bisect_right(keys, end + '\uffff') if end else len(keys)
+            return {field: self.trees[field].range_sum(first, stop) for field in self.fields}
+
+
+def benchmark_range_queries(years=(1, 10, 30), queries=2000, seed=0):
+    """Range totals through the index against summing the buckets in a loop"""
+    import time
+    from datetime import date, datetime, timedelta
+    from irrigation_rollups import IrrigationRollups, key_in_range
+
+    rng = np.random.default_rng(seed)
+    print("📐 Range total benchmark (water, events, pump time over day buckets)")
+    for year_count in years:
+        rollups = IrrigationRollups()
+        first_day = date(2000, 1, 1)
+        days = year_count * 365
+        for i in range(days):
+            events = int(rng.integers(0, 6))
+            rollups.daily_data[(first_day + timedelta(days=i)).isoformat()].update({
+                'water_used': round(events * rng.uniform(0.5, 3.0), 2),
+                'events': events,
+                'pump_duration': events * 120.0
+            })
+        rollups.generation += 1
+
+        spans = rng.integers(0, days, size=(queries, 2))
+        ranges = [((first_day + timedelta(days=int(a))).isoformat(), (first_day + timedelta(days=int(b))).isoformat())
+                  for a, b in np.sort(spans, axis=1)]
+
+        started = time.perf_counter()
+        expected = []
+        for start, end in ranges[:200]:
+            buckets = [bucket for key, bucket in rollups.daily_data.items() if key_in_range(key, start, end)]
+            expected.append(sum(bucket['water_used'] for bucket in buckets))
+        scan = (time.perf_counter() - started) / 200
+
+        started = time.perf_counter()
+        rollups.range_total('day')
+        build = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for start, end in ranges:
+            totals = rollups.range_total('day', start, end)
+        query = (time.perf_counter() - started) / queries
+        for (start, end), water in zip(ranges, expected):
+            assert np.isclose(rollups.range_total('day', start, end)['water_used'], water)
+
+        # A live sample on the last day: point update, then a query
+        last = first_day + timedelta(days=days - 1)
+        started = time.perf_counter()
+        for i in range(queries):
+            rollups.daily_data[last.isoformat()]['water_used'] += 0.5
+            rollups.indexes['day'].update([last.isoformat()])
+            totals = rollups.range_total('day', ranges[i][0])
+        update = (time.perf_counter() - started) / queries
+
+        # The month and year scans add_sample() used to run on every sample
+        month, year = last.isoformat()[:7], last.isoformat()[:4]
+        started = time.perf_counter()
+        for _ in range(200):
+            for field in ('water_used', 'events'):
+                sum(bucket[field] for key, bucket in rollups.daily_data.items() if key.startswith(month))
+                sum(bucket[field] for key, bucket in rollups.monthly_data.items() if key.startswith(year))
+        period_scans = (time.perf_counter() - started) / 200
+
+        moment = datetime(last.year, last.month, last.day, 12)
+        started = time.perf_counter()
+        for i in range(queries):
+            rollups.add_sample(moment + timedelta(seconds=2 * i), 500, False, 1.0 + i, 1)
+        sample = (time.perf_counter() - started) / queries
+
+        print(f"  {year_count:>2} years ({days} days): loop {scan * 1e6:8.1f} µs, "
+              f"index {query * 1e6:5.1f} µs per range (build {build * 1000:.1f} ms), "
+              f"update + query {update * 1e6:5.1f} µs; "
+              f"add_sample {sample * 1e6:5.1f} µs (period scans alone were {period_scans * 1e6:7.1f} µs)")
+
+
+if __name__ == "__main__":
+    benchmark_range_queries()
@@ -0,0 +1,843 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import re
+import socket
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from async_server import BackgroundServer
+from irrigation_rollups import LEVEL_FILE_KEYS, LEVEL_UNITS, format_bucket_keys
+from storage_backends import SQLiteStorage
+
+
+# Buckets in each kind of segment, by the length of the segment name:
+# a day ('2025-08-17') holds its minute, hour and day buckets, a month
+# ('2025-08') and a year ('2025') only their own bucket
+SEGMENT_LEVELS = {
+    10: ('minute', 'hour', 'day'),
+    7: ('month',),
+    4: ('year',)
+}
+
+CHUNK_SIZE = 256 * 1024
+MAX_SEGMENT_BYTES = 64 * 2 ** 20
+SYNC_INTERVAL = 600.0  # Seconds between syncs of a running dashboard
+REPLICATION_PORT = 8766
+
+SITE_NAME = re.compile(r'[A-Za-z0-9_.-]{1,64}')
+SEGMENT_NAME = re.compile(r'\d{4}(-\d{2}(-\d{2})?)?')
+CHECKSUM = re.compile(r'[0-9a-f]{64}')
+
+
+def check_name(site, segment=None, checksum=None):
+    """Reject names that could escape the replication directories"""
+    if not SITE_NAME.fullmatch(site) or site.startswith('.'):
+        raise ValueError(f"Invalid site name '{site}'")
+    if segment is not None and not SEGMENT_NAME.fullmatch(segment):
+        raise ValueError(f"Invalid segment '{segment}'")
+    if checksum is not None and not CHECKSUM.fullmatch(checksum):
+        raise ValueError(f"Invalid checksum '{checksum}'")
+    return site
+
+
+def segments_of_days(days):
+    """Names of the day, month and year segments the given day keys belong to"""
+    return set(days) | {day[:7] for day in days} | {day[:4] for day in days}
+
+
+def split_segments(levels):
+    """Group all buckets ({level: store}) into {segment: {level: {key: bucket}}}"""
+    segments = defaultdict(lambda: {level: {} for level in SEGMENT_LEVELS[10]})
+    for level in SEGMENT_LEVELS[10]:
+        for key, bucket in list(levels[level].items()):
+            segments[key[:10]][level][key] = bucket
+    segments = dict(segments)
+    for level in ('month', 'year'):
+        for key, bucket in list(levels[level].items()):
+            segments[key] = {level: {key: bucket}}
+    return segments
+
+
+def segment_buckets(levels, segment):
+    """One segment's buckets, looked up by key so the cost does not grow with the history"""
+    buckets = {}
+    for level in SEGMENT_LEVELS[len(segment)]:
+        store = levels[level]
+        if level in ('minute', 'hour'):
+            unit = f'datetime64[{LEVEL_UNITS[level]}]'
+            day = np.datetime64(segment, 'D')
+            keys = format_bucket_keys(np.arange(day.astype(unit).astype(np.int64),
+                                                (day + 1).astype(unit).astype(np.int64)), level)
+        else:
+            keys = [segment]
+        # get() does not create buckets in the defaultdict stores
+        buckets[level] = {key: bucket for key, bucket in ((key, store.get(key)) for key in keys) if bucket}
+    return buckets
+
+
+def encode_segment(buckets):
+    """(gzip payload, checksum) of one segment
+
+    The payload is canonical JSON in the irrigation_data.json layout, so
+    equal buckets always give equal bytes; the checksum is the SHA-256 of
+    that JSON, checked by the central after decompressing.
+    """
+    text = json.dumps({LEVEL_FILE_KEYS[level]: level_buckets for level, level_buckets in buckets.items()},
+                      sort_keys=True, separators=(',', ':')).encode()
+    return gzip.compress(text, compresslevel=6, mtime=0), hashlib.sha256(text).hexdigest()
+
+
+def decode_segment(segment, payload, checksum):
+    """The buckets of a received segment; ValueError if it is damaged or reaches outside itself"""
+    try:
+        text = gzip.decompress(payload)
+    except (OSError, EOFError) as e:
+        raise ValueError(f"Segment {segment} does not decompress: {e}")
+    if hashlib.sha256(text).hexdigest() != checksum:
+        raise ValueError(f"Segment {segment} does not match its checksum")
+    data = json.loads(text)
+    buckets = {level: data.get(LEVEL_FILE_KEYS[level], {}) for level in SEGMENT_LEVELS[len(segment)]}
+    for level_buckets in buckets.values():
+        if any(not key.startswith(segment) for key in level_buckets):
+            raise ValueError(f"Segment {segment} holds buckets of another period")
+    return buckets
+
+
+def _part_path(directory, segment, checksum):
+    return os.path.join(directory, f"{segment}.{checksum}.part")
+
+
+def part_offset(directory, segment, checksum):
+    """Bytes of a transfer already received; parts of older versions of the segment are removed"""
+    if not os.path.isdir(directory):
+        return 0
+    path = _part_path(directory, segment, checksum)
+    for name in os.listdir(directory):
+        if name.startswith(segment + '.') and name.endswith('.part') and os.path.join(directory, name) != path:
+            os.remove(os.path.join(directory, name))
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def append_part(directory, segment, checksum, offset, data):
+    """Append one chunk at offset, which must be where the part ends; returns the new size"""
+    os.makedirs(directory, exist_ok=True)
+    path = _part_path(directory, segment, checksum)
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    if offset != size:
+        raise ValueError(f"Chunk of {segment} at {offset} does not continue the {size} bytes received")
+    if size + len(data) > MAX_SEGMENT_BYTES:
+        raise ValueError(f"Segment {segment} is larger than {MAX_SEGMENT_BYTES} bytes")
+    with open(path, 'ab') as f:
+        f.write(data)
+    return size + len(data)
+
+
+class ReplicationCentral:
+    """The aggregator: applies the segments field nodes send to one store per site
+
+    directory holds <site>.db for each site, the SQLite layout
+    merge_import.py writes, so the fleet tools read it as it is. Its
+    settings carry device_id, and a segments(segment, checksum) table the
+    checksum of every applied segment, which is what nodes compare
+    against; applying a segment writes its own row. Transfers in progress
+    are kept as incoming/<site>/<segment>.<checksum>.part and resume from
+    their size.
+    """
+    def __init__(self, directory='central_history'):
+        self.directory = directory
+        self.incoming = os.path.join(directory, 'incoming')
+        os.makedirs(self.incoming, exist_ok=True)
+        self.lock = threading.RLock()
+        self.stores = {}
+        self.manifests = {}
+
+        self.applied = 0
+        self.deleted = 0
+        self.rejected = 0
+        self.bytes_received = 0
+
+    def sites(self):
+        return sorted(name[:-3] for name in os.listdir(self.directory) if name.endswith('.db'))
+
+    def store(self, site):
+        """The SQLiteStorage of a site, created on its first segment"""
+        with self.lock:
+            if site not in self.stores:
+                check_name(site)
+                storage = SQLiteStorage(os.path.join(self.directory, f"{site}.db"), import_json=None)
+                settings = storage.load_settings()
+                if 'device_id' not in settings:
+                    storage.save_settings({'device_id': site})
+                with storage.lock, storage.conn:
+                    storage.conn.execute("CREATE TABLE IF NOT EXISTS segments "
+                                         "(segment TEXT PRIMARY KEY, checksum TEXT NOT NULL) WITHOUT ROWID")
+                    # Stores written before the table kept the checksums in settings
+                    if settings.get('segments'):
+                        storage.conn.executemany("INSERT OR REPLACE INTO segments (segment, checksum) VALUES (?, ?)",
+                                                 list(settings['segments'].items()))
+                        storage.conn.execute("DELETE FROM settings WHERE key = 'segments'")
+                    self.manifests[site] = dict(storage.conn.execute("SELECT segment, checksum FROM segments"))
+                self.stores[site] = storage
+            return self.stores[site]
+
+    def manifest(self, site):
+        """{segment: checksum} of everything applied for a site"""
+        with self.lock:
+            self.store(site)
+            return dict(self.manifests[site])
+
+    def offset(self, site, segment, checksum):
+        check_name(site, segment, checksum)
+        with self.lock:
+            return part_offset(os.path.join(self.incoming, site), segment, checksum)
+
+    def send_chunk(self, site, segment, checksum, offset, data):
+        check_name(site, segment, checksum)
+        with self.lock:
+            size = append_part(os.path.join(self.incoming, site), segment, checksum, offset, data)
+            self.bytes_received += len(data)
+            return size
+
+    def commit(self, site, segment, checksum):
+        """Verify a fully received segment and apply it"""
+        check_name(site, segment, checksum)
+        with self.lock:
+            path = _part_path(os.path.join(self.incoming, site), segment, checksum)
+            if not os.path.exists(path):
+                raise ValueError(f"No transfer of segment {segment} to commit")
+            with open(path, 'rb') as f:
+                payload = f.read()
+            try:
+                self.apply(site, segment, checksum, payload)
+            finally:
+                # A damaged part cannot be resumed; the node sends it again from the start
+                os.remove(path)
+
+    def apply(self, site, segment, checksum, payload):
+        with self.lock:
+            try:
+                buckets = decode_segment(segment, payload, checksum)
+            except ValueError:
+                self.rejected += 1
+                raise
+            storage = self.store(site)
+            storage.replace_prefix(segment, buckets)
+            # Recorded after the buckets: a crash in between only makes the node send the segment again
+            with storage.lock, storage.conn:
+                storage.conn.execute("INSERT OR REPLACE INTO segments (segment, checksum) VALUES (?, ?)",
+                                     (segment, checksum))
+            self.manifests[site][segment] = checksum
+            self.applied += 1
+
+    def delete(self, site, segment):
+        """Remove a segment the node no longer holds"""
+        check_name(site, segment)
+        with self.lock:
+            storage = self.store(site)
+            storage.replace_prefix(segment, {level: {} for level in SEGMENT_LEVELS[len(segment)]})
+            with storage.lock, storage.conn:
+                storage.conn.execute("DELETE FROM segments WHERE segment = ?", (segment,))
+            if self.manifests[site].pop(segment, None) is not None:
+                self.deleted += 1
+
+    def collect(self, drop_directory):
+        """Apply the segments nodes left in a DirectoryTransport directory
+
+        Each site's manifest.json there is rewritten afterwards, which is
+        how nodes writing to the directory learn what has been applied.
+        A <segment>.delete file removes the segment. Returns the number of
+        segments applied.
+        """
+        applied = 0
+        for site in sorted(os.listdir(drop_directory)):
+            site_directory = os.path.join(drop_directory, site)
+            if not os.path.isdir(site_directory) or not SITE_NAME.fullmatch(site):
+                continue
+            for name in sorted(os.listdir(site_directory)):
+                path = os.path.join(site_directory, name)
+                if name.endswith('.delete'):
+                    try:
+                        self.delete(site, name[:-7])
+                    except ValueError:
+                        pass
+                    os.remove(path)
+                    continue
+                if not name.endswith('.seg'):
+                    continue
+                try:
+                    segment, checksum = name[:-4].split('.', 1)
+                    check_name(site, segment, checksum)
+                    with open(path, 'rb') as f:
+                        payload = f.read()
+                    self.bytes_received += len(payload)
+                    self.apply(site, segment, checksum, payload)
+                    applied += 1
+                except (ValueError, FileNotFoundError):
+                    pass  # Damaged or superseded; the node sends it again
+                if os.path.exists(path):
+                    os.remove(path)
+            temp_path = os.path.join(site_directory, 'manifest.json.tmp')
+            with open(temp_path, 'w') as f:
+                json.dump(self.manifest(site), f)
+            os.replace(temp_path, os.path.join(site_directory, 'manifest.json'))
+        return applied
+
+    def close(self):
+        with self.lock:
+            for storage in self.stores.values():
+                storage.close()
+            self.stores.clear()
+
+
+class DirectoryTransport:
+    """Sends segments through a shared directory (network share, synced folder, USB stick)
+
+    Chunks are appended to <site>/<segment>.<checksum>.part, which is
+    renamed to .seg once complete; an empty <segment>.delete asks for a
+    segment's removal. ReplicationCentral.collect() applies both and
+    writes <site>/manifest.json. Segments waiting for collection count as
+    sent, and as removed.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _site_directory(self, site):
+        return os.path.join(self.directory, check_name(site))
+
+    def manifest(self, site):
+        site_directory = self._site_directory(site)
+        manifest = {}
+        try:
+            with open(os.path.join(site_directory, 'manifest.json')) as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, ValueError):
+            pass
+        if os.path.isdir(site_directory):
+            for name in os.listdir(site_directory):
+                if name.endswith('.seg'):
+                    segment, checksum = name[:-4].split('.', 1)
+                    manifest[segment] = checksum
+                elif name.endswith('.delete'):
+                    manifest.pop(name[:-7], None)
+        return manifest
+
+    def offset(self, site, segment, checksum):
+        check_name(site, segment, checksum)
+        return part_offset(self._site_directory(site), segment, checksum)
+
+    def send_chunk(self, site, segment, checksum, offset, data):
+        check_name(site, segment, checksum)
+        return append_part(self._site_directory(site), segment, checksum, offset, data)
+
+    def commit(self, site, segment, checksum):
+        check_name(site, segment, checksum)
+        site_directory = self._site_directory(site)
+        self._discard(site_directory, segment)
+        os.replace(_part_path(site_directory, segment, checksum),
+                   os.path.join(site_directory, f"{segment}.{checksum}.seg"))
+
+    def delete(self, site, segment):
+        check_name(site, segment)
+        site_directory = self._site_directory(site)
+        os.makedirs(site_directory, exist_ok=True)
+        self._discard(site_directory, segment)
+        open(os.path.join(site_directory, f"{segment}.delete"), 'w').close()
+
+    @staticmethod
+    def _discard(site_directory, segment):
+        # An older version or removal not collected yet
+        for name in os.listdir(site_directory):
+            if name.startswith(segment + '.') and (name.endswith('.seg') or name.endswith('.delete')):
+                os.remove(os.path.join(site_directory, name))
+
+
+class SocketTransport:
+    """Sends segments to a ReplicationServer over TCP
+
+    Each request is one JSON line, a chunk's bytes follow its line; each
+    reply is one JSON line. The connection is made on the first request
+    and again after an error.
+    """
+    def __init__(self, host='127.0.0.1', port=REPLICATION_PORT, timeout=10.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.sock = None
+        self.stream = None
+
+    def _request(self, request, data=b''):
+        if self.sock is None:
+            self.sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            self.stream = self.sock.makefile('rb')
+        try:
+            self.sock.sendall(json.dumps(request).encode() + b'\n' + data)
+            line = self.stream.readline()
+        except OSError:
+            self.close()
+            raise
+        if not line:
+            self.close()
+            raise ConnectionError("Replication server closed the connection")
+        reply = json.loads(line)
+        if not reply.get('ok'):
+            raise ValueError(reply.get('error', 'request refused'))
+        return reply
+
+    def manifest(self, site):
+        return self._request({'op': 'manifest', 'site': site})['manifest']
+
+    def offset(self, site, segment, checksum):
+        return self._request({'op': 'offset', 'site': site, 'segment': segment, 'checksum': checksum})['offset']
+
+    def send_chunk(self, site, segment, checksum, offset, data):
+        return self._request({'op': 'chunk', 'site': site, 'segment': segment, 'checksum': checksum,
+                              'offset': offset, 'length': len(data)}, data)['offset']
+
+    def commit(self, site, segment, checksum):
+        self._request({'op': 'commit', 'site': site, 'segment': segment, 'checksum': checksum})
+
+    def delete(self, site, segment):
+        self._request({'op': 'delete', 'site': site, 'segment': segment})
+
+    def close(self):
+        if self.sock:
+            self.stream.close()
+            self.sock.close()
+            self.sock = None
+            self.stream = None
+
+
+class ReplicationServer(BackgroundServer):
+    """Serves a ReplicationCentral to SocketTransport clients
+
+    A BackgroundServer like the live data server; requests are applied on the loop's executor so a large commit
+    does not hold up other nodes' transfers.
+    """
+    def __init__(self, central, host='127.0.0.1', port=REPLICATION_PORT):
+        super().__init__(host, port)
+        self.central = central
+
+        self.requests = 0
+
+    def _dispatch(self, request, data):
+        central = self.central
+        op = request.get('op')
+        if op == 'manifest':
+            return {'manifest': central.manifest(request['site'])}
+        if op == 'delete':
+            central.delete(request['site'], request['segment'])
+            return {}
+        args = (request['site'], request['segment'], request['checksum'])
+        if op == 'offset':
+            return {'offset': central.offset(*args)}
+        if op == 'chunk':
+            return {'offset': central.send_chunk(*args, request['offset'], data)}
+        if op == 'commit':
+            central.commit(*args)
+            return {}
+        raise ValueError(f"Unknown request '{op}'")
+
+    async def _handle_client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    break
+                length = request.get('length', 0) if request.get('op') == 'chunk' else 0
+                if not 0 <= length <= CHUNK_SIZE * 4:
+                    break
+                data = await reader.readexactly(length)
+                self.requests += 1
+                try:
+                    reply = await self._loop.run_in_executor(None, self._dispatch, request, data)
+                    reply['ok'] = True
+                except (ValueError, KeyError, TypeError, OSError) as e:
+                    reply = {'ok': False, 'error': str(e)}
+                writer.write(json.dumps(reply).encode() + b'\n')
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+class ReplicationSender:
+    """Ships a node's history to the central, one changed segment at a time
+
+    Which segments to encode again is read from the rollups' day
+    versions, so after a day of new samples a sync encodes and sends that
+    day, its month and its year, whatever the length of the history. A
+    reload of the rollups (new generation) re-encodes everything once
+    and still sends only what differs. The central's checksums are asked
+    for on the first sync and after a failure; in between this node is
+    the only writer of its site. A segment goes out in chunk_size pieces
+    and, after a failure, resumes from what the central already holds.
+    Segments the node no longer has any buckets for are removed from the
+    central.
+    """
+    def __init__(self, site, rollups, transport, interval=SYNC_INTERVAL, chunk_size=CHUNK_SIZE, on_error=None):
+        self.site = check_name(site)
+        self.rollups = rollups
+        self.transport = transport
+        self.interval = interval
+        self.chunk_size = chunk_size
+        self.on_error = on_error  # Called with (sender, error or None) when syncs start or stop failing
+
+        self.checksums = {}  # Segment -> checksum of the local buckets
+        self.remote = None  # Segment -> checksum the central holds, None until asked
+        self._version = None
+        self._generation = None
+        self._stop = threading.Event()
+        self.thread = None
+
+        self.syncs = 0
+        self.segments_sent = 0
+        self.segments_deleted = 0
+        self.bytes_sent = 0
+        self.bytes_resumed = 0
+        self.last_sync = None
+        self.last_sync_seconds = 0.0
+        self.last_error = None
+
+    def sync(self):
+        """Send every segment the central does not hold and remove the ones gone here
+
+        Returns (segments, bytes) sent.
+        """
+        started = time.perf_counter()
+        encoded = self._refresh()
+        if self.remote is None:
+            self.remote = self.transport.manifest(self.site)
+        sent_segments = sent_bytes = 0
+        for segment in sorted(segment for segment, checksum in self.checksums.items()
+                              if self.remote.get(segment) != checksum):
+            payload, checksum = encoded.get(segment) or self._encode(segment)
+            sent_bytes += self._send(segment, payload, checksum)
+            sent_segments += 1
+        for segment in sorted(set(self.remote) - set(self.checksums)):
+            self._delete(segment)
+        self.syncs += 1
+        self.last_sync = time.time()
+        self.last_sync_seconds = time.perf_counter() - started
+        return sent_segments, sent_bytes
+
+    def _refresh(self):
+        """Bring the local checksums up to date; returns the payloads encoded on the way"""
+        rollups = self.rollups
+        version, generation = rollups.version, rollups.generation
+        days = None
+        if generation == self._generation:
+            days = rollups.days_changed_since(self._version)
+        if days is None:
+            encoded = {segment: encode_segment(buckets)
+                       for segment, buckets in split_segments(rollups.levels()).items()}
+            self.checksums = {segment: checksum for segment, (_, checksum) in encoded.items()}
+        else:
+            encoded = {}
+            for segment in segments_of_days(days):
+                payload = self._encode(segment)
+                if payload:
+                    encoded[segment] = payload
+        self._version, self._generation = version, generation
+        return encoded
+
+    def _encode(self, segment):
+        """(payload, checksum) of a segment, or None once it has no buckets left"""
+        buckets = segment_buckets(self.rollups.levels(), segment)
+        if not any(buckets.values()):
+            self.checksums.pop(segment, None)
+            return None
+        payload, checksum = encode_segment(buckets)
+        self.checksums[segment] = checksum
+        return payload, checksum
+
+    def _send(self, segment, payload, checksum):
+        try:
+            offset = self.transport.offset(self.site, segment, checksum)
+            for start in range(offset, len(payload), self.chunk_size):
+                chunk = payload[start:start + self.chunk_size]
+                self.transport.send_chunk(self.site, segment, checksum, start, chunk)
+                self.bytes_sent += len(chunk)
+            self.transport.commit(self.site, segment, checksum)
+        except Exception:
+            self.remote = None  # Ask the central again next time
+            raise
+        self.remote[segment] = checksum
+        self.segments_sent += 1
+        self.bytes_resumed += min(offset, len(payload))
+        return len(payload) - min(offset, len(payload))
+
+    def _delete(self, segment):
+        try:
+            self.transport.delete(self.site, segment)
+        except Exception:
+            self.remote = None
+            raise
+        del self.remote[segment]
+        self.segments_deleted += 1
+
+    def start(self):
+        self._stop.clear()
+        self.thread = threading.Thread(target=self._run, name=f"replication-{self.site}", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=10.0):
+        """Stop syncing after one last sync (for up to timeout seconds)"""
+        self._stop.set()
+        if self.thread:
+            self.thread.join(timeout)
+            self.thread = None
+        close = getattr(self.transport, 'close', None)
+        if close:
+            close()
+
+    def _run(self):
+        while True:
+            stopping = self._stop.wait(self.interval)
+            try:
+                self.sync()
+            except Exception as e:
+                first = self.last_error is None
+                self.last_error = str(e)
+                if first and self.on_error:
+                    self.on_error(self, e)
+            else:
+                if self.last_error is not None:
+                    self.last_error = None
+                    if self.on_error:
+                        self.on_error(self, None)
+            if stopping:
+                break
+
+    def stats(self):
+        return {
+            'site': self.site,
+            'segments': len(self.checksums),
+            'syncs': self.syncs,
+            'segments_sent': self.segments_sent,
+            'segments_deleted': self.segments_deleted,
+            'bytes_sent': self.bytes_sent,
+            'bytes_resumed': self.bytes_resumed,
+            'last_sync': self.last_sync,
+            'last_sync_ms': self.last_sync_seconds * 1000,
+            'last_error': self.last_error
+        }
+
+
+def build_sender(spec, rollups, on_error=None):
+    """A ReplicationSender from a dashboard spec
+
+    {'site': 'north-field', 'directory': '//central/irrigation'} writes
+    to a shared directory; {'site': ..., 'host': ..., 'port': ...} sends
+    to a ReplicationServer. 'interval' sets the seconds between syncs.
+    """
+    if spec.get('directory'):
+        transport = DirectoryTransport(spec['directory'])
+    else:
+        transport = SocketTransport(spec.get('host', '127.0.0.1'), spec.get('port', REPLICATION_PORT))
+    return ReplicationSender(spec['site'], rollups, transport, interval=spec.get('interval', SYNC_INTERVAL),
+                             on_error=on_error)
+
+
+class _CutTransport:
+    """Wraps a transport and fails one chunk, to exercise resuming"""
+    def __init__(self, transport, fail_at):
+        self.transport = transport
+        self.fail_at = fail_at
+        self.chunks = 0
+
+    def __getattr__(self, name):
+        return getattr(self.transport, name)
+
+    def send_chunk(self, *args):
+        self.chunks += 1
+        if self.chunks == self.fail_at:
+            raise ConnectionError("link dropped")
+        return self.transport.send_chunk(*args)
+
+
+def benchmark_replication(months=(3, 6, 12), interval=60, directory=None):
+    """Bytes and time of segment replication against copying the whole history file
+
+    For each history length: the first sync, a sync after one more day
+    of samples, after one more live sample and with nothing new. The
+    baseline copies irrigation_data.json, as centralizing does today.
+    The central store is checked against the node's buckets, and a
+    transfer cut off half way is resumed.
+    """
+    import shutil
+    import tempfile
+    from datetime import timedelta
+    from benchmark_suite import SETTINGS, synthetic_samples
+    from irrigation_rollups import LEVELS, IrrigationRollups
+    from storage_backends import JsonFileStorage
+
+    directory = directory or tempfile.mkdtemp(prefix='irrigation_replication_')
+    print(f"🌱 Replication benchmark (one sample per {interval} s, minute buckets kept for all of the history)")
+    results = {}
+    try:
+        for length in months:
+            days = round(length * 30.4)
+            per_day = 86400 // interval
+            arrays = synthetic_samples(days + 1, interval)
+            rollups = IrrigationRollups()
+            rollups.ingest_batch(heartbeat=interval, **{name: column[:-per_day] for name, column in arrays.items()})
+
+            central = ReplicationCentral(os.path.join(directory, f"central_{length}"))
+            server = ReplicationServer(central, port=0)
+            server.start()
+            sender = ReplicationSender('node', rollups, SocketTransport(port=server.port))
+            node_file = os.path.join(directory, 'irrigation_data.json')
+            node_storage = JsonFileStorage(node_file, csv_file=None)
+
+            def full_copy():
+                node_storage.save(rollups.levels(), SETTINGS)
+                started = time.perf_counter()
+                shutil.copyfile(node_file, os.path.join(central.directory, 'copied_irrigation_data.json'))
+                return os.path.getsize(node_file), time.perf_counter() - started
+
+            def timed_sync():
+                started = time.perf_counter()
+                segments, sent = sender.sync()
+                return segments, sent, time.perf_counter() - started
+
+            result = results[length] = {}
+            result['full_bytes'], result['full_s'] = full_copy()
+            with open(node_file, 'rb') as f:
+                result['full_gzip_bytes'] = len(gzip.compress(f.read(), compresslevel=6))
+            result['first'] = timed_sync()
+
+            rollups.ingest_batch(heartbeat=interval, **{name: column[-per_day:] for name, column in arrays.items()})
+            result['day'] = timed_sync()
+            result['day_full_bytes'], result['day_full_s'] = full_copy()
+
+            last = arrays['timestamps'][-1].astype(object)
+            rollups.add_sample(last + timedelta(seconds=interval), 300, False, 0.0, 0, heartbeat=interval)
+            result['sample'] = timed_sync()
+            result['idle'] = timed_sync()
+
+            stored = central.store('node').load()
+            levels = rollups.levels()
+            for level in LEVELS:
+                if stored[LEVEL_FILE_KEYS[level]] != dict(levels[level]):
+                    raise AssertionError(f"Central {level} buckets differ from the node's")
+
+            # Resume: small chunks so segments span several, and the link drops inside one half way through
+            cut = _CutTransport(SocketTransport(port=server.port), fail_at=None)
+            resumed = ReplicationSender('resumed', rollups, cut, chunk_size=1024)
+            payloads = [len(payload) for _, (payload, _) in sorted(resumed._refresh().items())]
+            total, chunks = sum(payloads), 0
+            for size in payloads:
+                if chunks * 1024 > total // 2 and size > 1024:
+                    cut.fail_at = chunks + 2
+                    break
+                chunks += -(-size // 1024)
+            try:
+                resumed.sync()
+            except ConnectionError:
+                pass
+            resumed.sync()
+            result['resume'] = (total, resumed.bytes_sent, resumed.bytes_resumed)
+            if central.manifest('resumed') != central.manifest('node'):
+                raise AssertionError("Resumed transfer did not complete")
+
+            # A reload without the oldest month removes its day and month segments from the central
+            oldest = min(levels['month'])
+            rollups.load_levels({LEVEL_FILE_KEYS[level]: {key: bucket for key, bucket in store.items()
+                                                          if not key.startswith(oldest)}
+                                 for level, store in rollups.levels().items()})
+            deleted = sender.segments_deleted
+            result['reload'] = timed_sync()
+            result['deleted'] = sender.segments_deleted - deleted
+            stored = central.store('node').load()
+            for level in LEVELS:
+                if stored[LEVEL_FILE_KEYS[level]] != dict(levels[level]):
+                    raise AssertionError(f"Central {level} buckets still hold removed segments")
+            if set(central.manifest('node')) != set(sender.checksums):
+                raise AssertionError("Central manifest still lists removed segments")
+
+            server.stop()
+            sender.transport.close()
+            cut.transport.close()
+            central.close()
+
+            first, day, sample, idle = result['first'], result['day'], result['sample'], result['idle']
+            print(f"  {length:>3g} months, {len(levels['minute'])} minute buckets, {first[0]} segments:")
+            print(f"      full copy {result['full_bytes'] / 1e6:.1f} MB ({result['full_gzip_bytes'] / 1e6:.1f} MB "
+                  f"gzipped) in {result['full_s'] * 1000:.0f} ms per sync")
+            print(f"      first sync {first[1] / 1e6:.1f} MB in {first[2]:.2f} s")
+            print(f"      +1 day: {day[0]} segments, {day[1] / 1e3:.1f} kB in {day[2] * 1000:.0f} ms "
+                  f"(full copy {result['day_full_bytes'] / 1e6:.1f} MB, {result['day_full_bytes'] / day[1]:.0f}x more)")
+            print(f"      +1 sample: {sample[0]} segments, {sample[1] / 1e3:.1f} kB in {sample[2] * 1000:.0f} ms; "
+                  f"nothing new: {idle[1]} bytes in {idle[2] * 1000:.1f} ms")
+            total, sent, skipped = result['resume']
+            print(f"      cut half way and resumed: {sent / 1e6:.2f} MB sent for {total / 1e6:.2f} MB of segments "
+                  f"({skipped} bytes picked up where the transfer stopped)")
+            print(f"      reloaded without {oldest}: {result['deleted']} segments removed from the central "
+                  f"in {result['reload'][2] * 1000:.0f} ms")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Segment replication of field histories to a central store")
+    parser.add_argument('--serve', metavar='DIR', help="run the central aggregator on this directory")
+    parser.add_argument('--collect', nargs=2, metavar=('DROP_DIR', 'DIR'),
+                        help="apply what nodes left in a shared directory to the central directory")
+    parser.add_argument('--push', metavar='STORE', help="sync irrigation_data.json or a .db store once")
+    parser.add_argument('--site', help="site name of the pushed store")
+    parser.add_argument('--to', metavar='DROP_DIR', help="push through a shared directory instead of a socket")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=REPLICATION_PORT)
+    parser.add_argument('--months', type=float, nargs='+', default=[3, 6, 12])
+    args = parser.parse_args()
+
+    if args.serve:
+        central = ReplicationCentral(args.serve)
+        server = ReplicationServer(central, args.host, args.port)
+        server.start()
+        print(f"🛰️ Replication central on {args.host}:{server.port}, stores in {args.serve} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            server.stop()
+            central.close()
+    elif args.collect:
+        central = ReplicationCentral(args.collect[1])
+        print(f"✅ Applied {central.collect(args.collect[0])} segments")
+        central.close()
+    elif args.push:
+        from irrigation_rollups import IrrigationRollups
+        from storage_backends import JsonFileStorage
+
+        if args.push.endswith('.db'):
+            storage = SQLiteStorage(args.push, import_json=None)
+        else:
+            storage = JsonFileStorage(args.push, csv_file=None)
+        data = storage.load()
+        storage.close()
+        rollups = IrrigationRollups()
+        rollups.load_levels(data)
+        site = args.site or data.get('settings', {}).get('device_id')
+        if not site:
+            parser.error("--site is required when the store has no device_id")
+        transport = DirectoryTransport(args.to) if args.to else SocketTransport(args.host, args.port)
+        sender = ReplicationSender(site, rollups, transport)
+        segments, sent = sender.sync()
+        sender.stop()
+        print(f"✅ {site}: {segments} of {len(sender.checksums)} segments sent ({sent / 1e3:.1f} kB)")
+    else:
+        benchmark_replication(args.months)
@@ -0,0 +1,259 @@
+import os
+import time
+from multiprocessing import Pool
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.backends.backend_pdf import PdfPages
+from matplotlib.figure import Figure
+
+from fleet_analytics import zone_names
+from irrigation_analytics import day_rows_metrics
+from irrigation_charts import (CHART_LAYOUTS, MOISTURE_LEVELS, draw_water_usage, draw_moisture,
+                               draw_efficiency, draw_pump_duration)
+from irrigation_rollups import LEVEL_FILE_KEYS, key_in_range
+from storage_backends import JsonFileStorage, SQLiteStorage, moisture_field
+
+
+CHARTS = ('water', 'moisture', 'efficiency', 'pump')
+
+
+class FigureTemplate:
+    """An Agg figure and its axes for one chart type, reused across reports
+
+    Creating a figure and laying out its subplots costs more than drawing
+    a chart into it, so each worker keeps one figure per chart type and
+    clears the axes before every report.
+    """
+    def __init__(self, chart, dpi=100):
+        figsize, (rows, cols) = CHART_LAYOUTS[chart]
+        self.figure = Figure(figsize=figsize, dpi=dpi)
+        FigureCanvasAgg(self.figure)
+        self.axes = self.figure.subplots(rows, cols)
+
+    def clear(self):
+        for ax in self.figure.axes:
+            ax.cla()
+        return self.figure, self.axes
+
+
+class ReportRenderer:
+    """Renders the dashboard's charts for history stores without a display"""
+    def __init__(self, dpi=100, reuse_templates=True):
+        self.dpi = dpi
+        self.reuse_templates = reuse_templates
+        self.templates = {}
+        self.stores = {}
+
+    def _template(self, chart):
+        if not self.reuse_templates:
+            return FigureTemplate(chart, self.dpi)
+        if chart not in self.templates:
+            self.templates[chart] = FigureTemplate(chart, self.dpi)
+        return self.templates[chart]
+
+    def _store(self, path):
+        """Open a store once per worker; JSON files are reloaded when they change"""
+        if path.endswith('.db'):
+            if path not in self.stores:
+                storage = SQLiteStorage(path, read_only=True)
+                self.stores[path] = (None, storage, storage.load_settings())
+            return self.stores[path]
+        mtime = os.path.getmtime(path)
+        cached = self.stores.get(path)
+        if cached is None or cached[0] != mtime:
+            data = JsonFileStorage(path, csv_file=None).load()
+            self.stores[path] = cached = (mtime, data, data.get('settings', {}))
+        return cached
+
+    def read_range(self, path, level, start=None, end=None):
+        _, store, _ = self._store(path)
+        if isinstance(store, SQLiteStorage):
+            return store.read_range(level, start, end)
+        data = store.get(LEVEL_FILE_KEYS[level], {})
+        return [[key, bucket] for key, bucket in sorted(data.items()) if key_in_range(key, start, end)]
+
+    def draw(self, chart, path, level, start=None, end=None):
+        """Draw one chart into its template; returns the figure, or None without data"""
+        if chart in ('efficiency', 'pump'):
+            rows = self.read_range(path, 'day', start, end)
+        elif chart == 'moisture' and level not in MOISTURE_LEVELS:
+            return None
+        else:
+            rows = self.read_range(path, level, start, end)
+        if not rows:
+            return None
+
+        figure, axes = self._template(chart).clear()
+        if chart == 'water':
+            draw_water_usage(axes, level, [key for key, _ in rows],
+                             [bucket['water_used'] for _, bucket in rows],
+                             [bucket['events'] for _, bucket in rows])
+        elif chart == 'moisture':
+            settings = self._store(path)[2]
+            draw_moisture(axes, level, [key for key, _ in rows],
+                          [bucket[moisture_field(level)] for _, bucket in rows],
+                          settings.get('dry_threshold', 400), settings.get('wet_threshold', 200))
+        elif chart == 'efficiency':
+            draw_efficiency(axes, day_rows_metrics(rows))
+        else:
+            draw_pump_duration(axes, day_rows_metrics(rows))
+        figure.tight_layout()
+        return figure
+
+    def render(self, job):
+        """Render one zone and period to PNG files or a multi-page PDF"""
+        name = report_name(job)
+        # Zones labelled by path ('site1/irrigation_data') get a subdirectory
+        os.makedirs(os.path.dirname(os.path.join(job['out_dir'], name)), exist_ok=True)
+        written = []
+        pdf = None
+        try:
+            for chart in job['charts']:
+                figure = self.draw(chart, job['store'], job['level'], job.get('start'), job.get('end'))
+                if figure is None:
+                    continue
+                if job['format'] == 'pdf':
+                    if pdf is None:
+                        filename = os.path.join(job['out_dir'], name + '.pdf')
+                        pdf = PdfPages(filename)
+                        written.append(filename)
+                    pdf.savefig(figure)
+                else:
+                    filename = os.path.join(job['out_dir'], f"{name}_{chart}.png")
+                    figure.savefig(filename)
+                    written.append(filename)
+        finally:
+            if pdf is not None:
+                pdf.close()
+        return written
+
+    def render_store(self, jobs):
+        """Render the jobs of one store, then close it; returns the written files"""
+        try:
+            return [filename for job in jobs for filename in self.render(job)]
+        finally:
+            self.close()
+
+    def close(self):
+        for _, store, _ in self.stores.values():
+            if isinstance(store, SQLiteStorage):
+                store.close()
+        self.stores = {}
+
+
+def report_name(job):
+    """File name stem for a zone and period, e.g. zone0001_day_2025-08-01_2025-08-31"""
+    parts = [job['zone'], job['level']]
+    for bound in (job.get('start'), job.get('end')):
+        if bound:
+            parts.append(bound.replace(' ', 'T').replace(':', ''))
+    return '_'.join(parts)
+
+
+def report_jobs(stores, levels, out_dir, start=None, end=None, charts=CHARTS, fmt='png'):
+    """One job per store and level
+
+    Zones are labelled as in fleet reports, so stores sharing a file name
+    do not overwrite each other's reports; a store listed twice raises
+    ValueError.
+    """
+    return [{
+        'store': store,
+        'zone': zone,
+        'level': level,
+        'start': start,
+        'end': end,
+        'charts': list(charts),
+        'out_dir': out_dir,
+        'format': fmt
+    } for store, zone in zip(stores, zone_names(stores)) for level in levels]
+
+
+_worker_renderer = None
+
+
+def _init_worker(dpi, reuse_templates):
+    global _worker_renderer
+    _worker_renderer = ReportRenderer(dpi, reuse_templates)
+
+
+def _render_store(jobs):
+    return _worker_renderer.render_store(jobs)
+
+
+def render_reports(jobs, workers=None, dpi=100, reuse_templates=True):
+    """Render jobs on a pool of worker processes; returns the written files
+
+    The jobs of one store go to the same worker, which closes the store
+    once they are done.
+    """
+    workers = workers or os.cpu_count()
+    by_store = {}
+    for job in jobs:
+        by_store.setdefault(job['store'], []).append(job)
+    if workers == 1:
+        renderer = ReportRenderer(dpi, reuse_templates)
+        results = [renderer.render_store(store_jobs) for store_jobs in by_store.values()]
+    else:
+        with Pool(workers, initializer=_init_worker, initargs=(dpi, reuse_templates)) as pool:
+            results = pool.map(_render_store, list(by_store.values()), chunksize=1)
+    return [filename for written in results for filename in written]
+
+
+def benchmark_reports(zones=6, years=1, max_workers=None, dpi=80):
+    """Reports per minute with fresh figures, with templates, and on 1..N workers"""
+    import shutil
+    import tempfile
+    from fleet_analytics import make_synthetic_fleet
+
+    max_workers = max_workers or os.cpu_count()
+    directory = tempfile.mkdtemp(prefix='irrigation_reports_')
+    try:
+        stores = make_synthetic_fleet(directory, zones, years)
+        last_year = str(2022 + years - 1)
+        jobs = (report_jobs(stores, ['day'], os.path.join(directory, 'out'), f"{last_year}-12-01", f"{last_year}-12-31")
+                + report_jobs(stores, ['month'], os.path.join(directory, 'out')))
+        print(f"🖨️ Report benchmark: {len(jobs)} reports ({zones} zones × 2 periods, 4 charts each, "
+              f"{os.cpu_count()} CPUs available)")
+
+        runs = [('fresh figures', 1, False)]
+        workers = 1
+        while workers < max_workers:
+            runs.append((f"templates, {workers} worker{'s' if workers > 1 else ''}", workers, True))
+            workers *= 2
+        runs.append((f"templates, {max_workers} worker{'s' if max_workers > 1 else ''}", max_workers, True))
+
+        for label, workers, reuse in runs:
+            started = time.perf_counter()
+            files = render_reports(jobs, workers, dpi, reuse)
+            elapsed = time.perf_counter() - started
+            print(f"  {label:>22}: {len(jobs) / elapsed * 60:.0f} reports/min "
+                  f"({len(files)} files in {elapsed:.1f} s)")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Render irrigation charts to PNG/PDF without a display")
+    parser.add_argument('stores', nargs='*', help="irrigation_data.json or .db files, one per zone")
+    parser.add_argument('--levels', default='day', help="comma-separated: minute,hour,day,month,year")
+    parser.add_argument('--start', help="first bucket, e.g. 2025-08-01")
+    parser.add_argument('--end', help="last bucket, e.g. 2025-08-31")
+    parser.add_argument('--charts', default=','.join(CHARTS))
+    parser.add_argument('--format', choices=['png', 'pdf'], default='pdf')
+    parser.add_argument('--out', default='reports')
+    parser.add_argument('--dpi', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--benchmark', action='store_true')
+    args = parser.parse_args()
+
+    if args.benchmark or not args.stores:
+        benchmark_reports(max_workers=args.workers)
+    else:
+        jobs = report_jobs(args.stores, args.levels.split(','), args.out, args.start, args.end,
+                           args.charts.split(','), args.format)
+        started = time.perf_counter()
+        files = render_reports(jobs, args.workers, args.dpi)
+        print(f"✅ {len(files)} report files written to {args.out} in {time.perf_counter() - started:.1f} s")
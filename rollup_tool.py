@@ -0,0 +1,178 @@
+import math
+import sys
+
+from irrigation_rollups import IrrigationRollups, LEVELS, samples_to_arrays
+from storage_backends import STORAGE_BACKENDS, JsonFileStorage, SQLiteStorage, moisture_field
+
+
+def rollups_from_samples(samples, heartbeat=None):
+    """Build all levels from raw sample dicts with one batch ingest"""
+    rollups = IrrigationRollups()
+    if samples:
+        rollups.ingest_batch(heartbeat=heartbeat, **samples_to_arrays(samples))
+    return rollups
+
+
+def covered_keys(raw_store, stored_store):
+    """Keys of one level that the raw sample log fully accounts for
+
+    That is every key between the first and last raw bucket. The boundary
+    buckets are left out when the stored history extends past them,
+    since then they also hold data from before or after the raw log.
+    """
+    if not raw_store:
+        return set()
+    raw_keys = sorted(raw_store)
+    first, last = raw_keys[0], raw_keys[-1]
+    keys = {key for key in stored_store if first <= key <= last}
+    keys.update(raw_keys)
+    if any(key < first for key in stored_store):
+        keys.discard(first)
+    if any(key > last for key in stored_store):
+        keys.discard(last)
+    return keys
+
+
+def compare_rollups(raw, stored, tolerance=1e-6):
+    """List (level, key, problem) differences within the raw log's coverage"""
+    raw_levels, stored_levels = raw.levels(), stored.levels()
+    mismatches = []
+    for level in LEVELS:
+        fields = ['water_used', 'events', 'pump_duration']
+        if level in ('minute', 'hour', 'day'):
+            fields.append(moisture_field(level))
+
+        raw_store, stored_store = raw_levels[level], stored_levels[level]
+        for key in sorted(covered_keys(raw_store, stored_store)):
+            if key not in stored_store:
+                mismatches.append((level, key, "missing from stored history"))
+            elif key not in raw_store:
+                mismatches.append((level, key, "not produced by the raw samples"))
+            else:
+                for field in fields:
+                    expected = raw_store[key][field]
+                    actual = stored_store[key].get(field, 0)
+                    if not math.isclose(expected, actual, rel_tol=tolerance, abs_tol=tolerance):
+                        mismatches.append((level, key, f"{field} is {actual}, raw samples give {expected}"))
+    return mismatches
+
+
+def rebuild_rollups(raw, stored):
+    """Replace the stored buckets covered by the raw log with the rebuilt ones
+
+    Buckets outside the raw log's coverage are kept, and monthly and yearly
+    totals over the covered span are recomputed from the merged days.
+    """
+    raw_levels, stored_levels = raw.levels(), stored.levels()
+    periods = {level: set() for level in LEVELS}
+    for level in LEVELS:
+        raw_store, stored_store = raw_levels[level], stored_levels[level]
+        for key in covered_keys(raw_store, stored_store):
+            stored_store.pop(key, None)
+            if key in raw_store:
+                stored_store[key] = dict(raw_store[key])
+        if level in ('month', 'year'):
+            periods[level].update(raw_store)
+    stored.generation += 1  # Buckets were replaced behind the rollups' back
+    stored._update_period_totals(periods)
+    return stored
+
+
+def open_storage(args):
+    if args.storage == 'sqlite':
+        return SQLiteStorage(args.db_file, import_json=None)
+    return JsonFileStorage(args.data_file, args.csv_file)
+
+
+def run_check(args):
+    """verify or rebuild the stored aggregates against the raw sample log"""
+    storage = open_storage(args)
+    try:
+        stored = IrrigationRollups()
+        data = storage.load()
+        stored.load_levels(data)
+        samples = list(storage.iter_samples())
+        raw = rollups_from_samples(samples, args.heartbeat)
+        print(f"📂 {len(samples)} raw samples, "
+              f"{sum(len(store) for store in stored.levels().values())} stored buckets")
+
+        mismatches = compare_rollups(raw, stored)
+        for level, key, problem in mismatches[:args.show]:
+            print(f"  ❌ {level} {key}: {problem}")
+        if len(mismatches) > args.show:
+            print(f"  ... {len(mismatches) - args.show} more")
+
+        if args.command == 'verify':
+            if mismatches:
+                print(f"❌ {len(mismatches)} mismatched buckets")
+                return 1
+            print("✅ Aggregates match the raw samples")
+            return 0
+
+        storage.replace_levels(rebuild_rollups(raw, stored).levels())
+        print(f"✅ Rebuilt aggregates ({len(mismatches)} buckets corrected)")
+        return 0
+    finally:
+        storage.close()
+
+
+def benchmark_ingest(sizes=(10000, 100000, 500000), hours=72, seed=0):
+    """Samples/s of ingest_batch against one add_sample() call per sample"""
+    import time
+    from datetime import datetime, timedelta
+    import numpy as np
+    from irrigation_simulator import generate_stream, parse_stream_samples
+
+    print("📦 Batch ingest benchmark")
+    rng = np.random.default_rng(seed)
+    runs = []
+    for size in sizes:
+        # Fixed-rate stream: a sample every 2 s, pump runs of ~1 min
+        start = datetime(2024, 1, 1)
+        pump = (np.arange(size) // 30) % 12 == 0
+        samples = [{
+            'timestamp': start + timedelta(seconds=2 * i),
+            'moisture': int(m), 'pump': bool(p), 'water_used': round(i * 0.0005 % 9, 2), 'events': i // 900 % 40
+        } for i, (m, p) in enumerate(zip(rng.integers(300, 701, size), pump))]
+        runs.append((f"{size:>7} fixed-rate samples", samples, None))
+    samples, heartbeat = parse_stream_samples(generate_stream(hours, report_on_change=True, seed=seed))
+    runs.append((f"{len(samples):>7} change-driven samples ({hours} h)", samples, heartbeat))
+
+    for label, samples, heartbeat in runs:
+        reference = IrrigationRollups()
+        started = time.perf_counter()
+        for s in samples:
+            reference.add_sample(s['timestamp'], s['moisture'], s['pump'], s['water_used'], s['events'],
+                                 heartbeat=heartbeat)
+        per_sample = time.perf_counter() - started
+
+        arrays = samples_to_arrays(samples)
+        batch = IrrigationRollups()
+        started = time.perf_counter()
+        batch.ingest_batch(heartbeat=heartbeat, **arrays)
+        batched = time.perf_counter() - started
+
+        mismatches = compare_rollups(reference, batch)
+        print(f"  {label}: add_sample {len(samples) / per_sample:,.0f}/s, "
+              f"ingest_batch {len(samples) / batched:,.0f}/s ({per_sample / batched:.0f}x), "
+              f"{len(mismatches)} mismatches")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Rebuild or verify the rollup levels from raw samples")
+    parser.add_argument('command', choices=['verify', 'rebuild', 'benchmark'])
+    parser.add_argument('--storage', choices=sorted(STORAGE_BACKENDS), default='json')
+    parser.add_argument('--data-file', default='irrigation_data.json')
+    parser.add_argument('--csv-file', default='irrigation_data.csv')
+    parser.add_argument('--db-file', default='irrigation_data.db')
+    parser.add_argument('--heartbeat', type=int, default=None,
+                        help="heartbeat (s) of a change-driven sketch; omit for the fixed 2 s stream")
+    parser.add_argument('--show', type=int, default=20, help="mismatches to list")
+    args = parser.parse_args()
+
+    if args.command == 'benchmark':
+        benchmark_ingest()
+    else:
+        sys.exit(run_check(args))
@@ -0,0 +1,380 @@
+import argparse
+import multiprocessing
+import os
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+
+RING_NAME = 'irrigation_samples'
+
+# One raw sample per slot, as the sketch reported it
+SAMPLE_DTYPE = np.dtype([
+    ('time', 'f8'),  # Unix seconds of the sample's TIME field
+    ('moisture', 'i4'),
+    ('pump', 'u1'),
+    ('water_used', 'f8'),  # The sketch's daily counters
+    ('events', 'i4')
+], align=True)
+
+# uint64 header words, one cache line ahead of the slots
+HEADER_BYTES = 64
+PUBLISHED, CAPACITY, MAGIC, OWNER = 0, 1, 2, 3
+MAGIC_VALUE = 0x49525249474152  # Identifies a sample ring
+
+
+class SampleRing:
+    """Fixed-size circular buffer of raw samples in shared memory
+
+    One writer (the dashboard's ingest thread) appends samples, and any
+    number of readers in any process look at them in place. The header
+    counts the samples published so far, and sample n lives in slot
+    n % capacity. The writer fills the slot, then bumps the counter.
+
+    Reading works like a seqlock. A reader takes views of the slots it
+    wants and uses them, then reads the counter again. If the writer has
+    come within one lap of the first slot meanwhile, those slots may
+    have been overwritten, and the read is repeated on what is still
+    intact. This relies on the writer's two stores becoming visible in
+    order, as they do on x86-64. Nothing is locked or copied.
+
+    The header also records the writer's pid. A ring left behind by a
+    writer that died without closing it is unlinked and created afresh;
+    FileExistsError means the name belongs to a live writer.
+    """
+    def __init__(self, name=RING_NAME, capacity=65536, create=True):
+        if create:
+            size = HEADER_BYTES + capacity * SAMPLE_DTYPE.itemsize
+            try:
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            except FileExistsError:
+                if not _unlink_stale(name):
+                    raise
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            # Before Python 3.13 an attached segment is registered with the
+            # resource tracker. A process of its own has its own tracker, which
+            # would unlink the segment when the process exits; multiprocessing
+            # children share the creator's.
+            if multiprocessing.parent_process() is None:
+                resource_tracker.unregister(self.shm._name, 'shared_memory')
+        self.owner = create
+
+        self.header = np.ndarray((HEADER_BYTES // 8,), dtype=np.uint64, buffer=self.shm.buf)
+        if create:
+            self.header[:] = 0
+            self.header[CAPACITY] = capacity
+            self.header[MAGIC] = MAGIC_VALUE
+            self.header[OWNER] = os.getpid()
+        elif self.header[MAGIC] != MAGIC_VALUE:
+            self.shm.close()
+            raise ValueError(f"'{name}' is not a sample ring")
+        self.capacity = int(self.header[CAPACITY])
+
+        self.slots = np.ndarray((self.capacity,), dtype=SAMPLE_DTYPE, buffer=self.shm.buf, offset=HEADER_BYTES)
+        if not create:
+            self.slots.flags.writeable = False
+        self._next = int(self.header[PUBLISHED])
+
+    @classmethod
+    def attach(cls, name=RING_NAME):
+        """Open an existing ring for reading"""
+        return cls(name, create=False)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def published(self):
+        """Number of samples written so far"""
+        return int(self.header[PUBLISHED])
+
+    def write(self, timestamp, moisture, pump, water_used, events):
+        """Append one sample (timestamp in Unix seconds); single writer only"""
+        seq = self._next
+        self.slots[seq % self.capacity] = (timestamp, moisture, pump, water_used, events)
+        self._next = seq + 1
+        self.header[PUBLISHED] = seq + 1
+
+    def views(self, start, stop):
+        """Views of the slots holding samples [start, stop), in order (one or two arrays)"""
+        if stop <= start:
+            return []
+        first, last = start % self.capacity, stop % self.capacity
+        if first < last or last == 0:
+            return [self.slots[first:last or self.capacity]]
+        return [self.slots[first:], self.slots[:last]]
+
+    def read(self, start, consume):
+        """Run consume(views) over samples [start, published) and return (result, first, stop)
+
+        Samples already overwritten are skipped: first is where the read
+        actually began. The views are only valid during the call; consume
+        must copy anything it keeps.
+        """
+        while True:
+            stop = self.published
+            # The writer may be filling slot `stop`, which held stop - capacity
+            first = max(start, stop - self.capacity + 1)
+            result = consume(self.views(first, stop))
+            if first > self.published - self.capacity:
+                return result, first, stop
+            start = first
+
+    def close(self):
+        self.slots = self.header = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _unlink_stale(name):
+    """Unlink the ring called name if its writer is no longer running; False if it is in use"""
+    try:
+        shm = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return True
+    owner = 0
+    if shm.size >= HEADER_BYTES:
+        header = np.ndarray((HEADER_BYTES // 8,), dtype=np.uint64, buffer=shm.buf)
+        if header[MAGIC] == MAGIC_VALUE:
+            owner = int(header[OWNER])
+        del header
+    # Rings from before the pid was recorded, and other segments, are left alone
+    stale = owner > 0
+    if stale:
+        try:
+            os.kill(owner, 0)
+            stale = False
+        except ProcessLookupError:
+            pass
+        except PermissionError:
+            stale = False  # Alive, under another user
+    if stale:
+        shm.unlink()
+    elif multiprocessing.parent_process() is None and owner != os.getpid():
+        # As in attach; a ring of this process's own stays registered
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    shm.close()
+    return stale
+
+
+class RingReader:
+    """Follows a ring from where its last read stopped
+
+    lost counts the samples the writer overwrote before they were read.
+    """
+    def __init__(self, ring, from_oldest=False):
+        self.ring = ring
+        self.next = max(0, ring.published - ring.capacity + 1) if from_oldest else ring.published
+        self.lost = 0
+
+    def read(self, consume):
+        """consume(views) over the samples published since the last read"""
+        result, first, stop = self.ring.read(self.next, consume)
+        self.lost += first - self.next
+        self.next = stop
+        return result
+
+
+def _in_window(times, latest, seconds):
+    """Mask of the sample times within `seconds` up to latest"""
+    return (times >= latest - seconds) & (times <= latest)
+
+
+def window_stats(views, seconds):
+    """(samples, pump-on share, pump starts) over the last `seconds` of sample time
+
+    Works on the views in place. Pump starts count off-to-on changes, so
+    cycling within a minute shows up even though minute buckets only keep
+    the last reading. The window is a mask rather than a search because
+    the sketch's clock can step back (a resync or a reset); samples stamped
+    after the latest one are from before the step and left out.
+    """
+    views = [view for view in views if len(view)]
+    if not views:
+        return 0, 0.0, 0
+    latest = views[-1]['time'][-1]
+    samples = pump_on = starts = 0
+    previous = None
+    for view in views:
+        pump = view['pump'][_in_window(view['time'], latest, seconds)]
+        if not len(pump):
+            continue
+        samples += len(pump)
+        pump_on += int(np.count_nonzero(pump))
+        starts += int(np.count_nonzero(pump[1:] > pump[:-1]))
+        if previous is not None and pump[0] > previous:
+            starts += 1
+        previous = pump[-1]
+    return samples, pump_on / samples if samples else 0.0, starts
+
+
+def view_live(name=RING_NAME, minutes=10):
+    """Plot the last minutes of raw samples from a running dashboard's ring"""
+    import matplotlib.pyplot as plt
+    from matplotlib.animation import FuncAnimation
+
+    ring = SampleRing.attach(name)
+    fig, (moisture_ax, pump_ax) = plt.subplots(2, 1, figsize=(12, 6), sharex=True)
+    moisture_line, = moisture_ax.plot([], [], color='#3498db')
+    pump_line, = pump_ax.step([], [], where='post', color='#27ae60')
+    moisture_ax.set_ylabel('Moisture')
+    pump_ax.set_ylabel('Pump')
+    pump_ax.set_ylim(-0.1, 1.1)
+    pump_ax.set_xlabel(f'Seconds (last {minutes} min)')
+
+    def update(frame):
+        def latest(views):
+            # Only the samples inside the window are copied for plotting
+            views = [view for view in views if len(view)]
+            if not views:
+                return np.empty(0, dtype=SAMPLE_DTYPE)
+            latest = views[-1]['time'][-1]
+            return np.concatenate([view[_in_window(view['time'], latest, minutes * 60)] for view in views])
+
+        window, _, _ = ring.read(0, latest)
+        if len(window):
+            seconds = window['time'] - window['time'][-1]
+            moisture_line.set_data(seconds, window['moisture'])
+            pump_line.set_data(seconds, window['pump'])
+            moisture_ax.set_xlim(-minutes * 60, 0)
+            moisture_ax.set_ylim(window['moisture'].min() - 50, window['moisture'].max() + 50)
+        fig.suptitle(f"Raw samples from '{name}': {ring.published} so far")
+        return moisture_line, pump_line
+
+    animation = FuncAnimation(fig, update, interval=500, cache_frame_data=False)
+    plt.show()
+    return animation
+
+
+def _benchmark_reader(name, total, started, results):
+    ring = SampleRing.attach(name)
+    reader = RingReader(ring)
+    reads = 0
+    water = 0.0
+
+    def consume(views):
+        return sum(float(view['water_used'].sum()) for view in views), sum(len(view) for view in views)
+
+    started.wait()
+    begin = time.perf_counter()
+    while reader.next < total:
+        batch_water, count = reader.read(consume)
+        if count:
+            water += batch_water
+            reads += 1
+        else:
+            time.sleep(0.0005)
+    results.put((reader.next - reader.lost, reader.lost, reads, time.perf_counter() - begin))
+    ring.close()
+
+
+def _benchmark_queue_reader(queue, total, results):
+    begin = None
+    for _ in range(total):
+        queue.get()
+        begin = begin or time.perf_counter()
+    results.put(time.perf_counter() - begin)
+
+
+def benchmark_ring(samples=1_000_000, readers=(0, 1, 4), capacity=65536, queue_samples=50_000):
+    """Writer and reader throughput, against a multiprocessing.Queue per reader"""
+    rng = np.random.default_rng(0)
+    times = (1.7e9 + np.arange(samples) * 2.0).tolist()
+    moisture = rng.choice([300, 700], samples).tolist()
+    pump = rng.random(samples) < 0.2
+    water = np.cumsum(pump * 0.03).tolist()
+    events = np.cumsum(pump[1:] > pump[:-1]).tolist() + [0]
+    pump = pump.tolist()
+    rows = list(zip(times, moisture, pump, water, events))
+
+    print(f"🧵 Shared-memory sample ring benchmark ({samples} samples, {capacity} slots, "
+          f"{os.cpu_count()} CPU)")
+    for reader_count in readers:
+        ring = SampleRing(name=f'irrigation_bench_{os.getpid()}', capacity=capacity)
+        started = multiprocessing.Event()
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=_benchmark_reader,
+                                             args=(ring.name, samples, started, results))
+                     for _ in range(reader_count)]
+        for process in processes:
+            process.start()
+        time.sleep(0.5)
+
+        started.set()
+        begin = time.perf_counter()
+        write = ring.write
+        for row in rows:
+            write(*row)
+        elapsed = time.perf_counter() - begin
+        line = f"  {reader_count} readers: writer {samples / elapsed / 1e6:.2f} M samples/s ({elapsed / samples * 1e6:.2f} µs each)"
+
+        reports = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        if reports:
+            read = sum(report[0] for report in reports)
+            lost = sum(report[1] for report in reports)
+            reads = sum(report[2] for report in reports)
+            rate = sum(report[0] / report[3] for report in reports) / len(reports)
+            line += (f", each reader {rate / 1e6:.2f} M samples/s in {reads / len(reports):.0f} reads, "
+                     f"{lost / (read + lost):.1%} overwritten before being read")
+        print(line)
+        ring.close()
+
+    # Scanning the whole ring in place, as a viewer's time window does
+    ring = SampleRing(name=f'irrigation_bench_{os.getpid()}', capacity=capacity)
+    for row in rows[:capacity]:
+        ring.write(*row)
+    begin = time.perf_counter()
+    for _ in range(100):
+        ring.read(0, lambda views: window_stats(views, 10 ** 9))
+    elapsed = (time.perf_counter() - begin) / 100
+    print(f"  window scan over all {capacity} slots in place: {elapsed * 1e6:.0f} µs "
+          f"({capacity / elapsed / 1e6:.0f} M samples/s)")
+    ring.close()
+
+    # The alternative: one pickled copy per sample per reader process
+    for reader_count in [count for count in readers if count]:
+        queues = [multiprocessing.Queue() for _ in range(reader_count)]
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=_benchmark_queue_reader, args=(queue, queue_samples, results))
+                     for queue in queues]
+        for process in processes:
+            process.start()
+        begin = time.perf_counter()
+        for row in rows[:queue_samples]:
+            for queue in queues:
+                queue.put(row)
+        elapsed = time.perf_counter() - begin
+        reader_times = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        print(f"  {reader_count} readers via multiprocessing.Queue: writer "
+              f"{queue_samples / elapsed / 1e6:.3f} M samples/s ({elapsed / queue_samples * 1e6:.1f} µs each), "
+              f"each reader {queue_samples / max(reader_times) / 1e6:.3f} M samples/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Raw samples shared by a running dashboard")
+    parser.add_argument('--name', default=RING_NAME, help="Shared memory name of the ring")
+    parser.add_argument('--view', action='store_true', help="Plot the latest raw samples live")
+    parser.add_argument('--minutes', type=int, default=10, help="Span of the live plot")
+    parser.add_argument('--benchmark', action='store_true', help="Measure writer and reader throughput")
+    parser.add_argument('--samples', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark_ring(samples=args.samples)
+    elif args.view:
+        view_live(args.name, args.minutes)
+    else:
+        ring = SampleRing.attach(args.name)
+        samples, pump_share, pump_starts = ring.read(0, lambda views: window_stats(views, args.minutes * 60))[0]
+        print(f"📈 '{args.name}': {ring.published} samples published; last {args.minutes} min: "
+              f"{samples} samples, pump on {pump_share:.0%}, {pump_starts} pump starts")
+        ring.close()
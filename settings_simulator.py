@@ -0,0 +1,282 @@
+import os
+import time
+from datetime import datetime, timedelta
+from multiprocessing import Pool
+
+import numpy as np
+
+from irrigation_rollups import DEFAULT_SAMPLE_INTERVAL, GAP_TOLERANCE, samples_to_arrays
+
+
+# The (dry, wet, samples) boolean block one step works on is kept under
+# this many cells; longer histories are walked in time chunks
+MAX_BLOCK_CELLS = 1 << 24
+
+# Days of raw samples the dashboard replays
+REPLAY_DAYS = 30
+
+
+def replay_columns(samples, heartbeat=None):
+    """Moisture readings of the raw samples and the seconds each one held
+
+    Pump time is credited the way the rollups credit it: a fixed-rate
+    sample holds for DEFAULT_SAMPLE_INTERVAL, a change-driven one until
+    the next sample unless the gap is a disconnect. Returns (moisture,
+    seconds, recorded), recorded being the pump time and pump starts the
+    controller actually had over the same samples.
+    """
+    arrays = samples_to_arrays(samples)
+    moisture, pump = arrays['moisture'], arrays['pump']
+    if heartbeat:
+        seconds = np.diff(arrays['timestamps']).astype(np.int64) / 1e6
+        seconds[(seconds <= 0) | (seconds > heartbeat * GAP_TOLERANCE)] = 0.0
+        seconds = np.append(seconds, 0.0)
+    else:
+        seconds = np.full(len(moisture), DEFAULT_SAMPLE_INTERVAL)
+    recorded = {
+        'pump_duration': float(seconds[pump].sum()),
+        'events': int(np.count_nonzero(pump[1:] > pump[:-1]) + (pump[:1].sum() if len(pump) else 0))
+    }
+    return moisture, seconds, recorded
+
+
+def compress_runs(moisture, seconds):
+    """Merge consecutive samples with the same reading
+
+    A repeated reading hits the same threshold as the one before it, so
+    the pump state cannot change within a run. A change-driven stream
+    shrinks to its moisture changes.
+    """
+    if not len(moisture):
+        return moisture, seconds
+    starts = np.flatnonzero(np.concatenate(([True], moisture[1:] != moisture[:-1])))
+    return moisture[starts], np.add.reduceat(seconds, starts)
+
+
+def _simulate_classes(task):
+    """Pump seconds and pump starts of every (dry class, wet class) pair
+
+    codes are the readings as ranks among the distinct readings. A dry
+    class a turns the pump on at codes >= a, a wet class b off at
+    codes < b, and on wins when both apply, like the sketch's if/else.
+    Between the two thresholds the pump keeps its state, so it is on
+    exactly when the last on-trigger is no older than the last off-trigger.
+    """
+    codes, seconds, dry_classes, wet_classes = task
+    n_dry, n_wet = len(dry_classes), len(wet_classes)
+    pump = np.zeros((n_dry, n_wet))
+    events = np.zeros((n_dry, n_wet), dtype=np.int64)
+    last_on = np.full(n_dry, -1, dtype=np.int64)
+    last_off = np.full(n_wet, -1, dtype=np.int64)
+    was_on = np.zeros((n_dry, n_wet), dtype=bool)
+
+    chunk = max(1, MAX_BLOCK_CELLS // max(1, n_dry * n_wet))
+    for begin in range(0, len(codes), chunk):
+        block = codes[begin:begin + chunk]
+        index = np.arange(begin, begin + len(block))
+
+        on_marks = np.where(block >= dry_classes[:, None], index, -1)
+        on_marks[:, 0] = np.maximum(on_marks[:, 0], last_on)
+        on_marks = np.maximum.accumulate(on_marks, axis=1)
+        off_marks = np.where(block < wet_classes[:, None], index, -1)
+        off_marks[:, 0] = np.maximum(off_marks[:, 0], last_off)
+        off_marks = np.maximum.accumulate(off_marks, axis=1)
+        last_on, last_off = on_marks[:, -1], off_marks[:, -1]
+
+        on = (on_marks[:, None, :] >= off_marks[None, :, :]) & (on_marks >= 0)[:, None, :]
+        pump += on @ seconds[begin:begin + chunk]
+        events += np.count_nonzero(on[:, :, 1:] & ~on[:, :, :-1], axis=2) + (on[:, :, 0] & ~was_on)
+        was_on = on[:, :, -1]
+    return pump, events
+
+
+def simulate_grid(moisture, seconds, dry_thresholds, wet_thresholds, flow_rates, workers=1):
+    """Replay a moisture history against every combination of settings
+
+    The pump turns on at readings >= dry_threshold and off at readings
+    <= wet_threshold, holding its state in between. Returns pump seconds
+    and pump starts per (dry, wet) pair and liters per (dry, wet, flow)
+    triple. The recorded readings are replayed as they are: watering
+    more or less would have changed them, which the replay cannot know.
+
+    Thresholds only matter through the distinct readings between them,
+    so combinations that split the readings the same way are simulated
+    once; a digital sensor's 300/700 gives at most 3 x 3 classes. Water
+    is pump time times flow rate, so flow rates cost one multiplication.
+    workers > 1 splits the dry classes across a process pool.
+    """
+    dry_thresholds = np.asarray(dry_thresholds)
+    wet_thresholds = np.asarray(wet_thresholds)
+    flow_rates = np.asarray(flow_rates, dtype=np.float64)
+    moisture, seconds = compress_runs(np.asarray(moisture), np.asarray(seconds, dtype=np.float64))
+
+    values, codes = np.unique(moisture, return_inverse=True)
+    dry_classes, dry_index = np.unique(np.searchsorted(values, dry_thresholds, side='left'), return_inverse=True)
+    wet_classes, wet_index = np.unique(np.searchsorted(values, wet_thresholds, side='right'), return_inverse=True)
+
+    if workers > 1 and len(dry_classes) > 1:
+        parts = np.array_split(dry_classes, min(workers * 4, len(dry_classes)))
+        with Pool(workers) as pool:
+            results = pool.map(_simulate_classes, [(codes, seconds, part, wet_classes) for part in parts])
+        pump = np.concatenate([result[0] for result in results])
+        events = np.concatenate([result[1] for result in results])
+    else:
+        pump, events = _simulate_classes((codes, seconds, dry_classes, wet_classes))
+
+    pump = pump[np.ix_(dry_index, wet_index)]
+    return {
+        'pump_duration': pump,
+        'events': events[np.ix_(dry_index, wet_index)],
+        'water_used': pump[:, :, None] / 60.0 * flow_rates,
+        'days': float(seconds.sum()) / 86400,
+        'runs': len(codes),
+        'classes': (len(dry_classes), len(wet_classes))
+    }
+
+
+def whatif_grid(dry_threshold, wet_threshold, flow_rate, step=16, flow_steps=9, current=None):
+    """Threshold and flow axes around a candidate setting, which is always on them
+
+    Thresholds span the sensor's 0-1023 range, flow rates 0.25x to 2x
+    the candidate. current, a (dry, wet, flow) setting to compare with,
+    is put on the axes too.
+    """
+    settings = [(dry_threshold, wet_threshold, flow_rate)] + ([current] if current else [])
+    dry = np.union1d(np.arange(0, 1024, step), [setting[0] for setting in settings])
+    wet = np.union1d(np.arange(0, 1024, step), [setting[1] for setting in settings])
+    flow = np.union1d(np.round(np.linspace(0.25, 2.0, flow_steps) * flow_rate, 3),
+                      [setting[2] for setting in settings])
+    return dry, wet, flow
+
+
+def load_replay(storage, days=REPLAY_DAYS, heartbeat=None, now=None):
+    """replay_columns() over the raw samples of the last days"""
+    start = ((now or datetime.now()) - timedelta(days=days)).strftime("%Y-%m-%d") if days else None
+    return replay_columns(list(storage.iter_samples(start)), heartbeat)
+
+
+def _replay_one(moisture, seconds, dry_threshold, wet_threshold):
+    """Pump seconds and starts of one setting, a sample at a time (for checking)"""
+    pump_on, pump, events = False, 0.0, 0
+    for reading, held in zip(moisture.tolist(), seconds.tolist()):
+        if reading >= dry_threshold:
+            events += not pump_on
+            pump_on = True
+        elif reading <= wet_threshold:
+            pump_on = False
+        if pump_on:
+            pump += held
+    return pump, events
+
+
+def analog_history(samples, seed=0):
+    """Synthetic analog readings: drying drift, sensor noise, a drop when watered"""
+    rng = np.random.default_rng(seed)
+    moisture = np.empty(samples, dtype=np.int64)
+    level, pump_on = 400.0, False
+    drift = rng.normal(0.3, 0.2, samples)
+    noise = rng.normal(0, 4, samples)
+    for i in range(samples):
+        if level >= 650:
+            pump_on = True
+        elif level <= 350:
+            pump_on = False
+        level = min(1023.0, max(0.0, level + (-6.0 if pump_on else drift[i])))
+        moisture[i] = int(level + noise[i])
+    return np.clip(moisture, 0, 1023), np.full(samples, DEFAULT_SAMPLE_INTERVAL)
+
+
+def benchmark_grid(grids=((8, 8, 4), (32, 32, 8), (64, 64, 16), (128, 128, 16)),
+                   samples=43200, workers=None):
+    """Evaluation time by grid size on a day of 2 s samples
+
+    'digital' is the sketch's 300/700 sensor, 'analog' a 0-1023 reading.
+    The per-combination loop is timed on a few settings and scaled up.
+    """
+    from irrigation_simulator import generate_stream, parse_stream_samples
+
+    workers = workers or os.cpu_count()
+    stream, _ = parse_stream_samples(generate_stream(samples * DEFAULT_SAMPLE_INTERVAL / 3600))
+    digital, digital_seconds, _ = replay_columns(stream)
+    histories = {'digital': (digital, digital_seconds), 'analog': analog_history(len(digital))}
+
+    print(f"🔮 What-if grid benchmark ({len(digital)} samples, {os.cpu_count()} CPUs available)")
+    for name, (moisture, seconds) in histories.items():
+        started = time.perf_counter()
+        checks = [(dry, wet) for dry in (300, 520, 700) for wet in (300, 480, 690)]
+        expected = [_replay_one(moisture, seconds, dry, wet) for dry, wet in checks]
+        loop = (time.perf_counter() - started) / len(checks)
+        for (dry, wet), (pump, events) in zip(checks, expected):
+            result = simulate_grid(moisture, seconds, [dry], [wet], [1.0])
+            assert np.isclose(result['pump_duration'][0, 0], pump) and result['events'][0, 0] == events
+
+        for n_dry, n_wet, n_flow in grids:
+            dry = np.linspace(0, 1023, n_dry).astype(int)
+            wet = np.linspace(0, 1023, n_wet).astype(int)
+            flow = np.linspace(0.25, 2.0, n_flow)
+            timings = []
+            for pool in sorted({1, workers}):
+                started = time.perf_counter()
+                result = simulate_grid(moisture, seconds, dry, wet, flow, workers=pool)
+                timings.append(f"{pool} worker{'s' if pool > 1 else ''} {(time.perf_counter() - started) * 1000:8.1f} ms")
+            combos = n_dry * n_wet * n_flow
+            print(f"  {name:<7} {n_dry:>3}x{n_wet:>3}x{n_flow:>2} = {combos:>6} settings "
+                  f"({result['runs']} runs, {result['classes'][0]}x{result['classes'][1]} classes): "
+                  f"{', '.join(timings)}; loop ~{loop * n_dry * n_wet:8.2f} s")
+
+
+def print_whatif(result, dry, wet, flow, current, recorded):
+    """Current and best settings of a grid, per day of replayed history"""
+    days = max(result['days'], 1e-9)
+    i = np.searchsorted(dry, current[0])
+    j = np.searchsorted(wet, current[1])
+    k = np.searchsorted(flow, current[2])
+    print(f"📂 {result['days']:.1f} days replayed ({result['runs']} reading runs); recorded "
+          f"{recorded['pump_duration'] / 60 / days:.1f} pump min/day, {recorded['events'] / days:.1f} starts/day")
+    print(f"  current  dry {current[0]:>4}, wet {current[1]:>4}, flow {current[2]:.2f} L/min: "
+          f"{result['water_used'][i, j, k] / days:7.2f} L/day, {result['events'][i, j] / days:6.1f} starts/day")
+
+    # Fewest liters among the settings that still water at all
+    water = np.where(result['events'] > 0, result['water_used'][:, :, k], np.inf)
+    a, b = np.unravel_index(np.argmin(water), water.shape)
+    print(f"  least    dry {dry[a]:>4}, wet {wet[b]:>4}, flow {current[2]:.2f} L/min: "
+          f"{result['water_used'][a, b, k] / days:7.2f} L/day, {result['events'][a, b] / days:6.1f} starts/day")
+
+if __name__ == "__main__":
+    import argparse
+
+    from storage_backends import STORAGE_BACKENDS, JsonFileStorage, SQLiteStorage
+
+    parser = argparse.ArgumentParser(description="Predict water use, pump starts and pump time for other settings")
+    parser.add_argument('--storage', choices=sorted(STORAGE_BACKENDS), default='json')
+    parser.add_argument('--data-file', default='irrigation_data.json')
+    parser.add_argument('--csv-file', default='irrigation_data.csv')
+    parser.add_argument('--db-file', default='irrigation_data.db')
+    parser.add_argument('--days', type=int, default=REPLAY_DAYS, help="replay the raw samples of the last days (0 for all)")
+    parser.add_argument('--heartbeat', type=int, default=None,
+                        help="heartbeat (s) of a change-driven sketch; omit for the fixed 2 s stream")
+    parser.add_argument('--dry', type=int, default=700)
+    parser.add_argument('--wet', type=int, default=300)
+    parser.add_argument('--flow', type=float, default=1.0)
+    parser.add_argument('--step', type=int, default=16, help="threshold grid step")
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--benchmark', action='store_true', help="evaluation time by grid size")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark_grid(workers=args.workers if args.workers > 1 else None)
+    else:
+        if args.storage == 'sqlite':
+            storage = SQLiteStorage(args.db_file, import_json=None)
+        else:
+            storage = JsonFileStorage(args.data_file, args.csv_file)
+        try:
+            moisture, seconds, recorded = load_replay(storage, args.days, args.heartbeat)
+        finally:
+            storage.close()
+        if not len(moisture):
+            print("❌ No raw samples to replay")
+        else:
+            dry, wet, flow = whatif_grid(args.dry, args.wet, args.flow, args.step)
+            result = simulate_grid(moisture, seconds, dry, wet, flow, workers=args.workers)
+            print_whatif(result, dry, wet, flow, (args.dry, args.wet, args.flow), recorded)
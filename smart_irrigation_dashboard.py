@@ -3,18 +3,35 @@ import serial.tools.list_ports
 import time
 import matplotlib.pyplot as plt
 import json
-import csv
 import os
 from datetime import datetime, timedelta
-from collections import defaultdict, deque
 import threading
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import pandas as pd
-import numpy as np
+from live_server import LiveDataServer
+from mqtt_broker import LocalMqttBroker
+from output_sinks import OutputStage, build_sinks, sink_record
+from irrigation_rollups import LEVELS, IrrigationRollups, parse_zone_frame, key_in_range, samples_to_arrays
+from controller_backlog import BacklogReceiver, backlog_request
+from anomaly_detector import AnomalyDetector, AlertLog
+from storage_backends import STORAGE_BACKENDS, JsonFileStorage, SQLiteStorage
+from irrigation_stats import UsageStatistics
+from irrigation_analytics import DailyAnalytics
+from demand_forecast import DemandForecast, refit_forecasts
+from irrigation_charts import (CHART_LAYOUTS, MOISTURE_LEVELS, draw_coverage_strip, draw_water_usage, draw_moisture,
+                              draw_forecast, draw_efficiency, draw_pump_duration, draw_settings_whatif)
+from event_log import EventLog
+from activity_view import ActivityView
+from history_loader import HistoryLoader
+from settings_simulator import REPLAY_DAYS, load_replay, simulate_grid, whatif_grid
+from sample_ring import RING_NAME, SampleRing, window_stats
+from irrigation_zones import ZoneSeries
+from replication import build_sender
 
 class SmartIrrigationMonitor:
-    def __init__(self, port='COM6', baudrate=9600):
+    def __init__(self, port='COM6', baudrate=9600, live_port=8765, storage='json', log_level='INFO', sinks=None,
+                 replication=None):
         self.port = port
         self.baudrate = baudrate
         self.serial_connection = None
@@ -34,28 +51,60 @@ class SmartIrrigationMonitor:
         self.flow_rate = 1.0  # liters per minute
         
         # Historical data storage with time aggregations
-        self.minute_data = defaultdict(lambda: {
-            'water_used': 0.0, 'moisture': 0, 'events': 0, 'pump_duration': 0.0
-        })
-        self.hourly_data = defaultdict(lambda: {
-            'water_used': 0.0, 'moisture': 0, 'events': 0, 'pump_duration': 0.0
-        })
-        self.daily_data = defaultdict(lambda: {
-            'water_used': 0.0, 'moisture_avg': 0, 'events': 0, 'pump_duration': 0.0
-        })
-        self.monthly_data = defaultdict(lambda: {
-            'water_used': 0.0, 'moisture_avg': 0, 'events': 0, 'pump_duration': 0.0
-        })
-        self.yearly_data = defaultdict(lambda: {
-            'water_used': 0.0, 'moisture_avg': 0, 'events': 0, 'pump_duration': 0.0
-        })
-        
-        self.recent_activity = deque(maxlen=100)
+        self.rollups = IrrigationRollups()
+        self.minute_data = self.rollups.minute_data
+        self.hourly_data = self.rollups.hourly_data
+        self.daily_data = self.rollups.daily_data
+        self.monthly_data = self.rollups.monthly_data
+        self.yearly_data = self.rollups.yearly_data
+        
+        # Heartbeat period (s) announced by change-driven sketches, None for fixed-rate
+        self.heartbeat_interval = None
+        
+        # Offline backlog download from the controller
+        self.backlog_receiver = BacklogReceiver()
+        self.session_start_timestamp = None  # First live sample since connecting
+        
+        # Incrementally maintained statistics for the data summary
+        self.usage_stats = UsageStatistics(self.rollups)
+        # Cached columnar metrics for the analysis views
+        self.analytics = DailyAnalytics(self.rollups)
+        # Water-demand forecast, updated as each day rolls over
+        self.forecast = DemandForecast(self.rollups)
+        
+        # Leveled activity and error events, kept in rotating compressed files
+        self.event_file = 'irrigation_events.log'
+        self.event_log = EventLog(self.event_file, level=log_level)
+        self.event_log.load_recent()
+        self.event_log.start()
+        
+        # Raw samples in shared memory for viewers in other processes
+        try:
+            self.sample_ring = SampleRing(RING_NAME)
+        except FileExistsError:
+            # Another dashboard is still running; share under this process's own name
+            self.sample_ring = SampleRing(f"{RING_NAME}_{os.getpid()}")
         
         # Data files for persistence
         self.data_file = 'irrigation_data.json'
-        self.csv_file = 'irrigation_data.csv'
-        self.load_historical_data()
+        self.csv_file = 'irrigation_data.csv'  # Raw sample log of the JSON backend
+        self.db_file = 'irrigation_data.db'
+        self.recovered_file = 'irrigation_data.recovered.json'  # Written instead when the history failed to load
+        self.storage_backend = storage
+        if storage == 'sqlite':
+            self.storage = SQLiteStorage(self.db_file, import_json=self.data_file)
+        elif storage == 'json':
+            self.storage = JsonFileStorage(self.data_file, self.csv_file)
+        else:
+            raise ValueError(f"Unknown storage backend '{storage}' (choose from {', '.join(STORAGE_BACKENDS)})")
+        
+        # Extra zones of a multi-zone controller, each with its own history (zone 0 is the main series)
+        self.zone_series = {}
+        
+        # History loads in the background, today and this month first (started below)
+        self.history_loader = HistoryLoader(self.storage, self.rollups,
+                                            on_recent=self.recent_history_loaded,
+                                            on_done=self.history_loaded)
         
         # GUI setup
         self.setup_gui()
@@ -67,6 +116,26 @@ class SmartIrrigationMonitor:
         self.monitoring_thread = None
         self.monitoring_active = False
         
+        # Online anomaly and leak detection
+        self.anomaly_detector = AnomalyDetector(flow_rate=self.flow_rate)
+        self.alert_log = AlertLog()
+        
+        # Live data server for remote dashboards (started in run)
+        self.live_server = LiveDataServer(port=live_port, history_provider=self.get_history_range,
+                                          totals_provider=self.get_range_totals)
+        
+        # Output sinks for every live sample, each with its own queue and thread (started in run,
+        # after the stand-in broker an MQTT sink may publish to)
+        self.sink_specs = sinks or []
+        self.output_stage = OutputStage(build_sinks(self.sink_specs), on_error=self.sink_error)
+        broker = next((spec for spec in self.sink_specs if spec['type'] == 'mqtt' and spec.get('broker')), None)
+        self.mqtt_broker = LocalMqttBroker(broker.get('host', '127.0.0.1'), broker.get('port', 1883)) if broker else None
+        
+        # Changed history segments shipped to a central aggregator (started once the history is loaded)
+        self.replication = build_sender(replication, self.rollups, on_error=self.replication_error) if replication else None
+        
+        self.history_loader.start()
+        
     def setup_gui(self):
         """Create the irrigation dashboard with tabbed interface"""
         self.root = tk.Tk()
@@ -156,6 +225,20 @@ class SmartIrrigationMonitor:
                                  fg='white', bg='#34495e')
         self.pump_label.pack(pady=5)
         
+        # Recent samples, read from the shared sample ring
+        self.window_label = tk.Label(status_info_frame, 
+                                   text="Last 10 min: no samples",
+                                   font=('Arial', 11),
+                                   fg='#bdc3c7', bg='#34495e')
+        self.window_label.pack(pady=5)
+        
+        # Extra zones of a multi-zone controller, empty for a single zone
+        self.zones_label = tk.Label(status_info_frame, 
+                                  text="",
+                                  font=('Arial', 11),
+                                  fg='#bdc3c7', bg='#34495e', justify='left')
+        self.zones_label.pack(pady=5)
+        
         # Today's Statistics Section
         today_frame = tk.LabelFrame(self.status_frame, text="Today's Statistics", 
                                   font=('Arial', 14, 'bold'),
@@ -202,21 +285,9 @@ class SmartIrrigationMonitor:
         self.activity_frame = ttk.Frame(self.notebook)
         self.notebook.add(self.activity_frame, text="Recent Activity")
         
-        # Activity listbox with scrollbar
-        listbox_frame = tk.Frame(self.activity_frame, bg='#34495e')
-        listbox_frame.pack(fill='both', expand=True, pady=10, padx=10)
-        
-        self.activity_listbox = tk.Listbox(listbox_frame, 
-                                         font=('Arial', 10),
-                                         bg='#2c3e50', fg='white',
-                                         selectbackground='#3498db')
-        
-        scrollbar = tk.Scrollbar(listbox_frame)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        self.activity_listbox.pack(side=tk.LEFT, fill='both', expand=True)
-        
-        self.activity_listbox.config(yscrollcommand=scrollbar.set)
-        scrollbar.config(command=self.activity_listbox.yview)
+        # Virtualized event log view with level, time and text filters
+        self.activity_view = ActivityView(self.activity_frame, self.event_log)
+        self.activity_view.pack(fill='both', expand=True, pady=10, padx=10)
         
         # Clear activity button
         tk.Button(self.activity_frame, text="Clear Activity Log", 
@@ -359,7 +430,7 @@ class SmartIrrigationMonitor:
             self.add_activity(f"🔍 Found {len(available_ports)} serial ports")
         else:
             self.port_dropdown['values'] = []
-            self.add_activity("⚠️ No serial ports detected")
+            self.add_activity("⚠️ No serial ports detected", 'WARNING')
     
     def toggle_connection(self):
         """Toggle Arduino connection"""
@@ -400,6 +471,7 @@ class SmartIrrigationMonitor:
                 self.connect_btn.config(text="Disconnect")
                 
                 self.monitoring_active = True
+                self.session_start_timestamp = None
                 self.monitoring_thread = threading.Thread(target=self.monitor_arduino, daemon=True)
                 self.monitoring_thread.start()
                 
@@ -416,11 +488,11 @@ class SmartIrrigationMonitor:
                 error_msg += "\n\nTroubleshooting:\n• Verify Arduino is connected\n• Check USB cable\n• Try scanning for ports again"
             
             messagebox.showerror("Connection Error", error_msg)
-            self.add_activity(f"❌ Connection failed: {str(e)}")
+            self.add_activity(f"❌ Connection failed: {str(e)}", 'ERROR')
             
         except Exception as e:
             messagebox.showerror("Connection Error", f"Failed to connect: {str(e)}")
-            self.add_activity(f"❌ Connection error: {str(e)}")
+            self.add_activity(f"❌ Connection error: {str(e)}", 'ERROR')
     
     def disconnect_arduino(self):
         """Disconnect from Arduino"""
@@ -434,6 +506,11 @@ class SmartIrrigationMonitor:
     
     def monitor_arduino(self):
         """Monitor Arduino data in separate thread"""
+        # Samples wait in the serial buffer until today's and this month's history is in memory
+        self.history_loader.recent_loaded.wait()
+        if self.monitoring_active:
+            self.request_backlog()
+        
         while self.monitoring_active and self.is_connected:
             try:
                 if self.serial_connection and self.serial_connection.in_waiting > 0:
@@ -441,32 +518,55 @@ class SmartIrrigationMonitor:
                     self.process_arduino_data(line)
                 time.sleep(0.1)
             except Exception as e:
-                print(f"Monitoring error: {e}")
+                self.add_activity(f"❌ Monitoring error: {e}", 'ERROR')
                 self.root.after(0, self.disconnect_arduino)
                 break
     
+    def request_backlog(self):
+        """Ask the controller for samples logged while the dashboard was away"""
+        last_sample = self.rollups.last_sample
+        if last_sample:
+            last_timestamp = last_sample['timestamp']
+        elif self.minute_data:
+            last_timestamp = datetime.strptime(max(self.minute_data.keys()), "%Y-%m-%d %H:%M") + timedelta(seconds=59)
+        else:
+            last_timestamp = None
+        
+        try:
+            self.serial_connection.write(backlog_request(last_timestamp).encode())
+            self.add_activity("📥 Requested offline backlog from controller")
+        except Exception as e:
+            self.add_activity(f"❌ Backlog request error: {e}", 'ERROR')
+    
+    def ingest_backlog(self, samples):
+        """Fold a downloaded backlog into the aggregates in one batch"""
+        count, changed_buckets = self.rollups.ingest_batch(
+            heartbeat=self.backlog_receiver.interval,
+            before=self.session_start_timestamp,
+            **samples_to_arrays(samples)
+        )
+        self.storage.write_buckets(changed_buckets)
+        self.storage.append_samples(samples[:count])
+        self.add_activity(f"📥 Recovered {count} offline samples from controller")
+        self.root.after(0, self.update_data_summary)
+    
     def process_arduino_data(self, data):
         """Process incoming Arduino data"""
-        if data.startswith("IRRIGATION_DATA:"):
+        if data.startswith("BACKLOG"):
+            try:
+                samples = self.backlog_receiver.feed(data)
+                if samples is not None:
+                    self.ingest_backlog(samples)
+            except Exception as e:
+                self.add_activity(f"❌ Bad backlog data: {str(e)}", 'ERROR', line=data)
+        
+        elif data.startswith("IRRIGATION_DATA:"):
             try:
-                # Debug: show raw data
-                self.add_activity(f"🔍 Raw data: {data}")
+                self.add_activity(f"🔍 Raw data: {data}", 'DEBUG')
                 
-                data_part = data.replace("IRRIGATION_DATA:", "")
-                params = {}
-                for param in data_part.split(","):
-                    if "=" in param:
-                        key, value = param.split("=", 1)
-                        if key == "MOISTURE":
-                            params[key] = int(value)
-                        elif key == "PUMP":
-                            params[key] = bool(int(value))
-                        elif key in ["WATER_USED", "TOTAL"]:
-                            params[key] = float(value)
-                        elif key == "EVENTS":
-                            params[key] = int(value)
-                        elif key == "TIME":
-                            params[key] = value
+                # A multi-zone controller sends every zone in one frame; zone 0 is the main series
+                zones = parse_zone_frame(data)
+                params = zones[0]
                 
                 # Update current data
                 self.current_moisture = params.get("MOISTURE", 0)
@@ -475,19 +575,47 @@ class SmartIrrigationMonitor:
                 self.watering_events_today = params.get("EVENTS", 0)
                 self.total_water_used = params.get("TOTAL", 0.0)
                 self.last_timestamp = params.get("TIME", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+                self.heartbeat_interval = params.get("HEARTBEAT")
                 
-                # Debug: show parsed values
                 self.add_activity(
-                    f"📊 Parsed - Moisture: {self.current_moisture}, Pump: {self.pump_status}, Sensor should be: {'DRY' if self.current_moisture >= 700 else 'WET'}"
+                    f"📊 Parsed - Moisture: {self.current_moisture}, Pump: {self.pump_status}, Sensor should be: {'DRY' if self.current_moisture >= 700 else 'WET'}",
+                    'DEBUG'
                 )
                 
-                self.update_aggregated_data()
+                changed_buckets = self.update_aggregated_data()
+                sample = self.rollups.last_sample
+                if sample:
+                    self.sample_ring.write(sample['timestamp'].timestamp(), sample['moisture'], sample['pump'],
+                                           sample['water_used'], sample['events'])
                 self.root.after(0, self.update_gui)
+                self.check_anomalies()
+                
+                # Write through to the storage backend
+                if changed_buckets:
+                    self.storage.write_buckets(changed_buckets)
+                    self.storage.append_samples([self.rollups.last_sample])
+                
+                # Queue for the output sinks; a slow sink drops rather than holding up ingest
+                if sample:
+                    self.output_stage.publish(sink_record(sample, self.total_water_used))
+                
+                # Fan out to remote dashboards
+                self.live_server.publish('sample', {
+                    'moisture': self.current_moisture,
+                    'pump': self.pump_status,
+                    'water_used': self.total_water_used_today,
+                    'events': self.watering_events_today,
+                    'total': self.total_water_used,
+                    'time': self.last_timestamp
+                })
+                if changed_buckets:
+                    self.live_server.publish('rollup', changed_buckets)
+                
+                for zone, zone_params in enumerate(zones[1:], 1):
+                    self.update_zone(zone, zone_params)
                 
             except Exception as e:
-                print(f"Data parsing error: {e}")
-                self.add_activity(f"[ERROR] Bad data: {data}")
-                self.add_activity(f"[ERROR] Parsing error: {str(e)}")
+                self.add_activity(f"❌ Bad data: {str(e)}", 'ERROR', line=data)
     
     def update_aggregated_data(self):
         """Update all time-aggregated data"""
@@ -499,63 +627,89 @@ class SmartIrrigationMonitor:
         except:
             timestamp = datetime.now()
         
-        # Generate time keys for different aggregation levels
-        minute_key = timestamp.strftime("%Y-%m-%d %H:%M")
-        hour_key = timestamp.strftime("%Y-%m-%d %H:00")
-        day_key = timestamp.strftime("%Y-%m-%d")
-        month_key = timestamp.strftime("%Y-%m")
-        year_key = timestamp.strftime("%Y")
-        
-        # Calculate pump duration (simplified - in real implementation you'd track actual duration)
-        pump_duration = 2.0 if self.pump_status else 0.0  # 2 seconds per update when pump is on
-        
-        # Update minute data
-        self.minute_data[minute_key].update({
-            'water_used': self.total_water_used_today,
-            'moisture': self.current_moisture,
-            'events': self.watering_events_today,
-            'pump_duration': self.minute_data[minute_key]['pump_duration'] + pump_duration
-        })
-        
-        # Update hourly data
-        self.hourly_data[hour_key].update({
-            'water_used': self.total_water_used_today,
-            'moisture': self.current_moisture,
-            'events': self.watering_events_today,
-            'pump_duration': self.hourly_data[hour_key]['pump_duration'] + pump_duration
-        })
-        
-        # Update daily data
-        self.daily_data[day_key].update({
-            'water_used': self.total_water_used_today,
-            'moisture_avg': self.current_moisture,
-            'events': self.watering_events_today,
-            'pump_duration': self.daily_data[day_key]['pump_duration'] + pump_duration
-        })
-        
-        # Update monthly data (aggregate from daily)
-        month_water = sum(day_data['water_used'] for day_key, day_data in self.daily_data.items() 
-                         if day_key.startswith(month_key))
-        month_events = sum(day_data['events'] for day_key, day_data in self.daily_data.items() 
-                          if day_key.startswith(month_key))
-        
-        self.monthly_data[month_key].update({
-            'water_used': month_water,
-            'events': month_events,
-            'pump_duration': self.monthly_data[month_key]['pump_duration'] + pump_duration
-        })
-        
-        # Update yearly data (aggregate from monthly)
-        year_water = sum(month_data['water_used'] for month_key, month_data in self.monthly_data.items() 
-                        if month_key.startswith(year_key))
-        year_events = sum(month_data['events'] for month_key, month_data in self.monthly_data.items() 
-                         if month_key.startswith(year_key))
-        
-        self.yearly_data[year_key].update({
-            'water_used': year_water,
-            'events': year_events,
-            'pump_duration': self.yearly_data[year_key]['pump_duration'] + pump_duration
-        })
+        if self.session_start_timestamp is None:
+            self.session_start_timestamp = timestamp
+        
+        return self.rollups.add_sample(
+            timestamp,
+            self.current_moisture,
+            self.pump_status,
+            self.total_water_used_today,
+            self.watering_events_today,
+            heartbeat=self.heartbeat_interval
+        )
+    
+    def update_zone(self, zone, params):
+        """Add one extra zone's values from a multi-zone frame to that zone's own series"""
+        series = self.zone_series.get(zone)
+        if series is None:
+            series = ZoneSeries(zone, self.zone_storage(zone), on_done=lambda error: self.zone_loaded(zone, error))
+            self.zone_series[zone] = series
+            self.add_activity(f"🌱 Zone {zone} reporting, loading its stored history")
+            series.start()
+        series.add(params)
+    
+    def zone_loaded(self, zone, error):
+        """Called from a zone's history loader once its history is in memory"""
+        if error:
+            self.add_activity(f"❌ Error loading zone {zone} data: {error}", 'ERROR')
+        else:
+            loader = self.zone_series[zone].loader
+            self.add_activity(f"📂 Zone {zone}: loaded {loader.buckets} history records in {loader.timings['done']:.1f}s")
+    
+    def zone_storage(self, zone):
+        """Storage for an extra zone, next to the main files (irrigation_data_zone1.json, ...)"""
+        suffix = f"_zone{zone}"
+        data_file = self.data_file.replace('.json', f'{suffix}.json')
+        if self.storage_backend == 'sqlite':
+            return SQLiteStorage(self.db_file.replace('.db', f'{suffix}.db'), import_json=data_file)
+        return JsonFileStorage(data_file, self.csv_file.replace('.csv', f'{suffix}.csv'))
+    
+    def check_anomalies(self):
+        """Run the latest sample through the anomaly detector and raise alerts"""
+        sample = self.rollups.last_sample
+        if not sample:
+            return
+        
+        alerts = self.anomaly_detector.observe(
+            sample['timestamp'], sample['moisture'], sample['pump'],
+            sample['water_used'], sample['events']
+        )
+        for alert in alerts:
+            self.add_activity(f"🚨 {alert['message']}", alert['severity'].upper(), alert=alert['kind'])
+            self.alert_log.write(alert)
+            self.live_server.publish('alert', alert)
+    
+    def get_history_range(self, level, start=None, end=None):
+        """Return sorted [key, bucket] pairs of one aggregation level within [start, end]"""
+        data_dict = self.rollups.levels()
+        if level not in data_dict:
+            raise KeyError(f"Unknown aggregation level: {level}")
+        
+        if self.storage.range_reads:
+            return self.storage.read_range(level, start, end)
+        
+        self.history_loader.wait(level, start)
+        return [[key, dict(bucket)] for key, bucket in sorted(dict(data_dict[level]).items())
+                if key_in_range(key, start, end)]
+    
+    def get_range_totals(self, level, start=None, end=None):
+        """Sum water, events and pump time of one aggregation level within [start, end]"""
+        if level not in self.rollups.levels():
+            raise KeyError(f"Unknown aggregation level: {level}")
+        self.history_loader.wait(level, start)
+        return self.rollups.range_total(level, start, end)
+    
+    def period_totals(self):
+        """Day totals over the last 7 and 30 days, this year and all time"""
+        today = datetime.now()
+        starts = {
+            'last_7_days': (today - timedelta(days=6)).strftime("%Y-%m-%d"),
+            'last_30_days': (today - timedelta(days=29)).strftime("%Y-%m-%d"),
+            'this_year': today.strftime("%Y"),
+            'all_time': None
+        }
+        return {period: self.rollups.range_total('day', start) for period, start in starts.items()}
     
     def update_gui(self):
         """Update GUI elements with current data"""
@@ -587,250 +741,119 @@ class SmartIrrigationMonitor:
         self.water_used_label.config(text=f"Water Used: {self.total_water_used_today:.2f} L")
         self.events_label.config(text=f"Watering Events: {self.watering_events_today}")
         self.total_label.config(text=f"Lifetime Total: {self.total_water_used:.2f} L")
+        
+        samples, pump_share, starts = self.sample_ring.read(0, lambda views: window_stats(views, 600))[0]
+        if samples:
+            self.window_label.config(text=f"Last 10 min: {samples} samples, pump on {pump_share:.0%}, {starts} pump starts")
+        
+        zones = sorted(self.zone_series.items())
+        if zones:
+            self.zones_label.config(text="\n".join(
+                f"Zone {zone}: {series.params.get('MOISTURE', 0)}, pump {'🟢' if series.params.get('PUMP') else '🔴'}, "
+                f"{series.params.get('WATER_USED', 0.0):.2f} L today"
+                for zone, series in zones
+            ))
     
-    def add_activity(self, message):
-        """Add activity to the recent activity list"""
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        activity = f"[{timestamp}] {message}"
-        self.recent_activity.append(activity)
-        self.root.after(0, self.update_activity_listbox)
-    
-    def update_activity_listbox(self):
-        """Update the activity listbox"""
-        self.activity_listbox.delete(0, tk.END)
-        for activity in reversed(list(self.recent_activity)):
-            self.activity_listbox.insert(0, activity)
+    def add_activity(self, message, level='INFO', **fields):
+        """Log an event; the Recent Activity view picks it up on its next poll"""
+        self.event_log.log(level, message, **fields)
     
     def clear_activity(self):
-        """Clear activity log"""
-        self.recent_activity.clear()
-        self.update_activity_listbox()
+        """Clear the activity view; earlier events stay in the log files"""
+        self.activity_view.clear()
+    
+    def history_ready(self, levels, retry, *args):
+        """True if levels are fully loaded; otherwise retry(*args) once they are"""
+        missing = [level for level in levels if not self.history_loader.covers(level)]
+        if not missing:
+            return True
+        if self.history_loader.error:
+            self.add_activity(f"⚠️ Showing partial {', '.join(missing)} history; loading it failed", 'WARNING')
+            return True
+        self.add_activity(f"⏳ Waiting for older {', '.join(missing)} history to load")
+        self.history_loader.notify(missing, lambda: self.root.after(0, retry, *args))
+        return False
     
     def show_water_usage_graph(self, period):
         """Show water usage graph for specified period"""
-        data_dict = {
-            'minute': self.minute_data,
-            'hour': self.hourly_data,
-            'day': self.daily_data,
-            'month': self.monthly_data,
-            'year': self.yearly_data
-        }
+        if not self.storage.range_reads and not self.history_ready([period], self.show_water_usage_graph, period):
+            return
         
-        data = data_dict.get(period, {})
+        data = self.get_history_range(period)
         if not data:
             messagebox.showinfo("No Data", f"No {period}ly data available to display")
             return
         
-        periods = sorted(data.keys())
-        water_used = [data[period_key]['water_used'] for period_key in periods]
-        events = [data[period_key]['events'] for period_key in periods]
-        
-        fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(14, 10))
-        
-        # Water usage graph
-        ax1.bar(periods, water_used, color='#3498db', alpha=0.7, edgecolor='#2980b9')
-        ax1.set_title(f'{period.title()}ly Water Usage', fontsize=16, fontweight='bold', pad=20)
-        ax1.set_ylabel('Water Used (Liters)', fontsize=12)
-        ax1.grid(True, alpha=0.3)
-        ax1.tick_params(axis='x', rotation=45)
-        
-        # Add value labels on bars
-        for i, v in enumerate(water_used):
-            if v > 0:
-                ax1.text(i, v + max(water_used) * 0.01, f'{v:.1f}L', 
-                        ha='center', va='bottom', fontweight='bold')
-        
-        # Events graph
-        ax2.bar(periods, events, color='#2ecc71', alpha=0.7, edgecolor='#27ae60')
-        ax2.set_title(f'{period.title()}ly Watering Events', fontsize=16, fontweight='bold', pad=20)
-        ax2.set_ylabel('Number of Events', fontsize=12)
-        ax2.set_xlabel('Time Period', fontsize=12)
-        ax2.grid(True, alpha=0.3)
-        ax2.tick_params(axis='x', rotation=45)
-        
-        # Add value labels on bars
-        for i, v in enumerate(events):
-            if v > 0:
-                ax2.text(i, v + max(events) * 0.01, str(v), 
-                        ha='center', va='bottom', fontweight='bold')
-        
+        periods = [period_key for period_key, _ in data]
+        water_used = [bucket['water_used'] for _, bucket in data]
+        events = [bucket['events'] for _, bucket in data]
+        
+        figsize, (rows, cols) = CHART_LAYOUTS['water']
+        fig, axes = plt.subplots(rows, cols, figsize=figsize)
+        draw_water_usage(axes, period, periods, water_used, events)
+        forecast = self.forecast.forecast() if period == 'day' else None
+        if forecast:
+            draw_forecast(axes[0], forecast, len(periods))
+        draw_coverage_strip(axes[0], self.rollups.coverage_index().bucket_coverage(periods, period))
         plt.tight_layout()
         plt.show()
     
     def show_moisture_graph(self, period):
         """Show moisture graph for specified period"""
-        data_dict = {
-            'minute': self.minute_data,
-            'hour': self.hourly_data,
-            'day': self.daily_data
-        }
+        if (period in MOISTURE_LEVELS and not self.storage.range_reads
+                and not self.history_ready([period], self.show_moisture_graph, period)):
+            return
         
-        data = data_dict.get(period, {})
+        data = self.get_history_range(period) if period in MOISTURE_LEVELS else []
         if not data:
             messagebox.showinfo("No Data", f"No {period}ly moisture data available")
             return
         
-        periods = sorted(data.keys())
+        periods = [period_key for period_key, _ in data]
         moisture_key = 'moisture' if period in ['minute', 'hour'] else 'moisture_avg'
-        moisture = [data[period_key][moisture_key] for period_key in periods]
-        
-        plt.figure(figsize=(14, 8))
-        
-        # Plot moisture levels
-        plt.plot(periods, moisture, marker='o', color='#9b59b6', 
-                label='Moisture Level', linewidth=2, markersize=6)
-        
-        # Add threshold lines
-        plt.axhline(y=self.dry_threshold, color='red', linestyle='--', linewidth=2,
-                   label=f'Dry Threshold ({self.dry_threshold})')
-        plt.axhline(y=self.wet_threshold, color='green', linestyle='--', linewidth=2,
-                   label=f'Wet Threshold ({self.wet_threshold})')
-        
-        plt.title(f'{period.title()}ly Soil Moisture History', fontsize=16, fontweight='bold', pad=20)
-        plt.xlabel('Time Period', fontsize=12)
-        plt.ylabel('Moisture Level', fontsize=12)
-        plt.legend(fontsize=11)
-        plt.grid(True, alpha=0.3)
-        plt.xticks(rotation=45)
+        moisture = [bucket[moisture_key] for _, bucket in data]
+        
+        coverage = self.rollups.coverage_index()
+        fig, ax = plt.subplots(figsize=CHART_LAYOUTS['moisture'][0])
+        draw_moisture(ax, period, periods, moisture, self.dry_threshold, self.wet_threshold,
+                      gaps=coverage.bucket_gaps(periods, period))
+        draw_coverage_strip(ax, coverage.bucket_coverage(periods, period))
         plt.tight_layout()
         plt.show()
     
     def show_efficiency_analysis(self):
         """Show irrigation efficiency analysis"""
+        if not self.history_ready(['day'], self.show_efficiency_analysis):
+            return
         if not self.daily_data:
             messagebox.showinfo("No Data", "No daily data available for analysis")
             return
         
-        # Calculate efficiency metrics
-        dates = sorted(self.daily_data.keys())
-        water_per_event = []
-        efficiency_scores = []
-        
-        for date in dates:
-            data = self.daily_data[date]
-            events = data['events']
-            water = data['water_used']
-            
-            if events > 0:
-                wpe = water / events
-                water_per_event.append(wpe)
-                
-                # Simple efficiency score (lower water per event = higher efficiency)
-                # Normalize between 0-100
-                max_wpe = 10.0  # Assume max 10L per event for normalization
-                efficiency = max(0, 100 - (wpe / max_wpe * 100))
-                efficiency_scores.append(efficiency)
-            else:
-                water_per_event.append(0)
-                efficiency_scores.append(100)  # No watering needed = 100% efficient
-        
-        fig, (ax1, ax2, ax3) = plt.subplots(3, 1, figsize=(14, 12))
-        
-        # Water per event
-        ax1.plot(dates, water_per_event, marker='s', color='#e74c3c', 
-                linewidth=2, markersize=6, label='Water per Event')
-        ax1.set_title('Water Usage per Watering Event', fontsize=14, fontweight='bold')
-        ax1.set_ylabel('Liters per Event')
-        ax1.grid(True, alpha=0.3)
-        ax1.legend()
-        
-        # Efficiency scores
-        ax2.bar(dates, efficiency_scores, color='#27ae60', alpha=0.7)
-        ax2.set_title('Daily Irrigation Efficiency Score', fontsize=14, fontweight='bold')
-        ax2.set_ylabel('Efficiency Score (%)')
-        ax2.grid(True, alpha=0.3)
-        
-        # Cumulative water usage
-        cumulative_water = []
-        total = 0
-        for date in dates:
-            total += self.daily_data[date]['water_used']
-            cumulative_water.append(total)
-        
-        ax3.plot(dates, cumulative_water, marker='o', color='#3498db', 
-                linewidth=3, markersize=6, label='Cumulative Water Usage')
-        ax3.fill_between(dates, cumulative_water, alpha=0.3, color='#3498db')
-        ax3.set_title('Cumulative Water Usage Over Time', fontsize=14, fontweight='bold')
-        ax3.set_ylabel('Total Liters')
-        ax3.set_xlabel('Date')
-        ax3.grid(True, alpha=0.3)
-        ax3.legend()
-        
-        for ax in [ax1, ax2, ax3]:
-            ax.tick_params(axis='x', rotation=45)
-        
+        figsize, (rows, cols) = CHART_LAYOUTS['efficiency']
+        fig, axes = plt.subplots(rows, cols, figsize=figsize)
+        draw_efficiency(axes, self.analytics.efficiency_metrics())
         plt.tight_layout()
         plt.show()
     
     def show_pump_duration_analysis(self):
         """Show pump duration analysis"""
+        if not self.history_ready(['day'], self.show_pump_duration_analysis):
+            return
         if not self.daily_data:
             messagebox.showinfo("No Data", "No daily data available for analysis")
             return
         
-        dates = sorted(self.daily_data.keys())
-        pump_durations = [self.daily_data[date]['pump_duration'] / 60.0 for date in dates]  # Convert to minutes
-        water_used = [self.daily_data[date]['water_used'] for date in dates]
-        events = [self.daily_data[date]['events'] for date in dates]
-        
-        fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(16, 10))
-        
-        # Daily pump duration
-        ax1.bar(dates, pump_durations, color='#8e44ad', alpha=0.7)
-        ax1.set_title('Daily Pump Duration', fontsize=12, fontweight='bold')
-        ax1.set_ylabel('Duration (minutes)')
-        ax1.grid(True, alpha=0.3)
-        ax1.tick_params(axis='x', rotation=45)
-        
-        # Pump duration vs Water used
-        ax2.scatter(pump_durations, water_used, color='#e67e22', s=60, alpha=0.7)
-        ax2.set_title('Pump Duration vs Water Used', fontsize=12, fontweight='bold')
-        ax2.set_xlabel('Pump Duration (minutes)')
-        ax2.set_ylabel('Water Used (Liters)')
-        ax2.grid(True, alpha=0.3)
-        
-        # Add trend line
-        if len(pump_durations) > 1:
-            z = np.polyfit(pump_durations, water_used, 1)
-            p = np.poly1d(z)
-            ax2.plot(pump_durations, p(pump_durations), "r--", alpha=0.8)
-        
-        # Average duration per event
-        avg_duration_per_event = []
-        for i, date in enumerate(dates):
-            if events[i] > 0:
-                avg_duration_per_event.append(pump_durations[i] / events[i])
-            else:
-                avg_duration_per_event.append(0)
-        
-        ax3.plot(dates, avg_duration_per_event, marker='d', color='#16a085', 
-                linewidth=2, markersize=6)
-        ax3.set_title('Average Duration per Watering Event', fontsize=12, fontweight='bold')
-        ax3.set_ylabel('Minutes per Event')
-        ax3.grid(True, alpha=0.3)
-        ax3.tick_params(axis='x', rotation=45)
-        
-        # Pump efficiency (water/time)
-        efficiency = []
-        for i in range(len(dates)):
-            if pump_durations[i] > 0:
-                eff = water_used[i] / pump_durations[i]  # Liters per minute
-                efficiency.append(eff)
-            else:
-                efficiency.append(0)
-        
-        ax4.bar(dates, efficiency, color='#f39c12', alpha=0.7)
-        ax4.set_title('Pump Efficiency (L/min)', fontsize=12, fontweight='bold')
-        ax4.set_ylabel('Liters per Minute')
-        ax4.set_xlabel('Date')
-        ax4.grid(True, alpha=0.3)
-        ax4.tick_params(axis='x', rotation=45)
-        
+        figsize, (rows, cols) = CHART_LAYOUTS['pump']
+        fig, axes = plt.subplots(rows, cols, figsize=figsize)
+        draw_pump_duration(axes, self.analytics.pump_metrics())
         plt.tight_layout()
         plt.show()
     
     def export_json_data(self):
         """Export all data to JSON file"""
+        if not self.history_ready(LEVELS, self.export_json_data):
+            return
+        
         data = {
             'minute_data': dict(self.minute_data),
             'hourly_data': dict(self.hourly_data),
@@ -845,6 +868,7 @@ class SmartIrrigationMonitor:
                 'total_water_used': self.total_water_used,
                 'last_timestamp': self.last_timestamp
             },
+            'totals': self.period_totals(),
             'settings': {
                 'dry_threshold': self.dry_threshold,
                 'wet_threshold': self.wet_threshold,
@@ -870,6 +894,9 @@ class SmartIrrigationMonitor:
     
     def export_csv_data(self):
         """Export data to CSV files"""
+        if not self.history_ready(['hour', 'day', 'month'], self.export_csv_data):
+            return
+        
         try:
             # Ask user to select directory
             directory = filedialog.askdirectory(title="Select Directory for CSV Export")
@@ -946,6 +973,13 @@ class SmartIrrigationMonitor:
             summary.append(f"Last Update: {self.last_timestamp}")
         summary.append("")
         
+        # Extra zones of a multi-zone controller
+        zones = sorted(self.zone_series.items())
+        if zones:
+            summary.append("--- ZONES ---")
+            summary.extend(series.status_line() for _, series in zones)
+            summary.append("")
+        
         # Data availability
         summary.append("--- DATA AVAILABILITY ---")
         summary.append(f"Minute Records: {len(self.minute_data)}")
@@ -953,23 +987,61 @@ class SmartIrrigationMonitor:
         summary.append(f"Daily Records: {len(self.daily_data)}")
         summary.append(f"Monthly Records: {len(self.monthly_data)}")
         summary.append(f"Yearly Records: {len(self.yearly_data)}")
+        state = "failed to load" if self.history_loader.error else "loading"
+        for level, oldest in self.history_loader.pending():
+            summary.append(f"({state} {level} records before {oldest})" if oldest else f"({state} {level} records)")
+        if self.minute_data:
+            summary.extend(self.coverage_lines())
         summary.append("")
         
         # Recent daily statistics
         if self.daily_data:
             summary.append("--- RECENT DAILY STATISTICS ---")
-            recent_days = sorted(self.daily_data.keys())[-7:]  # Last 7 days
-            for day in recent_days:
-                data = self.daily_data[day]
-                summary.append(f"{day}: {data['water_used']:.1f}L, {data['events']} events")
+            summary.extend(self.usage_stats.recent_daily_lines())  # Last 7 days
             summary.append("")
         
         # Monthly totals
         if self.monthly_data:
             summary.append("--- MONTHLY TOTALS ---")
-            for month in sorted(self.monthly_data.keys()):
-                data = self.monthly_data[month]
-                summary.append(f"{month}: {data['water_used']:.1f}L total, {data['events']} events")
+            summary.extend(self.usage_stats.monthly_lines())
+            summary.append("")
+        
+        # Range totals from the day index
+        if self.daily_data:
+            summary.append("--- TOTALS ---")
+            for period, totals in self.period_totals().items():
+                summary.append(f"{period.replace('_', ' ').capitalize()}: {totals['water_used']:.1f}L, "
+                               f"{totals['events']} events, {totals['pump_duration'] / 3600.0:.1f}h pumping")
+            summary.append("")
+        
+        # Expected water per zone; zones reloaded since the last summary are refitted together
+        if self.daily_data and self.history_loader.loaded.is_set():
+            summary.append("--- WATER FORECAST ---")
+            forecasts = [("Zone 0" if zones else None, self.forecast)]
+            forecasts.extend((f"Zone {zone}", series.forecast) for zone, series in zones)
+            refit_forecasts([forecast for _, forecast in forecasts if forecast.stale])
+            for label, forecast in forecasts:
+                summary.extend(forecast.summary_lines(label))
+            summary.append("")
+        
+        # Output sinks
+        if self.output_stage.sinks:
+            summary.append("--- OUTPUT SINKS ---")
+            for stats in self.output_stage.stats():
+                line = (f"{stats['name']}: {stats['written']} written, {stats['dropped']} dropped, "
+                        f"{stats['queued']} queued, {stats['rate']:.1f}/s, lag {stats['last_lag']:.1f}s")
+                summary.append(line + (f" (failing: {stats['last_error']})" if stats['last_error'] else ""))
+            summary.append("")
+        
+        # Central replication
+        if self.replication:
+            stats = self.replication.stats()
+            summary.append("--- REPLICATION ---")
+            last_sync = (datetime.fromtimestamp(stats['last_sync']).strftime('%H:%M:%S')
+                         if stats['last_sync'] else 'not yet')
+            line = (f"{stats['site']}: {stats['segments']} segments, {stats['segments_sent']} sent "
+                    f"({stats['bytes_sent'] / 1024:.0f} kB), last sync {last_sync}")
+            summary.append(line + (f" (failing: {stats['last_error']})" if stats['last_error'] else ""))
             summary.append("")
         
         # System settings
@@ -979,20 +1051,66 @@ class SmartIrrigationMonitor:
         summary.append(f"Flow Rate: {self.flow_rate} L/min")
         summary.append("")
         
-        # Calculate some statistics
-        if self.daily_data:
-            daily_values = [data['water_used'] for data in self.daily_data.values() if data['water_used'] > 0]
-            if daily_values:
-                summary.append("--- USAGE STATISTICS ---")
-                summary.append(f"Average Daily Usage: {np.mean(daily_values):.2f} L")
-                summary.append(f"Maximum Daily Usage: {max(daily_values):.2f} L")
-                summary.append(f"Minimum Daily Usage: {min(daily_values):.2f} L")
-                summary.append(f"Total Days with Usage: {len(daily_values)}")
+        # Usage statistics kept up to date on every sample
+        summary.extend(self.usage_stats.usage_lines())
         
         # Update the text widget
         self.summary_text.delete(1.0, tk.END)
         self.summary_text.insert(tk.END, "\n".join(summary))
     
+    def coverage_lines(self):
+        """Data summary lines on the time the history covers and the holes in the last week"""
+        coverage = self.rollups.coverage_index()
+        now = datetime.now().replace(second=0, microsecond=0)
+        week_start = now - timedelta(days=7)
+        lines = [f"Coverage: {coverage.coverage(now - timedelta(days=1), now):.1%} of the last 24 hours, "
+                 f"{coverage.coverage(week_start, now):.1%} of the last 7 days"]
+        
+        gaps = coverage.gaps(week_start, now, min_minutes=5)
+        if gaps:
+            start, end = max(gaps, key=lambda gap: gap[1] - gap[0])
+            minutes = int((end - start).total_seconds() // 60)
+            lines.append(f"Gaps of 5+ min in the last 7 days: {len(gaps)} (longest {minutes // 60}h {minutes % 60:02d}m "
+                         f"from {start.strftime('%Y-%m-%d %H:%M')})")
+        
+        days = [(now - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(7, 0, -1)]  # Before today
+        partial = [(day, share) for day, share in zip(days, coverage.bucket_coverage(days, 'day').tolist())
+                   if day in self.daily_data and share < 0.99]
+        if partial:
+            lines.append("Incomplete days (totals and averages miss the gaps): " +
+                         ", ".join(f"{day} {share:.0%}" for day, share in partial))
+        return lines
+    
+    def show_settings_whatif(self, candidate):
+        """Heat maps of the water use and pump starts recent samples predict around candidate settings"""
+        current = (self.dry_threshold, self.wet_threshold, self.flow_rate)
+        self.add_activity(f"🔮 Replaying the last {REPLAY_DAYS} days against dry {candidate[0]}, "
+                          f"wet {candidate[1]}, flow {candidate[2]:.2f} L/min")
+
+        def show(result, dry, wet, flow):
+            figsize, (rows, cols) = CHART_LAYOUTS['whatif']
+            fig, axes = plt.subplots(rows, cols, figsize=figsize)
+            draw_settings_whatif(axes, result, dry, wet, flow, current, candidate)
+            fig.suptitle(f"What-if over {result['days']:.1f} days of recorded moisture "
+                         f"({dry.size * wet.size * flow.size} settings)", fontsize=14, fontweight='bold')
+            plt.tight_layout()
+            plt.show()
+
+        def run():
+            # Reading the raw samples can take seconds; keep it off the GUI thread
+            try:
+                moisture, seconds, _ = load_replay(self.storage, REPLAY_DAYS, self.heartbeat_interval)
+                if not len(moisture):
+                    self.root.after(0, messagebox.showinfo, "No Data", "No raw samples to replay yet")
+                    return
+                dry, wet, flow = whatif_grid(*candidate, current=current)
+                result = simulate_grid(moisture, seconds, dry, wet, flow)
+                self.root.after(0, show, result, dry, wet, flow)
+            except Exception as e:
+                self.add_activity(f"❌ What-if error: {str(e)}", 'ERROR')
+
+        threading.Thread(target=run, daemon=True).start()
+
     def show_settings(self):
         """Show settings dialog"""
         settings_window = tk.Toplevel(self.root)
@@ -1049,6 +1167,7 @@ class SmartIrrigationMonitor:
                 self.dry_threshold = int(dry_spin.get())
                 self.wet_threshold = int(wet_spin.get())
                 self.flow_rate = float(flow_spin.get())
+                self.anomaly_detector.flow_rate = self.flow_rate
                 self.port = port_entry.get()
                 
                 if self.is_connected:
@@ -1065,6 +1184,14 @@ class SmartIrrigationMonitor:
             except Exception as e:
                 messagebox.showerror("Error", f"Invalid settings: {str(e)}")
         
+        def preview_settings():
+            try:
+                candidate = (int(dry_spin.get()), int(wet_spin.get()), float(flow_spin.get()))
+            except ValueError as e:
+                messagebox.showerror("Error", f"Invalid settings: {str(e)}")
+                return
+            self.show_settings_whatif(candidate)
+        
         # Buttons frame
         button_frame = tk.Frame(main_frame, bg='#34495e')
         button_frame.pack(pady=20)
@@ -1072,6 +1199,9 @@ class SmartIrrigationMonitor:
         tk.Button(button_frame, text="Save Settings", command=save_settings,
                  bg='#27ae60', fg='white', font=('Arial', 12)).pack(side=tk.LEFT, padx=5)
         
+        tk.Button(button_frame, text="🔮 What-if", command=preview_settings,
+                 bg='#8e44ad', fg='white', font=('Arial', 12)).pack(side=tk.LEFT, padx=5)
+        
         tk.Button(button_frame, text="Cancel", command=settings_window.destroy,
                  bg='#e74c3c', fg='white', font=('Arial', 12)).pack(side=tk.LEFT, padx=5)
     
@@ -1088,71 +1218,89 @@ class SmartIrrigationMonitor:
         self.add_activity("🔄 Dashboard refreshed")
     
     def save_historical_data(self):
-        """Save historical data to file"""
-        data = {
-            'minute_data': dict(self.minute_data),
-            'hourly_data': dict(self.hourly_data),
-            'daily_data': dict(self.daily_data),
-            'monthly_data': dict(self.monthly_data),
-            'yearly_data': dict(self.yearly_data),
-            'settings': {
-                'dry_threshold': self.dry_threshold,
-                'wet_threshold': self.wet_threshold,
-                'flow_rate': self.flow_rate,
-                'port': self.port
-            },
-            'last_updated': datetime.now().isoformat()
+        """Save historical data through the storage backend"""
+        settings = {
+            'dry_threshold': self.dry_threshold,
+            'wet_threshold': self.wet_threshold,
+            'flow_rate': self.flow_rate,
+            'port': self.port
         }
         
         try:
-            with open(self.data_file, 'w') as f:
-                json.dump(data, f, indent=2, default=str)
+            if self.history_loader.error:
+                # Only part of the history is in memory; rewriting the store would drop the rest
+                self.storage.flush()
+                JsonFileStorage(data_file=self.recovered_file).save(self.rollups.levels(), settings)
+                self.add_activity(f"⚠️ History failed to load; kept the stored history and saved this "
+                                  f"session's data to {self.recovered_file}", 'WARNING')
+            else:
+                self.storage.save(self.rollups.levels(), settings)
+            for zone, series in sorted(self.zone_series.items()):
+                if not series.save(settings):
+                    self.add_activity(f"⚠️ Zone {zone} history failed to load; kept its stored history", 'WARNING')
         except Exception as e:
-            print(f"Error saving data: {e}")
+            self.add_activity(f"❌ Error saving data: {e}", 'ERROR')
     
     def load_historical_data(self):
-        """Load historical data from file"""
+        """Reload all historical data from the storage backend in one go"""
         try:
-            if os.path.exists(self.data_file):
-                with open(self.data_file, 'r') as f:
-                    data = json.load(f)
-                    
-                    # Load all data levels
-                    self.minute_data = defaultdict(lambda: {
-                        'water_used': 0.0, 'moisture': 0, 'events': 0, 'pump_duration': 0.0
-                    })
-                    self.minute_data.update(data.get('minute_data', {}))
-                    
-                    self.hourly_data = defaultdict(lambda: {
-                        'water_used': 0.0, 'moisture': 0, 'events': 0, 'pump_duration': 0.0
-                    })
-                    self.hourly_data.update(data.get('hourly_data', {}))
-                    
-                    self.daily_data = defaultdict(lambda: {
-                        'water_used': 0.0, 'moisture_avg': 0, 'events': 0, 'pump_duration': 0.0
-                    })
-                    self.daily_data.update(data.get('daily_data', {}))
-                    
-                    self.monthly_data = defaultdict(lambda: {
-                        'water_used': 0.0, 'moisture_avg': 0, 'events': 0, 'pump_duration': 0.0
-                    })
-                    self.monthly_data.update(data.get('monthly_data', {}))
-                    
-                    self.yearly_data = defaultdict(lambda: {
-                        'water_used': 0.0, 'moisture_avg': 0, 'events': 0, 'pump_duration': 0.0
-                    })
-                    self.yearly_data.update(data.get('yearly_data', {}))
-                    
-                    # Load settings
-                    settings = data.get('settings', {})
-                    self.dry_threshold = settings.get('dry_threshold', 400)
-                    self.wet_threshold = settings.get('wet_threshold', 200)
-                    self.flow_rate = settings.get('flow_rate', 1.0)
-                    if 'port' in settings:
-                        self.port = settings['port']
-                        
+            data = self.storage.load()
+            
+            # Load all data levels in place so the monitor's references stay valid
+            self.rollups.load_levels(data)
+            
+            settings = data.get('settings', {})
+            self.apply_settings(settings)
+            if 'port' in settings:
+                self.port = settings['port']
+                
         except Exception as e:
-            print(f"Error loading data: {e}")
+            self.add_activity(f"❌ Error loading data: {e}", 'ERROR')
+    
+    def apply_settings(self, settings):
+        """Apply stored thresholds and flow rate"""
+        self.dry_threshold = settings.get('dry_threshold', 400)
+        self.wet_threshold = settings.get('wet_threshold', 200)
+        self.flow_rate = settings.get('flow_rate', 1.0)
+        self.anomaly_detector.flow_rate = self.flow_rate
+    
+    def recent_history_loaded(self, settings):
+        """Called from the history loader once today's and this month's data is in memory"""
+        self.apply_settings(settings)
+        self.root.after(0, self.restore_port, settings.get('port'))
+        self.root.after(0, self.update_data_summary)
+    
+    def history_loaded(self, error):
+        """Called from the history loader once all of the history is in memory"""
+        loader = self.history_loader
+        if error:
+            self.add_activity(f"❌ Error loading data: {error}", 'ERROR')
+        else:
+            self.add_activity(f"📂 Loaded {loader.buckets} history records in {loader.timings['done']:.1f}s")
+            # Only a complete history is replicated; a partial one would replace the central's days
+            if self.replication:
+                self.replication.start()
+        self.root.after(0, self.update_data_summary)
+    
+    def sink_error(self, sink, error):
+        """Called from a sink's thread when its writes start or stop failing"""
+        if error is None:
+            self.add_activity(f"✅ Output sink '{sink.name}' is writing again")
+        else:
+            self.add_activity(f"⚠️ Output sink '{sink.name}' failing, retrying: {str(error)}", 'WARNING')
+    
+    def replication_error(self, sender, error):
+        """Called from the replication thread when syncs start or stop failing"""
+        if error is None:
+            self.add_activity(f"✅ Replication of '{sender.site}' is syncing again")
+        else:
+            self.add_activity(f"⚠️ Replication of '{sender.site}' failing, retrying: {str(error)}", 'WARNING')
+    
+    def restore_port(self, port):
+        """Select the port saved last time, if it is available and nothing is connected yet"""
+        if port and not self.is_connected and port in self.port_dropdown['values']:
+            self.port = port
+            self.port_var.set(port)
     
     def run(self):
         """Start the monitoring system"""
@@ -1163,11 +1311,40 @@ class SmartIrrigationMonitor:
         # Initialize data summary
         self.update_data_summary()
         
+        try:
+            self.live_server.start()
+            print(f"🌐 Live data server on http://{self.live_server.host}:{self.live_server.port}/")
+            self.add_activity(f"🌐 Live data server listening on port {self.live_server.port}")
+        except OSError as e:
+            self.add_activity(f"⚠️ Live data server unavailable: {str(e)}", 'WARNING')
+        if self.mqtt_broker:
+            try:
+                self.mqtt_broker.start()
+                self.add_activity(f"📡 MQTT stand-in broker listening on port {self.mqtt_broker.port}")
+            except OSError as e:
+                self.add_activity(f"⚠️ MQTT broker unavailable: {str(e)}", 'WARNING')
+        self.output_stage.start()
+        self.add_activity(f"🧵 Raw samples shared as '{self.sample_ring.name}' "
+                          f"(view with: python sample_ring.py --name {self.sample_ring.name} --view)")
+        
         def on_closing():
             if self.is_connected:
                 self.disconnect_arduino()
             self.monitoring_active = False
+            self.live_server.stop()
+            self.output_stage.stop()
+            if self.mqtt_broker:
+                self.mqtt_broker.stop()
+            # Saving a half-loaded history would drop the rest from the JSON file
+            self.history_loader.loaded.wait()
             self.save_historical_data()
+            if self.replication:
+                self.replication.stop()  # One last sync
+            self.storage.close()
+            for series in self.zone_series.values():
+                series.close()
+            self.event_log.close()
+            self.sample_ring.close()
             self.root.destroy()
         
         self.root.protocol("WM_DELETE_WINDOW", on_closing)
@@ -1183,12 +1360,27 @@ if __name__ == "__main__":
     # Configuration - Update COM port as needed
     ARDUINO_PORT = 'COM6'  # Change to your Arduino port
     BAUD_RATE = 9600
+    LIVE_PORT = 8765  # Local port for browser dashboards
+    STORAGE = 'json'  # 'json' (irrigation_data.json) or 'sqlite' (irrigation_data.db)
+    LOG_LEVEL = 'INFO'  # 'DEBUG' also logs every raw and parsed sample line
+    # Where every live sample goes besides the dashboard; each sink takes batch_size,
+    # flush_interval, queue_size and policy ('drop_oldest', 'drop_newest' or 'block'). Add
+    # {'type': 'mqtt', 'host': '127.0.0.1', 'port': 1883, 'topic': 'irrigation/samples'} for a broker,
+    # with 'broker': True to run the local stand-in broker on that port
+    SINKS = [
+        {'type': 'archive', 'directory': 'irrigation_archive'},
+        {'type': 'csv', 'path': 'irrigation_tail.csv', 'batch_size': 1}
+    ]
+    # Ship the history to a central aggregator (python replication.py --serve DIR), e.g.
+    # {'site': 'north-field', 'host': '192.168.1.20', 'port': 8766} or {'site': ..., 'directory': '//central/drop'}
+    REPLICATION = None
     
     print("🚀 Starting Smart Irrigation System...")
     print("=" * 50)
     
     try:
-        monitor = SmartIrrigationMonitor(port=ARDUINO_PORT, baudrate=BAUD_RATE)
+        monitor = SmartIrrigationMonitor(port=ARDUINO_PORT, baudrate=BAUD_RATE, live_port=LIVE_PORT, storage=STORAGE,
+                                         log_level=LOG_LEVEL, sinks=SINKS, replication=REPLICATION)
         monitor.run()
     except Exception as e:
         print(f"❌ Error starting system: {e}")
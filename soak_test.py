@@ -0,0 +1,342 @@
+import gc
+import heapq
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from benchmark_suite import HeadlessDialogs, HeadlessMonitor, HeadlessText, plt
+from event_log import EventQuery
+from irrigation_rollups import LEVELS
+from irrigation_simulator import VirtualIrrigationController
+
+
+DEFAULT_DAYS = 90
+
+# Growth a months-long run can afford. Slopes and the latency trend are
+# fitted to the checkpoints after WARMUP_DAYS, so start-up allocations
+# and caches filling up do not count, and only checked with at least
+# MIN_CHECKPOINTS of them; a shorter run reports insufficient data.
+LIMITS = {
+    'rss_mb_per_day': 2.0,          # resident memory
+    'blocks_per_day': 20000,        # memory blocks allocated by the interpreter
+    'latency_p99_growth': 0.5,      # last tenth of the days against the first, per-sample p99
+    'open_figures': 0,              # figures left registered with pyplot
+    'pending_callbacks': 5          # after() callbacks still queued after the GUI caught up
+}
+TREND_LIMITS = ('rss_mb_per_day', 'blocks_per_day', 'latency_p99_growth')
+WARMUP_DAYS = 7
+MIN_CHECKPOINTS = 14
+
+# What an operator does once per simulated day, besides watching
+DAILY_VIEWS = [
+    ('data summary', lambda monitor: monitor.update_data_summary()),
+    ('water usage graph', lambda monitor: monitor.show_water_usage_graph('day')),
+    ('moisture graph', lambda monitor: monitor.show_moisture_graph('hour')),
+    ('efficiency analysis', lambda monitor: monitor.show_efficiency_analysis())
+]
+
+
+def rss_bytes():
+    """Resident set size of this process (peak RSS where /proc is missing)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class SoakRoot:
+    """Stands in for Tk's event queue, on the simulated clock
+
+    after() callbacks queue up like Tk's timers and run when run_due() is
+    called, so their backlog and their cost can be measured.
+    """
+    def __init__(self):
+        self.now = 0.0
+        self.queue = []
+        self.cancelled = set()
+        self.next_id = 0
+        self.peak = 0
+        self.callback_seconds = []
+
+    def after(self, ms, func, *args):
+        self.next_id += 1
+        heapq.heappush(self.queue, (self.now + ms / 1000.0, self.next_id, func, args))
+        self.peak = max(self.peak, len(self.queue))
+        return self.next_id
+
+    def after_cancel(self, after_id):
+        self.cancelled.add(after_id)
+
+    def run_due(self, now):
+        """Run every callback due by now (seconds on the simulated clock)"""
+        self.now = now
+        while self.queue and self.queue[0][0] <= now:
+            _, after_id, func, args = heapq.heappop(self.queue)
+            if after_id in self.cancelled:
+                self.cancelled.discard(after_id)
+                continue
+            started = time.perf_counter()
+            func(*args)
+            self.callback_seconds.append(time.perf_counter() - started)
+
+    def pending(self):
+        return len(self.queue) - len(self.cancelled)
+
+
+class HeadlessLabel:
+    """Stands in for the status labels update_gui() configures"""
+    def config(self, **options):
+        pass
+
+    configure = config
+
+
+class SoakMonitor(HeadlessMonitor):
+    """The headless monitor with a queued after() and the status labels"""
+    def setup_gui(self):
+        self.root = SoakRoot()
+        self.summary_text = HeadlessText()
+        for name in ('time_label', 'moisture_label', 'moisture_status', 'pump_label',
+                     'water_used_label', 'events_label', 'total_label', 'window_label',
+                     'zones_label'):
+            setattr(self, name, HeadlessLabel())
+
+
+def sample_lines(controller, days):
+    """(simulated seconds, line) for every IRRIGATION_DATA line over days"""
+    start = controller.now
+    end = start + timedelta(days=days)
+    while controller.now < end:
+        for line in controller.step():
+            if line.startswith("IRRIGATION_DATA:"):
+                yield (controller.now - start).total_seconds(), line
+
+
+def fit_slope(days, values):
+    """Growth per day of a least-squares line through the values"""
+    if len(days) < 2:
+        return 0.0
+    return float(np.polyfit(days, values, 1)[0])
+
+
+def object_types():
+    gc.collect()
+    return Counter(type(obj).__name__ for obj in gc.get_objects())
+
+
+def run_soak(days=DEFAULT_DAYS, report_on_change=True, heartbeat=60, storage='json',
+             views=True, checkpoint_days=1, seed=0, progress=10):
+    """Drive the whole pipeline through days of simulated time
+
+    Lines of the simulated sketch go through process_arduino_data() as
+    fast as they can be processed, and the after() queue is drained on
+    the simulated clock after each one, like an idle mainloop. Once a day
+    the operator views run. Every checkpoint records RSS, allocated
+    blocks, GC-tracked objects, open figures, pending callbacks, bucket
+    counts and the per-sample latency percentiles since the previous
+    checkpoint.
+    """
+    cwd = os.getcwd()
+    directory = tempfile.mkdtemp(prefix='irrigation_soak_')
+    checkpoints = []
+    try:
+        os.chdir(directory)
+        monitor = SoakMonitor(storage=storage)
+        monitor.history_loader.loaded.wait()
+        root = monitor.root
+        controller = VirtualIrrigationController(start=datetime(2025, 1, 1), report_on_change=report_on_change,
+                                                 heartbeat=heartbeat, seed=seed)
+        started = time.perf_counter()
+        types_before = None
+        latencies = []
+        next_checkpoint = checkpoint_days * 86400
+        next_view = 86400
+
+        print(f"🧪 Soak test: {days} simulated days, {'change-driven' if report_on_change else 'fixed-rate'} "
+              f"reporting, {storage} storage")
+        try:
+            with HeadlessDialogs(directory):
+                # The operator closes each chart window; figures nobody showed stay open
+                original_show = plt.show
+                plt.show = lambda *args, **kwargs: plt.close(plt.gcf())
+                try:
+                    for now, line in sample_lines(controller, days):
+                        begin = time.perf_counter()
+                        monitor.process_arduino_data(line)
+                        latencies.append(time.perf_counter() - begin)
+                        root.run_due(now)
+
+                        if views and now >= next_view:
+                            next_view += 86400
+                            for _, view in DAILY_VIEWS:
+                                view(monitor)
+                            root.run_due(now)
+
+                        if now >= next_checkpoint:
+                            next_checkpoint += checkpoint_days * 86400
+                            gc.collect()
+                            levels = monitor.rollups.levels()
+                            sample_times = np.array(latencies)
+                            callback_times = np.array(root.callback_seconds or [0.0])
+                            checkpoints.append({
+                                'day': now / 86400,
+                                'wall_seconds': time.perf_counter() - started,
+                                'rss_mb': rss_bytes() / 2 ** 20,
+                                'blocks': sys.getallocatedblocks(),
+                                'objects': len(gc.get_objects()),
+                                'open_figures': len(plt.get_fignums()),
+                                'pending_callbacks': root.pending(),
+                                'peak_callbacks': root.peak,
+                                'samples': len(latencies),
+                                'p50_us': float(np.percentile(sample_times, 50)) * 1e6,
+                                'p99_us': float(np.percentile(sample_times, 99)) * 1e6,
+                                'max_us': float(sample_times.max()) * 1e6,
+                                'callback_p99_us': float(np.percentile(callback_times, 99)) * 1e6,
+                                'buckets': {level: len(levels[level]) for level in LEVELS}
+                            })
+                            latencies = []
+                            root.callback_seconds = []
+                            root.peak = root.pending()
+                            if types_before is None:
+                                types_before = object_types()
+                            if progress and len(checkpoints) % progress == 0:
+                                print_checkpoint(checkpoints[-1])
+                finally:
+                    plt.show = original_show
+        finally:
+            monitor.storage.close()
+            monitor.event_log.close()
+            monitor.sample_ring.close()
+
+        errors = EventQuery(monitor.event_log, 'ERROR')
+        growth = (object_types() - types_before).most_common(8) if types_before else []
+        return {
+            'days': days,
+            'report_on_change': report_on_change,
+            'storage': storage,
+            'wall_seconds': time.perf_counter() - started,
+            'errors': errors.page(0, 5) if len(errors) else [],
+            'object_growth': growth,
+            'checkpoints': checkpoints
+        }
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def print_checkpoint(point):
+    buckets = point['buckets']
+    print(f"  day {point['day']:5.1f} ({point['wall_seconds']:6.0f} s): RSS {point['rss_mb']:7.1f} MB, "
+          f"{point['blocks']:>10,} blocks, {point['open_figures']} figures, "
+          f"{point['pending_callbacks']} pending/{point['peak_callbacks']} peak callbacks, "
+          f"p50 {point['p50_us']:6.0f} µs p99 {point['p99_us']:6.0f} µs max {point['max_us'] / 1000:6.1f} ms, "
+          f"{buckets['minute']:,} minute/{buckets['hour']:,} hour buckets")
+
+
+def analyze_trends(report, limits=LIMITS, warmup_days=WARMUP_DAYS, min_checkpoints=MIN_CHECKPOINTS):
+    """Trend figures of a soak report and the limits they break
+
+    Trends of fewer than min_checkpoints checkpoints after the warm-up
+    are None (insufficient data) and break no limit; open figures and
+    pending callbacks are checked at every checkpoint.
+    """
+    checkpoints = report['checkpoints']
+    points = [point for point in checkpoints if point['day'] > warmup_days]
+    trends = {
+        'open_figures': max((point['open_figures'] for point in checkpoints), default=0),
+        'pending_callbacks': max((point['pending_callbacks'] for point in checkpoints), default=0),
+        'trend_checkpoints': len(points)
+    }
+    if len(points) < min_checkpoints:
+        for name in ('rss_mb_per_day', 'blocks_per_day', 'objects_per_day', 'latency_p99_growth',
+                     'minute_buckets_per_day', 'hour_buckets_per_day'):
+            trends[name] = None
+    else:
+        days = [point['day'] for point in points]
+        tenth = max(1, len(points) // 10)
+        first_p99 = np.median([point['p99_us'] for point in points[:tenth]])
+        last_p99 = np.median([point['p99_us'] for point in points[-tenth:]])
+        trends.update({
+            'rss_mb_per_day': fit_slope(days, [point['rss_mb'] for point in points]),
+            'blocks_per_day': fit_slope(days, [point['blocks'] for point in points]),
+            'objects_per_day': fit_slope(days, [point['objects'] for point in points]),
+            'latency_p99_growth': last_p99 / first_p99 - 1 if first_p99 else 0.0,
+            'minute_buckets_per_day': fit_slope(days, [point['buckets']['minute'] for point in points]),
+            'hour_buckets_per_day': fit_slope(days, [point['buckets']['hour'] for point in points])
+        })
+    failures = [(name, trends[name], limit) for name, limit in limits.items()
+                if trends[name] is not None and trends[name] > limit]
+    return trends, failures
+
+
+def print_report(report, trends, failures, limits=LIMITS, warmup_days=WARMUP_DAYS, min_checkpoints=MIN_CHECKPOINTS):
+    simulated = report['days'] * 86400
+    samples = sum(point['samples'] for point in report['checkpoints'])
+    print(f"📈 Trends over {report['days']} simulated days ({samples:,} samples) in "
+          f"{report['wall_seconds'] / 60:.1f} min ({simulated / report['wall_seconds']:,.0f}x real time):")
+    units = {'rss_mb_per_day': 'MB/day', 'blocks_per_day': 'blocks/day', 'latency_p99_growth': '',
+             'open_figures': 'figures', 'pending_callbacks': 'callbacks'}
+    for name, limit in limits.items():
+        bound = f"{limit:.0%}" if name == 'latency_p99_growth' else f"{limit:,} {units[name]}"
+        if trends[name] is None:
+            print(f"  ⚪ {name:<20} {'insufficient data':>22} (limit {bound})")
+            continue
+        status = "❌" if any(failure[0] == name for failure in failures) else "✅"
+        value = f"{trends[name]:+.0%}" if name == 'latency_p99_growth' else f"{trends[name]:,.2f} {units[name]}"
+        print(f"  {status} {name:<20} {value:>22} (limit {bound})")
+    if trends['rss_mb_per_day'] is None:
+        print(f"  Trends need {min_checkpoints} checkpoints after a {warmup_days}-day warm-up; "
+              f"this run has {trends['trend_checkpoints']}")
+        return
+    # Bucket dicts hold only numbers, so the collector does not track them
+    print(f"  GC-tracked objects grow {trends['objects_per_day']:,.0f}/day; minute buckets grow {trends['minute_buckets_per_day']:,.0f}/day, "
+          f"hour buckets {trends['hour_buckets_per_day']:,.0f}/day (kept for the whole history)")
+    if report['object_growth']:
+        print("  most grown object types: " + ", ".join(f"{name} +{count:,}" for name, count in report['object_growth']))
+    if report['errors']:
+        print(f"  ⚠️ the monitor logged errors: {report['errors']}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Soak test the monitor over months of simulated time")
+    parser.add_argument('--days', type=int, default=DEFAULT_DAYS)
+    parser.add_argument('--fixed-rate', action='store_true', help="the sketch's fixed 2 s reporting instead of change-driven")
+    parser.add_argument('--heartbeat', type=int, default=60)
+    parser.add_argument('--storage', choices=['json', 'sqlite'], default='json')
+    parser.add_argument('--no-views', action='store_true', help="skip the daily summary and chart views")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--report', help="write the checkpoints and trends to this JSON file")
+    parser.add_argument('--warmup-days', type=float, default=WARMUP_DAYS, help="days left out of the trend fits")
+    parser.add_argument('--min-checkpoints', type=int, default=MIN_CHECKPOINTS,
+                        help="daily checkpoints after the warm-up needed to check the trends")
+    for name, limit in LIMITS.items():
+        parser.add_argument(f"--max-{name.replace('_', '-')}", type=type(limit), default=limit, dest=name)
+    args = parser.parse_args()
+
+    limits = {name: getattr(args, name) for name in LIMITS}
+    report = run_soak(args.days, not args.fixed_rate, args.heartbeat, args.storage, not args.no_views, seed=args.seed)
+    trends, failures = analyze_trends(report, limits, args.warmup_days, args.min_checkpoints)
+    print_report(report, trends, failures, limits, args.warmup_days, args.min_checkpoints)
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(dict(report, trends=trends, limits=limits), f, indent=2, default=str)
+        print(f"💾 Report written to {args.report}")
+    if failures or report['errors']:
+        print(f"❌ {len(failures)} limits exceeded" + (", errors logged" if report['errors'] else ""))
+        sys.exit(1)
+    if any(trends[name] is None for name in TREND_LIMITS):
+        print("✅ Within the checked limits; too few days to check the trends")
+    else:
+        print("✅ Within all limits")
@@ -0,0 +1,551 @@
+import csv
+import gzip
+import json
+import json.decoder
+import json.scanner
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from urllib.request import pathname2url
+
+from irrigation_rollups import LEVELS, LEVEL_FILE_KEYS, LEVEL_FORMATS, TIME_FORMAT, key_in_range
+
+
+def moisture_field(level):
+    """Name of the moisture field in a bucket of the given level"""
+    return 'moisture' if level in ('minute', 'hour') else 'moisture_avg'
+
+
+def _decode_object(text, index, depth, scan_once):
+    result = {}
+    index = json.decoder.WHITESPACE.match(text, index + 1).end()
+    if text[index] == '}':
+        return result, index + 1
+    while True:
+        key, index = scan_once(text, index)
+        index = json.decoder.WHITESPACE.match(text, index).end()
+        if text[index] != ':':
+            raise json.JSONDecodeError("Expecting ':' delimiter", text, index)
+        index = json.decoder.WHITESPACE.match(text, index + 1).end()
+        if depth > 1 and text[index] == '{':
+            value, index = _decode_object(text, index, depth - 1, scan_once)
+        else:
+            value, index = scan_once(text, index)
+        result[key] = value
+        index = json.decoder.WHITESPACE.match(text, index).end()
+        if text[index] == '}':
+            return result, index + 1
+        if text[index] != ',':
+            raise json.JSONDecodeError("Expecting ',' delimiter", text, index)
+        index = json.decoder.WHITESPACE.match(text, index + 1).end()
+
+
+def decode_in_steps(text, depth=2):
+    """json.loads() of an object, decoding members `depth` levels down one by one
+
+    json.loads() holds the GIL for the whole document, which freezes every
+    other thread while a large history file is parsed. Decoding bucket by
+    bucket lets the interpreter switch threads in between, at about twice
+    the total cost.
+    """
+    scan_once = json.scanner.make_scanner(json.JSONDecoder())
+    index = json.decoder.WHITESPACE.match(text).end()
+    try:
+        if text[index] != '{':
+            raise json.JSONDecodeError("Expecting '{'", text, index)
+        result, index = _decode_object(text, index, depth, scan_once)
+    except (StopIteration, IndexError) as e:
+        raise json.JSONDecodeError("Expecting value", text, getattr(e, 'value', len(text)))
+    if json.decoder.WHITESPACE.match(text, index).end() != len(text):
+        raise json.JSONDecodeError("Extra data", text, index)
+    return result
+
+
+class HistoryStorage:
+    """Interface the monitor writes its history through
+
+    write_buckets() receives the changed buckets returned by
+    IrrigationRollups.add_sample(); append_samples() receives raw samples.
+    Implementations may buffer both and write them in batches of
+    batch_size or every flush_interval seconds, whichever comes first.
+    """
+    # True when read_range() is cheaper than scanning the in-memory levels
+    range_reads = False
+
+    def __init__(self, batch_size=50, flush_interval=5.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending_buckets = {}
+        self.pending_samples = []
+        self.last_flush = time.monotonic()
+        self.lock = threading.RLock()
+
+    def prepare(self):
+        """Get the store ready for reads; called once before loading"""
+        pass
+
+    def load(self):
+        """Return the stored history in the irrigation_data.json layout"""
+        raise NotImplementedError
+
+    def load_in_steps(self):
+        """load() for a background thread, without holding the GIL for long"""
+        return self.load()
+
+    def save(self, levels, settings):
+        """Persist settings and any levels not yet written through"""
+        raise NotImplementedError
+
+    def load_settings(self):
+        """Return only the stored settings"""
+        return self.load().get('settings', {})
+
+    def replace_levels(self, levels):
+        """Overwrite every stored bucket with the given levels, keeping settings"""
+        raise NotImplementedError
+
+    def read_range(self, level, start=None, end=None):
+        """Return sorted [key, bucket] pairs of one level within [start, end]"""
+        raise NotImplementedError
+
+    def bucket_months(self, level):
+        """Months ('2025-08') holding buckets of one level, newest first"""
+        return sorted({key[:7] for key, _ in self.read_range(level)}, reverse=True)
+
+    def iter_samples(self, start=None, end=None):
+        """Yield raw sample dicts in time order"""
+        raise NotImplementedError
+
+    def write_buckets(self, changed):
+        """Queue changed buckets ({level: {key: bucket}}) for writing"""
+        with self.lock:
+            for level, buckets in changed.items():
+                for key, bucket in buckets.items():
+                    self.pending_buckets[(level, key)] = bucket
+            self._maybe_flush()
+
+    def append_samples(self, samples):
+        """Queue raw samples for writing"""
+        with self.lock:
+            self.pending_samples.extend(samples)
+            self._maybe_flush()
+
+    def flush(self):
+        """Write everything queued so far"""
+        with self.lock:
+            if self.pending_buckets or self.pending_samples:
+                self._write_batch(self.pending_buckets, self.pending_samples)
+                self.pending_buckets = {}
+                self.pending_samples = []
+            self.last_flush = time.monotonic()
+
+    def close(self):
+        self.flush()
+
+    def _maybe_flush(self):
+        pending = max(len(self.pending_buckets), len(self.pending_samples))
+        if pending >= self.batch_size or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def _write_batch(self, buckets, samples):
+        raise NotImplementedError
+
+
+class JsonFileStorage(HistoryStorage):
+    """The original irrigation_data.json file plus a CSV log of raw samples
+
+    Buckets are only written when save() rewrites the whole JSON file.
+    Like the event log, the sample log is gzip-compressed into numbered
+    segments once it reaches max_bytes (irrigation_data.csv.1.gz is the
+    newest), keeping at most `backups` of them; iter_samples() reads
+    through the segments and the current file.
+    """
+    def __init__(self, data_file='irrigation_data.json', csv_file='irrigation_data.csv', max_bytes=16 * 2 ** 20,
+                 backups=20, **kwargs):
+        super().__init__(**kwargs)
+        self.data_file = data_file
+        self.csv_file = csv_file
+        self.max_bytes = max_bytes
+        self.backups = backups
+
+    def load(self):
+        if not os.path.exists(self.data_file):
+            return {}
+        with open(self.data_file, 'r') as f:
+            return json.load(f)
+
+    def load_in_steps(self):
+        if not os.path.exists(self.data_file):
+            return {}
+        with open(self.data_file, 'r') as f:
+            return decode_in_steps(f.read())
+
+    def save(self, levels, settings):
+        data = {LEVEL_FILE_KEYS[level]: dict(levels[level]) for level in LEVELS}
+        data['settings'] = settings
+        data['last_updated'] = datetime.now().isoformat()
+        with self.lock:
+            self.flush()
+            with open(self.data_file, 'w') as f:
+                json.dump(data, f, indent=2, default=str)
+
+    def replace_levels(self, levels):
+        self.save(levels, self.load().get('settings', {}))
+
+    def read_range(self, level, start=None, end=None):
+        data = self.load().get(LEVEL_FILE_KEYS[level], {})
+        return [[key, bucket] for key, bucket in sorted(data.items()) if key_in_range(key, start, end)]
+
+    def segment(self, number):
+        return f"{self.csv_file}.{number}.gz"
+
+    def iter_samples(self, start=None, end=None):
+        self.flush()
+        paths = [self.segment(number) for number in range(self.backups, 0, -1)] + [self.csv_file]
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            opener = gzip.open if path.endswith('.gz') else open
+            with opener(path, 'rt', newline='') as f:
+                for row in csv.DictReader(f):
+                    if not key_in_range(row['Time'], start, end):
+                        continue
+                    yield {
+                        'timestamp': datetime.strptime(row['Time'], TIME_FORMAT),
+                        'moisture': int(row['Moisture']),
+                        'pump': row['Pump'] == '1',
+                        'water_used': float(row['Water_Used_L']),
+                        'events': int(row['Watering_Events'])
+                    }
+
+    def _write_batch(self, buckets, samples):
+        if not samples:
+            return
+        new_file = not os.path.exists(self.csv_file)
+        with open(self.csv_file, 'a', newline='') as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(['Time', 'Moisture', 'Pump', 'Water_Used_L', 'Watering_Events'])
+            writer.writerows(
+                [s['timestamp'].strftime(TIME_FORMAT), s['moisture'], 1 if s['pump'] else 0,
+                 s['water_used'], s['events']]
+                for s in samples
+            )
+            size = f.tell()
+        if self.max_bytes and size >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self):
+        """Compress the sample log into segment 1, shifting the older ones up"""
+        oldest = self.segment(self.backups)
+        if os.path.exists(oldest):
+            os.remove(oldest)
+        for number in range(self.backups - 1, 0, -1):
+            if os.path.exists(self.segment(number)):
+                os.replace(self.segment(number), self.segment(number + 1))
+        with open(self.csv_file, 'rb') as source, gzip.open(self.segment(1), 'wb') as target:
+            shutil.copyfileobj(source, target)
+        os.remove(self.csv_file)
+
+
+class SQLiteStorage(HistoryStorage):
+    """Embedded SQLite history for ad-hoc SQL queries
+
+    Tables:
+      buckets(level, bucket, water_used, moisture, events, pump_duration)
+        keyed by (level, bucket) so time-range reads use the primary key
+      samples(time, moisture, pump, water_used, events) indexed on time
+      settings(key, value)
+    The database runs in WAL mode so analysts can query it while the
+    dashboard is writing. When the database is empty, an existing
+    irrigation_data.json is imported on first load.
+
+    read_only=True opens an existing database for the analysis tools
+    without touching it: no WAL switch, no tables created, no import.
+    """
+    range_reads = True
+
+    def __init__(self, db_file='irrigation_data.db', import_json='irrigation_data.json', read_only=False, **kwargs):
+        super().__init__(**kwargs)
+        self.db_file = db_file
+        self.import_json = None if read_only else import_json
+        self.read_only = read_only
+        if read_only:
+            uri = f"file:{pathname2url(os.path.abspath(db_file))}?mode=ro"
+            self.conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            return
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS buckets (
+                level TEXT NOT NULL,
+                bucket TEXT NOT NULL,
+                water_used REAL NOT NULL DEFAULT 0,
+                moisture REAL NOT NULL DEFAULT 0,
+                events INTEGER NOT NULL DEFAULT 0,
+                pump_duration REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (level, bucket)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS samples (
+                time TEXT NOT NULL,
+                moisture INTEGER NOT NULL,
+                pump INTEGER NOT NULL,
+                water_used REAL NOT NULL,
+                events INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS samples_time ON samples (time);
+            CREATE TABLE IF NOT EXISTS settings (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+        """)
+        self.conn.commit()
+
+    def prepare(self):
+        # First start on SQLite: import the JSON history once
+        with self.lock:
+            empty = self.conn.execute("SELECT 1 FROM buckets LIMIT 1").fetchone() is None
+        if empty and self.import_json and os.path.exists(self.import_json):
+            with open(self.import_json, 'r') as f:
+                data = json.load(f)
+            self.save_levels({level: data.get(LEVEL_FILE_KEYS[level], {}) for level in LEVELS})
+            self.save_settings(data.get('settings', {}))
+
+    def load(self):
+        self.prepare()
+        data = {LEVEL_FILE_KEYS[level]: {} for level in LEVELS}
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT level, bucket, water_used, moisture, events, pump_duration FROM buckets"
+            ).fetchall()
+            settings = dict(self.conn.execute("SELECT key, value FROM settings").fetchall())
+        for level, key, water, moisture, events, pump_duration in rows:
+            data[LEVEL_FILE_KEYS[level]][key] = self._bucket(level, water, moisture, events, pump_duration)
+        data['settings'] = {key: json.loads(value) for key, value in settings.items()}
+        return data
+
+    def save(self, levels, settings):
+        # Buckets are written through as they change; only flush and settings remain
+        self.flush()
+        self.save_settings(settings)
+
+    def save_levels(self, levels):
+        """Bulk upsert whole levels in one transaction"""
+        with self.lock:
+            self._write_batch({(level, key): bucket for level in LEVELS
+                               for key, bucket in levels.get(level, {}).items()}, [])
+
+    def replace_levels(self, levels):
+        with self.lock:
+            self.flush()
+            # One transaction: the delete is rolled back if the insert fails
+            with self.conn:
+                self.conn.execute("DELETE FROM buckets")
+                self.save_levels(levels)
+
+    def replace_prefix(self, prefix, levels):
+        """Replace the buckets of each given level whose keys start with prefix
+
+        levels maps a level to its new buckets under the prefix; an empty
+        dict clears that level's buckets there. One transaction, like
+        replace_levels().
+        """
+        with self.lock:
+            self.flush()
+            with self.conn:
+                self.conn.executemany(
+                    "DELETE FROM buckets WHERE level = ? AND bucket >= ? AND bucket < ?",
+                    [(level, prefix, prefix + '\uffff') for level in levels]
+                )
+                self.save_levels(levels)
+
+    def load_settings(self):
+        with self.lock:
+            settings = dict(self.conn.execute("SELECT key, value FROM settings").fetchall())
+        return {key: json.loads(value) for key, value in settings.items()}
+
+    def save_settings(self, settings):
+        with self.lock:
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                    [(key, json.dumps(value)) for key, value in settings.items()]
+                )
+
+    def read_range(self, level, start=None, end=None):
+        self.flush()
+        query = "SELECT bucket, water_used, moisture, events, pump_duration FROM buckets WHERE level = ?"
+        args = [level]
+        key_length = len(datetime(2000, 1, 1).strftime(LEVEL_FORMATS[level]))
+        if start:
+            query += " AND bucket >= ?"
+            args.append(start[:key_length])
+        if end:
+            # Narrow with the index, then apply the exact prefix rule below
+            query += " AND bucket <= ?"
+            args.append(end + '\uffff')
+        query += " ORDER BY bucket"
+        with self.lock:
+            rows = self.conn.execute(query, args).fetchall()
+        return [[key, self._bucket(level, water, moisture, events, pump_duration)]
+                for key, water, moisture, events, pump_duration in rows
+                if key_in_range(key, start, end)]
+
+    def bucket_months(self, level):
+        # One primary key seek per month instead of reading the buckets
+        months = []
+        with self.lock:
+            self.flush()
+            below = '\uffff'
+            while True:
+                newest, = self.conn.execute("SELECT MAX(bucket) FROM buckets WHERE level = ? AND bucket < ?",
+                                            (level, below)).fetchone()
+                if newest is None:
+                    return months
+                months.append(newest[:7])
+                below = newest[:7]
+
+    def iter_samples(self, start=None, end=None):
+        self.flush()
+        query = "SELECT time, moisture, pump, water_used, events FROM samples"
+        conditions, args = [], []
+        if start:
+            conditions.append("time >= ?")
+            args.append(start)
+        if end:
+            conditions.append("time <= ?")
+            args.append(end + '\uffff')
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY time"
+        with self.lock:
+            rows = self.conn.execute(query, args).fetchall()
+        for time_str, moisture, pump, water_used, events in rows:
+            if not key_in_range(time_str, start, end):
+                continue
+            yield {
+                'timestamp': datetime.strptime(time_str, TIME_FORMAT),
+                'moisture': moisture,
+                'pump': bool(pump),
+                'water_used': water_used,
+                'events': events
+            }
+
+    def close(self):
+        super().close()
+        with self.lock:
+            self.conn.close()
+
+    def _write_batch(self, buckets, samples):
+        with self.conn:
+            if buckets:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO buckets (level, bucket, water_used, moisture, events, pump_duration) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [(level, key, b.get('water_used', 0.0), b.get(moisture_field(level), 0),
+                      b.get('events', 0), b.get('pump_duration', 0.0))
+                     for (level, key), b in buckets.items()]
+                )
+            if samples:
+                self.conn.executemany(
+                    "INSERT INTO samples (time, moisture, pump, water_used, events) VALUES (?, ?, ?, ?, ?)",
+                    [(s['timestamp'].strftime(TIME_FORMAT), s['moisture'], 1 if s['pump'] else 0,
+                      s['water_used'], s['events']) for s in samples]
+                )
+
+    @staticmethod
+    def _bucket(level, water, moisture, events, pump_duration):
+        return {'water_used': water, moisture_field(level): moisture, 'events': events,
+                'pump_duration': pump_duration}
+
+
+STORAGE_BACKENDS = {
+    'json': JsonFileStorage,
+    'sqlite': SQLiteStorage
+}
+
+
+def benchmark_storage(days=365, samples=20000, directory=None):
+    """Compare write and range-query cost of the JSON file and SQLite"""
+    import shutil
+    import tempfile
+    from datetime import timedelta
+    from irrigation_rollups import IrrigationRollups
+
+    directory = directory or tempfile.mkdtemp(prefix='irrigation_bench_')
+    try:
+        # Synthetic history: one bucket per hour and day, plus minute buckets for the last 30 days
+        rollups = IrrigationRollups()
+        start = datetime(2024, 1, 1)
+        t = start
+        for i in range(days * 24):
+            pump = i % 7 == 0
+            rollups.add_sample(t, 700 if pump else 300, pump, (i % 24) * 0.1, (i % 24) // 7)
+            t += timedelta(hours=1)
+        minute_start = t - timedelta(days=30)
+        for i in range(30 * 24 * 60):
+            rollups.minute_data[(minute_start + timedelta(minutes=i)).strftime("%Y-%m-%d %H:%M")].update(
+                {'water_used': 0.1, 'moisture': 300, 'events': 1})
+        levels = rollups.levels()
+        settings = {'dry_threshold': 700, 'wet_threshold': 300, 'flow_rate': 1.0}
+        bucket_count = sum(len(store) for store in levels.values())
+
+        json_store = JsonFileStorage(os.path.join(directory, 'h.json'), os.path.join(directory, 'h.csv'))
+        sqlite_store = SQLiteStorage(os.path.join(directory, 'h.db'), import_json=None)
+        sqlite_store.save_levels(levels)
+
+        print(f"🗄️ Storage benchmark: {bucket_count} buckets ({days} days of history)")
+
+        # Insert throughput: one sample at a time through write-through
+        stream = IrrigationRollups()
+        t = datetime(2025, 6, 1)
+        changes = []
+        for i in range(samples):
+            pump = (i // 30) % 10 == 0
+            changed = stream.add_sample(t, 700 if pump else 300, pump, i * 0.001, i // 300)
+            changes.append((changed, {'timestamp': t, 'moisture': 700 if pump else 300, 'pump': pump,
+                                      'water_used': i * 0.001, 'events': i // 300}))
+            t += timedelta(seconds=2)
+
+        for name, store in (('JSON + CSV', json_store), ('SQLite', sqlite_store)):
+            started = time.perf_counter()
+            for changed, sample in changes:
+                store.write_buckets(changed)
+                store.append_samples([sample])
+            store.flush()
+            elapsed = time.perf_counter() - started
+            print(f"  {name:>10} write-through: {samples / elapsed:,.0f} samples/s")
+
+        # The JSON file only persists buckets by rewriting everything
+        started = time.perf_counter()
+        json_store.save(levels, settings)
+        json_save = time.perf_counter() - started
+        print(f"  {'JSON':>10} full save: {json_save * 1000:.0f} ms per save "
+              f"({os.path.getsize(json_store.data_file) / 1e6:.1f} MB)")
+
+        # Range queries for graphs: one month of hours, last week of minutes, one year of days
+        queries = [
+            ('hour', '2024-06-01', '2024-06-30'),
+            ('minute', (t - timedelta(days=7)).strftime("%Y-%m-%d"), None),
+            ('day', '2024-01-01', '2024-12-31')
+        ]
+        for level, q_start, q_end in queries:
+            timings = {}
+            for name, store in (('JSON', json_store), ('SQLite', sqlite_store)):
+                started = time.perf_counter()
+                rows = store.read_range(level, q_start, q_end)
+                timings[name] = (time.perf_counter() - started, len(rows))
+            print(f"  {level:>6} range {q_start}..{q_end or 'now'}: "
+                  f"JSON {timings['JSON'][0] * 1000:.1f} ms, SQLite {timings['SQLite'][0] * 1000:.1f} ms "
+                  f"({timings['SQLite'][1]} rows)")
+        sqlite_store.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    benchmark_storage()
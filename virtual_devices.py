@@ -0,0 +1,433 @@
+import heapq
+import json
+import os
+import random
+import selectors
+import time
+import tty
+from collections import Counter, deque
+from datetime import datetime, timedelta
+
+from controller_backlog import encode_record
+from irrigation_simulator import VirtualIrrigationController
+
+
+# Irrigating.ino constants the backlog emulation follows
+BACKLOG_CAPACITY = 512
+BACKLOG_INTERVAL_S = 300
+BACKLOG_RECORDS_PER_LINE = 8
+BACKLOG_SEND_INTERVAL_MS = 200
+SAMPLE_BUFFER_SIZE = 8
+
+# Fault kinds and what one occurrence does
+FAULTS = {
+    'garbage': "random bytes, sometimes with a line break, before a line",
+    'truncate': "a line cut off without its line break",
+    'stall': "the device stays silent for 5-30 steps",
+    'disconnect': "the pty hangs up for a few seconds, like pulling the USB cable",
+    'clock_jump': "the RTC jumps by up to six hours forwards or backwards"
+}
+
+LINK_PREFIX = 'ttyACMV'  # pyserial's port scan lists /dev/ttyACM* entries
+
+
+def parse_faults(text):
+    """'garbage=0.01,disconnect=0.0005' -> {fault: chance per step}"""
+    faults = {}
+    for part in filter(None, (text or '').split(',')):
+        name, _, chance = part.partition('=')
+        if name not in FAULTS:
+            raise ValueError(f"Unknown fault '{name}' (choose from {', '.join(FAULTS)})")
+        faults[name] = float(chance)
+    return faults
+
+
+class VirtualDevice:
+    """One simulated Irrigating.ino behind a pseudo-terminal
+
+    The sketch model runs loop_interval seconds per step() and its serial
+    output goes to the pty master. The dashboard opens the slave through a
+    stable symlink, which is re-pointed when the device reconnects after a
+    simulated unplug. Like the sketch, the device answers REQUEST_DATA and
+    REQUEST_DATA:SINCE=<unix> with a backlog download from an EEPROM-sized
+    ring of records, so reconnects exercise the backlog path too.
+    """
+    def __init__(self, index, link_path, start=None, loop_interval=2.0, report_on_change=True,
+                 heartbeat=60, flow_rate=1.0, faults=None, seed=0):
+        self.index = index
+        self.link_path = link_path
+        self.faults = faults or {}
+        self.rng = random.Random(seed * 100003 + index)
+        self.controller = VirtualIrrigationController(
+            start=start, flow_rate=flow_rate, loop_interval=loop_interval,
+            report_on_change=report_on_change, heartbeat=heartbeat, seed=seed * 100003 + index)
+
+        self.backlog = deque(maxlen=BACKLOG_CAPACITY)
+        self.last_logged = None
+        self.last_pump = False
+        self.download = deque()
+        self.command = b""
+
+        self.master = None
+        self.slave = None
+        self.stalled_steps = 0
+        self.offline_until = None
+        self.stats = Counter()
+        self.open()
+
+    def open(self):
+        """Create a fresh pty and point the link at its slave"""
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)  # No echo or newline translation, like a USB CDC port
+        os.set_blocking(self.master, False)
+        temporary = self.link_path + '.new'
+        if os.path.lexists(temporary):
+            os.remove(temporary)
+        os.symlink(os.ttyname(self.slave), temporary)
+        os.replace(temporary, self.link_path)
+        self.offline_until = None
+
+    def hang_up(self, offline_seconds=None):
+        """Close the pty; readers of the slave get an I/O error"""
+        for fd in (self.master, self.slave):
+            if fd is not None:
+                os.close(fd)
+        self.master = self.slave = None
+        self.command = b""
+        self.download.clear()
+        if os.path.lexists(self.link_path):
+            os.remove(self.link_path)
+        if offline_seconds is not None:
+            self.offline_until = time.monotonic() + offline_seconds
+
+    @property
+    def online(self):
+        return self.master is not None
+
+    def write(self, data):
+        """Write to the master; bytes nobody reads are dropped, not queued"""
+        try:
+            written = os.write(self.master, data)
+        except (BlockingIOError, OSError):
+            written = 0
+        self.stats['bytes'] += written
+        self.stats['dropped_bytes'] += len(data) - written
+
+    def println(self, line):
+        self.write(line.encode() + b"\r\n")
+        self.stats['lines'] += 1
+
+    def log_backlog(self, stamp, lines):
+        """Log EEPROM records like logBacklogRecord(): pump changes, midnight, every 5 min"""
+        controller = self.controller
+        new_day = "Daily counters reset - New day!" in lines
+        if (controller.pump_status != self.last_pump or new_day or self.last_logged is None
+                or (stamp - self.last_logged).total_seconds() >= BACKLOG_INTERVAL_S):
+            self.backlog.append(encode_record(stamp, controller.water_used_today, controller.watering_events_today,
+                                              controller.pump_status, controller.high_count))
+            self.last_logged = stamp
+            self.last_pump = controller.pump_status
+
+    def start_download(self, since):
+        """Queue BACKLOG lines for the records newer than since, as startBacklogDownload() does"""
+        records = [record for record in self.backlog if int.from_bytes(record[:4], 'little') > since]
+        self.download.clear()
+        self.println(f"BACKLOG_BEGIN:COUNT={len(records)},BUFFER={SAMPLE_BUFFER_SIZE},INTERVAL={BACKLOG_INTERVAL_S}")
+        for i in range(0, len(records), BACKLOG_RECORDS_PER_LINE):
+            self.download.append("BACKLOG:" + b"".join(records[i:i + BACKLOG_RECORDS_PER_LINE]).hex().upper())
+        if records:
+            self.download.append("BACKLOG_END")
+
+    def read_commands(self):
+        """Handle the dashboard's REQUEST_DATA commands"""
+        try:
+            data = os.read(self.master, 1024)
+        except (BlockingIOError, OSError):
+            return
+        self.command += data.replace(b"\r", b"")
+        while b"\n" in self.command:
+            line, self.command = self.command.split(b"\n", 1)
+            command = line.decode(errors='ignore')
+            self.stats['commands'] += 1
+            if command == "REQUEST_DATA":
+                self.println(self.controller.format_data_line())
+            elif command.startswith("REQUEST_DATA:SINCE="):
+                try:
+                    self.start_download(int(command[len("REQUEST_DATA:SINCE="):]))
+                except ValueError:
+                    pass
+        self.command = self.command[-64:]  # The sketch's command buffer is bounded too
+
+    def inject(self, fault):
+        chance = self.faults.get(fault, 0.0)
+        if chance and self.rng.random() < chance:
+            self.stats[fault] += 1
+            return True
+        return False
+
+    def step(self):
+        """Run the sketch for one step; output is lost while stalled or unplugged
+
+        Returns the offline time in seconds when a disconnect fault fires;
+        the caller hangs the device up.
+        """
+        controller = self.controller
+        if self.inject('clock_jump'):
+            controller.now += timedelta(seconds=self.rng.choice((-1, 1)) * self.rng.uniform(60, 6 * 3600))
+        stamp = controller.now
+        lines = controller.step()
+        self.log_backlog(stamp, lines)
+
+        if not self.online:
+            return None
+        if self.inject('disconnect'):
+            return self.rng.uniform(2, 10)
+        if self.stalled_steps > 0:
+            self.stalled_steps -= 1
+            return None
+        if self.inject('stall'):
+            self.stalled_steps = self.rng.randint(5, 30)
+            return None
+
+        for line in lines:
+            if self.inject('garbage'):
+                noise = bytes(self.rng.randrange(256) for _ in range(self.rng.randint(1, 40)))
+                self.write(noise + (b"\r\n" if self.rng.random() < 0.5 else b""))
+            if self.inject('truncate'):
+                self.write(line.encode()[:self.rng.randrange(max(len(line), 1))])
+                continue
+            self.println(line)
+
+        # The sketch sends one backlog line every BACKLOG_SEND_INTERVAL_MS
+        for _ in range(max(1, int(controller.loop_interval * 1000 / BACKLOG_SEND_INTERVAL_MS))):
+            if not self.download:
+                break
+            self.println(self.download.popleft())
+        return None
+
+
+class DeviceFarm:
+    """Runs many virtual devices from one event loop
+
+    Each device steps every loop_interval / speed real seconds; speed=60
+    runs the sketch a minute per second. One selector watches every pty
+    master for commands, so hundreds of devices need no threads.
+    """
+    def __init__(self, count, link_dir, speed=1.0, loop_interval=2.0, report_on_change=True, heartbeat=60,
+                 flow_rate=1.0, faults=None, seed=0, start=None):
+        self.link_dir = link_dir
+        self.speed = speed
+        self.period = loop_interval / speed
+        os.makedirs(link_dir, exist_ok=True)
+        raise_fd_limit(2 * count + 64)
+        start = start or datetime.now().replace(microsecond=0)
+        self.devices = [
+            VirtualDevice(i, os.path.join(link_dir, f"{LINK_PREFIX}{i:03d}"), start, loop_interval,
+                          report_on_change, heartbeat, flow_rate, faults, seed)
+            for i in range(count)
+        ]
+        self.selector = selectors.DefaultSelector()
+        for device in self.devices:
+            self.selector.register(device.master, selectors.EVENT_READ, device)
+        self.late_steps = 0
+        self.write_manifest(faults or {}, loop_interval, report_on_change)
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.link_dir, 'virtual_devices.json')
+
+    def write_manifest(self, faults, loop_interval, report_on_change):
+        with open(self.manifest_path, 'w') as f:
+            json.dump({
+                'speed': self.speed,
+                'loop_interval': loop_interval,
+                'report_on_change': report_on_change,
+                'faults': faults,
+                'devices': [device.link_path for device in self.devices]
+            }, f, indent=2)
+
+    def run(self, duration=None, status_interval=10.0):
+        """Step the devices until duration (real seconds) passes or Ctrl+C"""
+        now = time.monotonic()
+        end = now + duration if duration else None
+        # Spread the devices over one period so their output is not bursty
+        schedule = [(now + self.period * i / len(self.devices), i) for i in range(len(self.devices))]
+        heapq.heapify(schedule)
+        next_status = now + status_interval
+        last_totals = self.totals()
+        try:
+            while end is None or now < end:
+                timeout = max(0.0, schedule[0][0] - time.monotonic())
+                for key, _ in self.selector.select(timeout):
+                    key.data.read_commands()
+
+                now = time.monotonic()
+                while schedule[0][0] <= now:
+                    due, i = heapq.heappop(schedule)
+                    device = self.devices[i]
+                    offline = device.step()
+                    if offline is not None:
+                        self.selector.unregister(device.master)
+                        device.hang_up(offline)
+                    elif not device.online and now >= device.offline_until:
+                        device.open()
+                        self.selector.register(device.master, selectors.EVENT_READ, device)
+                    due += self.period
+                    if due < now - 1.0:
+                        # Too far behind: skip ahead instead of bursting
+                        self.late_steps += 1
+                        due = now
+                    heapq.heappush(schedule, (due, i))
+
+                if now >= next_status:
+                    totals = self.totals()
+                    self.print_status(totals, last_totals, now - next_status + status_interval)
+                    last_totals = totals
+                    next_status = now + status_interval
+        except KeyboardInterrupt:
+            pass
+        return self.totals()
+
+    def totals(self):
+        totals = Counter()
+        for device in self.devices:
+            totals.update(device.stats)
+        totals['online'] = sum(device.online for device in self.devices)
+        return totals
+
+    def print_status(self, totals, last, elapsed):
+        faults = ', '.join(f"{name} {totals[name]}" for name in FAULTS if totals[name])
+        print(f"  {totals['online']}/{len(self.devices)} online, "
+              f"{(totals['lines'] - last['lines']) / elapsed:,.0f} lines/s, "
+              f"{(totals['bytes'] - last['bytes']) / elapsed / 1000:,.1f} kB/s, "
+              f"{totals['commands']} commands, {totals['dropped_bytes']} bytes unread"
+              + (f", faults: {faults}" if faults else "")
+              + (f", {self.late_steps} late steps" if self.late_steps else ""))
+
+    def close(self):
+        for device in self.devices:
+            if device.online:
+                self.selector.unregister(device.master)
+                device.hang_up()
+        self.selector.close()
+        if os.path.exists(self.manifest_path):
+            os.remove(self.manifest_path)
+
+
+def raise_fd_limit(needed):
+    """Two descriptors per device; raise the soft limit up to the hard one"""
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != resource.RLIM_INFINITY and soft < needed:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (needed if hard == resource.RLIM_INFINITY else min(needed, hard), hard))
+
+
+def check_devices(paths, seconds=10.0):
+    """Open every device with pyserial like the dashboard and count what arrives
+
+    Returns per-path counts of data lines, other lines, undecodable lines
+    and I/O errors (hang-ups), reopening a device after it comes back.
+    """
+    import serial
+    from irrigation_rollups import parse_irrigation_line
+
+    counts = {path: Counter() for path in paths}
+    ports, buffers = {}, {}
+    selector = selectors.DefaultSelector()
+
+    def connect(path):
+        try:
+            port = serial.Serial(path, 9600, timeout=0)
+        except (serial.SerialException, OSError):
+            return
+        ports[path] = port
+        buffers[path] = b""
+        selector.register(port.fileno(), selectors.EVENT_READ, path)
+        # pyserial's write() uses select(), which stops at fd 1024
+        os.write(port.fileno(), b"REQUEST_DATA:SINCE=0\n")
+
+    for path in paths:
+        connect(path)
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        for key, _ in selector.select(0.2):
+            path = key.data
+            try:
+                data = os.read(key.fd, 4096)
+                if not data:
+                    raise OSError("hang-up")
+            except OSError:
+                counts[path]['io_errors'] += 1
+                selector.unregister(key.fd)
+                ports.pop(path).close()
+                continue
+            buffers[path] += data
+            *lines, buffers[path] = buffers[path].split(b"\n")
+            for raw in lines:
+                try:
+                    line = raw.decode('utf-8').strip()
+                except UnicodeDecodeError:
+                    counts[path]['undecodable'] += 1
+                    continue
+                if not line.startswith("IRRIGATION_DATA:"):
+                    counts[path]['other'] += 1
+                    continue
+                try:
+                    counts[path]['data' if parse_irrigation_line(line) else 'bad_data'] += 1
+                except ValueError:
+                    counts[path]['bad_data'] += 1
+        for path in paths:
+            if path not in ports and os.path.exists(path):
+                connect(path)
+    for port in ports.values():
+        port.close()
+    selector.close()
+    return counts
+
+
+if __name__ == "__main__":
+    import argparse
+    import threading
+
+    parser = argparse.ArgumentParser(description="Virtual Irrigating.ino devices on pseudo-terminals")
+    parser.add_argument('--devices', type=int, default=1)
+    parser.add_argument('--link-dir', default='/tmp/irrigation_devices',
+                        help="where the ttyACMV### links go; /dev (as root) lets the dashboard's Scan find them")
+    parser.add_argument('--speed', type=float, default=1.0, help="simulated seconds per real second")
+    parser.add_argument('--interval', type=float, default=2.0, help="simulated seconds per step of each device")
+    parser.add_argument('--fixed-rate', action='store_true', help="report every loop instead of on change")
+    parser.add_argument('--heartbeat', type=int, default=60)
+    parser.add_argument('--flow-rate', type=float, default=1.0)
+    parser.add_argument('--faults', default='',
+                        help="chance per step, e.g. garbage=0.01,disconnect=0.0005 ("
+                             + ', '.join(FAULTS) + ")")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--duration', type=float, default=None, help="real seconds to run (default: until Ctrl+C)")
+    parser.add_argument('--check', action='store_true', help="read every device with pyserial and report")
+    args = parser.parse_args()
+
+    farm = DeviceFarm(args.devices, args.link_dir, args.speed, args.interval, not args.fixed_rate,
+                      args.heartbeat, args.flow_rate, parse_faults(args.faults), args.seed)
+    paths = [device.link_path for device in farm.devices]
+    print(f"🔌 {len(paths)} virtual Irrigating.ino devices at {args.speed:g}x: {paths[0]}"
+          + (f" ... {paths[-1]}" if len(paths) > 1 else "") + f" (list in {farm.manifest_path})")
+    try:
+        if args.check:
+            duration = args.duration or 10.0
+            runner = threading.Thread(target=farm.run, args=(duration + 1.0,), daemon=True)
+            runner.start()
+            counts = check_devices(paths, duration)
+            runner.join()
+            total = Counter()
+            for count in counts.values():
+                total.update(count)
+            print(f"📥 Read back over {duration:g} s: {total['data']} data lines, {total['other']} other lines, "
+                  f"{total['bad_data']} malformed data lines, {total['undecodable']} undecodable lines, "
+                  f"{total['io_errors']} hang-ups seen")
+        else:
+            farm.run(args.duration)
+    finally:
+        farm.close()